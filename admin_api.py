@@ -7,10 +7,12 @@
 import logging
 from flask import Flask, jsonify, render_template, request
 from flask_cors import CORS
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import db_pool
+from settings_cache import BOT_SETTINGS, get_int_setting, get_bool_setting, invalidate_settings
+import dashboard_metrics
+import task_log_summary
+import task_search
 import os
-from urllib.parse import urlparse
 from datetime import datetime, timedelta
 import requests
 import json
@@ -29,57 +31,16 @@ CORS(app)
 DATABASE_URL = os.getenv('DATABASE_URL')
 
 def get_db_connection():
-    """获取数据库连接"""
-    result = urlparse(DATABASE_URL)
-    return psycopg2.connect(
-        database=result.path[1:],
-        user=result.username,
-        password=result.password,
-        host=result.hostname,
-        port=result.port,
-        cursor_factory=RealDictCursor
-    )
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
 
 def get_reward_config():
-    """获取奖励配置"""
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT key, value FROM bot_settings 
-            WHERE key IN ('task_reward_x2c', 'newcomer_reward_multiplier', 'enable_newcomer_reward')
-        """)
-        
-        settings = cur.fetchall()
-        cur.close()
-        conn.close()
-        
-        config = {
-            'task_reward_x2c': 100,
-            'newcomer_reward_multiplier': 5,
-            'enable_newcomer_reward': True
-        }
-        
-        for setting in settings:
-            key = setting['key']
-            value = setting['value']
-            
-            if key == 'task_reward_x2c':
-                config['task_reward_x2c'] = int(value)
-            elif key == 'newcomer_reward_multiplier':
-                config['newcomer_reward_multiplier'] = int(value)
-            elif key == 'enable_newcomer_reward':
-                config['enable_newcomer_reward'] = value.lower() in ('true', '1', 'yes')
-        
-        return config
-    except Exception as e:
-        logger.error(f"获取奖励配置失败: {e}")
-        return {
-            'task_reward_x2c': 100,
-            'newcomer_reward_multiplier': 5,
-            'enable_newcomer_reward': True
-        }
+    """获取奖励配置（读配置缓存）"""
+    return {
+        'task_reward_x2c': get_int_setting('task_reward_x2c', 100),
+        'newcomer_reward_multiplier': get_int_setting('newcomer_reward_multiplier', 5),
+        'enable_newcomer_reward': get_bool_setting('enable_newcomer_reward', True)
+    }
 
 @app.route('/')
 def index():
@@ -108,8 +69,8 @@ def get_task_logs():
         search_condition = ""
         search_params = []
         if search:
-            search_condition = " AND (t.title ILIKE %s OR t.project_id ILIKE %s)"
-            search_params = [f'%{search}%', f'%{search}%']
+            search_sql, search_params = task_search.search_condition(cur, search)
+            search_condition = f" AND {search_sql}"
         
         # 先查询总数
         if hours > 0:
@@ -228,8 +189,8 @@ def get_task_logs():
 def get_completion_logs():
     """
     获取任务完成日志
-    按任务分组，同一任务的多个完成者整合到一行
-    支持分页参数: limit, offset, hours
+    按任务分组，同一任务的多个完成者整合到一行（读取 task_log_summary 汇总表）
+    支持分页参数: limit, cursor（上一页返回的 next_cursor）, hours；兼容旧的 offset 参数
     支持搜索参数: search (按任务名或 project_id 搜索)
     """
     try:
@@ -237,80 +198,49 @@ def get_completion_logs():
         offset = int(request.args.get('offset', 0))
         hours = int(request.args.get('hours', 24))
         search = request.args.get('search', '').strip()
+        cursor = request.args.get('cursor') or None
         
         conn = get_db_connection()
         cur = conn.cursor()
         
-        # 构建搜索条件
-        search_condition = ""
-        search_params = []
-        if search:
-            search_condition = " AND (t.title ILIKE %s OR t.project_id ILIKE %s)"
-            search_params = [f'%{search}%', f'%{search}%']
-        
-        # 先查询总数（有完成记录的任务数）
-        if hours > 0:
-            cur.execute(f"""
-                SELECT COUNT(DISTINCT t.task_id) as total
-                FROM user_tasks ut
-                JOIN drama_tasks t ON ut.task_id = t.task_id
-                WHERE ut.status = 'submitted'
-                    AND ut.submitted_at >= NOW() - INTERVAL '%s hours'{search_condition}
-            """, [hours] + search_params)
-        else:
-            cur.execute(f"""
-                SELECT COUNT(DISTINCT t.task_id) as total
-                FROM user_tasks ut
-                JOIN drama_tasks t ON ut.task_id = t.task_id
-                WHERE ut.status = 'submitted'{search_condition}
-            """, search_params if search_params else [])
-        total_count = cur.fetchone()['total']
-        
-        # 查询最近完成的任务（按任务分组）
-        base_sql = """
-            SELECT 
-                t.task_id,
-                t.external_task_id,
-                t.project_id,
-                t.title,
-                t.category,
-                t.platform_requirements,
-                t.node_power_reward,
-                t.max_completions,
-                COUNT(DISTINCT ut.user_id) as completion_count,
-                SUM(COALESCE(ut.view_count, 0)) as total_view_count,
-                SUM(COALESCE(ut.like_count, 0)) as total_like_count,
-                MAX(ut.submitted_at) as latest_completed_at,
-                MIN(ut.submitted_at) as earliest_completed_at,
-                MAX(ut.view_count_updated_at) as view_count_updated_at
-            FROM user_tasks ut
-            JOIN drama_tasks t ON ut.task_id = t.task_id
-            WHERE ut.status = 'submitted'
-        """
-        
-        if hours > 0:
-            where_extra = f" AND ut.submitted_at >= NOW() - INTERVAL '%s hours'{search_condition}"
-            query_params = [hours] + search_params + [limit, offset]
-        else:
-            where_extra = search_condition
-            query_params = search_params + [limit, offset]
+        total_count = task_log_summary.count_completion_tasks(cur, hours, search)
+        tasks, next_cursor = task_log_summary.list_completion_tasks(cur, hours, search, limit, cursor, offset)
+        task_ids = [task['task_id'] for task in tasks]
         
-        full_sql = f"""{base_sql}{where_extra}
-            GROUP BY t.task_id, t.external_task_id, t.project_id, t.title, t.category, t.platform_requirements, t.node_power_reward, t.max_completions
-            ORDER BY MAX(ut.submitted_at) DESC
-            LIMIT %s OFFSET %s
-        """
-        cur.execute(full_sql, query_params)
+        # 任务基本信息
+        task_info = {}
+        if task_ids:
+            cur.execute("""
+                SELECT task_id, external_task_id, project_id, title, category,
+                       platform_requirements, node_power_reward, max_completions
+                FROM drama_tasks
+                WHERE task_id = ANY(%s)
+            """, (task_ids,))
+            task_info = {row['task_id']: row for row in cur.fetchall()}
         
-        tasks = cur.fetchall()
+        # 限定时间范围时，完成人数、播放量等只统计范围内的完成记录（只查当前页的任务）
+        if task_ids and hours > 0:
+            cur.execute("""
+                SELECT 
+                    task_id,
+                    COUNT(DISTINCT user_id) as completion_count,
+                    SUM(COALESCE(view_count, 0)) as total_view_count,
+                    SUM(COALESCE(like_count, 0)) as total_like_count,
+                    MAX(submitted_at) as latest_completed_at,
+                    MIN(submitted_at) as earliest_completed_at,
+                    MAX(view_count_updated_at) as view_count_updated_at
+                FROM user_tasks
+                WHERE task_id = ANY(%s) AND status = 'submitted'
+                    AND submitted_at >= NOW() - %s * INTERVAL '1 hour'
+                GROUP BY task_id
+            """, (task_ids, hours))
+            windowed = {row['task_id']: row for row in cur.fetchall()}
+            tasks = [{**task, **windowed.get(task['task_id'], {})} for task in tasks]
         
         # 获取基础奖励配置（只查询一次）
         reward_config = get_reward_config()
         base_reward = reward_config.get('task_reward_x2c', 100)
         
-        # 获取所有任务ID
-        task_ids = [task['task_id'] for task in tasks]
-        
         # 批量获取所有完成者详情（只查询一次）
         all_completers = {}
         if task_ids:
@@ -354,6 +284,7 @@ def get_completion_logs():
         result_data = []
         for task in tasks:
             task_id = task['task_id']
+            info = task_info.get(task_id, {})
             completers_list = all_completers.get(task_id, [])
             
             # 计算所有完成者的总奖励
@@ -361,14 +292,14 @@ def get_completion_logs():
             
             # 构建任务数据
             task_data = {
-                'task_id': task['task_id'],
-                'external_task_id': task['external_task_id'],
-                'project_id': task['project_id'],
-                'title': task['title'],
-                'category': task['category'],
-                'platform_requirements': task['platform_requirements'],
-                'node_power_reward': task['node_power_reward'],
-                'max_completions': task['max_completions'] or 100,
+                'task_id': task_id,
+                'external_task_id': info.get('external_task_id'),
+                'project_id': info.get('project_id'),
+                'title': info.get('title'),
+                'category': info.get('category'),
+                'platform_requirements': info.get('platform_requirements'),
+                'node_power_reward': info.get('node_power_reward'),
+                'max_completions': info.get('max_completions') or 100,
                 'completion_count': task['completion_count'],
                 'total_view_count': task['total_view_count'] or 0,
                 'total_like_count': task['total_like_count'] or 0,
@@ -389,11 +320,17 @@ def get_completion_logs():
             'data': result_data,
             'count': total_count,  # 返回真实总数
             'displayed': len(result_data),  # 当前显示的数量
-            'offset': offset,  # 当前偏移量
+            'offset': offset,  # 当前偏移量（使用 cursor 时忽略）
             'limit': limit,  # 每页数量
-            'has_more': offset + len(result_data) < total_count  # 是否有更多数据
+            'has_more': next_cursor is not None,  # 是否有更多数据
+            'next_cursor': next_cursor  # 下一页游标
         })
     
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"获取完成日志失败: {e}")
         return jsonify({
@@ -401,12 +338,39 @@ def get_completion_logs():
             'error': str(e)
         }), 500
 
+@app.route('/api/logs/completions/count', methods=['GET'])
+def get_completion_logs_count():
+    """
+    有完成记录的任务数（只读汇总表）
+    支持参数: hours（0 或负数表示全部）, search
+    """
+    try:
+        hours = int(request.args.get('hours', 0))
+        search = request.args.get('search', '').strip()
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        total_count = task_log_summary.count_completion_tasks(cur, hours, search)
+        cur.close()
+        conn.close()
+        
+        return jsonify({
+            'success': True,
+            'count': total_count
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/logs/webhooks', methods=['GET'])
 def get_webhook_logs():
     """
     获取 Webhook 回调日志
-    从webook_logs表读取真实的回调记录（如果表存在）
-    支持分页参数: limit, offset, hours
+    按任务分组，每个任务显示最新的一条回调记录（读取 task_log_summary 汇总表）
+    支持分页参数: limit, cursor（上一页返回的 next_cursor）, hours；兼容旧的 offset 参数
     支持搜索参数: search (按任务名或 project_id 搜索)
     """
     try:
@@ -414,426 +378,166 @@ def get_webhook_logs():
         offset = int(request.args.get('offset', 0))
         hours = int(request.args.get('hours', 24))
         search = request.args.get('search', '').strip()
+        cursor = request.args.get('cursor') or None
         
         conn = get_db_connection()
         cur = conn.cursor()
         
-        # 构建搜索条件
-        search_condition_webhook = ""
-        search_condition_task = ""
-        search_params = []
-        if search:
-            search_condition_webhook = " AND (task_title ILIKE %s OR project_id ILIKE %s)"
-            search_condition_task = " AND (t.title ILIKE %s OR t.project_id ILIKE %s)"
-            search_params = [f'%{search}%', f'%{search}%']
-        
-        # 检查webhook_logs表是否存在
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'webhook_logs'
-            )
-        """)
-        table_exists = cur.fetchone()['exists']
-        logger.info(f"🔍 [DEBUG] webhook_logs表存在: {table_exists}, hours={hours}, limit={limit}")
+        total_count = task_log_summary.count_webhook_tasks(cur, hours, search)
+        tasks, next_cursor = task_log_summary.list_webhook_tasks(cur, hours, search, limit, cursor, offset)
+        task_ids = [task['task_id'] for task in tasks]
         
-        # 如果表存在，从 webhook_logs 读取（按任务ID分组，只显示最新的一条回调记录，按回调时间降序排列）
-        if table_exists:
-            if hours > 0:
-                # 构建搜索条件的 SQL 片段
-                search_where = search_condition_webhook if search else ""
-                webhook_params = [hours] + search_params if search else [hours]
-                count_params = [hours] + search_params if search else [hours]
-                final_params = webhook_params + count_params + [limit, offset]
-                
-                cur.execute(f"""
-                    WITH latest_webhooks AS (
-                        SELECT DISTINCT ON (task_id)
-                            id,
-                            task_id,
-                            task_title,
-                            project_id,
-                            callback_url,
-                            callback_status,
-                            payload,
-                            created_at
-                        FROM webhook_logs
-                        WHERE created_at >= NOW() - INTERVAL '%s hours'{search_where}
-                        ORDER BY task_id, created_at DESC
-                    ),
-                    callback_counts AS (
-                        SELECT task_id, COUNT(*) as callback_count
-                        FROM webhook_logs
-                        WHERE created_at >= NOW() - INTERVAL '%s hours'{search_where}
-                        GROUP BY task_id
-                    ),
-                    task_completion_times AS (
-                        SELECT task_id, MAX(submitted_at) as latest_completed_at
-                        FROM user_tasks
-                        WHERE status = 'submitted'
-                        GROUP BY task_id
-                    )
-                    SELECT 
-                        lw.id,
-                        lw.task_id,
-                        lw.task_title as title,
-                        lw.project_id,
-                        lw.callback_url,
-                        lw.callback_status,
-                        lw.payload,
-                        lw.created_at,
-                        t.external_task_id,
-                        t.callback_retry_count,
-                        t.callback_last_attempt,
-                        t.video_url,
-                        COUNT(DISTINCT CASE WHEN ut.status = 'submitted' THEN ut.user_id END) as completed_count,
-                        COALESCE(cc.callback_count, 1) as callback_count,
-                        tct.latest_completed_at
-                    FROM latest_webhooks lw
-                    LEFT JOIN drama_tasks t ON lw.task_id = t.task_id
-                    LEFT JOIN user_tasks ut ON lw.task_id = ut.task_id
-                    LEFT JOIN callback_counts cc ON lw.task_id = cc.task_id
-                    LEFT JOIN task_completion_times tct ON lw.task_id = tct.task_id
-                    GROUP BY lw.id, lw.task_id, lw.task_title, lw.project_id, lw.callback_url, 
-                             lw.callback_status, lw.payload, lw.created_at, t.external_task_id,
-                             t.callback_retry_count, t.callback_last_attempt, t.video_url, cc.callback_count, tct.latest_completed_at
-                    ORDER BY tct.latest_completed_at DESC NULLS LAST
-                    LIMIT %s OFFSET %s
-                """, final_params)
-            else:
-                # 构建搜索条件的 SQL 片段
-                if search:
-                    search_where = " WHERE" + search_condition_webhook.replace(" AND", "", 1)
-                    final_params = search_params + search_params + [limit, offset]
-                else:
-                    search_where = ""
-                    final_params = [limit, offset]
-                
-                cur.execute(f"""
-                    WITH latest_webhooks AS (
-                        SELECT DISTINCT ON (task_id)
-                            id,
-                            task_id,
-                            task_title,
-                            project_id,
-                            callback_url,
-                            callback_status,
-                            payload,
-                            created_at
-                        FROM webhook_logs{search_where}
-                        ORDER BY task_id, created_at DESC
-                    ),
-                    callback_counts AS (
-                        SELECT task_id, COUNT(*) as callback_count
-                        FROM webhook_logs{search_where}
-                        GROUP BY task_id
-                    ),
-                    task_completion_times AS (
-                        SELECT task_id, MAX(submitted_at) as latest_completed_at
-                        FROM user_tasks
-                        WHERE status = 'submitted'
-                        GROUP BY task_id
-                    )
-                    SELECT 
-                        lw.id,
-                        lw.task_id,
-                        lw.task_title as title,
-                        lw.project_id,
-                        lw.callback_url,
-                        lw.callback_status,
-                        lw.payload,
-                        lw.created_at,
-                        t.external_task_id,
-                        t.callback_retry_count,
-                        t.callback_last_attempt,
-                        t.video_url,
-                        COUNT(DISTINCT CASE WHEN ut.status = 'submitted' THEN ut.user_id END) as completed_count,
-                        COALESCE(cc.callback_count, 1) as callback_count,
-                        tct.latest_completed_at
-                    FROM latest_webhooks lw
-                    LEFT JOIN drama_tasks t ON lw.task_id = t.task_id
-                    LEFT JOIN user_tasks ut ON lw.task_id = ut.task_id
-                    LEFT JOIN callback_counts cc ON lw.task_id = cc.task_id
-                    LEFT JOIN task_completion_times tct ON lw.task_id = tct.task_id
-                    GROUP BY lw.id, lw.task_id, lw.task_title, lw.project_id, lw.callback_url, 
-                             lw.callback_status, lw.payload, lw.created_at, t.external_task_id,
-                             t.callback_retry_count, t.callback_last_attempt, t.video_url, cc.callback_count, tct.latest_completed_at
-                    ORDER BY tct.latest_completed_at DESC NULLS LAST
-                    LIMIT %s OFFSET %s
-                """, final_params)
-            
-            webhooks = cur.fetchall()
-            
-            # 调试日志：输出查询到的记录数
-            logger.info(f"🔍 [DEBUG] 查询到的webhook记录数: {len(webhooks)}")
-            
-            # 查询总记录数
-            cur.execute("SELECT COUNT(*) as total FROM webhook_logs")
-            total_count = cur.fetchone()['total']
-            logger.info(f"🔍 [DEBUG] webhook_logs表总记录数: {total_count}")
+        latest_webhooks = {}
+        task_info = {}
+        callback_counts = {task['task_id']: task['webhook_count'] for task in tasks}
+        user_submissions = {}
+        if task_ids:
+            # 每个任务最新的一条回调记录
+            cur.execute("""
+                SELECT id, task_id, task_title, project_id, callback_url, callback_status, payload, created_at
+                FROM webhook_logs
+                WHERE id = ANY(%s)
+            """, ([task['latest_webhook_id'] for task in tasks],))
+            latest_webhooks = {row['task_id']: row for row in cur.fetchall()}
             
-            # 转换日期格式
-            for webhook in webhooks:
-                if webhook['created_at']:
-                    webhook['created_at'] = webhook['created_at'].isoformat()
-                if webhook.get('callback_last_attempt'):
-                    webhook['callback_last_attempt'] = webhook['callback_last_attempt'].isoformat()
-                
-                # 添加状态标签
-                if webhook['callback_status'] == 'success':
-                    webhook['status_label'] = '✅ 成功'
-                    webhook['status_class'] = 'success'
-                else:
-                    webhook['status_label'] = '❌ 失败'
-                    webhook['status_class'] = 'danger'
-                
-                # payload已经是JSONB格式
-                webhook['callback_payload'] = webhook.get('payload', {})
-                
-                # 从 user_tasks 表获取播放量数据（而不是从 payload 中获取）
-                task_id_for_view = webhook.get('task_id')
-                if task_id_for_view:
-                    cur_view = conn.cursor()
-                    cur_view.execute("""
-                        SELECT COALESCE(SUM(view_count), 0) as total_views
-                        FROM user_tasks
-                        WHERE task_id = %s AND status = 'submitted'
-                    """, (task_id_for_view,))
-                    view_result = cur_view.fetchone()
-                    webhook['view_count'] = view_result['total_views'] if view_result else 0
-                    cur_view.close()
-                else:
-                    webhook['view_count'] = 0
-                
-                # 查询用户分发链接
-                task_id = webhook.get('task_id')
-                if task_id:
-                    cur2 = conn.cursor()
-                    cur2.execute("""
-                        SELECT 
-                            user_id,
-                            submission_link as video_url,
-                            submitted_at
-                        FROM user_tasks
-                        WHERE task_id = %s AND status = 'submitted' AND submission_link IS NOT NULL
-                        ORDER BY submitted_at ASC
-                    """, (task_id,))
-                    
-                    user_submissions = cur2.fetchall()
-                    webhook['user_submissions'] = [
-                        {
-                            'user_id': str(sub['user_id']),
-                            'video_url': sub['video_url'],
-                            'submitted_at': sub['submitted_at'].isoformat() if sub['submitted_at'] else None
-                        }
-                        for sub in user_submissions
-                    ]
-                    cur2.close()
-                else:
-                    webhook['user_submissions'] = []
+            cur.execute("""
+                SELECT task_id, external_task_id, callback_retry_count, callback_last_attempt, video_url
+                FROM drama_tasks
+                WHERE task_id = ANY(%s)
+            """, (task_ids,))
+            task_info = {row['task_id']: row for row in cur.fetchall()}
             
-            # 查询总任务数（按任务ID去重）- 在关闭连接前执行，需要考虑搜索条件
-            cur2 = conn.cursor()
+            # 限定时间范围时，回调次数只统计范围内的记录
             if hours > 0:
-                if search:
-                    cur2.execute(f"SELECT COUNT(DISTINCT task_id) as total FROM webhook_logs WHERE created_at >= NOW() - INTERVAL '%s hours'{search_condition_webhook}", [hours] + search_params)
-                else:
-                    cur2.execute("SELECT COUNT(DISTINCT task_id) as total FROM webhook_logs WHERE created_at >= NOW() - INTERVAL '%s hours'", (hours,))
-            else:
-                if search:
-                    search_where_count = " WHERE" + search_condition_webhook.replace(" AND", "", 1)
-                    cur2.execute(f"SELECT COUNT(DISTINCT task_id) as total FROM webhook_logs{search_where_count}", search_params)
-                else:
-                    cur2.execute("SELECT COUNT(DISTINCT task_id) as total FROM webhook_logs")
-            total_count = cur2.fetchone()['total']
-            cur2.close()
+                cur.execute("""
+                    SELECT task_id, COUNT(*) as callback_count
+                    FROM webhook_logs
+                    WHERE task_id = ANY(%s) AND created_at >= NOW() - %s * INTERVAL '1 hour'
+                    GROUP BY task_id
+                """, (task_ids, hours))
+                callback_counts = {row['task_id']: row['callback_count'] for row in cur.fetchall()}
             
-            cur.close()
-            conn.close()
-            
-            return jsonify({
-                'success': True,
-                'data': webhooks,
-                'count': total_count,  # 返回真实总数
-                'displayed': len(webhooks),  # 当前显示的数量
-                'offset': offset,  # 当前偏移量
-                'limit': limit,  # 每页数量
-                'has_more': offset + len(webhooks) < total_count,  # 是否有更多数据
-                'source': 'webhook_logs'
-            })
-        
-        # 如果表不存在，使用原来的逻辑（从 drama_tasks 读取）
-        
-        # 查询有回调配置的任务
-        if hours > 0:
-            cur.execute("""
-                SELECT 
-                    t.task_id,
-                    t.external_task_id,
-                    t.project_id,
-                    t.title,
-                    t.duration,
-                    t.platform_requirements,
-                    t.callback_url,
-                    t.callback_status,
-                    t.callback_retry_count,
-                    t.callback_last_attempt,
-                    t.created_at,
-                    t.video_url,
-                    COUNT(DISTINCT CASE WHEN ut.status = 'submitted' THEN ut.user_id END) as completed_count
-                FROM drama_tasks t
-                LEFT JOIN user_tasks ut ON t.task_id = ut.task_id
-                WHERE t.callback_url IS NOT NULL
-                    AND t.created_at >= NOW() - INTERVAL '%s hours'
-                GROUP BY t.task_id
-                ORDER BY t.callback_last_attempt DESC NULLS LAST, t.created_at DESC
-                LIMIT %s
-            """, (hours, limit))
-        else:
+            # 用户分发链接
             cur.execute("""
                 SELECT 
-                    t.task_id,
-                    t.external_task_id,
-                    t.project_id,
-                    t.title,
-                    t.duration,
-                    t.platform_requirements,
-                    t.callback_url,
-                    t.callback_status,
-                    t.callback_retry_count,
-                    t.callback_last_attempt,
-                    t.created_at,
-                    t.video_url,
-                    COUNT(DISTINCT CASE WHEN ut.status = 'submitted' THEN ut.user_id END) as completed_count
-                FROM drama_tasks t
-                LEFT JOIN user_tasks ut ON t.task_id = ut.task_id
-                WHERE t.callback_url IS NOT NULL
-                GROUP BY t.task_id
-                ORDER BY t.callback_last_attempt DESC NULLS LAST, t.created_at DESC
-                LIMIT %s
-            """, (limit,))
+                    task_id,
+                    user_id,
+                    submission_link as video_url,
+                    submitted_at
+                FROM user_tasks
+                WHERE task_id = ANY(%s) AND status = 'submitted' AND submission_link IS NOT NULL
+                ORDER BY task_id, submitted_at ASC
+            """, (task_ids,))
+            for sub in cur.fetchall():
+                user_submissions.setdefault(sub['task_id'], []).append({
+                    'user_id': str(sub['user_id']),
+                    'video_url': sub['video_url'],
+                    'submitted_at': sub['submitted_at'].isoformat() if sub['submitted_at'] else None
+                })
         
-        webhooks = cur.fetchall()
+        cur.close()
+        conn.close()
         
-        # 转换日期格式
-        for webhook in webhooks:
-            if webhook['created_at']:
-                webhook['created_at'] = webhook['created_at'].isoformat()
-            if webhook['callback_last_attempt']:
-                webhook['callback_last_attempt'] = webhook['callback_last_attempt'].isoformat()
+        webhooks = []
+        for task in tasks:
+            task_id = task['task_id']
+            lw = latest_webhooks.get(task_id, {})
+            info = task_info.get(task_id, {})
+            webhook = {
+                'id': lw.get('id'),
+                'task_id': task_id,
+                'title': lw.get('task_title'),
+                'project_id': lw.get('project_id'),
+                'callback_url': lw.get('callback_url'),
+                'callback_status': lw.get('callback_status'),
+                'payload': lw.get('payload'),
+                'created_at': lw['created_at'].isoformat() if lw.get('created_at') else None,
+                'external_task_id': info.get('external_task_id'),
+                'callback_retry_count': info.get('callback_retry_count'),
+                'callback_last_attempt': info['callback_last_attempt'].isoformat() if info.get('callback_last_attempt') else None,
+                'video_url': info.get('video_url'),
+                'completed_count': task['completion_count'],
+                'callback_count': callback_counts.get(task_id) or 1,
+                'latest_completed_at': task['latest_completed_at'].isoformat() if task['latest_completed_at'] else None
+            }
             
             # 添加状态标签
             if webhook['callback_status'] == 'success':
                 webhook['status_label'] = '✅ 成功'
                 webhook['status_class'] = 'success'
-            elif webhook['callback_status'] == 'failed':
+            else:
                 webhook['status_label'] = '❌ 失败'
                 webhook['status_class'] = 'danger'
-            elif webhook['callback_retry_count'] and webhook['callback_retry_count'] > 0:
-                webhook['status_label'] = f"🔄 重试中 ({webhook['callback_retry_count']}/3)"
-                webhook['status_class'] = 'warning'
-            else:
-                webhook['status_label'] = '⏳ 待回调'
-                webhook['status_class'] = 'secondary'
             
-            # 生成回调数据示例
-            platform = webhook.get('platform_requirements', '').lower()
-            stats_data = {
-                'project_id': webhook.get('project_id'),
-                'task_id': webhook.get('external_task_id') or webhook.get('task_id'),
-                'duration': webhook.get('duration', 30),
-                'account_count': 1
-            }
-            
-            # 根据平台添加示例字段
-            if 'youtube' in platform or 'yt' in platform:
-                stats_data['yt_account_count'] = 1
-                # 可以添加示例数据
-                # stats_data['yt_view_count'] = 0
-                # stats_data['yt_like_count'] = 0
-            elif 'tiktok' in platform or 'tt' in platform:
-                stats_data['tt_account_count'] = 1
-                # stats_data['tt_view_count'] = 0
-                # stats_data['tt_like_count'] = 0
+            # payload已经是JSONB格式
+            webhook['callback_payload'] = webhook.get('payload') or {}
             
-            webhook['callback_payload'] = {
-                'site_name': 'DramaRelayBot',
-                'stats': [stats_data]
-            }
-        
-        # 查询总数（有回调配置的任务数）- 在关闭连接前执行
-        if hours > 0:
-            cur2 = conn.cursor()
-            cur2.execute("SELECT COUNT(*) as total FROM drama_tasks WHERE callback_url IS NOT NULL AND created_at >= NOW() - INTERVAL '%s hours'", (hours,))
-            total_count = cur2.fetchone()['total']
-            cur2.close()
-        else:
-            cur2 = conn.cursor()
-            cur2.execute("SELECT COUNT(*) as total FROM drama_tasks WHERE callback_url IS NOT NULL")
-            total_count = cur2.fetchone()['total']
-            cur2.close()
-        
-        cur.close()
-        conn.close()
+            # 播放量来自 user_tasks（汇总表中的合计），而不是 payload
+            webhook['view_count'] = task['total_view_count']
+            webhook['user_submissions'] = user_submissions.get(task_id, [])
+            webhooks.append(webhook)
         
         return jsonify({
             'success': True,
             'data': webhooks,
             'count': total_count,  # 返回真实总数
             'displayed': len(webhooks),  # 当前显示的数量
-            'offset': offset,  # 当前偏移量
+            'offset': offset,  # 当前偏移量（使用 cursor 时忽略）
             'limit': limit,  # 每页数量
-            'has_more': offset + len(webhooks) < total_count  # 是否有更多数据
+            'has_more': next_cursor is not None,  # 是否有更多数据
+            'next_cursor': next_cursor,  # 下一页游标
+            'source': 'webhook_logs'
         })
     
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
-@app.route('/api/logs/stats', methods=['GET'])
-def get_stats():
+@app.route('/api/logs/webhooks/count', methods=['GET'])
+def get_webhook_logs_count():
     """
-    获取统计数据
+    有回调记录的任务数（只读汇总表）
+    支持参数: hours（0 或负数表示全部）, search
     """
     try:
-        hours = int(request.args.get('hours', 24))
+        hours = int(request.args.get('hours', 0))
+        search = request.args.get('search', '').strip()
         
         conn = get_db_connection()
         cur = conn.cursor()
-        
-        # 任务统计 - 如果 hours 为 0 或负数，则查询所有数据
-        if hours > 0:
-            cur.execute("""
-                SELECT 
-                    COUNT(DISTINCT t.task_id) as total_tasks,
-                    COUNT(DISTINCT ut.user_id) as total_users,
-                    COUNT(DISTINCT CASE WHEN ut.status = 'submitted' THEN ut.user_id END) as completed_users,
-                    COUNT(DISTINCT CASE WHEN t.callback_status = 'success' THEN t.task_id END) as successful_callbacks,
-                    COUNT(DISTINCT CASE WHEN t.callback_status = 'failed' THEN t.task_id END) as failed_callbacks
-                FROM drama_tasks t
-                LEFT JOIN user_tasks ut ON t.task_id = ut.task_id
-                WHERE t.created_at >= NOW() - INTERVAL '%s hours'
-            """, (hours,))
-        else:
-            # 查询所有数据（不限时间）
-            cur.execute("""
-                SELECT 
-                    COUNT(DISTINCT t.task_id) as total_tasks,
-                    COUNT(DISTINCT ut.user_id) as total_users,
-                    COUNT(DISTINCT CASE WHEN ut.status = 'submitted' THEN ut.user_id END) as completed_users,
-                    COUNT(DISTINCT CASE WHEN t.callback_status = 'success' THEN t.task_id END) as successful_callbacks,
-                    COUNT(DISTINCT CASE WHEN t.callback_status = 'failed' THEN t.task_id END) as failed_callbacks
-                FROM drama_tasks t
-                LEFT JOIN user_tasks ut ON t.task_id = ut.task_id
-            """)
-        
-        stats = cur.fetchone()
-        
+        total_count = task_log_summary.count_webhook_tasks(cur, hours, search)
         cur.close()
         conn.close()
         
+        return jsonify({
+            'success': True,
+            'count': total_count
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/logs/stats', methods=['GET'])
+def get_stats():
+    """
+    获取统计数据
+    """
+    try:
+        hours = int(request.args.get('hours', 24))
+        
+        # 任务统计 - 如果 hours 为 0 或负数，则统计所有数据（读取增量计数，窗口起点取整到整点）
+        stats = dashboard_metrics.get_task_stats(hours)
+        
         return jsonify({
             'success': True,
             'data': stats
@@ -1273,14 +977,11 @@ def trigger_broadcaster_api():
     """
     try:
         from stats_broadcaster import broadcast_all_tasks
-        import asyncio
+        import http_client
         import traceback
         
         # 运行异步任务
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(broadcast_all_tasks())
-        loop.close()
+        result = http_client.run(broadcast_all_tasks())
         
         # 检查内部结果是否成功
         if result and result.get('success') == False:
@@ -1580,25 +1281,16 @@ def migrate_categories():
 
 @app.route('/api/tasks/search', methods=['GET'])
 def search_tasks():
-    """搜索任务"""
+    """
+    搜索任务（按相关度排序）
+    支持参数: q（或旧参数 title）, limit（默认 10，最多 50）
+    按任务名、英文标题、project_id、外部任务ID 匹配，见 task_search
+    """
     try:
-        title = request.args.get('title', '')
-        
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT *
-            FROM drama_tasks
-            WHERE title LIKE %s
-            ORDER BY created_at DESC
-            LIMIT 10
-        """, (f'%{title}%',))
+        keyword = request.args.get('q') or request.args.get('title', '')
+        limit = int(request.args.get('limit', 10))
         
-        tasks = cur.fetchall()
-        
-        cur.close()
-        conn.close()
+        tasks = task_search.search_tasks(keyword, limit)
         
         # 转换datetime对象为字符串
         tasks_data = []
@@ -1607,6 +1299,7 @@ def search_tasks():
             for key, value in task_dict.items():
                 if isinstance(value, datetime):
                     task_dict[key] = value.isoformat()
+            task_dict['score'] = float(task_dict['score'])
             tasks_data.append(task_dict)
         
         return jsonify({
@@ -1623,61 +1316,38 @@ def search_tasks():
             'traceback': traceback.format_exc()
         }), 500
 
+@app.route('/api/tasks/suggest', methods=['GET'])
+def suggest_tasks():
+    """
+    搜索框联想（前缀补全）
+    支持参数: q, limit（默认 10）
+    """
+    try:
+        prefix = request.args.get('q', '')
+        limit = int(request.args.get('limit', 10))
+        
+        return jsonify({
+            'success': True,
+            'data': task_search.suggest_tasks(prefix, limit)
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/verification/queue-status', methods=['GET'])
 def get_verification_queue_status():
     """
-    获取TikTok验证队列状态
+    获取验证队列状态（队列深度、最早待处理记录的等待时长、按平台吞吐）
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # 查询待验证的任务数量
-        cur.execute("""
-            SELECT COUNT(*) as pending_count
-            FROM pending_verifications
-            WHERE status = 'pending'
-        """)
-        pending_count = cur.fetchone()['pending_count']
-        
-        # 查询正在处理的任务数量
-        cur.execute("""
-            SELECT COUNT(*) as processing_count
-            FROM pending_verifications
-            WHERE status = 'processing'
-        """)
-        processing_count = cur.fetchone()['processing_count']
-        
-        # 查询最近完成的任务数量（24小时内）
-        cur.execute("""
-            SELECT COUNT(*) as completed_count
-            FROM pending_verifications
-            WHERE status = 'completed'
-              AND completed_at >= NOW() - INTERVAL '24 hours'
-        """)
-        completed_count = cur.fetchone()['completed_count']
-        
-        # 查询最近失败的任务数量（24小时内）
-        cur.execute("""
-            SELECT COUNT(*) as failed_count
-            FROM pending_verifications
-            WHERE status = 'failed'
-              AND updated_at >= NOW() - INTERVAL '24 hours'
-        """)
-        failed_count = cur.fetchone()['failed_count']
-        
-        cur.close()
-        conn.close()
+        from async_verification_worker import get_queue_status
         
         return jsonify({
             'success': True,
-            'data': {
-                'pending': pending_count,
-                'processing': processing_count,
-                'completed_24h': completed_count,
-                'failed_24h': failed_count,
-                'total_queue': pending_count + processing_count
-            }
+            'data': get_queue_status()
         })
     
     except Exception as e:
@@ -2090,96 +1760,10 @@ def get_user_growth_stats():
     try:
         days = int(request.args.get('days', 30))  # 默认查询最近 30 天
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # 1. TG Bot 用户每日增长
-        cur.execute("""
-            SELECT 
-                DATE(created_at) as date,
-                COUNT(*) as new_users
-            FROM users
-            WHERE created_at >= NOW() - INTERVAL '%s days'
-            GROUP BY DATE(created_at)
-            ORDER BY date ASC
-        """, (days,))
-        tg_daily = cur.fetchall()
-        
-        # 2. Web 用户每日增长
-        cur.execute("""
-            SELECT 
-                DATE(created_at) as date,
-                COUNT(*) as new_users
-            FROM web_users
-            WHERE created_at >= NOW() - INTERVAL '%s days'
-            GROUP BY DATE(created_at)
-            ORDER BY date ASC
-        """, (days,))
-        web_daily = cur.fetchall()
-        
-        # 3. 用户总数统计
-        cur.execute("SELECT COUNT(*) as total FROM users")
-        tg_total = cur.fetchone()['total']
-        
-        cur.execute("SELECT COUNT(*) as total FROM web_users")
-        web_total = cur.fetchone()['total']
-        
-        # 4. 最近 7 天新增用户
-        cur.execute("""
-            SELECT COUNT(*) as count FROM users 
-            WHERE created_at >= NOW() - INTERVAL '7 days'
-        """)
-        tg_7d = cur.fetchone()['count']
-        
-        cur.execute("""
-            SELECT COUNT(*) as count FROM web_users 
-            WHERE created_at >= NOW() - INTERVAL '7 days'
-        """)
-        web_7d = cur.fetchone()['count']
-        
-        # 5. 最近 30 天新增用户
-        cur.execute("""
-            SELECT COUNT(*) as count FROM users 
-            WHERE created_at >= NOW() - INTERVAL '30 days'
-        """)
-        tg_30d = cur.fetchone()['count']
-        
-        cur.execute("""
-            SELECT COUNT(*) as count FROM web_users 
-            WHERE created_at >= NOW() - INTERVAL '30 days'
-        """)
-        web_30d = cur.fetchone()['count']
-        
-        cur.close()
-        conn.close()
-        
-        # 转换日期格式
-        for item in tg_daily:
-            item['date'] = item['date'].isoformat() if item['date'] else None
-        for item in web_daily:
-            item['date'] = item['date'].isoformat() if item['date'] else None
-        
+        # 读取按天汇总（见 dashboard_metrics），查询成本与天数成正比，不扫描用户表
         return jsonify({
             'success': True,
-            'data': {
-                'tg_bot': {
-                    'total': tg_total,
-                    'last_7_days': tg_7d,
-                    'last_30_days': tg_30d,
-                    'daily': list(tg_daily)
-                },
-                'web': {
-                    'total': web_total,
-                    'last_7_days': web_7d,
-                    'last_30_days': web_30d,
-                    'daily': list(web_daily)
-                },
-                'combined': {
-                    'total': tg_total + web_total,
-                    'last_7_days': tg_7d + web_7d,
-                    'last_30_days': tg_30d + web_30d
-                }
-            }
+            'data': dashboard_metrics.get_user_growth(days)
         })
         
     except Exception as e:
@@ -2201,112 +1785,10 @@ def get_task_stats():
     try:
         days = int(request.args.get('days', 30))
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # 1. 任务每日领取统计
-        cur.execute("""
-            SELECT 
-                DATE(created_at) as date,
-                COUNT(*) as claimed_count
-            FROM user_tasks
-            WHERE created_at >= NOW() - INTERVAL '%s days'
-            GROUP BY DATE(created_at)
-            ORDER BY date ASC
-        """, (days,))
-        daily_claimed = cur.fetchall()
-        
-        # 2. 任务每日完成统计
-        cur.execute("""
-            SELECT 
-                DATE(submitted_at) as date,
-                COUNT(*) as completed_count
-            FROM user_tasks
-            WHERE submitted_at IS NOT NULL
-            AND submitted_at >= NOW() - INTERVAL '%s days'
-            GROUP BY DATE(submitted_at)
-            ORDER BY date ASC
-        """, (days,))
-        daily_completed = cur.fetchall()
-        
-        # 3. 任务总体统计
-        cur.execute("""
-            SELECT 
-                COUNT(*) as total_claimed,
-                COUNT(CASE WHEN status IN ('submitted', 'approved', 'completed') THEN 1 END) as total_completed,
-                COUNT(CASE WHEN status = 'rejected' THEN 1 END) as total_rejected,
-                COUNT(CASE WHEN status IN ('claimed', 'pending') THEN 1 END) as total_pending,
-                COALESCE(SUM(node_power_earned), 0) as total_rewards
-            FROM user_tasks
-        """)
-        task_totals = cur.fetchone()
-        
-        # 4. 最近 7 天任务统计
-        cur.execute("""
-            SELECT 
-                COUNT(*) as claimed,
-                COUNT(CASE WHEN status IN ('submitted', 'approved', 'completed') THEN 1 END) as completed,
-                COALESCE(SUM(node_power_earned), 0) as rewards
-            FROM user_tasks
-            WHERE created_at >= NOW() - INTERVAL '7 days'
-        """)
-        task_7d = cur.fetchone()
-        
-        # 5. 最近 30 天任务统计
-        cur.execute("""
-            SELECT 
-                COUNT(*) as claimed,
-                COUNT(CASE WHEN status IN ('submitted', 'approved', 'completed') THEN 1 END) as completed,
-                COALESCE(SUM(node_power_earned), 0) as rewards
-            FROM user_tasks
-            WHERE created_at >= NOW() - INTERVAL '30 days'
-        """)
-        task_30d = cur.fetchone()
-        
-        # 6. 按状态分布
-        cur.execute("""
-            SELECT 
-                status,
-                COUNT(*) as count
-            FROM user_tasks
-            GROUP BY status
-            ORDER BY count DESC
-        """)
-        status_distribution = cur.fetchall()
-        
-        cur.close()
-        conn.close()
-        
-        # 转换日期格式
-        for item in daily_claimed:
-            item['date'] = item['date'].isoformat() if item['date'] else None
-        for item in daily_completed:
-            item['date'] = item['date'].isoformat() if item['date'] else None
-        
+        # 读取按天汇总和状态计数（见 dashboard_metrics），不扫描 user_tasks
         return jsonify({
             'success': True,
-            'data': {
-                'totals': {
-                    'claimed': task_totals['total_claimed'],
-                    'completed': task_totals['total_completed'],
-                    'rejected': task_totals['total_rejected'],
-                    'pending': task_totals['total_pending'],
-                    'rewards_distributed': int(task_totals['total_rewards'])
-                },
-                'last_7_days': {
-                    'claimed': task_7d['claimed'],
-                    'completed': task_7d['completed'],
-                    'rewards': int(task_7d['rewards'])
-                },
-                'last_30_days': {
-                    'claimed': task_30d['claimed'],
-                    'completed': task_30d['completed'],
-                    'rewards': int(task_30d['rewards'])
-                },
-                'daily_claimed': list(daily_claimed),
-                'daily_completed': list(daily_completed),
-                'status_distribution': list(status_distribution)
-            }
+            'data': dashboard_metrics.get_task_trends(days)
         })
         
     except Exception as e:
@@ -2326,103 +1808,10 @@ def get_stats_overview():
     包括用户、任务、奖励等核心指标
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # 1. 用户统计
-        cur.execute("SELECT COUNT(*) as total FROM users")
-        tg_users = cur.fetchone()['total']
-        
-        cur.execute("SELECT COUNT(*) as total FROM web_users")
-        web_users = cur.fetchone()['total']
-        
-        # 2. 任务统计
-        cur.execute("SELECT COUNT(*) as total FROM drama_tasks WHERE status = 'active'")
-        active_tasks = cur.fetchone()['total']
-        
-        cur.execute("SELECT COUNT(*) as total FROM user_tasks")
-        total_claimed = cur.fetchone()['total']
-        
-        cur.execute("""
-            SELECT COUNT(*) as total FROM user_tasks 
-            WHERE status IN ('submitted', 'approved', 'completed')
-        """)
-        total_completed = cur.fetchone()['total']
-        
-        # 3. 奖励统计
-        cur.execute("SELECT COALESCE(SUM(node_power_earned), 0) as total FROM user_tasks")
-        total_rewards = int(cur.fetchone()['total'])
-        
-        # 4. 今日统计
-        cur.execute("""
-            SELECT COUNT(*) as count FROM users 
-            WHERE DATE(created_at) = CURRENT_DATE
-        """)
-        tg_today = cur.fetchone()['count']
-        
-        cur.execute("""
-            SELECT COUNT(*) as count FROM web_users 
-            WHERE DATE(created_at) = CURRENT_DATE
-        """)
-        web_today = cur.fetchone()['count']
-        
-        cur.execute("""
-            SELECT COUNT(*) as count FROM user_tasks 
-            WHERE DATE(created_at) = CURRENT_DATE
-        """)
-        tasks_today = cur.fetchone()['count']
-        
-        cur.execute("""
-            SELECT COUNT(*) as count FROM user_tasks 
-            WHERE DATE(submitted_at) = CURRENT_DATE
-            AND status IN ('submitted', 'approved', 'completed')
-        """)
-        completed_today = cur.fetchone()['count']
-        
-        # 5. 提现统计
-        cur.execute("""
-            SELECT 
-                COUNT(*) as total,
-                COUNT(CASE WHEN status = 'completed' THEN 1 END) as completed,
-                COUNT(CASE WHEN status = 'pending' THEN 1 END) as pending,
-                COALESCE(SUM(CASE WHEN status = 'completed' THEN amount END), 0) as total_amount
-            FROM withdrawals
-        """)
-        withdrawal_stats = cur.fetchone()
-        
-        cur.close()
-        conn.close()
-        
+        # 计数由触发器增量维护，见 dashboard_metrics
         return jsonify({
             'success': True,
-            'data': {
-                'users': {
-                    'tg_bot': tg_users,
-                    'web': web_users,
-                    'total': tg_users + web_users,
-                    'tg_today': tg_today,
-                    'web_today': web_today,
-                    'today_total': tg_today + web_today
-                },
-                'tasks': {
-                    'active': active_tasks,
-                    'total_claimed': total_claimed,
-                    'total_completed': total_completed,
-                    'completion_rate': round(total_completed / total_claimed * 100, 1) if total_claimed > 0 else 0,
-                    'claimed_today': tasks_today,
-                    'completed_today': completed_today
-                },
-                'rewards': {
-                    'total_distributed': total_rewards,
-                    'total_usd': round(total_rewards * 0.02, 2)  # X2C 价格 $0.02
-                },
-                'withdrawals': {
-                    'total': withdrawal_stats['total'],
-                    'completed': withdrawal_stats['completed'],
-                    'pending': withdrawal_stats['pending'],
-                    'total_amount': int(withdrawal_stats['total_amount'])
-                }
-            }
+            'data': dashboard_metrics.get_overview()
         })
         
     except Exception as e:
@@ -2628,6 +2017,9 @@ def update_reward_settings():
         cur.close()
         conn.close()
         
+        # 本进程立即失效，并通知 bot 进程
+        invalidate_settings(BOT_SETTINGS)
+        
         logger.info(f"✅ Reward settings updated: {updated_keys}")
         
         return jsonify({
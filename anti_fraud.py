@@ -1,19 +1,164 @@
 """
 反刷量检查模块
 """
+import os
+import time
+import asyncio
+import weakref
 import psycopg2
+from psycopg2.extras import execute_values
 from datetime import datetime, timedelta
 import logging
-import requests
-from urllib.parse import urlparse
+import aiohttp
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+import db_pool
+import http_client
+import video_identity
+from rate_limiter import SlidingWindowRateLimiter
 
 logger = logging.getLogger(__name__)
 
+# 数据库连接
+DATABASE_URL = db_pool.DATABASE_URL
+
 # 配置参数
 DAILY_SUBMIT_LIMIT = 100  # 每日提交上限
 SUBMIT_INTERVAL_MINUTES = 1  # 提交间隔(分钟)
+SUBMIT_WINDOW_LIMIT = int(os.getenv('SUBMIT_WINDOW_LIMIT', '1'))  # 每个提交间隔窗口内允许的提交次数
 NEW_USER_COOLDOWN_MINUTES = 5  # 新用户冷却期(分钟)
 LINK_VERIFY_TIMEOUT = 10  # 链接验证超时(秒)
+LINK_PROBE_PER_HOST = int(os.getenv('LINK_PROBE_PER_HOST', '4'))  # 每个主机同时探测的链接数
+LINK_PROBE_CACHE_TTL = int(os.getenv('LINK_PROBE_CACHE_TTL', '300'))  # 探测结果缓存时间(秒)
+LINK_PROBE_CACHE_MAX = int(os.getenv('LINK_PROBE_CACHE_MAX', '5000'))
+
+DUPLICATE_VIDEO_MESSAGE = "❌ 该视频已被提交过!\n\n同一个视频只能提交一次，请发布新视频后提交新的链接"
+
+LINK_PROBE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# 规范化链接时去掉的跟踪参数
+TRACKING_QUERY_PARAMS = {'is_from_webapp', 'sender_device', 'sender_web_id', 'si', 'feature', 'igsh', 'igshid', '_r', '_t'}
+
+# 规范化 URL -> ((is_valid, error_message), expires_at)
+_probe_cache = {}
+
+# 事件循环 -> {host: asyncio.Semaphore}
+_host_semaphores = weakref.WeakKeyDictionary()
+
+
+def get_db_connection():
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
+
+
+def ensure_rate_limit_columns():
+    """确保 users 表有限流写回所需的每日提交计数字段"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS last_submission_time TIMESTAMP")
+        cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS daily_submit_date DATE")
+        cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS daily_submit_count INTEGER NOT NULL DEFAULT 0")
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error(f"初始化限流字段失败: {e}")
+        return False
+
+
+def _load_limit_state(conn, user_id: int):
+    """
+    一条 SQL 读取冷却期、提交间隔和每日上限所需的数据，用户不存在返回 None
+    
+    今日提交数取今日完成的任务数和限流器写回的今日提交计数中较大的一个；
+    限流器只记录提交成功（核验通过并入账）的任务，核验失败的链接不计入
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT u.created_at, u.last_submission_time,
+               GREATEST(
+                   (
+                       SELECT COUNT(*) FROM user_tasks ut
+                       WHERE ut.user_id = u.user_id
+                         AND ut.created_at >= CURRENT_DATE
+                         AND ut.created_at < CURRENT_DATE + 1
+                         AND ut.status = 'completed'
+                   ),
+                   CASE WHEN u.daily_submit_date = CURRENT_DATE THEN u.daily_submit_count ELSE 0 END
+               ) as today_count
+        FROM users u
+        WHERE u.user_id = %s
+    """, (user_id,))
+    return cursor.fetchone()
+
+
+def _evaluate_new_user_cooldown(state) -> tuple[bool, str]:
+    if not state:
+        return False, "用户不存在"
+    
+    created_at = state['created_at']
+    cooldown_end = created_at + timedelta(minutes=NEW_USER_COOLDOWN_MINUTES)
+    now = datetime.now()
+    
+    if now < cooldown_end:
+        return False, "新注册用户需要等待5分钟,请稍后重试"
+    
+    return True, ""
+
+
+def _evaluate_submit_interval(state) -> tuple[bool, str]:
+    if not state or not state['last_submission_time']:
+        # 首次提交
+        return True, ""
+    
+    last_submit_time = state['last_submission_time']
+    next_allowed_time = last_submit_time + timedelta(minutes=SUBMIT_INTERVAL_MINUTES)
+    now = datetime.now()
+    
+    if now < next_allowed_time:
+        remaining_seconds = int((next_allowed_time - now).total_seconds())
+        remaining_minutes = remaining_seconds // 60
+        remaining_secs = remaining_seconds % 60
+        
+        return False, f"⏱️ 提交太频繁!\n\n请等待 {remaining_minutes} 分 {remaining_secs} 秒后再试。\n\n这是为了防止刷量行为,感谢理解!"
+    
+    return True, ""
+
+
+def _evaluate_daily_limit(state) -> tuple[bool, str]:
+    today_count = state['today_count'] if state else 0
+    
+    if today_count >= DAILY_SUBMIT_LIMIT:
+        return False, f"🚫 今日提交次数已达上限!\n\n每天最多提交 {DAILY_SUBMIT_LIMIT} 次任务。\n明天再来吧!"
+    
+    return True, ""
+
+
+def check_user_limits(conn, user_id: int) -> tuple[bool, str]:
+    """
+    一次查询完成新用户冷却期、提交间隔和每日上限检查
+    
+    Returns:
+        (is_allowed, error_message)
+    """
+    try:
+        state = _load_limit_state(conn, user_id)
+    except Exception as e:
+        logger.error(f"检查提交限制失败: {e}")
+        return False, "系统错误,请稍后重试"
+    
+    for evaluate in (_evaluate_new_user_cooldown, _evaluate_submit_interval, _evaluate_daily_limit):
+        allowed, error = evaluate(state)
+        if not allowed:
+            return False, error
+    
+    return True, ""
 
 
 def check_new_user_cooldown(conn, user_id: int) -> tuple[bool, str]:
@@ -24,24 +169,8 @@ def check_new_user_cooldown(conn, user_id: int) -> tuple[bool, str]:
         (is_allowed, error_message)
     """
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT created_at FROM users WHERE user_id = %s
-        """, (user_id,))
-        
-        result = cursor.fetchone()
-        if not result:
-            return False, "用户不存在"
-        
-        created_at = result['created_at']
-        cooldown_end = created_at + timedelta(minutes=NEW_USER_COOLDOWN_MINUTES)
-        now = datetime.now()
-        
-        if now < cooldown_end:
-            return False, "新注册用户需要等待5分钟,请稍后重试"
-        
-        return True, ""
-        
+        return _evaluate_new_user_cooldown(_load_limit_state(conn, user_id))
+    
     except Exception as e:
         logger.error(f"检查新用户冷却期失败: {e}")
         return False, "系统错误,请稍后重试"
@@ -55,29 +184,8 @@ def check_submit_interval(conn, user_id: int) -> tuple[bool, str]:
         (is_allowed, error_message)
     """
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT last_submission_time FROM users WHERE user_id = %s
-        """, (user_id,))
-        
-        result = cursor.fetchone()
-        if not result or not result['last_submission_time']:
-            # 首次提交
-            return True, ""
-        
-        last_submit_time = result['last_submission_time']
-        next_allowed_time = last_submit_time + timedelta(minutes=SUBMIT_INTERVAL_MINUTES)
-        now = datetime.now()
-        
-        if now < next_allowed_time:
-            remaining_seconds = int((next_allowed_time - now).total_seconds())
-            remaining_minutes = remaining_seconds // 60
-            remaining_secs = remaining_seconds % 60
-            
-            return False, f"⏱️ 提交太频繁!\n\n请等待 {remaining_minutes} 分 {remaining_secs} 秒后再试。\n\n这是为了防止刷量行为,感谢理解!"
-        
-        return True, ""
-        
+        return _evaluate_submit_interval(_load_limit_state(conn, user_id))
+    
     except Exception as e:
         logger.error(f"检查提交间隔失败: {e}")
         return False, "系统错误,请稍后重试"
@@ -91,98 +199,206 @@ def check_daily_limit(conn, user_id: int) -> tuple[bool, str]:
         (is_allowed, error_message)
     """
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT COUNT(*) FROM user_tasks
-            WHERE user_id = %s
-            AND DATE(created_at) = CURRENT_DATE
-            AND status = 'completed'
-        """, (user_id,))
-        
-        result = cursor.fetchone()
-        today_count = result['count'] if result else 0
-        
-        if today_count >= DAILY_SUBMIT_LIMIT:
-            return False, f"🚫 今日提交次数已达上限!\n\n每天最多提交 {DAILY_SUBMIT_LIMIT} 次任务。\n明天再来吧!"
-        
-        return True, ""
-        
+        return _evaluate_daily_limit(_load_limit_state(conn, user_id))
+    
     except Exception as e:
         logger.error(f"检查每日上限失败: {e}")
         return False, "系统错误,请稍后重试"
 
 
-def verify_link_exists(link: str) -> tuple[bool, str]:
+# ============================================================
+# 内存限流（滑动窗口 + 每日配额）
+# ============================================================
+
+def _seed_limit_state(user_id: int):
+    """限流器首次访问用户时从数据库加载状态"""
+    conn = get_db_connection()
+    try:
+        return _load_limit_state(conn, user_id)
+    finally:
+        conn.close()
+
+
+def _write_back_limit_state(rows: list):
+    """把限流器记录的提交批量写回 users 表"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        execute_values(cursor, """
+            UPDATE users u
+            SET last_submission_time = GREATEST(COALESCE(u.last_submission_time, v.last_submission_time), v.last_submission_time),
+                daily_submit_count = CASE
+                    WHEN u.daily_submit_date = v.day THEN GREATEST(u.daily_submit_count, v.daily_count)
+                    ELSE v.daily_count
+                END,
+                daily_submit_date = v.day
+            FROM (VALUES %s) AS v(user_id, last_submission_time, day, daily_count)
+            WHERE u.user_id = v.user_id
+        """, rows)
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+_submit_limiter = SlidingWindowRateLimiter(
+    _seed_limit_state,
+    _write_back_limit_state,
+    window_seconds=SUBMIT_INTERVAL_MINUTES * 60,
+    window_limit=SUBMIT_WINDOW_LIMIT
+)
+
+
+def check_user_limits_cached(user_id: int) -> tuple[bool, str]:
+    """
+    用内存限流状态检查新用户冷却期、提交间隔和每日上限
+    
+    用户状态已在内存中时不访问数据库；首次访问会从数据库加载一次
+    
+    Returns:
+        (is_allowed, error_message)
+    """
+    try:
+        state = _submit_limiter.snapshot(user_id)
+    except Exception as e:
+        logger.error(f"检查提交限制失败: {e}")
+        return False, "系统错误,请稍后重试"
+    
+    for evaluate in (_evaluate_new_user_cooldown, _evaluate_submit_interval, _evaluate_daily_limit):
+        allowed, error = evaluate(state)
+        if not allowed:
+            return False, error
+    
+    return True, ""
+
+
+def is_limit_state_cached(user_id: int) -> bool:
+    """用户的限流状态是否已在内存中（为 True 时 check_user_limits_cached 不会访问数据库）"""
+    return _submit_limiter.is_cached(user_id)
+
+
+def record_submission(user_id: int):
+    """记录一次成功提交（由 submit_task_link 调用）：立即计入内存中的窗口和每日配额，由后台线程写回数据库"""
+    _submit_limiter.record(user_id)
+
+
+def start_rate_limit_write_back():
+    """启动限流状态写回线程"""
+    return _submit_limiter.start_write_back()
+
+
+def stop_rate_limit_write_back():
+    """停止写回线程并写回剩余状态（进程退出前调用）"""
+    _submit_limiter.stop_write_back()
+
+
+def get_rate_limit_stats() -> dict:
+    """限流器统计（用于监控）"""
+    return _submit_limiter.get_stats()
+
+
+def normalize_link(link: str) -> str:
+    """规范化链接（协议和域名小写、去掉锚点和跟踪参数、参数排序），用作探测缓存的键"""
+    parsed = urlparse(link.strip())
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key not in TRACKING_QUERY_PARAMS and not key.startswith('utm_')
+    )
+    return urlunparse((
+        parsed.scheme.lower(),
+        parsed.netloc.lower(),
+        parsed.path.rstrip('/') or '/',
+        parsed.params,
+        urlencode(query),
+        ''
+    ))
+
+
+def _get_host_semaphore(host: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphores = _host_semaphores.setdefault(loop, {})
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(LINK_PROBE_PER_HOST)
+    return semaphores[host]
+
+
+def _cache_probe_result(key: str, result: tuple):
+    if len(_probe_cache) >= LINK_PROBE_CACHE_MAX:
+        now = time.monotonic()
+        for cached_key in [k for k, (_, expires_at) in _probe_cache.items() if expires_at <= now]:
+            del _probe_cache[cached_key]
+        if len(_probe_cache) >= LINK_PROBE_CACHE_MAX:
+            _probe_cache.clear()
+    _probe_cache[key] = (result, time.monotonic() + LINK_PROBE_CACHE_TTL)
+
+
+async def _probe_status(session, method: str, link: str) -> int:
+    """发送探测请求，只读取状态行和响应头，不下载页面内容"""
+    headers = dict(LINK_PROBE_HEADERS)
+    if method == 'GET':
+        # 只请求第一个字节；不支持 Range 的服务器也会在读完响应头后断开
+        headers['Range'] = 'bytes=0-0'
+    
+    async with session.request(
+        method,
+        link,
+        headers=headers,
+        timeout=aiohttp.ClientTimeout(total=LINK_VERIFY_TIMEOUT),
+        allow_redirects=True
+    ) as response:
+        return response.status
+
+
+async def probe_link(link: str) -> tuple[bool, str]:
     """
-    验证链接是否真实存在
+    异步验证链接是否真实存在（共享会话、按主机限流、结果按规范化 URL 短期缓存）
     
     Returns:
         (is_valid, error_message)
     """
+    # 解析 URL
+    parsed = urlparse(link)
+    if not parsed.scheme or not parsed.netloc:
+        return False, "链接格式无效"
+    
+    key = normalize_link(link)
+    cached = _probe_cache.get(key)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    
+    session = http_client.get_session()
+    
     try:
-        # 解析 URL
-        parsed = urlparse(link)
-        if not parsed.scheme or not parsed.netloc:
-            return False, "链接格式无效"
-        
-        # 发送 HEAD 请求(更快,不下载内容)
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        response = requests.head(
-            link,
-            headers=headers,
-            timeout=LINK_VERIFY_TIMEOUT,
-            allow_redirects=True
-        )
+        async with _get_host_semaphore(parsed.netloc.lower()):
+            # 先发 HEAD 请求(更快,不下载内容)
+            status = await _probe_status(session, 'HEAD', link)
+            
+            if status not in (200, 404):
+                # TikTok 等平台对 HEAD 请求返回 403，其他状态码也再用 GET 确认
+                logger.info(f"⚠️ HEAD 请求返回 {status}，尝试 GET 请求: {link}")
+                status = await _probe_status(session, 'GET', link)
         
-        # 检查状态码
-        if response.status_code == 200:
-            return True, ""
-        elif response.status_code == 404:
-            return False, "链接不存在或已被删除"
-        elif response.status_code == 403:
-            # TikTok 等平台对 HEAD 请求返回 403，尝试 GET 请求
-            logger.info(f"⚠️ HEAD 请求返回 403，尝试 GET 请求: {link}")
-            try:
-                response = requests.get(
-                    link,
-                    headers=headers,
-                    timeout=LINK_VERIFY_TIMEOUT,
-                    allow_redirects=True
-                )
-                if response.status_code == 200:
-                    return True, ""
-                elif response.status_code == 403:
-                    # 如果 GET 也返回 403，但链接格式正确，则通过验证
-                    # （TikTok 的反爬虫机制）
-                    logger.info(f"✅ TikTok 链接返回 403，但格式正确，通过验证: {link}")
-                    return True, ""
-                else:
-                    return False, f"链接无法访问(状态码: {response.status_code})"
-            except Exception as e:
-                logger.warning(f"GET 请求失败: {e}，通过验证")
-                return True, ""
+        if status in (200, 206):
+            result = (True, "")
+        elif status == 404:
+            result = (False, "链接不存在或已被删除")
+        elif status == 403:
+            # 如果 GET 也返回 403，但链接格式正确，则通过验证
+            # （TikTok 的反爬虫机制）
+            logger.info(f"✅ 链接返回 403，但格式正确，通过验证: {link}")
+            result = (True, "")
         else:
-            # 对于其他状态码,尝试 GET 请求
-            response = requests.get(
-                link,
-                headers=headers,
-                timeout=LINK_VERIFY_TIMEOUT,
-                allow_redirects=True
-            )
-            
-            if response.status_code == 200:
-                return True, ""
-            else:
-                return False, f"链接无法访问(状态码: {response.status_code})"
+            result = (False, f"链接无法访问(状态码: {status})")
         
-    except requests.Timeout:
+        # 只缓存确定的结果，网络错误不缓存
+        _cache_probe_result(key, result)
+        return result
+    
+    except asyncio.TimeoutError:
         logger.warning(f"链接验证超时: {link}")
         # 超时不算失败,可能是网络问题
         return True, ""
-    except requests.RequestException as e:
+    except aiohttp.ClientError as e:
         logger.error(f"链接验证失败: {link}, 错误: {e}")
         # 网络错误不算失败,给用户通过
         return True, ""
@@ -191,49 +407,84 @@ def verify_link_exists(link: str) -> tuple[bool, str]:
         return True, ""
 
 
+def verify_link_exists(link: str) -> tuple[bool, str]:
+    """
+    验证链接是否真实存在（同步版本，供没有事件循环的脚本使用）
+    
+    Returns:
+        (is_valid, error_message)
+    """
+    return http_client.run(probe_link(link))
+
+
+def _link_failed_message(error: str) -> str:
+    return f"❌ 链接验证失败!\n\n{error}\n\n请确保:\n• 链接真实有效\n• 视频是公开的\n• 视频未被删除"
+
+
+async def check_link_exists(link: str) -> tuple[bool, str]:
+    """
+    异步验证提交的链接，失败时返回给用户的完整提示
+    
+    Returns:
+        (is_allowed, error_message)
+    """
+    allowed, error = await probe_link(link)
+    if not allowed:
+        return False, _link_failed_message(error)
+    return True, ""
+
+
+async def check_duplicate_video(user_id: int, task_id: int, link: str) -> tuple[bool, str]:
+    """
+    检查视频是否已被其他任务记录提交（按平台 + 视频ID，短链接解析后比较，一次主键查询）
+    
+    Returns:
+        (is_allowed, error_message)
+    """
+    from async_db import run_db
+    
+    try:
+        video_platform, video_id = await video_identity.resolve_video_identity(link)
+        if not video_id:
+            return True, ""
+        owner = await run_db(video_identity.find_video_owner, video_platform, video_id)
+    except Exception as e:
+        # 检查失败时放行，提交时的唯一约束仍会拦住重复视频
+        logger.error(f"重复视频检查失败: {e}")
+        return True, ""
+    
+    if owner and (owner['user_id'], owner['task_id']) != (user_id, task_id):
+        logger.warning(f"⚠️ 重复视频: user={user_id}, task={task_id}, {video_platform}:{video_id} 已被 user={owner['user_id']} task={owner['task_id']} 提交")
+        return False, DUPLICATE_VIDEO_MESSAGE
+    return True, ""
+
+
 def update_last_submit_time(conn, user_id: int):
     """
-    更新用户最后提交时间
+    更新用户最后提交时间（记录到内存限流器，由后台线程写回；conn 参数保留兼容旧调用）
     """
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE users
-            SET last_submission_time = NOW()
-            WHERE user_id = %s
-        """, (user_id,))
-        conn.commit()
+        record_submission(user_id)
     except Exception as e:
         logger.error(f"更新最后提交时间失败: {e}")
-        conn.rollback()
 
 
 def check_all_limits(conn, user_id: int, link: str) -> tuple[bool, str]:
     """
-    执行所有反刷量检查
+    执行所有反刷量检查（同步版本；bot 中使用 check_user_limits + check_link_exists）
     
     Returns:
         (is_allowed, error_message)
     """
-    # 1. 检查新用户冷却期
-    allowed, error = check_new_user_cooldown(conn, user_id)
-    if not allowed:
-        return False, error
-    
-    # 2. 检查提交间隔
-    allowed, error = check_submit_interval(conn, user_id)
-    if not allowed:
-        return False, error
-    
-    # 3. 检查每日上限
-    allowed, error = check_daily_limit(conn, user_id)
+    # 1-3. 新用户冷却期、提交间隔、每日上限
+    allowed, error = check_user_limits(conn, user_id)
     if not allowed:
         return False, error
     
     # 4. 验证链接真实性
     allowed, error = verify_link_exists(link)
     if not allowed:
-        return False, f"❌ 链接验证失败!\n\n{error}\n\n请确保:\n• 链接真实有效\n• 视频是公开的\n• 视频未被删除"
+        return False, _link_failed_message(error)
     
     return True, ""
 
@@ -243,24 +494,10 @@ def get_user_submit_stats(conn, user_id: int) -> dict:
     获取用户提交统计
     """
     try:
-        cursor = conn.cursor()
-        
-        # 今日提交次数
-        cursor.execute("""
-            SELECT COUNT(*) FROM user_tasks
-            WHERE user_id = %s
-            AND DATE(created_at) = CURRENT_DATE
-            AND status = 'completed'
-        """, (user_id,))
-        result = cursor.fetchone()
-        today_count = result['count'] if result else 0
-        
-        # 最后提交时间
-        cursor.execute("""
-            SELECT last_submission_time FROM users WHERE user_id = %s
-        """, (user_id,))
-        result = cursor.fetchone()
-        last_submit = result['last_submission_time'] if result and result.get('last_submission_time') else None
+        # 今日提交次数和最后提交时间
+        state = _load_limit_state(conn, user_id)
+        today_count = state['today_count'] if state else 0
+        last_submit = state['last_submission_time'] if state and state.get('last_submission_time') else None
         
         # 计算下次可提交时间
         next_allowed = None
@@ -9,10 +9,18 @@ import os
 import logging
 from datetime import datetime
 from functools import wraps
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import db_pool
+import http_client
+import translation_queue
+import oembed_store
+import video_identity
+import settings_cache
+import dashboard_metrics
+import task_log_summary
+import task_search
+import live_feed
 
 # ============================================================
 # 配置
@@ -48,8 +56,8 @@ logger.info(f"✅ API Port: {PORT}")
 # ============================================================
 
 def get_db_connection():
-    """获取数据库连接"""
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
 
 # ============================================================
 # 认证装饰器
@@ -345,9 +353,13 @@ def create_task():
         except Exception as log_error:
             logger.warning(f"⚠️ 保存任务接收日志失败: {log_error}")
         
+        # 加入预翻译队列（随任务一起提交，由后台线程翻译）
+        translation_queue.enqueue_translation([new_task['task_id']], cur=cur)
+        
         conn.commit()
         cur.close()
         conn.close()
+        translation_queue.wake_translation_worker()
         
         task_dict = dict(new_task)
         if task_dict.get('created_at'):
@@ -418,6 +430,11 @@ def update_task(task_id):
             update_fields.append("status = %s")
             params.append(data['status'])
         
+        # 标题或描述变更后旧译文失效，重新翻译
+        retranslate = 'title' in data or 'description' in data
+        if retranslate:
+            update_fields.append("translations = '{}'::jsonb, title_en = NULL, description_en = NULL")
+        
         if not update_fields:
             cur.close()
             conn.close()
@@ -431,9 +448,13 @@ def update_task(task_id):
         
         cur.execute(query, params)
         updated_task = cur.fetchone()
+        if retranslate:
+            translation_queue.enqueue_translation([task_id], cur=cur)
         conn.commit()
         cur.close()
         conn.close()
+        if retranslate:
+            translation_queue.wake_translation_worker()
         
         task_dict = dict(updated_task)
         if task_dict.get('created_at'):
@@ -828,6 +849,14 @@ def get_task_submissions(task_id):
 # 健康检查
 # ============================================================
 
+def _youtube_quota_status():
+    """本进程的 YouTube Data API 配额使用情况（googleapiclient 未安装时为 None）"""
+    try:
+        from video_stats_fetcher import get_youtube_quota_status
+    except ImportError:
+        return None
+    return get_youtube_quota_status()
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康检查端点"""
@@ -842,6 +871,15 @@ def health_check():
         return jsonify({
             'status': 'healthy',
             'database': 'connected',
+            'db_pool': db_pool.get_pool_status(),
+            'http_client': http_client.get_http_metrics(),
+            'translation': translation_queue.get_translation_status(),
+            'oembed': oembed_store.get_oembed_stats(),
+            'settings_cache': settings_cache.get_settings_cache_stats(),
+            'dashboard_metrics': dashboard_metrics.get_dashboard_metrics_stats(),
+            'task_log_summary': task_log_summary.get_task_log_summary_stats(),
+            'live_feed': live_feed.get_live_feed_stats(),
+            'youtube_quota': _youtube_quota_status(),
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
@@ -874,11 +912,21 @@ def admin_webhooks():
     """Webhook 日志 API"""
     return admin_api.get_webhook_logs()
 
+@app.route('/api/logs/webhooks/count')
+def admin_webhooks_count():
+    """Webhook 日志任务数 API"""
+    return admin_api.get_webhook_logs_count()
+
 @app.route('/api/logs/completions')
 def admin_completions():
     """完成日志 API"""
     return admin_api.get_completion_logs()
 
+@app.route('/api/logs/completions/count')
+def admin_completions_count():
+    """完成日志任务数 API"""
+    return admin_api.get_completion_logs_count()
+
 @app.route('/api/logs/tasks')
 def admin_tasks():
     """任务日志 API"""
@@ -889,11 +937,43 @@ def admin_errors():
     """错误日志 API"""
     return admin_api.get_error_logs()
 
+@app.route('/api/tasks/search')
+def admin_search_tasks():
+    """任务搜索 API"""
+    return admin_api.search_tasks()
+
+@app.route('/api/tasks/suggest')
+def admin_suggest_tasks():
+    """任务搜索联想 API"""
+    return admin_api.suggest_tasks()
+
 @app.route('/api/verification/queue-status')
 def verification_queue_status():
-    """获取TikTok验证队列状态"""
+    """获取验证队列状态"""
     return admin_api.get_verification_queue_status()
 
+@app.route('/api/live/stream')
+def admin_live_stream():
+    """
+    管理后台实时推送（Server-Sent Events）
+    
+    Query参数:
+        topics: 逗号分隔的主题（queue / broadcaster / view_counter / completions / withdrawals），默认全部
+    """
+    try:
+        topics = live_feed.parse_topics(request.args.get('topics'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    sub = live_feed.subscribe(topics)
+    if sub is None:
+        return jsonify({'success': False, 'error': '实时推送连接数已达上限'}), 503
+    
+    return Response(live_feed.stream(sub), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
 @app.route('/api/config/api-key')
 def admin_api_key():
     """获取 API Key"""
@@ -1134,6 +1214,9 @@ def set_callback_url():
         cur.close()
         conn.close()
         
+        # 回传和 Webhook 读取的是配置缓存，立即失效并通知 bot 进程
+        settings_cache.invalidate_settings(settings_cache.SYSTEM_CONFIG)
+        
         logger.info(f"✅ Callback URL 已更新: {callback_url}")
         
         return jsonify({
@@ -1160,6 +1243,7 @@ try:
         start_view_count_timer,
         stop_view_count_timer,
         is_timer_running,
+        get_crawl_metrics,
         ensure_view_count_columns,
         ensure_view_count_error_log_table
     )
@@ -1210,7 +1294,8 @@ def get_view_counter_status():
     return jsonify({
         'success': True,
         'running': is_timer_running(),
-        'interval_minutes': 10
+        'interval_minutes': 10,
+        'metrics': get_crawl_metrics()
     })
 
 @app.route('/api/view-counter/trigger', methods=['POST'])
@@ -1344,9 +1429,13 @@ def x2c_task_receive():
         except Exception as log_error:
             logger.warning(f"⚠️ [X2C] 保存任务接收日志失败: {log_error}")
         
+        # 加入预翻译队列（随任务一起提交，由后台线程翻译）
+        translation_queue.enqueue_translation([new_task['task_id']], cur=cur)
+        
         conn.commit()
         cur.close()
         conn.close()
+        translation_queue.wake_translation_worker()
         
         task_dict = dict(new_task)
         if task_dict.get('created_at'):
@@ -1655,4 +1744,41 @@ if __name__ == '__main__':
     else:
         logger.warning("⚠️ 播放量抓取服务不可用，跳过自动启动")
     
-    app.run(host='0.0.0.0', port=PORT, debug=False)
+    # 启动后台预翻译线程，并补齐历史任务的译文
+    try:
+        translation_queue.ensure_translation_tables()
+        translation_queue.enqueue_missing_translations()
+        translation_queue.start_translation_worker()
+    except Exception as e:
+        logger.error(f"❌ 启动翻译线程失败: {e}")
+    
+    # oEmbed 元数据缓存表（与 bot 进程共享）
+    oembed_store.ensure_oembed_cache_table()
+    
+    # 配置缓存：监听其他进程修改配置的通知
+    settings_cache.ensure_settings_tables()
+    settings_cache.start_settings_listener()
+    
+    # 规范化视频ID：确保字段存在，后台补齐历史提交记录
+    if video_identity.ensure_video_identity_schema():
+        video_identity.start_video_identity_backfill()
+    
+    # 管理后台统计计数：安装触发器，后台回填并定期校正
+    if dashboard_metrics.ensure_dashboard_metrics():
+        dashboard_metrics.start_dashboard_metrics_reconciler()
+    
+    # 管理后台任务搜索索引（pg_trgm + 中文单字/双字切分）
+    task_search.ensure_task_search_index()
+    
+    # 完成 / 回调日志的任务汇总：安装触发器，后台回填并定期校正
+    if task_log_summary.ensure_task_log_summary():
+        task_log_summary.start_task_log_reconciler()
+    
+    # 管理后台实时推送：完成记录 / 提现变更通知触发器（生产者线程在第一个连接时启动）
+    live_feed.ensure_live_feed_triggers()
+    
+    try:
+        app.run(host='0.0.0.0', port=PORT, debug=False, threaded=True)
+    finally:
+        http_client.close_all_sessions()
+        db_pool.close_all_pools()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步数据库访问层
+psycopg2 是同步驱动，Telegram handler 直接调用会阻塞整个事件循环。
+这里提供一个专用线程池，把同步的数据库函数包装成 awaitable，
+线程数与连接池大小一致，避免线程空等连接
+"""
+
+import os
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import db_pool
+
+logger = logging.getLogger(__name__)
+
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', str(db_pool.DB_POOL_MAX_SIZE)))
+
+_executor = None
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """获取数据库专用线程池（懒加载）"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix='db')
+        logger.info(f"✅ 数据库线程池已创建 (workers={DB_EXECUTOR_WORKERS})")
+    return _executor
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    在数据库线程池中执行同步函数
+
+    Example:
+        >>> user = await run_db(get_or_create_user, user_id, username, first_name)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(func, *args, **kwargs))
+
+
+def to_async(func):
+    """把同步数据库函数包装成协程函数，原函数保留在 .sync 属性上"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    wrapper.sync = func
+    return wrapper
+
+
+def shutdown_db_executor(wait: bool = True):
+    """关闭数据库线程池（进程退出时调用）"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
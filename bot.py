@@ -6,16 +6,20 @@ X2C DramaRelayBot - 全球短剧分发节点 Telegram Bot
 
 import os
 import re
+import time
 import logging
 import asyncio
-from datetime import datetime, timedelta
+import threading
+from collections import OrderedDict
 from typing import Optional, List, Dict
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import db_pool
+import http_client
+from async_db import to_async, run_db
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.error import Forbidden
 from telegram.ext import (
     Application,
+    BaseUpdateProcessor,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
@@ -25,9 +29,12 @@ from telegram.ext import (
 )
 from auto_migrate import auto_migrate
 from link_verifier import LinkVerifier
-from anti_fraud import check_all_limits, update_last_submit_time, get_user_submit_stats
+from anti_fraud import check_user_limits_cached, is_limit_state_cached, record_submission, check_link_exists, check_duplicate_video, update_last_submit_time, get_user_submit_stats
 from retry_submit_handler import retry_submit_callback
 from translator import translate_task_content
+from translation_queue import get_translated_text, request_translation
+from video_identity import lookup_video_identity, claim_video, ensure_video_identity_schema, DuplicateVideoError
+from settings_cache import get_int_setting, get_bool_setting, ensure_settings_tables, start_settings_listener
 from i18n import t, get_user_language as get_user_lang_i18n, set_user_language as set_user_lang_i18n, SUPPORTED_LANGUAGES
 from category_browser import show_tasks_by_category, category_select_callback, pagination_callback
 from category_classifier import classify_drama_by_ai
@@ -36,57 +43,23 @@ from category_classifier import classify_drama_by_ai
 # 配置和日志
 # ============================================================
 
-# 多语言辅助函数
+# 多语言辅助函数（只读预翻译结果，翻译由 translation_queue 在后台完成）
 def get_task_title(task, user_lang, auto_translate=True):
-    """根据用户语言获取任务标题"""
-    if user_lang == 'en':
-        if task.get('title_en'):
-            return task['title_en']
-        elif auto_translate and task.get('title'):
-            # 自动翻译并缓存
-            from translator import translate_to_english
-            title_en = translate_to_english(task['title'], context="drama title")
-            # 更新数据库缓存
-            try:
-                conn = get_db_connection()
-                cur = conn.cursor()
-                cur.execute(
-                    "UPDATE drama_tasks SET title_en = %s WHERE task_id = %s",
-                    (title_en, task['task_id'])
-                )
-                conn.commit()
-                cur.close()
-                conn.close()
-                logger.info(f"✅ Cached translation for task {task['task_id']}")
-            except Exception as e:
-                logger.error(f"❌ Failed to cache translation: {e}")
-            return title_en
+    """根据用户语言获取任务标题（缺少译文时返回原文，auto_translate 为 True 时加入翻译队列）"""
+    title = get_translated_text(task, 'title', user_lang)
+    if title:
+        return title
+    if auto_translate and task.get('title'):
+        request_translation(task.get('task_id'))
     return task['title']
 
 def get_task_description(task, user_lang, auto_translate=True):
-    """根据用户语言获取任务描述"""
-    if user_lang == 'en':
-        if task.get('description_en'):
-            return task['description_en']
-        elif auto_translate and task.get('description'):
-            # 自动翻译并缓存
-            from translator import translate_to_english
-            description_en = translate_to_english(task['description'], context="drama description")
-            # 更新数据库缓存
-            try:
-                conn = get_db_connection()
-                cur = conn.cursor()
-                cur.execute(
-                    "UPDATE drama_tasks SET description_en = %s WHERE task_id = %s",
-                    (description_en, task['task_id'])
-                )
-                conn.commit()
-                cur.close()
-                conn.close()
-                logger.info(f"✅ Cached translation for task {task['task_id']}")
-            except Exception as e:
-                logger.error(f"❌ Failed to cache translation: {e}")
-            return description_en
+    """根据用户语言获取任务描述（缺少译文时返回原文，auto_translate 为 True 时加入翻译队列）"""
+    description = get_translated_text(task, 'description', user_lang)
+    if description:
+        return description
+    if auto_translate and task.get('description'):
+        request_translation(task.get('task_id'))
     return task.get('description', '')
 
 logging.basicConfig(
@@ -129,85 +102,20 @@ link_verifier = LinkVerifier()
 # ============================================================
 
 def get_db_connection():
-    """获取数据库连接"""
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
 
 # ============================================================
 # 奖励配置
 # ============================================================
 
-# 奖励配置缓存
-_reward_config_cache = None
-_reward_config_cache_time = None
-REWARD_CONFIG_CACHE_TTL = 60  # 缓存 60 秒
-
 def get_reward_config():
-    """获取奖励配置（带缓存）"""
-    global _reward_config_cache, _reward_config_cache_time
-    
-    # 检查缓存是否有效
-    if _reward_config_cache and _reward_config_cache_time:
-        if (datetime.now() - _reward_config_cache_time).total_seconds() < REWARD_CONFIG_CACHE_TTL:
-            return _reward_config_cache
-    
-    # 从数据库获取配置
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # 确保 bot_settings 表存在
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS bot_settings (
-                key VARCHAR(100) PRIMARY KEY,
-                value TEXT NOT NULL,
-                description TEXT,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        conn.commit()
-        
-        # 获取奖励设置
-        cur.execute("""
-            SELECT key, value FROM bot_settings 
-            WHERE key IN ('task_reward_x2c', 'newcomer_bonus_multiplier', 'newcomer_bonus_enabled')
-        """)
-        settings = cur.fetchall()
-        
-        cur.close()
-        conn.close()
-        
-        # 转换为字典
-        config = {
-            'task_reward_x2c': 100,  # 默认值
-            'newcomer_bonus_multiplier': 50,  # 默认50倍
-            'newcomer_bonus_enabled': True  # 默认开启
-        }
-        
-        for s in settings:
-            key = s['key']
-            value = s['value']
-            if key == 'newcomer_bonus_enabled':
-                config[key] = value.lower() == 'true'
-            elif key in ['task_reward_x2c', 'newcomer_bonus_multiplier']:
-                config[key] = int(value)
-            else:
-                config[key] = value
-        
-        # 更新缓存
-        _reward_config_cache = config
-        _reward_config_cache_time = datetime.now()
-        
-        logger.info(f"✅ Reward config loaded: {config}")
-        return config
-        
-    except Exception as e:
-        logger.error(f"❌ Failed to get reward config: {e}")
-        # 返回默认值
-        return {
-            'task_reward_x2c': 100,
-            'newcomer_bonus_multiplier': 50,
-            'newcomer_bonus_enabled': True
-        }
+    """获取奖励配置（读配置缓存，后台修改后通过 settings_cache 失效）"""
+    return {
+        'task_reward_x2c': get_int_setting('task_reward_x2c', 100),
+        'newcomer_bonus_multiplier': get_int_setting('newcomer_bonus_multiplier', 50),  # 默认50倍
+        'newcomer_bonus_enabled': get_bool_setting('newcomer_bonus_enabled', True)  # 默认开启
+    }
 
 def get_task_reward(task_id: int = None, is_newcomer: bool = False) -> int:
     """获取任务奖励金额"""
@@ -233,23 +141,79 @@ def get_display_reward(user_id: int = None) -> int:
     
     return base_reward
 
-def is_user_newcomer(user_id: int) -> bool:
+# 用户资料缓存（语言、是否新手、完成数、算力余额）
+# 同一进程内的提交/领取/改语言会主动失效；其他进程（API 服务器）的写入最多延迟 TTL 秒可见
+_user_profile_cache = OrderedDict()  # user_id -> (profile, loaded_at)
+_user_profile_lock = threading.Lock()
+USER_PROFILE_CACHE_TTL = int(os.getenv('USER_PROFILE_CACHE_TTL', '60'))
+USER_PROFILE_CACHE_MAX = int(os.getenv('USER_PROFILE_CACHE_MAX', '10000'))
+
+def _load_user_profile(user_id: int) -> Optional[dict]:
+    """一条 SQL 读取用户资料，用户不存在返回 None"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute("""
+        SELECT u.language, u.total_node_power, u.completed_tasks,
+               EXISTS (
+                   SELECT 1 FROM user_tasks ut
+                   WHERE ut.user_id = u.user_id
+                     AND ut.status IN ('submitted', 'approved', 'completed', 'verified')
+               ) as has_completed,
+               (
+                   SELECT COUNT(*) FROM user_tasks ut
+                   WHERE ut.user_id = u.user_id AND ut.status = 'in_progress'
+               ) as in_progress_tasks
+        FROM users u
+        WHERE u.user_id = %s
+    """, (user_id,))
+    row = cur.fetchone()
+    
+    cur.close()
+    conn.close()
+    
+    if not row:
+        return None
+    return {
+        'language': row['language'],
+        'is_newcomer': not row['has_completed'],
+        'total_power': row['total_node_power'] or 0,
+        'completed_tasks': row['completed_tasks'] or 0,
+        'in_progress_tasks': row['in_progress_tasks'] or 0,
+    }
+
+def get_user_profile(user_id: int, use_cache: bool = True) -> Optional[dict]:
+    """获取用户资料（带 TTL 缓存）"""
+    now = time.monotonic()
+    if use_cache:
+        with _user_profile_lock:
+            cached = _user_profile_cache.get(user_id)
+            if cached and now - cached[1] < USER_PROFILE_CACHE_TTL:
+                _user_profile_cache.move_to_end(user_id)
+                return cached[0]
+    
+    profile = _load_user_profile(user_id)
+    
+    # 用户不存在时不缓存，避免注册后仍读到空资料
+    if profile is not None:
+        with _user_profile_lock:
+            _user_profile_cache[user_id] = (profile, now)
+            _user_profile_cache.move_to_end(user_id)
+            while len(_user_profile_cache) > USER_PROFILE_CACHE_MAX:
+                _user_profile_cache.popitem(last=False)
+    return profile
+
+def invalidate_user_profile(user_id: int):
+    """用户数据变更后使缓存失效"""
+    with _user_profile_lock:
+        _user_profile_cache.pop(user_id, None)
+
+def is_user_newcomer(user_id: int, use_cache: bool = True) -> bool:
     """检查用户是否是新手（从未完成过任务）"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # 检查用户是否有已完成的任务
-        cur.execute("""
-            SELECT COUNT(*) as count FROM user_tasks 
-            WHERE user_id = %s AND status IN ('submitted', 'approved', 'completed', 'verified')
-        """, (user_id,))
-        result = cur.fetchone()
-        
-        cur.close()
-        conn.close()
-        
-        return result['count'] == 0
+        profile = get_user_profile(user_id, use_cache=use_cache)
+        # 用户不存在时也没有完成过任务
+        return profile['is_newcomer'] if profile else True
         
     except Exception as e:
         logger.error(f"❌ Failed to check newcomer status: {e}")
@@ -971,17 +935,10 @@ def get_or_create_user(user_id: int, username: str = None, first_name: str = Non
 
 def get_user_language(user_id: int) -> str:
     """获取用户语言"""
-    conn = get_db_connection()
-    cur = conn.cursor()
+    profile = get_user_profile(user_id)
     
-    cur.execute("SELECT language FROM users WHERE user_id = %s", (user_id,))
-    result = cur.fetchone()
-    
-    cur.close()
-    conn.close()
-    
-    if result and result['language']:
-        lang = result['language']
+    if profile and profile['language']:
+        lang = profile['language']
         # 兼容旧的语言代码
         if lang == 'zh':
             return 'zh-CN'
@@ -1003,6 +960,8 @@ def set_user_language(user_id: int, language: str):
     conn.commit()
     cur.close()
     conn.close()
+    
+    invalidate_user_profile(user_id)
 
 def get_active_tasks() -> List[dict]:
     """获取所有活跃任务"""
@@ -1060,6 +1019,7 @@ def claim_task(user_id: int, task_id: int) -> bool:
     cur.close()
     conn.close()
     
+    invalidate_user_profile(user_id)
     return True
 
 def get_user_in_progress_tasks(user_id: int) -> List[dict]:
@@ -1089,21 +1049,37 @@ def submit_task_link(user_id: int, task_id: int, platform: str, link: str) -> in
     conn = get_db_connection()
     cur = conn.cursor()
     
-    # 检查用户是否是新手（首次完成任务）
-    is_newcomer = is_user_newcomer(user_id)
+    # 检查用户是否是新手（首次完成任务）；决定发放金额，必须读数据库最新状态
+    is_newcomer = is_user_newcomer(user_id, use_cache=False)
     
     # 从全局配置获取奖励金额
     reward = get_task_reward(task_id, is_newcomer)
     
     logger.info(f"🎁 Task reward for user {user_id}: {reward} X2C (newcomer: {is_newcomer})")
     
+    # 规范化视频ID（短链接在入队前已解析，这里只查已保存的结果）
+    video_platform, video_id = lookup_video_identity(cur, link)
+    
     # 更新任务状态
     cur.execute("""
         UPDATE user_tasks
         SET status = 'submitted', platform = %s, submission_link = %s,
-            submitted_at = CURRENT_TIMESTAMP, node_power_earned = %s
+            submitted_at = CURRENT_TIMESTAMP, node_power_earned = %s,
+            video_platform = %s, video_id = %s
         WHERE user_id = %s AND task_id = %s
-    """, (platform, link, reward, user_id, task_id))
+        RETURNING id
+    """, (platform, link, reward, video_platform or 'other', video_id, user_id, task_id))
+    user_task = cur.fetchone()
+    
+    # 同一视频只能被一条任务记录占用（主键约束，并发提交时只有一个成功）
+    if user_task and video_id:
+        owner = claim_video(cur, user_task['id'], user_id, task_id, video_platform, video_id)
+        if owner:
+            conn.rollback()
+            cur.close()
+            conn.close()
+            logger.warning(f"⚠️ 重复视频: {video_platform}:{video_id} 已被 user={owner['user_id']} task={owner['task_id']} 提交")
+            raise DuplicateVideoError("该视频已被提交过，请提交新的视频链接")
     
     # 更新用户算力和累计收益
     cur.execute("""
@@ -1119,10 +1095,18 @@ def submit_task_link(user_id: int, task_id: int, platform: str, link: str) -> in
     cur.close()
     conn.close()
     
+    invalidate_user_profile(user_id)
+    
+    # 提交成功才计入提交间隔和每日配额（核验失败、重复视频不占用次数）
+    record_submission(user_id)
+    
     # 处理推荐奖励
     try:
         from invitation_system import process_referral_reward
-        process_referral_reward(user_id, task_id, reward)
+        inviter_id = process_referral_reward(user_id, task_id, reward)
+        if inviter_id:
+            # 邀请人获得了推荐奖励，缓存中的算力已过期
+            invalidate_user_profile(inviter_id)
     except Exception as e:
         logger.error(f"⚠️ Failed to process referral reward: {e}")
     
@@ -1130,25 +1114,12 @@ def submit_task_link(user_id: int, task_id: int, platform: str, link: str) -> in
 
 def get_user_stats(user_id: int) -> dict:
     """获取用户统计"""
+    # 基本统计和进行中任务数来自用户资料缓存
+    profile = get_user_profile(user_id)
+    
     conn = get_db_connection()
     cur = conn.cursor()
     
-    # 基本统计
-    cur.execute("""
-        SELECT total_node_power, completed_tasks
-        FROM users
-        WHERE user_id = %s
-    """, (user_id,))
-    user = cur.fetchone()
-    
-    # 进行中任务数
-    cur.execute("""
-        SELECT COUNT(*) as count
-        FROM user_tasks
-        WHERE user_id = %s AND status = 'in_progress'
-    """, (user_id,))
-    in_progress = cur.fetchone()
-    
     # 排名
     cur.execute("""
         SELECT COUNT(*) + 1 as rank
@@ -1161,9 +1132,9 @@ def get_user_stats(user_id: int) -> dict:
     conn.close()
     
     return {
-        'total_power': user['total_node_power'] if user else 0,
-        'completed_tasks': user['completed_tasks'] if user else 0,
-        'in_progress_tasks': in_progress['count'] if in_progress else 0,
+        'total_power': profile['total_power'] if profile else 0,
+        'completed_tasks': profile['completed_tasks'] if profile else 0,
+        'in_progress_tasks': profile['in_progress_tasks'] if profile else 0,
         'rank': rank['rank'] if rank else 0,
         'estimated_airdrop': 0  # TODO: 实现空投计算
     }
@@ -1204,6 +1175,127 @@ def bind_wallet(user_id: int, wallet_address: str):
     cur.close()
     conn.close()
 
+def has_claimed_task(user_id: int, task_id: int) -> bool:
+    """检查用户是否已领取任务"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute("SELECT 1 FROM user_tasks WHERE user_id = %s AND task_id = %s", (user_id, task_id))
+    existing_claim = cur.fetchone()
+    
+    cur.close()
+    conn.close()
+    
+    return existing_claim is not None
+
+def get_claimed_task_detail(user_id: int, task_id: int) -> Optional[dict]:
+    """获取用户已领取任务的详情（用于提交界面）"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute("""
+        SELECT dt.*
+        FROM user_tasks ut
+        JOIN drama_tasks dt ON ut.task_id = dt.task_id
+        WHERE ut.user_id = %s AND ut.task_id = %s
+    """, (user_id, task_id))
+    task = cur.fetchone()
+    
+    cur.close()
+    conn.close()
+    
+    return dict(task) if task else None
+
+def get_user_verification_states(user_id: int):
+    """获取用户 pending 任务ID列表和 failed 任务 {task_id: error_message}"""
+    from check_pending_status import get_user_pending_tasks, get_user_failed_tasks
+    conn = get_db_connection()
+    try:
+        return get_user_pending_tasks(conn, user_id), get_user_failed_tasks(conn, user_id)
+    finally:
+        conn.close()
+
+def check_submit_limits(user_id: int):
+    """反刷量检查（冷却期、提交间隔、每日上限），返回 (allowed, error_msg)"""
+    return check_user_limits_cached(user_id)
+
+def get_task_summary(task_id: int) -> Optional[dict]:
+    """获取任务标题、描述和奖励"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute("SELECT title, description, node_power_reward FROM drama_tasks WHERE task_id = %s", (task_id,))
+    task = cur.fetchone()
+    
+    cur.close()
+    conn.close()
+    
+    return dict(task) if task else None
+
+def get_total_participants() -> int:
+    """获取总参与人数（提交过任务的用户数）"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute("SELECT COUNT(DISTINCT user_id) as total FROM user_tasks WHERE status = 'submitted'")
+    result = cur.fetchone()
+    
+    cur.close()
+    conn.close()
+    
+    return result['total'] if result else 0
+
+def record_invitation(inviter_id: int, invitee_id: int) -> bool:
+    """记录邀请关系"""
+    from invitation_system import record_invitation as _record_invitation
+    return _record_invitation(inviter_id, invitee_id)
+
+def get_invitation_overview(user_id: int, page: int = 1, per_page: int = 10):
+    """获取邀请统计和有效被邀请人列表"""
+    from invitation_system import get_invitation_stats, get_active_invitees
+    return get_invitation_stats(user_id), get_active_invitees(user_id, page=page, per_page=per_page)
+
+# ============================================================
+# 异步数据库接口
+# async handler 统一通过这些 awaitable 访问数据库，
+# 实际查询在专用线程池中执行，不阻塞事件循环
+# ============================================================
+
+get_or_create_user_async = to_async(get_or_create_user)
+get_user_language_async = to_async(get_user_language)
+set_user_language_async = to_async(set_user_language)
+get_active_tasks_async = to_async(get_active_tasks)
+get_task_by_id_async = to_async(get_task_by_id)
+has_claimed_task_async = to_async(has_claimed_task)
+claim_task_async = to_async(claim_task)
+get_user_in_progress_tasks_async = to_async(get_user_in_progress_tasks)
+get_claimed_task_detail_async = to_async(get_claimed_task_detail)
+get_user_verification_states_async = to_async(get_user_verification_states)
+get_task_summary_async = to_async(get_task_summary)
+submit_task_link_async = to_async(submit_task_link)
+get_user_stats_async = to_async(get_user_stats)
+get_ranking_async = to_async(get_ranking)
+get_total_participants_async = to_async(get_total_participants)
+bind_wallet_async = to_async(bind_wallet)
+record_invitation_async = to_async(record_invitation)
+get_invitation_overview_async = to_async(get_invitation_overview)
+get_display_reward_async = to_async(get_display_reward)
+get_task_title_async = to_async(get_task_title)
+get_task_description_async = to_async(get_task_description)
+
+async def check_submit_limits_async(user_id: int, link: str, task_id: int = None):
+    """反刷量检查：限流状态在内存中时直接判断，首次访问在线程池中从数据库加载；链接探测和重复视频检查在事件循环上异步执行"""
+    if is_limit_state_cached(user_id):
+        allowed, error_msg = check_submit_limits(user_id)
+    else:
+        allowed, error_msg = await run_db(check_submit_limits, user_id)
+    if not allowed:
+        return allowed, error_msg
+    allowed, error_msg = await check_link_exists(link)
+    if not allowed or task_id is None:
+        return allowed, error_msg
+    return await check_duplicate_video(user_id, task_id, link)
+
 # ============================================================
 # 工具函数
 # ============================================================
@@ -1270,24 +1362,12 @@ def get_main_menu_keyboard(user_lang: str) -> InlineKeyboardMarkup:
 # 命令处理函数
 # ============================================================
 
-async def check_invitation_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """检查邀请系统数据的临时命令"""
-    user_id = update.effective_user.id
-    
-    # 仅允许管理员使用（您的user_id）
-    if user_id != 5156570084:
-        await update.message.reply_text("❌ 此命令仅供管理员使用")
-        return
-    
-    await update.message.reply_text("🔍 正在查询数据库...")
-    
+def build_invitation_check_report(inviter_id: int, invitee_id: int) -> str:
+    """查询邀请关系、被邀请人任务和推荐奖励，生成检查报告（同步，供 /check_invitation 在线程池中调用）"""
+    conn = get_db_connection()
     try:
-        conn = get_db_connection()
         cur = conn.cursor()
         
-        inviter_id = 5156570084
-        invitee_id = 8550836392
-        
         result_text = "📊 邀请系统数据检查\n\n"
         
         # 1. 检查邀请关系
@@ -1365,47 +1445,49 @@ async def check_invitation_command(update: Update, context: ContextTypes.DEFAULT
             result_text += "✅ 数据正常\n"
         
         cur.close()
+        return result_text
+    finally:
         conn.close()
-        
-        await update.message.reply_text(result_text)
-        
-    except Exception as e:
-        logger.error(f"❌ 检查邀请数据失败: {e}", exc_info=True)
-        await update.message.reply_text(f"❌ 查询失败: {str(e)}")
 
-async def manual_reward_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """手动补发推荐奖励的临时命令"""
+async def check_invitation_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """检查邀请系统数据的临时命令"""
     user_id = update.effective_user.id
     
-    # 仅允许管理员使用
+    # 仅允许管理员使用（您的user_id）
     if user_id != 5156570084:
         await update.message.reply_text("❌ 此命令仅供管理员使用")
         return
     
-    await update.message.reply_text("🔧 正在补发推荐奖励...")
+    await update.message.reply_text("🔍 正在查询数据库...")
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        result_text = await run_db(build_invitation_check_report, 5156570084, 8550836392)
+        await update.message.reply_text(result_text)
         
-        inviter_id = 5156570084
-        invitee_id = 8550836392
-        task_id = 51  # 从查询结果中看到的任务ID
-        original_reward = 10  # 原始奖励
-        referral_reward = int(original_reward * 0.1)  # 10%的推荐奖励
+    except Exception as e:
+        logger.error(f"❌ 检查邀请数据失败: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ 查询失败: {str(e)}")
+
+def apply_manual_referral_reward(inviter_id: int, invitee_id: int, task_id: int,
+                                 original_reward: int, referral_reward: int) -> Optional[bool]:
+    """
+    补发推荐奖励（同步，供 /manual_reward 在线程池中调用）
+    
+    Returns:
+        Optional[bool]: 已经补发过时返回 None，否则返回是否给被邀请人发放了新人奖励
+    """
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
         
         # 1. 检查是否已经补发过
         cur.execute("""
             SELECT * FROM referral_rewards 
             WHERE inviter_id = %s AND invitee_id = %s AND task_id = %s
         """, (inviter_id, invitee_id, task_id))
-        existing = cur.fetchone()
-        
-        if existing:
-            await update.message.reply_text("⚠️ 该任务的推荐奖励已经发放过了")
+        if cur.fetchone():
             cur.close()
-            conn.close()
-            return
+            return None
         
         # 2. 插入推荐奖励记录
         cur.execute("""
@@ -1446,7 +1528,42 @@ async def manual_reward_command(update: Update, context: ContextTypes.DEFAULT_TY
         
         conn.commit()
         cur.close()
+        return invitee_bonus_given
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         conn.close()
+
+async def manual_reward_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """手动补发推荐奖励的临时命令"""
+    user_id = update.effective_user.id
+    
+    # 仅允许管理员使用
+    if user_id != 5156570084:
+        await update.message.reply_text("❌ 此命令仅供管理员使用")
+        return
+    
+    await update.message.reply_text("🔧 正在补发推荐奖励...")
+    
+    try:
+        inviter_id = 5156570084
+        invitee_id = 8550836392
+        task_id = 51  # 从查询结果中看到的任务ID
+        original_reward = 10  # 原始奖励
+        referral_reward = int(original_reward * 0.1)  # 10%的推荐奖励
+        
+        invitee_bonus_given = await run_db(
+            apply_manual_referral_reward, inviter_id, invitee_id, task_id, original_reward, referral_reward
+        )
+        
+        if invitee_bonus_given is None:
+            await update.message.reply_text("⚠️ 该任务的推荐奖励已经发放过了")
+            return
+        
+        # 邀请人和被邀请人的算力都已变化
+        invalidate_user_profile(inviter_id)
+        invalidate_user_profile(invitee_id)
         
         result_text = "✅ 推荐奖励补发成功！\n\n"
         result_text += f"🎯 任务ID: {task_id}\n"
@@ -1468,9 +1585,6 @@ async def manual_reward_command(update: Update, context: ContextTypes.DEFAULT_TY
     except Exception as e:
         logger.error(f"❌ 补发推荐奖励失败: {e}", exc_info=True)
         await update.message.reply_text(f"❌ 补发失败: {str(e)}")
-        if conn:
-            conn.rollback()
-            conn.close()
 
 async def clear_pending_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """清理所有 pending 状态的验证任务"""
@@ -1485,7 +1599,7 @@ async def clear_pending_command(update: Update, context: ContextTypes.DEFAULT_TY
     
     try:
         from async_verification_worker import force_fail_all_pending
-        cleaned_count = force_fail_all_pending()
+        cleaned_count = await run_db(force_fail_all_pending)
         
         await update.message.reply_text(
             f"✅ 清理完成！\n\n"
@@ -1500,6 +1614,27 @@ async def clear_pending_command(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text(f"❌ 清理失败: {str(e)}")
 
 
+def get_recent_pending_verifications(limit: int = 20) -> List[dict]:
+    """最近的 pending_verifications 记录（同步，供 /debug_pending 在线程池中调用）"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT pv.id, pv.user_id, pv.task_id, pv.video_url, pv.platform, 
+                   pv.status, pv.retry_count, pv.error_message, pv.created_at,
+                   dt.title as task_title
+            FROM pending_verifications pv
+            LEFT JOIN drama_tasks dt ON pv.task_id = dt.task_id
+            ORDER BY pv.created_at DESC
+            LIMIT %s
+        """, (limit,))
+        records = cur.fetchall()
+        cur.close()
+        return records
+    finally:
+        conn.close()
+
+
 async def debug_pending_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """调试命令：查看 pending_verifications 表中的记录"""
     user_id = update.effective_user.id
@@ -1512,21 +1647,8 @@ async def debug_pending_command(update: Update, context: ContextTypes.DEFAULT_TY
     await update.message.reply_text("🔍 正在查询 pending_verifications 表...")
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
         # 查询所有记录（最近 20 条）
-        cur.execute("""
-            SELECT pv.id, pv.user_id, pv.task_id, pv.video_url, pv.platform, 
-                   pv.status, pv.retry_count, pv.error_message, pv.created_at,
-                   dt.title as task_title
-            FROM pending_verifications pv
-            LEFT JOIN drama_tasks dt ON pv.task_id = dt.task_id
-            ORDER BY pv.created_at DESC
-            LIMIT 20
-        """)
-        
-        records = cur.fetchall()
+        records = await run_db(get_recent_pending_verifications, 20)
         
         if not records:
             await update.message.reply_text("✅ pending_verifications 表中没有记录")
@@ -1565,9 +1687,6 @@ async def debug_pending_command(update: Update, context: ContextTypes.DEFAULT_TY
         else:
             await update.message.reply_text(full_message)
         
-        cur.close()
-        conn.close()
-        
     except Exception as e:
         logger.error(f"❌ 查询 pending_verifications 失败: {e}", exc_info=True)
         await update.message.reply_text(f"❌ 查询失败: {str(e)}")
@@ -1631,7 +1750,7 @@ async def set_expiry_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 /start 命令 - 支持多语言检测"""
     user = update.effective_user
-    get_or_create_user(user.id, user.username, user.first_name)
+    await get_or_create_user_async(user.id, user.username, user.first_name)
     
     # 检测用户 Telegram 客户端语言
     lang_code = user.language_code or 'en'
@@ -1643,8 +1762,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             try:
                 inviter_id = int(arg.replace('invite_', ''))
                 if inviter_id != user.id:  # 不能邀请自己
-                    from invitation_system import record_invitation
-                    success = record_invitation(inviter_id, user.id)
+                    success = await record_invitation_async(inviter_id, user.id)
                     if success:
                         logger.info(f"✅ User {user.id} was invited by {inviter_id}")
             except ValueError:
@@ -1737,7 +1855,7 @@ async def get_tasks_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     # 默认显示 latest 分类
     await show_tasks_by_category(update, context, 'latest')
@@ -1748,21 +1866,21 @@ async def task_detail_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     task_id = int(query.data.split('_')[1])
-    task = get_task_by_id(task_id)
+    task = await get_task_by_id_async(task_id)
     
     if not task:
         await query.edit_message_text("任务不存在" if user_lang.startswith('zh') else "Task not found")
         return
     
     # 显示任务详情，根据用户语言选择内容（自动翻译）
-    title = get_task_title(task, user_lang)
-    description = get_task_description(task, user_lang)
+    title = await get_task_title_async(task, user_lang)
+    description = await get_task_description_async(task, user_lang)
     
     # 使用全局配置的奖励金额
-    display_reward = get_display_reward(user_id)
+    display_reward = await get_display_reward_async(user_id)
     
     message = get_message(user_lang, 'task_details',
         title=title,
@@ -1798,7 +1916,7 @@ async def claim_task_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         logger.warning(f"⚠️ query.answer() failed in claim_task_callback: {e}")
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     try:
         task_id = int(query.data.split('_')[1])
@@ -1809,7 +1927,7 @@ async def claim_task_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     logger.info(f"🔔 claim_task_callback triggered! user_id={user_id}, task_id={task_id}, callback_data={query.data}")
     
     # 获取任务详情
-    task = get_task_by_id(task_id)
+    task = await get_task_by_id_async(task_id)
     
     if not task:
         await query.edit_message_text(
@@ -1828,14 +1946,7 @@ async def claim_task_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     
     # 先检查是否已经领取
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM user_tasks WHERE user_id = %s AND task_id = %s", (user_id, task_id))
-    existing_claim = cur.fetchone()
-    cur.close()
-    conn.close()
-    
-    if existing_claim:
+    if await has_claimed_task_async(user_id, task_id):
         logger.info(f"⚠️ Task already claimed by user")
         message = get_message(user_lang, 'task_already_claimed')
         keyboard = get_main_menu_keyboard(user_lang)
@@ -1860,7 +1971,7 @@ async def claim_task_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         # 先检查文件大小
         try:
-            head_response = requests.head(video_url, timeout=10)
+            head_response = await asyncio.to_thread(requests.head, video_url, timeout=10)
             file_size = int(head_response.headers.get('content-length', 0))
             file_size_mb = file_size / (1024 * 1024)
             logger.info(f"📊 Video file size: {file_size_mb:.2f} MB")
@@ -1878,7 +1989,7 @@ async def claim_task_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
             description = task.get('description', '')
             keywords_raw = task.get('keywords_template', '')
             # 使用全局配置的奖励金额
-            reward = get_display_reward(user_id)
+            reward = await get_display_reward_async(user_id)
             
             # 清理 keywords_template
             keywords_lines = keywords_raw.split('\n')
@@ -1981,7 +2092,7 @@ to receive 🎉 {reward} X2C"""
             context.user_data['task_hint_messages'][task_id] = hint_msg.message_id
             
             # 标记任务为已领取
-            claim_result = claim_task(user_id, task_id)
+            claim_result = await claim_task_async(user_id, task_id)
             logger.info(f"✅ Download link sent for large video file, task claimed: {claim_result}")
             return
         
@@ -1993,7 +2104,7 @@ to receive 🎉 {reward} X2C"""
             description = task.get('description', '')
             keywords_raw = task.get('keywords_template', '') or ''
             # 使用全局配置的奖励金额
-            reward = get_display_reward(user_id)
+            reward = await get_display_reward_async(user_id)
             
             # 清理 keywords_template
             if keywords_raw:
@@ -2104,7 +2215,7 @@ Clip from @X2CDramaOfficial
             context.user_data['task_card_chat_id'] = query.message.chat_id
             
             # 标记任务为已领取
-            claim_result = claim_task(user_id, task_id)
+            claim_result = await claim_task_async(user_id, task_id)
             logger.info(f"✅ Video sent successfully, task claimed: {claim_result}, waiting for user to submit link")
             
             # 返回 SUBMIT_LINK 状态，让用户可以直接输入链接
@@ -2132,9 +2243,9 @@ async def submit_link_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
-    tasks = get_user_in_progress_tasks(user_id)
+    tasks = await get_user_in_progress_tasks_async(user_id)
     
     if not tasks:
         await query.edit_message_text(
@@ -2146,14 +2257,10 @@ async def submit_link_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         return
     
     # 获取用户所有 pending 和 failed 状态的任务
-    from check_pending_status import get_user_pending_tasks, get_user_failed_tasks
-    conn = get_db_connection()
-    pending_task_ids = get_user_pending_tasks(conn, user_id)
-    failed_tasks = get_user_failed_tasks(conn, user_id)  # {task_id: error_message}
-    conn.close()
+    pending_task_ids, failed_tasks = await get_user_verification_states_async(user_id)  # failed: {task_id: error_message}
     
     # 获取全局配置的奖励金额
-    display_reward = get_display_reward(user_id)
+    display_reward = await get_display_reward_async(user_id)
     
     # 显示进行中的任务列表
     keyboard = []
@@ -2170,7 +2277,7 @@ async def submit_link_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             keyboard.append([InlineKeyboardButton(button_text, callback_data=f"submit_task_{task_id}")])
         else:
             # 可以提交 - 使用全局配置的奖励金额
-            display_reward = get_display_reward(user_id)
+            display_reward = await get_display_reward_async(user_id)
             button_text = f"📤 {task['title']} ({display_reward} X2C)"
             keyboard.append([InlineKeyboardButton(button_text, callback_data=f"submit_task_{task_id}")])
     
@@ -2196,7 +2303,7 @@ async def submit_task_select_callback(update: Update, context: ContextTypes.DEFA
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     # 支持 submit_task_123 和 submit_link_123 两种格式
     parts = query.data.split('_')
@@ -2205,19 +2312,9 @@ async def submit_task_select_callback(update: Update, context: ContextTypes.DEFA
     context.user_data['submit_task_id'] = task_id
     
     # 获取任务信息
-    conn = get_db_connection()
-    cur = conn.cursor()
     logger.info(f"📊 Querying task info for user_id={user_id}, task_id={task_id}")
-    cur.execute("""
-        SELECT dt.*
-        FROM user_tasks ut
-        JOIN drama_tasks dt ON ut.task_id = dt.task_id
-        WHERE ut.user_id = %s AND ut.task_id = %s
-    """, (user_id, task_id))
-    task = cur.fetchone()
+    task = await get_claimed_task_detail_async(user_id, task_id)
     logger.info(f"📋 Query result: {task}")
-    cur.close()
-    conn.close()
     
     if not task:
         logger.warning(f"⚠️ Task {task_id} not found for user {user_id}")
@@ -2236,7 +2333,7 @@ async def submit_task_select_callback(update: Update, context: ContextTypes.DEFA
     # 兼容不同的字段名：keywords 或 keywords_template
     keywords_raw = task.get('keywords') or task.get('keywords_template', '') or ''
     # 使用全局配置的奖励金额
-    reward = get_display_reward(user_id)
+    reward = await get_display_reward_async(user_id)
     # 获取视频链接
     video_url = task.get('video_url', '')
     
@@ -2363,7 +2460,7 @@ async def platform_select_callback(update: Update, context: ContextTypes.DEFAULT
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     platform = query.data.split('_')[1]
     context.user_data['submit_platform'] = platform
@@ -2375,7 +2472,7 @@ async def platform_select_callback(update: Update, context: ContextTypes.DEFAULT
 async def link_input_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理链接输入（异步验证模式：立即返回，后台验证）"""
     user_id = update.effective_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     link = update.message.text.strip()
     task_id = context.user_data.get('submit_task_id')
@@ -2434,8 +2531,7 @@ async def link_input_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return SUBMIT_LINK
     
     # 反刷量检查
-    conn = get_db_connection()
-    allowed, error_msg = check_all_limits(conn, user_id, link)
+    allowed, error_msg = await check_submit_limits_async(user_id, link, task_id)
     
     if not allowed:
         # 显示限制错误
@@ -2451,15 +2547,10 @@ async def link_input_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 reply_markup=retry_button,
                 parse_mode='HTML'
             )
-        conn.close()
         return SUBMIT_LINK
     
     # 获取任务信息
-    cur = conn.cursor()
-    cur.execute("SELECT title, description, node_power_reward FROM drama_tasks WHERE task_id = %s", (task_id,))
-    task = cur.fetchone()
-    cur.close()
-    conn.close()
+    task = await get_task_summary_async(task_id)
     
     if not task:
         if task_card_message_id and task_card_chat_id:
@@ -2509,7 +2600,7 @@ async def link_input_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     # 将链接添加到验证队列
     from async_verification_worker import add_to_verification_queue
-    queue_id = add_to_verification_queue(user_id, task_id, link, platform)
+    queue_id = await run_db(add_to_verification_queue, user_id, task_id, link, platform)
     
     if queue_id is None:
         # 该链接已经验证完成
@@ -2536,7 +2627,7 @@ async def link_input_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return ConversationHandler.END
     
     # 使用全局配置的奖励金额
-    display_reward = get_display_reward(user_id)
+    display_reward = await get_display_reward_async(user_id)
     
     # 立即返回"已接收"消息
     received_msg = (
@@ -2576,9 +2667,9 @@ async def my_power_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
-    stats = get_user_stats(user_id)
+    stats = await get_user_stats_async(user_id)
     
     message = get_message(user_lang, 'my_power',
         total_power=stats['total_power'],
@@ -2600,19 +2691,13 @@ async def ranking_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
-    ranking = get_ranking(20)
-    stats = get_user_stats(user_id)
+    ranking = await get_ranking_async(20)
+    stats = await get_user_stats_async(user_id)
     
     # 获取总参与人数
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(DISTINCT user_id) as total FROM user_tasks WHERE status = 'submitted'")
-    result = cur.fetchone()
-    total_participants = result['total'] if result else 0
-    cur.close()
-    conn.close()
+    total_participants = await get_total_participants_async()
     
     ranking_list = []
     for r in ranking:
@@ -2638,9 +2723,9 @@ async def airdrop_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
-    stats = get_user_stats(user_id)
+    stats = await get_user_stats_async(user_id)
     eligible = "✅ 是" if stats['total_power'] >= 100 else "❌ 否（需要 100+ X2C）"
     if user_lang == 'en':
         eligible = "✅ Yes" if stats['total_power'] >= 100 else "❌ No (Need 100+ X2C)"
@@ -2664,17 +2749,13 @@ async def invite_friends_callback(update: Update, context: ContextTypes.DEFAULT_
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     # 生成邀请链接
     invite_link = f"https://t.me/{BOT_USERNAME}?start=invite_{user_id}"
     
-    # 获取邀请统计
-    from invitation_system import get_invitation_stats, get_active_invitees
-    stats = get_invitation_stats(user_id)
-    
-    # 获取有效被邀请人列表
-    invitees_data = get_active_invitees(user_id, page=page, per_page=10)
+    # 获取邀请统计和有效被邀请人列表
+    stats, invitees_data = await get_invitation_overview_async(user_id, page=page, per_page=10)
     
     message = get_message(user_lang, 'invite_friends',
         invite_link=invite_link,
@@ -2749,14 +2830,14 @@ async def withdraw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     # 获取用户余额
     from withdrawal_system import get_user_balance, get_user_withdrawals
-    balance = get_user_balance(user_id)
+    balance = await run_db(get_user_balance, user_id)
     
     # 获取用户提现记录
-    withdrawals = get_user_withdrawals(user_id, limit=5)
+    withdrawals = await run_db(get_user_withdrawals, user_id, limit=5)
     
     # 构建提现记录文本
     history_text = ""
@@ -2808,7 +2889,7 @@ async def withdraw_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def withdraw_address_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理 SOL 地址/邮箱输入 - Step 2: 输入提现数量"""
     user_id = update.effective_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     address = update.message.text.strip()
     
@@ -2826,7 +2907,7 @@ async def withdraw_address_handler(update: Update, context: ContextTypes.DEFAULT
     
     # 获取用户余额
     from withdrawal_system import get_user_balance
-    balance = get_user_balance(user_id)
+    balance = await run_db(get_user_balance, user_id)
     
     keyboard = InlineKeyboardMarkup([[
         InlineKeyboardButton(get_message(user_lang, 'back_to_menu'), callback_data='back_to_menu')
@@ -2842,7 +2923,7 @@ async def withdraw_address_handler(update: Update, context: ContextTypes.DEFAULT
 async def withdraw_amount_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """处理提现数量输入 - Step 3: 二次确认"""
     user_id = update.effective_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     amount_str = update.message.text.strip()
     
@@ -2857,7 +2938,7 @@ async def withdraw_amount_handler(update: Update, context: ContextTypes.DEFAULT_
     
     # 检查余额
     from withdrawal_system import get_user_balance
-    balance = get_user_balance(user_id)
+    balance = await run_db(get_user_balance, user_id)
     
     if amount > balance:
         await update.message.reply_text(
@@ -2889,7 +2970,7 @@ async def confirm_withdraw_callback(update: Update, context: ContextTypes.DEFAUL
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     address = context.user_data.get('withdraw_address')
     amount = context.user_data.get('withdraw_amount')
@@ -2911,7 +2992,9 @@ async def confirm_withdraw_callback(update: Update, context: ContextTypes.DEFAUL
     
     # 创建提现申请（不立即转账，等待管理员审批）
     from withdrawal_system import create_withdrawal_request
-    withdrawal_id = create_withdrawal_request(user_id, address, amount)
+    withdrawal_id = await run_db(create_withdrawal_request, user_id, address, amount)
+    # 提现申请会扣除余额，缓存中的资料已过期
+    invalidate_user_profile(user_id)
     
     if not withdrawal_id:
         keyboard = InlineKeyboardMarkup([[
@@ -2969,7 +3052,7 @@ async def tutorial_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     message = get_message(user_lang, 'tutorial')
     
@@ -2997,7 +3080,7 @@ async def language_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     # 支持 6 种语言
     keyboard = [
@@ -3032,7 +3115,7 @@ async def set_language_callback(update: Update, context: ContextTypes.DEFAULT_TY
         logger.warning(f"Unsupported language: {new_lang}")
         new_lang = 'zh-CN'  # 默认使用简体中文
     
-    set_user_language(user_id, new_lang)
+    await set_user_language_async(user_id, new_lang)
     
     # 获取用户信息
     user = query.from_user
@@ -3059,7 +3142,7 @@ async def back_to_menu_callback(update: Update, context: ContextTypes.DEFAULT_TY
         logger.warning(f"⚠️ query.answer() failed: {e}")
     
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     # 获取用户名
     username = query.from_user.username or query.from_user.first_name or "用户"
@@ -3154,7 +3237,7 @@ async def pending_task_callback(update: Update, context: ContextTypes.DEFAULT_TY
     """处理点击 pending 状态的任务"""
     query = update.callback_query
     user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    user_lang = await get_user_language_async(user_id)
     
     # 显示提示消息
     if user_lang.startswith('zh'):
@@ -3178,6 +3261,40 @@ async def retry_submit_callback(update: Update, context: ContextTypes.DEFAULT_TY
 # 主函数
 # ============================================================
 
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    不同用户的 update 并发处理，同一用户的 update 按到达顺序串行处理
+    
+    ConversationHandler（提交链接、提现确认）在同一用户的 update 并发处理时
+    不保证会话状态一致，连续两条消息可能同时通过同一个状态
+    """
+    
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._user_locks = {}  # user_id -> [asyncio.Lock, 等待/持有该锁的 update 数]
+    
+    async def do_process_update(self, update, coroutine):
+        user = getattr(update, 'effective_user', None)
+        if user is None:
+            await coroutine
+            return
+        
+        entry = self._user_locks.setdefault(user.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._user_locks[user.id]
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass
+
 def main():
     """主函数"""
     logger.info("🚀 X2C DramaRelayBot Starting...")
@@ -3193,8 +3310,35 @@ def main():
     # 初始化数据库
     init_database()
     
+    # 初始化任务领取计数（触发器维护的 drama_tasks.claim_count）
+    from category_browser import init_claim_counts
+    init_claim_counts()
+    
+    # 提交限流：内存中判断，后台线程写回数据库
+    from anti_fraud import ensure_rate_limit_columns, start_rate_limit_write_back
+    ensure_rate_limit_columns()
+    start_rate_limit_write_back()
+    
+    # oEmbed 元数据缓存表（与 API 服务器进程共享）
+    from oembed_store import ensure_oembed_cache_table
+    ensure_oembed_cache_table()
+    
+    # 规范化视频ID字段（历史数据由 API 服务器进程补齐）
+    ensure_video_identity_schema()
+    
+    # 配置缓存：监听后台修改配置的通知
+    ensure_settings_tables()
+    start_settings_listener()
+    
     # 创建应用
-    application = Application.builder().token(BOT_TOKEN).build()
+    # 数据库访问已改为线程池执行，允许不同用户的 update 并发处理（同一用户仍串行）
+    concurrent_updates = int(os.getenv('BOT_CONCURRENT_UPDATES', '32'))
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PerUserUpdateProcessor(concurrent_updates))
+        .build()
+    )
     
     # 启动异步验证 Worker
     verification_worker_task = None
@@ -3202,6 +3346,10 @@ def main():
     async def start_verification_worker(app):
         """启动验证 Worker 作为后台任务"""
         nonlocal verification_worker_task
+        
+        # 在 bot 事件循环上预先创建共享 HTTP 会话
+        http_client.get_session()
+        
         from async_verification_worker import run_verification_worker
         logger.info("🔧 Starting async verification worker...")
         
@@ -3228,6 +3376,18 @@ def main():
             except asyncio.CancelledError:
                 pass
             logger.info("✅ Verification Worker 已停止")
+        
+        # 关闭共享 HTTP 会话
+        await http_client.close_session()
+        
+        # 写回尚未落库的限流状态
+        from anti_fraud import stop_rate_limit_write_back
+        stop_rate_limit_write_back()
+        
+        # 关闭数据库线程池和连接池
+        from async_db import shutdown_db_executor
+        shutdown_db_executor()
+        db_pool.close_all_pools()
     
     application.post_init = start_verification_worker
     application.post_shutdown = stop_verification_worker
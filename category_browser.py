@@ -7,147 +7,240 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from x2c_category_sync import get_all_categories_for_bot
+from async_db import run_db
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 领取计数触发器版本，记录在触发器函数的注释中；修改触发器或索引定义时递增，下次启动会重新安装并校准
+CLAIM_COUNT_SCHEMA_VERSION = 'claim_count:v1'
 
-async def show_tasks_by_category(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str = 'latest', page: int = 1):
+
+def init_claim_counts():
     """
-    按分类显示任务列表
+    初始化任务领取人数计数
     
-    Args:
-        update: Telegram Update 对象
-        context: Context 对象
-        category: 分类代码（默认 latest）
-        page: 页码（默认 1）
+    drama_tasks.claim_count 由 user_tasks 上的触发器维护（按 user_id 去重，
+    与原来的 COUNT(DISTINCT user_id) 口径一致）。仅在触发器未安装或版本变化时执行 DDL，
+    并按 user_tasks 一次性回填计数；之后的启动只做版本检查
     """
-    from bot import get_db_connection, get_user_language, get_task_title, get_message, get_display_reward
-    
-    query = update.callback_query
-    user_id = query.from_user.id
-    user_lang = get_user_language(user_id)
+    from bot import get_db_connection
     
-    # 分页参数
-    page_size = 6  # 每页显示 6 个任务（Telegram 消息长度限制）
-    offset = (page - 1) * page_size
-    
-    logger.info(f"📋 [v2.2] show_tasks_by_category: user_id={user_id}, category={category}, page={page}")
-    
-    # 获取该分类的任务
     conn = get_db_connection()
     cur = conn.cursor()
     
-    # 获取任务过期时间配置
-    from task_expiry import get_task_expiry_hours
-    expiry_hours = get_task_expiry_hours()
-    
-    # 查询该分类的活跃任务（直接在 SQL 中过滤已领取的任务，并过滤超过有效期的任务）
-    # 任务超过有效期自动过期，不再允许领取
-    # 同时统计每个任务被领取的人数
-    # 过滤已满员的任务（claim_count >= max_completions）
-    if category == 'latest':
-        # latest 分类显示所有类型的最新任务（包括 category 为 NULL 的任务）
+    try:
         cur.execute("""
-            SELECT dt.*, COALESCE(claim_counts.claim_count, 0) as claim_count
-            FROM drama_tasks dt
-            LEFT JOIN (
-                SELECT task_id, COUNT(DISTINCT user_id) as claim_count
-                FROM user_tasks
-                GROUP BY task_id
-            ) claim_counts ON dt.task_id = claim_counts.task_id
-            WHERE dt.status = 'active' 
-            AND dt.created_at > NOW() - INTERVAL '%s hours'
-            AND dt.task_id NOT IN (
-                SELECT task_id FROM user_tasks WHERE user_id = %s
-            )
-            AND COALESCE(claim_counts.claim_count, 0) < COALESCE(dt.max_completions, 100)
-            ORDER BY dt.created_at DESC
-            LIMIT %s OFFSET %s
-        """, (expiry_hours, user_id, page_size, offset))
-    else:
-        # 其他分类只显示该分类的任务
+            SELECT obj_description(to_regprocedure('user_tasks_claim_count_sync()'), 'pg_proc') AS version
+        """)
+        row = cur.fetchone()
+        if row and row['version'] == CLAIM_COUNT_SCHEMA_VERSION:
+            conn.rollback()
+            logger.info(f"✅ 任务领取计数已就绪（{CLAIM_COUNT_SCHEMA_VERSION}）")
+            return
+        
+        cur.execute("ALTER TABLE drama_tasks ADD COLUMN IF NOT EXISTS claim_count INTEGER NOT NULL DEFAULT 0")
+        
         cur.execute("""
-            SELECT dt.*, COALESCE(claim_counts.claim_count, 0) as claim_count
-            FROM drama_tasks dt
+            CREATE OR REPLACE FUNCTION user_tasks_claim_count_sync() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                    IF NOT EXISTS (
+                        SELECT 1 FROM user_tasks
+                        WHERE user_id = OLD.user_id AND task_id = OLD.task_id AND id <> OLD.id
+                    ) THEN
+                        UPDATE drama_tasks SET claim_count = GREATEST(claim_count - 1, 0)
+                        WHERE task_id = OLD.task_id;
+                    END IF;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    IF NOT EXISTS (
+                        SELECT 1 FROM user_tasks
+                        WHERE user_id = NEW.user_id AND task_id = NEW.task_id AND id <> NEW.id
+                    ) THEN
+                        UPDATE drama_tasks SET claim_count = claim_count + 1
+                        WHERE task_id = NEW.task_id;
+                    END IF;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        cur.execute("DROP TRIGGER IF EXISTS trg_user_tasks_claim_count ON user_tasks")
+        cur.execute("""
+            CREATE TRIGGER trg_user_tasks_claim_count
+            AFTER INSERT OR DELETE OR UPDATE OF user_id, task_id ON user_tasks
+            FOR EACH ROW EXECUTE FUNCTION user_tasks_claim_count_sync()
+        """)
+        
+        # 反连接 (NOT EXISTS) 和触发器查询使用
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_user_tasks_user_task
+            ON user_tasks(user_id, task_id)
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_user_tasks_task_user
+            ON user_tasks(task_id, user_id)
+        """)
+        # 分类浏览：活跃任务按分类、创建时间查询
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_drama_tasks_active_category_created
+            ON drama_tasks(category, created_at DESC)
+            WHERE status = 'active'
+        """)
+        
+        # 回填计数（触发器安装前已有的领取记录）
+        cur.execute("""
+            UPDATE drama_tasks dt
+            SET claim_count = COALESCE(c.claim_count, 0)
+            FROM drama_tasks d
             LEFT JOIN (
                 SELECT task_id, COUNT(DISTINCT user_id) as claim_count
                 FROM user_tasks
                 GROUP BY task_id
-            ) claim_counts ON dt.task_id = claim_counts.task_id
-            WHERE dt.status = 'active' 
-            AND dt.category = %s 
-            AND dt.created_at > NOW() - INTERVAL '%s hours'
-            AND dt.task_id NOT IN (
-                SELECT task_id FROM user_tasks WHERE user_id = %s
-            )
-            AND COALESCE(claim_counts.claim_count, 0) < COALESCE(dt.max_completions, 100)
-            ORDER BY dt.created_at DESC
-            LIMIT %s OFFSET %s
-        """, (category, expiry_hours, user_id, page_size, offset))
-    
-    available_tasks = cur.fetchall()
+            ) c ON c.task_id = d.task_id
+            WHERE dt.task_id = d.task_id
+              AND dt.claim_count IS DISTINCT FROM COALESCE(c.claim_count, 0)
+        """)
+        fixed = cur.rowcount
+        
+        cur.execute(
+            "COMMENT ON FUNCTION user_tasks_claim_count_sync() IS %s",
+            (CLAIM_COUNT_SCHEMA_VERSION,)
+        )
+        
+        conn.commit()
+        logger.info(f"✅ 任务领取计数已安装 {CLAIM_COUNT_SCHEMA_VERSION}（回填 {fixed} 个任务）")
+    except Exception as e:
+        logger.error(f"❌ 初始化任务领取计数失败: {e}")
+        conn.rollback()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def load_category_page(user_id: int, user_lang: str, category: str, page: int, page_size: int) -> dict:
+    """
+    查询分类页所需的数据（同步，供 run_db 在线程池中调用）
+    
+    一条 SQL 同时返回当前页任务和所有分类的可领取数量
+    
+    Returns:
+        dict: {
+            'tasks': 当前页可领取任务（含 display_title）,
+            'categories': {code: display_name},
+            'category_counts': {code: 可领取数量},
+            'display_reward': 当前用户的展示奖励
+        }
+    """
+    from bot import get_db_connection, get_task_title, get_display_reward
     
+    offset = (page - 1) * page_size
+    
+    # 获取任务过期时间配置
+    from task_expiry import get_task_expiry_hours
+    expiry_hours = get_task_expiry_hours()
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    # 可领取任务：活跃、未超过有效期（超过有效期自动过期，不再允许领取）、
+    # 未满员（claim_count < max_completions）、当前用户未领取过
+    # latest 分类显示所有类型的最新任务（包括 category 为 NULL 的任务）
+    cur.execute("""
+        WITH available AS (
+            SELECT dt.*
+            FROM drama_tasks dt
+            WHERE dt.status = 'active'
+              AND dt.created_at > NOW() - %s * INTERVAL '1 hour'
+              AND dt.claim_count < COALESCE(dt.max_completions, 100)
+              AND NOT EXISTS (
+                  SELECT 1 FROM user_tasks ut
+                  WHERE ut.task_id = dt.task_id AND ut.user_id = %s
+              )
+        )
+        SELECT
+            (SELECT COUNT(*) FROM available) as total_count,
+            (SELECT COALESCE(json_object_agg(category, cnt), '{}'::json)
+             FROM (
+                 SELECT category, COUNT(*) as cnt
+                 FROM available
+                 WHERE category IS NOT NULL
+                 GROUP BY category
+             ) c) as category_counts,
+            (SELECT COALESCE(json_agg(p), '[]'::json)
+             FROM (
+                 SELECT * FROM available
+                 WHERE %s = 'latest' OR category = %s
+                 ORDER BY created_at DESC
+                 LIMIT %s OFFSET %s
+             ) p) as tasks
+    """, (expiry_hours, user_id, category, category, page_size, offset))
+    
+    row = cur.fetchone()
     cur.close()
     conn.close()
     
+    available_tasks = row['tasks'] or []
+    
     logger.info(f"📊 分类 {category}: 可领取 {len(available_tasks)}")
     if len(available_tasks) == 0:
         logger.warning(f"⚠️ 分类 {category} 查询结果为空！user_id={user_id}")
     else:
         logger.info(f"✅ 分类 {category} 查询到任务: {[t['task_id'] for t in available_tasks[:3]]}")
     
-    # 构建分类切换按钮
+    # 分类列表
     categories = get_all_categories_for_bot(user_lang)
-    category_buttons = []
     
-    # 查询每个分类的可领取任务数量
-    conn = get_db_connection()
-    cur = conn.cursor()
-    category_counts = {}
-    
-    for cat_code in categories.keys():
-        if cat_code == 'latest':
-            # latest 分类显示所有类型的任务数（过滤超过有效期的任务和已满员的任务）
-            cur.execute("""
-                SELECT COUNT(*) as count 
-                FROM drama_tasks dt
-                LEFT JOIN (
-                    SELECT task_id, COUNT(DISTINCT user_id) as claim_count
-                    FROM user_tasks
-                    GROUP BY task_id
-                ) claim_counts ON dt.task_id = claim_counts.task_id
-                WHERE dt.status = 'active' 
-                AND dt.created_at > NOW() - INTERVAL '%s hours'
-                AND dt.task_id NOT IN (
-                    SELECT task_id FROM user_tasks WHERE user_id = %s
-                )
-                AND COALESCE(claim_counts.claim_count, 0) < COALESCE(dt.max_completions, 100)
-            """, (expiry_hours, user_id))
-        else:
-            # 其他分类只统计该分类的任务（过滤超过有效期的任务和已满员的任务）
-            cur.execute("""
-                SELECT COUNT(*) as count 
-                FROM drama_tasks dt
-                LEFT JOIN (
-                    SELECT task_id, COUNT(DISTINCT user_id) as claim_count
-                    FROM user_tasks
-                    GROUP BY task_id
-                ) claim_counts ON dt.task_id = claim_counts.task_id
-                WHERE dt.status = 'active' 
-                AND dt.category = %s 
-                AND dt.created_at > NOW() - INTERVAL '%s hours'
-                AND dt.task_id NOT IN (
-                    SELECT task_id FROM user_tasks WHERE user_id = %s
-                )
-                AND COALESCE(claim_counts.claim_count, 0) < COALESCE(dt.max_completions, 100)
-            """, (cat_code, expiry_hours, user_id))
-        
-        result = cur.fetchone()
-        category_counts[cat_code] = result['count'] if result else 0
+    # 每个分类的可领取任务数量（latest 为全部可领取任务数）
+    counts_by_category = row['category_counts'] or {}
+    category_counts = {
+        cat_code: row['total_count'] if cat_code == 'latest' else counts_by_category.get(cat_code, 0)
+        for cat_code in categories.keys()
+    }
     
-    cur.close()
-    conn.close()
+    tasks = [dict(task) for task in available_tasks]
+    for task in tasks:
+        task['display_title'] = get_task_title(task, user_lang)
+    
+    return {
+        'tasks': tasks,
+        'categories': categories,
+        'category_counts': category_counts,
+        'display_reward': get_display_reward(user_id),
+    }
+
+
+async def show_tasks_by_category(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str = 'latest', page: int = 1):
+    """
+    按分类显示任务列表
+    
+    Args:
+        update: Telegram Update 对象
+        context: Context 对象
+        category: 分类代码（默认 latest）
+        page: 页码（默认 1）
+    """
+    from bot import get_user_language_async, get_message
+    
+    query = update.callback_query
+    user_id = query.from_user.id
+    user_lang = await get_user_language_async(user_id)
+    
+    # 分页参数
+    page_size = 6  # 每页显示 6 个任务（Telegram 消息长度限制）
+    
+    logger.info(f"📋 [v2.2] show_tasks_by_category: user_id={user_id}, category={category}, page={page}")
+    
+    # 数据库查询与标题翻译在数据库线程池中执行，不阻塞事件循环
+    page_data = await run_db(load_category_page, user_id, user_lang, category, page, page_size)
+    available_tasks = page_data['tasks']
+    categories = page_data['categories']
+    category_counts = page_data['category_counts']
+    display_reward = page_data['display_reward']
+    
+    # 构建分类切换按钮
+    category_buttons = []
     
     # 每行显示 3 个分类按钮
     row = []
@@ -173,7 +266,7 @@ async def show_tasks_by_category(update: Update, context: ContextTypes.DEFAULT_T
     if available_tasks:
         # 添加任务按钮
         for task in available_tasks:
-            title = get_task_title(task, user_lang)
+            title = task['display_title']
             claim_count = task.get('claim_count', 0)
             # 只有有人领取时才显示领取人数，合并到同一行
             if claim_count > 0:
@@ -183,8 +276,6 @@ async def show_tasks_by_category(update: Update, context: ContextTypes.DEFAULT_T
                     claim_info = f" | 👥{claim_count}"
             else:
                 claim_info = ""
-            # 使用全局配置的奖励金额
-            display_reward = get_display_reward(user_id)
             button_text = f"🎬 {title} ({task['duration']}s) - {display_reward} X2C{claim_info}"
             keyboard.append([InlineKeyboardButton(button_text, callback_data=f"claim_{task['task_id']}")])
         
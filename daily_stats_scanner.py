@@ -6,13 +6,11 @@
 """
 
 import os
-import asyncio
 import logging
 from datetime import datetime, date, timedelta
 from typing import Dict, List, Optional
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from urllib.parse import urlparse
+import db_pool
+import http_client
 import json
 
 from video_stats_fetcher import VideoStatsFetcher
@@ -29,16 +27,8 @@ logger = logging.getLogger(__name__)
 DATABASE_URL = os.getenv('DATABASE_URL')
 
 def get_db_connection():
-    """获取数据库连接"""
-    result = urlparse(DATABASE_URL)
-    return psycopg2.connect(
-        database=result.path[1:],
-        user=result.username,
-        password=result.password,
-        host=result.hostname,
-        port=result.port,
-        cursor_factory=RealDictCursor
-    )
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
 
 
 class DailyStatsScanner:
@@ -100,6 +90,9 @@ class DailyStatsScanner:
             tasks = cur.fetchall()
             logger.info(f"📊 找到 {len(tasks)} 个任务在 {target_date} 有完成记录")
             
+            # 需要实时抓取的 YouTube 视频一次性批量查询（每 50 个视频 1 个配额单位）
+            youtube_stats = await self._prefetch_youtube_stats(cur, target_date)
+            
             for task in tasks:
                 try:
                     result['tasks_processed'] += 1
@@ -108,7 +101,8 @@ class DailyStatsScanner:
                     stats = await self._aggregate_task_stats(
                         cur, 
                         task['task_id'], 
-                        target_date
+                        target_date,
+                        youtube_stats
                     )
                     
                     # 3. 保存到 task_daily_stats 表
@@ -169,7 +163,48 @@ class DailyStatsScanner:
         
         return result
     
-    async def _aggregate_task_stats(self, cur, task_id: int, target_date: date) -> Dict:
+    @staticmethod
+    def _parse_details(raw) -> Dict:
+        if not raw:
+            return {}
+        try:
+            return json.loads(raw) if isinstance(raw, str) else raw
+        except (TypeError, ValueError):
+            return {}
+    
+    async def _prefetch_youtube_stats(self, cur, target_date: date) -> Dict[str, Dict]:
+        """
+        批量抓取目标日期内验证详情里没有播放量的 YouTube 提交
+        
+        Returns:
+            dict: {submission_link: fetch_video_stats 结构的结果}
+        """
+        if not self.video_fetcher.youtube_api_key:
+            return {}
+        
+        cur.execute("""
+            SELECT DISTINCT ut.submission_link, ut.verification_details::text AS verification_details
+            FROM user_tasks ut
+            JOIN drama_tasks dt ON dt.task_id = ut.task_id
+            WHERE ut.status = 'submitted'
+              AND DATE(ut.submitted_at) = %s
+              AND dt.status = 'active'
+              AND LOWER(ut.platform) IN ('youtube', 'yt')
+              AND ut.submission_link IS NOT NULL AND ut.submission_link != ''
+        """, (target_date,))
+        links = sorted({
+            row['submission_link'] for row in cur.fetchall()
+            if not self._parse_details(row['verification_details']).get('view_count')
+        })
+        if not links:
+            return {}
+        
+        results = await self.video_fetcher.fetch_youtube_stats_batch(links)
+        logger.info(f"📡 批量抓取 {len(links)} 个 YouTube 视频的数据")
+        return dict(zip(links, results))
+    
+    async def _aggregate_task_stats(self, cur, task_id: int, target_date: date,
+                                    youtube_stats: Optional[Dict[str, Dict]] = None) -> Dict:
         """
         聚合指定任务在指定日期的统计数据
         
@@ -177,6 +212,7 @@ class DailyStatsScanner:
             cur: 数据库游标
             task_id: 任务ID
             target_date: 目标日期
+            youtube_stats: 预先批量抓取的 YouTube 数据 {submission_link: 结果}
         
         Returns:
             dict: 聚合后的统计数据
@@ -236,13 +272,10 @@ class DailyStatsScanner:
                     except:
                         pass
                 
-                # 如果没有数据，尝试实时抓取
+                # 如果没有数据，使用预先批量抓取的结果
                 if stats['yt_view_count'] == 0 and completion['submission_link']:
-                    video_stats = await self.video_fetcher.fetch_video_stats(
-                        completion['submission_link'],
-                        platform='youtube'
-                    )
-                    if video_stats['success']:
+                    video_stats = (youtube_stats or {}).get(completion['submission_link'])
+                    if video_stats and video_stats['success']:
                         stats['yt_view_count'] += video_stats.get('view_count', 0)
                         stats['yt_like_count'] += video_stats.get('like_count', 0)
                         stats['yt_comment_count'] += video_stats.get('comment_count', 0)
@@ -483,4 +516,4 @@ if __name__ == "__main__":
             print(f"❌ 日期格式错误，请使用 YYYY-MM-DD 格式")
             sys.exit(1)
     
-    asyncio.run(run_daily_scan(target_date))
+    http_client.run(run_daily_scan(target_date))
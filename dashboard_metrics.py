@@ -0,0 +1,948 @@
+# -*- coding: utf-8 -*-
+"""
+管理后台统计指标（增量维护）
+/api/stats/overview、/api/logs/stats、/api/stats/user-growth、/api/stats/task-stats
+不再扫描业务表，而是读取触发器维护的计数：
+
+- dashboard_counters：全量计数（用户数、任务数、各状态任务数、奖励总额、提现等），按连接分片写入，避免热点行锁
+- dashboard_hourly / dashboard_daily：按小时 / 按天汇总的时间序列（新增用户、领取、提交、完成、奖励、提现、
+  任务创建、回调结果），任意天数的查询只读取对应天数的汇总行
+- dashboard_task_users：按任务创建小时 + 用户汇总的领取 / 完成次数，用于时间窗口内去重用户数
+
+时效性：
+- 触发器与业务写入在同一事务中，计数在提交时即准确
+- 接口结果在进程内缓存 DASHBOARD_METRICS_CACHE_SECONDS 秒（默认 10 秒），即展示数据最多滞后这么久
+- 绕过触发器的写入（禁用触发器的批量导入、修改任务创建时间等）造成的偏差，
+  由校正任务每 DASHBOARD_RECONCILE_MINUTES 分钟（默认 60）按业务表重新计算后修正；
+  校正以增量方式写入，与并发的触发器更新互不覆盖
+- /api/logs/stats 的时间窗口按小时取整（起点向下取整到整点），
+  /api/stats/user-growth 和 /api/stats/task-stats 按自然日取整（最近 N 个自然日，含今天）
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import db_pool
+
+logger = logging.getLogger(__name__)
+
+# 数据库连接
+DATABASE_URL = db_pool.DATABASE_URL
+
+DASHBOARD_METRICS_CACHE_SECONDS = int(os.getenv('DASHBOARD_METRICS_CACHE_SECONDS', '10'))  # 接口结果缓存时间（秒）
+DASHBOARD_RECONCILE_MINUTES = int(os.getenv('DASHBOARD_RECONCILE_MINUTES', '60'))  # 校正间隔（分钟）
+DASHBOARD_RECONCILE_HOURS = int(os.getenv('DASHBOARD_RECONCILE_HOURS', '48'))  # 定期校正的小时汇总范围
+
+DASHBOARD_METRICS_DDL = """
+CREATE TABLE IF NOT EXISTS dashboard_counters (
+    metric VARCHAR(50) NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    value NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, shard)
+);
+
+CREATE TABLE IF NOT EXISTS dashboard_hourly (
+    bucket TIMESTAMP NOT NULL,
+    metric VARCHAR(50) NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    value NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, metric, shard)
+);
+
+CREATE TABLE IF NOT EXISTS dashboard_daily (
+    day DATE NOT NULL,
+    metric VARCHAR(50) NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    value NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, metric, shard)
+);
+
+CREATE TABLE IF NOT EXISTS dashboard_task_users (
+    bucket TIMESTAMP NOT NULL,
+    user_id BIGINT NOT NULL,
+    claims INTEGER NOT NULL DEFAULT 0,
+    completions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, user_id)
+);
+
+CREATE OR REPLACE FUNCTION dashboard_bump(p_metric TEXT, p_delta NUMERIC) RETURNS void AS $$
+BEGIN
+    IF p_delta IS NULL OR p_delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO dashboard_counters (metric, shard, value)
+    VALUES (p_metric, pg_backend_pid() % 8, p_delta)
+    ON CONFLICT (metric, shard) DO UPDATE SET value = dashboard_counters.value + EXCLUDED.value;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_bump_hourly(p_at TIMESTAMP, p_metric TEXT, p_delta NUMERIC) RETURNS void AS $$
+BEGIN
+    IF p_at IS NULL OR p_delta IS NULL OR p_delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO dashboard_hourly (bucket, metric, shard, value)
+    VALUES (date_trunc('hour', p_at), p_metric, pg_backend_pid() % 8, p_delta)
+    ON CONFLICT (bucket, metric, shard) DO UPDATE SET value = dashboard_hourly.value + EXCLUDED.value;
+    INSERT INTO dashboard_daily (day, metric, shard, value)
+    VALUES (p_at::DATE, p_metric, pg_backend_pid() % 8, p_delta)
+    ON CONFLICT (day, metric, shard) DO UPDATE SET value = dashboard_daily.value + EXCLUDED.value;
+END
+$$ LANGUAGE plpgsql;
+
+-- 把一行的贡献从旧小时移到新小时（同一小时内只写差值）
+CREATE OR REPLACE FUNCTION dashboard_move_hourly(p_metric TEXT, p_old_at TIMESTAMP, p_old NUMERIC,
+                                                 p_new_at TIMESTAMP, p_new NUMERIC) RETURNS void AS $$
+BEGIN
+    IF date_trunc('hour', p_old_at) IS NOT DISTINCT FROM date_trunc('hour', p_new_at) THEN
+        PERFORM dashboard_bump_hourly(p_new_at, p_metric, p_new - p_old);
+    ELSE
+        PERFORM dashboard_bump_hourly(p_old_at, p_metric, -p_old);
+        PERFORM dashboard_bump_hourly(p_new_at, p_metric, p_new);
+    END IF;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_bump_task_user(p_bucket TIMESTAMP, p_user_id BIGINT,
+                                                    p_claims INTEGER, p_completions INTEGER) RETURNS void AS $$
+BEGIN
+    IF p_bucket IS NULL OR p_user_id IS NULL OR (p_claims = 0 AND p_completions = 0) THEN
+        RETURN;
+    END IF;
+    INSERT INTO dashboard_task_users (bucket, user_id, claims, completions)
+    VALUES (p_bucket, p_user_id, p_claims, p_completions)
+    ON CONFLICT (bucket, user_id) DO UPDATE
+    SET claims = dashboard_task_users.claims + EXCLUDED.claims,
+        completions = dashboard_task_users.completions + EXCLUDED.completions;
+END
+$$ LANGUAGE plpgsql;
+
+-- users / web_users：TG_ARGV[0] 为指标前缀
+CREATE OR REPLACE FUNCTION dashboard_users_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM dashboard_bump(TG_ARGV[0] || '_total', 1);
+        PERFORM dashboard_bump_hourly(NEW.created_at, TG_ARGV[0] || '_created', 1);
+    ELSE
+        PERFORM dashboard_bump(TG_ARGV[0] || '_total', -1);
+        PERFORM dashboard_bump_hourly(OLD.created_at, TG_ARGV[0] || '_created', -1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_drama_tasks_trigger() RETURNS trigger AS $$
+DECLARE
+    o_exists INTEGER := 0; n_exists INTEGER := 0;
+    o_active INTEGER := 0; n_active INTEGER := 0;
+    o_success INTEGER := 0; n_success INTEGER := 0;
+    o_failed INTEGER := 0; n_failed INTEGER := 0;
+    o_at TIMESTAMP; n_at TIMESTAMP;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        o_exists := 1;
+        o_active := (OLD.status = 'active')::INTEGER;
+        o_success := COALESCE((OLD.callback_status = 'success')::INTEGER, 0);
+        o_failed := COALESCE((OLD.callback_status = 'failed')::INTEGER, 0);
+        o_at := OLD.created_at;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        n_exists := 1;
+        n_active := (NEW.status = 'active')::INTEGER;
+        n_success := COALESCE((NEW.callback_status = 'success')::INTEGER, 0);
+        n_failed := COALESCE((NEW.callback_status = 'failed')::INTEGER, 0);
+        n_at := NEW.created_at;
+    END IF;
+
+    PERFORM dashboard_bump('tasks_total', n_exists - o_exists);
+    PERFORM dashboard_bump('active_tasks', COALESCE(n_active, 0) - COALESCE(o_active, 0));
+    PERFORM dashboard_bump('callbacks_success', n_success - o_success);
+    PERFORM dashboard_bump('callbacks_failed', n_failed - o_failed);
+    PERFORM dashboard_move_hourly('tasks_created', o_at, o_exists, n_at, n_exists);
+    PERFORM dashboard_move_hourly('callbacks_success', o_at, o_success, n_at, n_success);
+    PERFORM dashboard_move_hourly('callbacks_failed', o_at, o_failed, n_at, n_failed);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_user_tasks_trigger() RETURNS trigger AS $$
+DECLARE
+    o_exists INTEGER := 0; n_exists INTEGER := 0;
+    o_completed INTEGER := 0; n_completed INTEGER := 0;
+    o_submitted INTEGER := 0; n_submitted INTEGER := 0;
+    o_reward NUMERIC := 0; n_reward NUMERIC := 0;
+    o_status TEXT; n_status TEXT;
+    o_created_at TIMESTAMP; n_created_at TIMESTAMP;
+    o_submitted_at TIMESTAMP; n_submitted_at TIMESTAMP;
+    o_bucket TIMESTAMP; n_bucket TIMESTAMP;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        o_exists := 1;
+        o_completed := COALESCE((OLD.status IN ('submitted', 'approved', 'completed'))::INTEGER, 0);
+        o_submitted := COALESCE((OLD.status = 'submitted')::INTEGER, 0);
+        o_reward := COALESCE(OLD.node_power_earned, 0);
+        o_status := OLD.status;
+        o_created_at := OLD.created_at;
+        o_submitted_at := OLD.submitted_at;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        n_exists := 1;
+        n_completed := COALESCE((NEW.status IN ('submitted', 'approved', 'completed'))::INTEGER, 0);
+        n_submitted := COALESCE((NEW.status = 'submitted')::INTEGER, 0);
+        n_reward := COALESCE(NEW.node_power_earned, 0);
+        n_status := NEW.status;
+        n_created_at := NEW.created_at;
+        n_submitted_at := NEW.submitted_at;
+    END IF;
+
+    PERFORM dashboard_bump('user_tasks_total', n_exists - o_exists);
+    PERFORM dashboard_bump('user_tasks_completed', n_completed - o_completed);
+    PERFORM dashboard_bump('rewards_total', n_reward - o_reward);
+    PERFORM dashboard_move_hourly('user_tasks_created', o_created_at, o_exists, n_created_at, n_exists);
+    PERFORM dashboard_move_hourly('user_tasks_completed', o_submitted_at, o_completed, n_submitted_at, n_completed);
+    -- 提交数按提交时间（不区分后续审核结果），领取批次的完成数和奖励按领取时间
+    PERFORM dashboard_move_hourly('user_tasks_submitted', o_submitted_at, o_exists, n_submitted_at, n_exists);
+    PERFORM dashboard_move_hourly('claims_completed', o_created_at, o_completed, n_created_at, n_completed);
+    PERFORM dashboard_move_hourly('claims_rewards', o_created_at, o_reward, n_created_at, n_reward);
+    IF o_status IS DISTINCT FROM n_status THEN
+        IF o_status IS NOT NULL THEN
+            PERFORM dashboard_bump('user_tasks_status:' || o_status, -1);
+        END IF;
+        IF n_status IS NOT NULL THEN
+            PERFORM dashboard_bump('user_tasks_status:' || n_status, 1);
+        END IF;
+    END IF;
+
+    -- 按任务创建小时汇总的用户领取 / 完成（只改奖励等字段时跳过）
+    IF TG_OP = 'UPDATE' AND OLD.task_id = NEW.task_id AND OLD.user_id = NEW.user_id
+       AND o_submitted = n_submitted THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        SELECT date_trunc('hour', created_at) INTO o_bucket FROM drama_tasks WHERE task_id = OLD.task_id;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        SELECT date_trunc('hour', created_at) INTO n_bucket FROM drama_tasks WHERE task_id = NEW.task_id;
+    END IF;
+    IF TG_OP = 'UPDATE' AND o_bucket IS NOT DISTINCT FROM n_bucket AND OLD.user_id = NEW.user_id THEN
+        PERFORM dashboard_bump_task_user(n_bucket, NEW.user_id, 0, n_submitted - o_submitted);
+    ELSE
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM dashboard_bump_task_user(o_bucket, OLD.user_id, -1, -o_submitted);
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            PERFORM dashboard_bump_task_user(n_bucket, NEW.user_id, 1, n_submitted);
+        END IF;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_withdrawals_trigger() RETURNS trigger AS $$
+DECLARE
+    o_exists INTEGER := 0; n_exists INTEGER := 0;
+    o_completed INTEGER := 0; n_completed INTEGER := 0;
+    o_pending INTEGER := 0; n_pending INTEGER := 0;
+    o_amount NUMERIC := 0; n_amount NUMERIC := 0;
+    o_requested NUMERIC := 0; n_requested NUMERIC := 0;
+    o_at TIMESTAMP; n_at TIMESTAMP;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        o_exists := 1;
+        o_completed := COALESCE((OLD.status = 'completed')::INTEGER, 0);
+        o_pending := COALESCE((OLD.status = 'pending')::INTEGER, 0);
+        o_amount := CASE WHEN o_completed = 1 THEN COALESCE(OLD.amount, 0) ELSE 0 END;
+        o_requested := COALESCE(OLD.amount, 0);
+        o_at := OLD.created_at;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        n_exists := 1;
+        n_completed := COALESCE((NEW.status = 'completed')::INTEGER, 0);
+        n_pending := COALESCE((NEW.status = 'pending')::INTEGER, 0);
+        n_amount := CASE WHEN n_completed = 1 THEN COALESCE(NEW.amount, 0) ELSE 0 END;
+        n_requested := COALESCE(NEW.amount, 0);
+        n_at := NEW.created_at;
+    END IF;
+
+    PERFORM dashboard_bump('withdrawals_total', n_exists - o_exists);
+    PERFORM dashboard_bump('withdrawals_completed', n_completed - o_completed);
+    PERFORM dashboard_bump('withdrawals_pending', n_pending - o_pending);
+    PERFORM dashboard_bump('withdrawals_completed_amount', n_amount - o_amount);
+    PERFORM dashboard_move_hourly('withdrawals_requested', o_at, o_exists, n_at, n_exists);
+    PERFORM dashboard_move_hourly('withdrawals_requested_amount', o_at, o_requested, n_at, n_requested);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# 表 -> (触发器名, 触发事件, 触发器函数调用)
+DASHBOARD_TRIGGERS = {
+    'users': ('trg_dashboard_users', 'INSERT OR DELETE', "dashboard_users_trigger('users')"),
+    'web_users': ('trg_dashboard_web_users', 'INSERT OR DELETE', "dashboard_users_trigger('web_users')"),
+    'drama_tasks': (
+        'trg_dashboard_drama_tasks',
+        'INSERT OR DELETE OR UPDATE OF status, callback_status, created_at',
+        'dashboard_drama_tasks_trigger()'
+    ),
+    'user_tasks': (
+        'trg_dashboard_user_tasks',
+        'INSERT OR DELETE OR UPDATE OF status, node_power_earned, created_at, submitted_at, task_id, user_id',
+        'dashboard_user_tasks_trigger()'
+    ),
+    'withdrawals': (
+        'trg_dashboard_withdrawals',
+        'INSERT OR DELETE OR UPDATE OF status, amount, created_at',
+        'dashboard_withdrawals_trigger()'
+    ),
+}
+
+# 表 -> 计算全量计数的查询（每张表扫描一次）
+COUNTER_TRUTH = {
+    'users': "SELECT 'users_total'::text AS metric, COUNT(*)::numeric AS value FROM users",
+    'web_users': "SELECT 'web_users_total'::text, COUNT(*)::numeric FROM web_users",
+    'drama_tasks': """
+        SELECT m.metric, m.value FROM (
+            SELECT COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE status = 'active') AS active,
+                   COUNT(*) FILTER (WHERE callback_status = 'success') AS success,
+                   COUNT(*) FILTER (WHERE callback_status = 'failed') AS failed
+            FROM drama_tasks
+        ) s CROSS JOIN LATERAL (VALUES
+            ('tasks_total'::text, s.total::numeric), ('active_tasks', s.active),
+            ('callbacks_success', s.success), ('callbacks_failed', s.failed)
+        ) AS m(metric, value)
+    """,
+    'user_tasks': """
+        SELECT m.metric, m.value FROM (
+            SELECT COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE status IN ('submitted', 'approved', 'completed')) AS completed,
+                   COALESCE(SUM(node_power_earned), 0) AS rewards
+            FROM user_tasks
+        ) s CROSS JOIN LATERAL (VALUES
+            ('user_tasks_total'::text, s.total::numeric), ('user_tasks_completed', s.completed),
+            ('rewards_total', s.rewards)
+        ) AS m(metric, value)
+        UNION ALL
+        SELECT 'user_tasks_status:' || status, COUNT(*)::numeric
+        FROM user_tasks WHERE status IS NOT NULL GROUP BY status
+    """,
+    'withdrawals': """
+        SELECT m.metric, m.value FROM (
+            SELECT COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+                   COUNT(*) FILTER (WHERE status = 'pending') AS pending,
+                   COALESCE(SUM(amount) FILTER (WHERE status = 'completed'), 0) AS amount
+            FROM withdrawals
+        ) s CROSS JOIN LATERAL (VALUES
+            ('withdrawals_total'::text, s.total::numeric), ('withdrawals_completed', s.completed),
+            ('withdrawals_pending', s.pending), ('withdrawals_completed_amount', s.amount)
+        ) AS m(metric, value)
+    """,
+}
+
+# 表 -> 计算小时汇总的查询（%(since)s 为整点）
+HOURLY_TRUTH = {
+    'users': """
+        SELECT date_trunc('hour', created_at) AS bucket, 'users_created'::text AS metric, COUNT(*)::numeric AS value
+        FROM users WHERE created_at >= %(since)s GROUP BY 1
+    """,
+    'web_users': """
+        SELECT date_trunc('hour', created_at), 'web_users_created'::text, COUNT(*)::numeric
+        FROM web_users WHERE created_at >= %(since)s GROUP BY 1
+    """,
+    'drama_tasks': """
+        SELECT date_trunc('hour', created_at), m.metric, SUM(m.value)::numeric
+        FROM drama_tasks CROSS JOIN LATERAL (VALUES
+            ('tasks_created'::text, 1),
+            ('callbacks_success', (callback_status = 'success')::int),
+            ('callbacks_failed', (callback_status = 'failed')::int)
+        ) AS m(metric, value)
+        WHERE created_at >= %(since)s AND m.value IS NOT NULL
+        GROUP BY 1, 2
+    """,
+    'user_tasks': """
+        SELECT date_trunc('hour', created_at), m.metric, SUM(m.value)::numeric
+        FROM user_tasks CROSS JOIN LATERAL (VALUES
+            ('user_tasks_created'::text, 1::numeric),
+            ('claims_completed', (status IN ('submitted', 'approved', 'completed'))::int),
+            ('claims_rewards', COALESCE(node_power_earned, 0))
+        ) AS m(metric, value)
+        WHERE created_at >= %(since)s AND m.value IS NOT NULL
+        GROUP BY 1, 2
+        UNION ALL
+        SELECT date_trunc('hour', submitted_at), m.metric, SUM(m.value)::numeric
+        FROM user_tasks CROSS JOIN LATERAL (VALUES
+            ('user_tasks_submitted'::text, 1),
+            ('user_tasks_completed', (status IN ('submitted', 'approved', 'completed'))::int)
+        ) AS m(metric, value)
+        WHERE submitted_at >= %(since)s AND m.value IS NOT NULL
+        GROUP BY 1, 2
+    """,
+    'withdrawals': """
+        SELECT date_trunc('hour', created_at), m.metric, SUM(m.value)::numeric
+        FROM withdrawals CROSS JOIN LATERAL (VALUES
+            ('withdrawals_requested'::text, 1::numeric),
+            ('withdrawals_requested_amount', COALESCE(amount, 0))
+        ) AS m(metric, value)
+        WHERE created_at >= %(since)s
+        GROUP BY 1, 2
+    """,
+}
+
+HOURLY_METRICS = {
+    'users': ['users_created'],
+    'web_users': ['web_users_created'],
+    'drama_tasks': ['tasks_created', 'callbacks_success', 'callbacks_failed'],
+    'user_tasks': [
+        'user_tasks_created', 'user_tasks_completed', 'user_tasks_submitted', 'claims_completed', 'claims_rewards'
+    ],
+    'withdrawals': ['withdrawals_requested', 'withdrawals_requested_amount'],
+}
+
+# (key, hours) -> (过期时间, 结果)
+_response_cache = {}
+_cache_lock = threading.Lock()
+
+_reconcile_thread = None
+_reconcile_running = False
+
+_dashboard_metrics_stats = {
+    'cache_hits': 0,
+    'queries': 0,
+    'reconcile_runs': 0,
+    'reconcile_corrections': 0,
+    'last_reconcile_at': None,
+    'last_reconcile_seconds': None,
+}
+
+
+def get_db_connection():
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
+
+
+def _existing_tables(cur) -> list:
+    cur.execute("""
+        SELECT name FROM unnest(%s::text[]) AS name WHERE to_regclass(name) IS NOT NULL
+    """, (list(DASHBOARD_TRIGGERS),))
+    return [row['name'] for row in cur.fetchall()]
+
+
+def ensure_dashboard_metrics():
+    """创建计数表、触发器函数，并在已存在的业务表上安装触发器"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(DASHBOARD_METRICS_DDL)
+        for table in _existing_tables(cur):
+            trigger, events, function = DASHBOARD_TRIGGERS[table]
+            cur.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+            cur.execute(f"""
+                CREATE TRIGGER {trigger}
+                AFTER {events} ON {table}
+                FOR EACH ROW EXECUTE PROCEDURE {function}
+            """)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        logger.info("✅ 统计计数表和触发器已就绪")
+        return True
+    except Exception as e:
+        logger.error(f"❌ 初始化统计计数失败: {e}")
+        return False
+
+
+# ============================================================
+# 校正（按业务表重新计算，以增量方式修正偏差）
+# ============================================================
+
+def reconcile_dashboard_metrics(hours: int = None) -> int:
+    """
+    按业务表重新计算计数，把偏差作为增量写回
+    
+    每条语句在同一个快照中同时读取业务表和计数表，偏差只包含快照时刻的差异；
+    增量写入与快照之后提交的触发器更新可以叠加，不会相互覆盖
+    
+    Args:
+        hours: 小时汇总的校正范围，None 表示全部历史
+    
+    Returns:
+        int: 修正的计数条数
+    """
+    started = time.monotonic()
+    if hours is None:
+        since = datetime(1970, 1, 1)
+    else:
+        since = (datetime.now() - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
+    
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        tables = _existing_tables(cur)
+        hourly_tables = [table for table in tables if table in HOURLY_TRUTH]
+        if not hourly_tables:
+            cur.close()
+            return 0
+        corrections = 0
+        
+        # 1. 全量计数
+        truth = " UNION ALL ".join(COUNTER_TRUTH[table] for table in tables)
+        cur.execute(f"""
+            WITH truth AS ({truth}),
+            stored AS (
+                SELECT metric, SUM(value) AS value FROM dashboard_counters GROUP BY metric
+            )
+            INSERT INTO dashboard_counters (metric, shard, value)
+            SELECT COALESCE(t.metric, s.metric), 0, COALESCE(t.value, 0) - COALESCE(s.value, 0)
+            FROM truth t FULL OUTER JOIN stored s ON s.metric = t.metric
+            WHERE COALESCE(t.value, 0) <> COALESCE(s.value, 0)
+            ON CONFLICT (metric, shard) DO UPDATE SET value = dashboard_counters.value + EXCLUDED.value
+        """)
+        corrections += cur.rowcount
+        conn.commit()
+        
+        # 2. 小时汇总
+        truth = " UNION ALL ".join(HOURLY_TRUTH[table] for table in hourly_tables)
+        metrics = [metric for table in hourly_tables for metric in HOURLY_METRICS[table]]
+        cur.execute(f"""
+            WITH truth (bucket, metric, value) AS ({truth}),
+            stored AS (
+                SELECT bucket, metric, SUM(value) AS value
+                FROM dashboard_hourly
+                WHERE bucket >= %(since)s AND metric = ANY(%(metrics)s)
+                GROUP BY bucket, metric
+            ),
+            diff AS (
+                SELECT COALESCE(t.bucket, s.bucket) AS bucket, COALESCE(t.metric, s.metric) AS metric,
+                       COALESCE(t.value, 0) - COALESCE(s.value, 0) AS delta
+                FROM truth t
+                FULL OUTER JOIN stored s ON s.bucket = t.bucket AND s.metric = t.metric
+            )
+            INSERT INTO dashboard_hourly (bucket, metric, shard, value)
+            SELECT bucket, metric, 0, delta FROM diff WHERE delta <> 0
+            ON CONFLICT (bucket, metric, shard) DO UPDATE SET value = dashboard_hourly.value + EXCLUDED.value
+        """, {'since': since, 'metrics': metrics})
+        corrections += cur.rowcount
+        conn.commit()
+        
+        # 3. 按天汇总（由小时汇总重新合计，起点取整到当天零点）
+        cur.execute("""
+            WITH truth AS (
+                SELECT bucket::DATE AS day, metric, SUM(value) AS value
+                FROM dashboard_hourly
+                WHERE bucket >= %(since)s AND metric = ANY(%(metrics)s)
+                GROUP BY 1, 2
+            ),
+            stored AS (
+                SELECT day, metric, SUM(value) AS value
+                FROM dashboard_daily
+                WHERE day >= %(since)s::DATE AND metric = ANY(%(metrics)s)
+                GROUP BY day, metric
+            ),
+            diff AS (
+                SELECT COALESCE(t.day, s.day) AS day, COALESCE(t.metric, s.metric) AS metric,
+                       COALESCE(t.value, 0) - COALESCE(s.value, 0) AS delta
+                FROM truth t
+                FULL OUTER JOIN stored s ON s.day = t.day AND s.metric = t.metric
+            )
+            INSERT INTO dashboard_daily (day, metric, shard, value)
+            SELECT day, metric, 0, delta FROM diff WHERE delta <> 0
+            ON CONFLICT (day, metric, shard) DO UPDATE SET value = dashboard_daily.value + EXCLUDED.value
+        """, {'since': since.replace(hour=0), 'metrics': metrics})
+        corrections += cur.rowcount
+        conn.commit()
+        
+        # 4. 按任务创建小时汇总的用户领取 / 完成
+        if 'user_tasks' in tables and 'drama_tasks' in tables:
+            cur.execute("""
+                WITH truth AS (
+                    SELECT date_trunc('hour', t.created_at) AS bucket, ut.user_id,
+                           COUNT(*) AS claims,
+                           COUNT(*) FILTER (WHERE ut.status = 'submitted') AS completions
+                    FROM user_tasks ut
+                    JOIN drama_tasks t ON t.task_id = ut.task_id
+                    WHERE t.created_at >= %(since)s
+                    GROUP BY 1, 2
+                ),
+                stored AS (
+                    SELECT bucket, user_id, claims, completions
+                    FROM dashboard_task_users
+                    WHERE bucket >= %(since)s
+                ),
+                diff AS (
+                    SELECT COALESCE(t.bucket, s.bucket) AS bucket, COALESCE(t.user_id, s.user_id) AS user_id,
+                           COALESCE(t.claims, 0) - COALESCE(s.claims, 0) AS claims,
+                           COALESCE(t.completions, 0) - COALESCE(s.completions, 0) AS completions
+                    FROM truth t
+                    FULL OUTER JOIN stored s ON s.bucket = t.bucket AND s.user_id = t.user_id
+                )
+                INSERT INTO dashboard_task_users (bucket, user_id, claims, completions)
+                SELECT bucket, user_id, claims, completions FROM diff
+                WHERE claims <> 0 OR completions <> 0
+                ON CONFLICT (bucket, user_id) DO UPDATE
+                SET claims = dashboard_task_users.claims + EXCLUDED.claims,
+                    completions = dashboard_task_users.completions + EXCLUDED.completions
+            """, {'since': since})
+            corrections += cur.rowcount
+            conn.commit()
+        
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    duration = time.monotonic() - started
+    with _cache_lock:
+        _dashboard_metrics_stats['reconcile_runs'] += 1
+        _dashboard_metrics_stats['reconcile_corrections'] += corrections
+        _dashboard_metrics_stats['last_reconcile_at'] = datetime.now().isoformat()
+        _dashboard_metrics_stats['last_reconcile_seconds'] = round(duration, 3)
+    
+    if corrections:
+        logger.info(f"🔧 统计计数已校正 {corrections} 条 (范围: {'全部' if hours is None else f'{hours} 小时'}, 耗时 {duration:.1f}s)")
+    return corrections
+
+
+def start_dashboard_metrics_reconciler(interval_minutes: int = DASHBOARD_RECONCILE_MINUTES):
+    """启动校正线程：启动时全量校正一次（同时完成历史数据回填），之后定期校正最近的小时汇总"""
+    global _reconcile_thread, _reconcile_running
+    if _reconcile_running:
+        return False
+    _reconcile_running = True
+    
+    def reconcile_loop():
+        hours = None
+        while _reconcile_running:
+            try:
+                reconcile_dashboard_metrics(hours)
+                hours = DASHBOARD_RECONCILE_HOURS
+            except Exception as e:
+                logger.error(f"❌ 统计计数校正失败: {e}")
+            time.sleep(interval_minutes * 60)
+    
+    _reconcile_thread = threading.Thread(target=reconcile_loop, name='dashboard-reconcile', daemon=True)
+    _reconcile_thread.start()
+    logger.info(f"✅ 统计计数校正线程已启动，间隔: {interval_minutes} 分钟")
+    return True
+
+
+def stop_dashboard_metrics_reconciler():
+    """停止校正线程"""
+    global _reconcile_running
+    _reconcile_running = False
+
+
+# ============================================================
+# 读取
+# ============================================================
+
+def _cached(key, loader):
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _response_cache.get(key)
+        if cached and cached[0] > now:
+            _dashboard_metrics_stats['cache_hits'] += 1
+            return cached[1]
+    
+    data = loader()
+    with _cache_lock:
+        _dashboard_metrics_stats['queries'] += 1
+        _response_cache[key] = (now + DASHBOARD_METRICS_CACHE_SECONDS, data)
+    return data
+
+
+def _load_counters(cur) -> dict:
+    cur.execute("SELECT metric, SUM(value) AS value FROM dashboard_counters GROUP BY metric")
+    return {row['metric']: int(row['value']) for row in cur.fetchall()}
+
+
+def _load_daily(cur, metrics, days: int) -> dict:
+    """
+    最近 days 个自然日（含今天）的按天汇总
+    
+    Returns:
+        dict: {metric: [(天数差, 日期, 值)]}，按日期升序，值为 0 的天不返回
+    """
+    cur.execute("""
+        SELECT day, CURRENT_DATE - day AS age, metric, SUM(value) AS value
+        FROM dashboard_daily
+        WHERE day > CURRENT_DATE - %s AND day <= CURRENT_DATE AND metric = ANY(%s)
+        GROUP BY day, metric
+        HAVING SUM(value) <> 0
+        ORDER BY day ASC
+    """, (days, list(metrics)))
+    series = {metric: [] for metric in metrics}
+    for row in cur.fetchall():
+        series[row['metric']].append((row['age'], row['day'], int(row['value'])))
+    return series
+
+
+def _window_sum(points, days: int) -> int:
+    return sum(value for age, _, value in points if age < days)
+
+
+def _daily_list(points, days: int, field: str) -> list:
+    return [{'date': day.isoformat(), field: value} for age, day, value in points if age < days]
+
+
+def _load_overview() -> dict:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        counters = _load_counters(cur)
+        cur.execute("""
+            SELECT metric, SUM(value) AS value
+            FROM dashboard_hourly
+            WHERE bucket >= CURRENT_DATE AND bucket < CURRENT_DATE + 1
+              AND metric IN ('users_created', 'web_users_created', 'user_tasks_created', 'user_tasks_completed')
+            GROUP BY metric
+        """)
+        today = {row['metric']: row['value'] for row in cur.fetchall()}
+        cur.close()
+    finally:
+        conn.close()
+    
+    def counter(name):
+        return counters.get(name, 0)
+    
+    def today_count(name):
+        return int(today.get(name) or 0)
+    
+    tg_users = counter('users_total')
+    web_users = counter('web_users_total')
+    total_claimed = counter('user_tasks_total')
+    total_completed = counter('user_tasks_completed')
+    total_rewards = counter('rewards_total')
+    tg_today = today_count('users_created')
+    web_today = today_count('web_users_created')
+    
+    return {
+        'users': {
+            'tg_bot': tg_users,
+            'web': web_users,
+            'total': tg_users + web_users,
+            'tg_today': tg_today,
+            'web_today': web_today,
+            'today_total': tg_today + web_today
+        },
+        'tasks': {
+            'active': counter('active_tasks'),
+            'total_claimed': total_claimed,
+            'total_completed': total_completed,
+            'completion_rate': round(total_completed / total_claimed * 100, 1) if total_claimed > 0 else 0,
+            'claimed_today': today_count('user_tasks_created'),
+            'completed_today': today_count('user_tasks_completed')
+        },
+        'rewards': {
+            'total_distributed': total_rewards,
+            'total_usd': round(total_rewards * 0.02, 2)  # X2C 价格 $0.02
+        },
+        'withdrawals': {
+            'total': counter('withdrawals_total'),
+            'completed': counter('withdrawals_completed'),
+            'pending': counter('withdrawals_pending'),
+            'total_amount': counter('withdrawals_completed_amount')
+        }
+    }
+
+
+def get_overview() -> dict:
+    """综合统计概览（/api/stats/overview 的 data 部分）"""
+    return _cached(('overview', None), _load_overview)
+
+
+def _load_task_stats(hours: int) -> dict:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        if hours > 0:
+            cur.execute("SELECT date_trunc('hour', LOCALTIMESTAMP - %s * INTERVAL '1 hour') AS since", (hours,))
+            since = cur.fetchone()['since']
+            cur.execute("""
+                SELECT
+                    COALESCE(SUM(value) FILTER (WHERE metric = 'tasks_created'), 0) AS total_tasks,
+                    COALESCE(SUM(value) FILTER (WHERE metric = 'callbacks_success'), 0) AS successful_callbacks,
+                    COALESCE(SUM(value) FILTER (WHERE metric = 'callbacks_failed'), 0) AS failed_callbacks
+                FROM dashboard_hourly
+                WHERE bucket >= %s AND metric IN ('tasks_created', 'callbacks_success', 'callbacks_failed')
+            """, (since,))
+            task_counts = cur.fetchone()
+            cur.execute("""
+                SELECT
+                    COUNT(DISTINCT user_id) FILTER (WHERE claims > 0) AS total_users,
+                    COUNT(DISTINCT user_id) FILTER (WHERE completions > 0) AS completed_users
+                FROM dashboard_task_users
+                WHERE bucket >= %s
+            """, (since,))
+        else:
+            cur.execute("""
+                SELECT
+                    COALESCE(SUM(value) FILTER (WHERE metric = 'tasks_total'), 0) AS total_tasks,
+                    COALESCE(SUM(value) FILTER (WHERE metric = 'callbacks_success'), 0) AS successful_callbacks,
+                    COALESCE(SUM(value) FILTER (WHERE metric = 'callbacks_failed'), 0) AS failed_callbacks
+                FROM dashboard_counters
+                WHERE metric IN ('tasks_total', 'callbacks_success', 'callbacks_failed')
+            """)
+            task_counts = cur.fetchone()
+            cur.execute("""
+                SELECT
+                    COUNT(DISTINCT user_id) FILTER (WHERE claims > 0) AS total_users,
+                    COUNT(DISTINCT user_id) FILTER (WHERE completions > 0) AS completed_users
+                FROM dashboard_task_users
+            """)
+        user_counts = cur.fetchone()
+        cur.close()
+    finally:
+        conn.close()
+    
+    return {
+        'total_tasks': int(task_counts['total_tasks']),
+        'total_users': user_counts['total_users'],
+        'completed_users': user_counts['completed_users'],
+        'successful_callbacks': int(task_counts['successful_callbacks']),
+        'failed_callbacks': int(task_counts['failed_callbacks'])
+    }
+
+
+def get_task_stats(hours: int = 24) -> dict:
+    """
+    时间窗口内创建的任务及其领取用户统计（/api/logs/stats 的 data 部分）
+    
+    Args:
+        hours: 时间窗口（小时，起点取整到整点），0 或负数表示全部
+    """
+    return _cached(('task_stats', hours), lambda: _load_task_stats(hours))
+
+
+def _load_user_growth(days: int) -> dict:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        counters = _load_counters(cur)
+        daily = _load_daily(cur, ('users_created', 'web_users_created'), max(days, 30))
+        cur.close()
+    finally:
+        conn.close()
+    
+    def source(total_metric, created_metric):
+        points = daily[created_metric]
+        return {
+            'total': counters.get(total_metric, 0),
+            'last_7_days': _window_sum(points, 7),
+            'last_30_days': _window_sum(points, 30),
+            'daily': _daily_list(points, days, 'new_users')
+        }
+    
+    tg = source('users_total', 'users_created')
+    web = source('web_users_total', 'web_users_created')
+    return {
+        'tg_bot': tg,
+        'web': web,
+        'combined': {
+            'total': tg['total'] + web['total'],
+            'last_7_days': tg['last_7_days'] + web['last_7_days'],
+            'last_30_days': tg['last_30_days'] + web['last_30_days']
+        }
+    }
+
+
+def get_user_growth(days: int = 30) -> dict:
+    """
+    用户增长统计（/api/stats/user-growth 的 data 部分）
+    
+    Args:
+        days: 每日新增序列的天数（自然日，含今天）
+    """
+    return _cached(('user_growth', days), lambda: _load_user_growth(days))
+
+
+def _load_task_trends(days: int) -> dict:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        counters = _load_counters(cur)
+        daily = _load_daily(
+            cur, ('user_tasks_created', 'user_tasks_submitted', 'claims_completed', 'claims_rewards'), max(days, 30)
+        )
+        cur.close()
+    finally:
+        conn.close()
+    
+    def window(window_days):
+        # 按领取时间统计：窗口内领取的任务及其完成数、奖励
+        return {
+            'claimed': _window_sum(daily['user_tasks_created'], window_days),
+            'completed': _window_sum(daily['claims_completed'], window_days),
+            'rewards': _window_sum(daily['claims_rewards'], window_days)
+        }
+    
+    status_prefix = 'user_tasks_status:'
+    statuses = {
+        metric[len(status_prefix):]: value
+        for metric, value in counters.items()
+        if metric.startswith(status_prefix) and value > 0
+    }
+    return {
+        'totals': {
+            'claimed': counters.get('user_tasks_total', 0),
+            'completed': counters.get('user_tasks_completed', 0),
+            'rejected': statuses.get('rejected', 0),
+            'pending': statuses.get('claimed', 0) + statuses.get('pending', 0),
+            'rewards_distributed': counters.get('rewards_total', 0)
+        },
+        'last_7_days': window(7),
+        'last_30_days': window(30),
+        'daily_claimed': _daily_list(daily['user_tasks_created'], days, 'claimed_count'),
+        'daily_completed': _daily_list(daily['user_tasks_submitted'], days, 'completed_count'),
+        'status_distribution': [
+            {'status': status, 'count': count}
+            for status, count in sorted(statuses.items(), key=lambda item: item[1], reverse=True)
+        ]
+    }
+
+
+def get_task_trends(days: int = 30) -> dict:
+    """
+    任务领取 / 完成 / 奖励统计（/api/stats/task-stats 的 data 部分）
+    
+    Args:
+        days: 每日序列的天数（自然日，含今天）
+    """
+    return _cached(('task_trends', days), lambda: _load_task_trends(days))
+
+
+def get_daily_series(metrics, days: int = 30) -> dict:
+    """
+    任意指标的按天序列（如 withdrawals_requested、withdrawals_requested_amount）
+    
+    Returns:
+        dict: {metric: [{'date': 'YYYY-MM-DD', 'value': 值}]}
+    """
+    def load():
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            daily = _load_daily(cur, metrics, days)
+            cur.close()
+        finally:
+            conn.close()
+        return {metric: _daily_list(points, days, 'value') for metric, points in daily.items()}
+    
+    return _cached(('daily_series', tuple(metrics), days), load)
+
+
+def get_dashboard_metrics_stats() -> dict:
+    """统计计数模块的运行状态（用于监控）"""
+    with _cache_lock:
+        return {
+            **_dashboard_metrics_stats,
+            'cache_seconds': DASHBOARD_METRICS_CACHE_SECONDS,
+            'reconcile_minutes': DASHBOARD_RECONCILE_MINUTES,
+        }
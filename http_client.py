@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程级共享 HTTP 客户端
+LinkVerifier / VideoStatsFetcher / webhook_notifier 等共用，
+连接保持 keep-alive 并缓存 DNS，避免每个请求都重新做 DNS 解析和 TLS 握手。
+
+aiohttp 会话绑定事件循环：每个事件循环一个会话（bot 主循环、回传线程循环等），
+连接上限、DNS 缓存和按主机的延迟指标在整个进程内共享配置
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from types import SimpleNamespace
+from typing import Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# 配置（可通过环境变量调整）
+# ============================================================
+
+HTTP_CLIENT_LIMIT = int(os.getenv('HTTP_CLIENT_LIMIT', '100'))  # 单个会话的总连接数上限
+HTTP_CLIENT_LIMIT_PER_HOST = int(os.getenv('HTTP_CLIENT_LIMIT_PER_HOST', '10'))  # 单个主机的连接数上限
+HTTP_CLIENT_DNS_TTL = int(os.getenv('HTTP_CLIENT_DNS_TTL', '300'))  # DNS 缓存时间（秒）
+HTTP_CLIENT_KEEPALIVE = float(os.getenv('HTTP_CLIENT_KEEPALIVE', '30'))  # 空闲连接保持时间（秒）
+HTTP_CLIENT_TIMEOUT = float(os.getenv('HTTP_CLIENT_TIMEOUT', '30'))  # 默认请求超时（秒）
+
+# 事件循环 -> 会话
+_sessions = weakref.WeakKeyDictionary()
+
+# 按主机的请求指标（多个事件循环所在线程共同写入）
+_metrics_lock = threading.Lock()
+_host_metrics = {}
+
+
+# ============================================================
+# 指标采集（aiohttp TraceConfig）
+# ============================================================
+
+def _record(host: str, latency: Optional[float], status: Optional[int] = None, error: Optional[str] = None):
+    with _metrics_lock:
+        stats = _host_metrics.setdefault(host, {
+            'requests': 0,
+            'errors': 0,
+            'total_latency': 0.0,
+            'max_latency': 0.0,
+            'last_status': None,
+            'last_error': None,
+        })
+        stats['requests'] += 1
+        if latency is not None:
+            stats['total_latency'] += latency
+            stats['max_latency'] = max(stats['max_latency'], latency)
+        if status is not None:
+            stats['last_status'] = status
+        if error is not None or (status is not None and status >= 500):
+            stats['errors'] += 1
+            stats['last_error'] = error or f'HTTP {status}'
+
+
+async def _on_request_start(session, ctx, params):
+    ctx.started = time.monotonic()
+
+
+async def _on_request_end(session, ctx, params):
+    _record(params.url.host or '', time.monotonic() - ctx.started, status=params.response.status)
+
+
+async def _on_request_exception(session, ctx, params):
+    _record(params.url.host or '', time.monotonic() - ctx.started, error=type(params.exception).__name__)
+
+
+def _build_trace_config() -> aiohttp.TraceConfig:
+    trace_config = aiohttp.TraceConfig(trace_config_ctx_factory=lambda trace_request_ctx=None: SimpleNamespace(started=0.0))
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_request_end.append(_on_request_end)
+    trace_config.on_request_exception.append(_on_request_exception)
+    return trace_config
+
+
+# ============================================================
+# 会话管理
+# ============================================================
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    获取当前事件循环的共享会话（懒加载，必须在协程中调用）
+    
+    调用方不要关闭返回的会话，单次请求的超时通过 timeout 参数覆盖
+    
+    Example:
+        >>> session = http_client.get_session()
+        >>> async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+        ...     data = await response.json()
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_CLIENT_LIMIT,
+            limit_per_host=HTTP_CLIENT_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_CLIENT_DNS_TTL,
+            keepalive_timeout=HTTP_CLIENT_KEEPALIVE
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_CLIENT_TIMEOUT),
+            trace_configs=[_build_trace_config()]
+        )
+        _sessions[loop] = session
+        logger.info(f"✅ 共享 HTTP 会话已创建 (thread={threading.current_thread().name})")
+    return session
+
+
+async def close_session():
+    """关闭当前事件循环的共享会话（事件循环退出前调用）"""
+    loop = asyncio.get_running_loop()
+    session = _sessions.pop(loop, None)
+    if session is not None and not session.closed:
+        await session.close()
+        logger.info("✅ 共享 HTTP 会话已关闭")
+
+
+def close_all_sessions():
+    """
+    关闭所有仍可操作的会话（进程退出时调用）
+    
+    正在运行的事件循环由各自的所有者负责关闭，这里只处理已停止但未关闭的循环
+    """
+    for loop, session in list(_sessions.items()):
+        if session.closed or loop.is_closed() or loop.is_running():
+            continue
+        try:
+            loop.run_until_complete(session.close())
+        except Exception as e:
+            logger.warning(f"⚠️ 关闭 HTTP 会话失败: {e}")
+    _sessions.clear()
+
+
+def run(coro):
+    """
+    在新事件循环中运行协程，结束时关闭该循环的共享会话
+    
+    用于 Flask 请求线程、定时器线程等没有事件循环的场景，替代 asyncio.run()
+    """
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await close_session()
+    
+    return asyncio.run(runner())
+
+
+def get_http_metrics() -> dict:
+    """按主机的请求数、错误数和延迟（用于监控）"""
+    with _metrics_lock:
+        hosts = {}
+        for host, stats in _host_metrics.items():
+            hosts[host] = {
+                **stats,
+                'avg_latency': round(stats['total_latency'] / stats['requests'], 3) if stats['requests'] else None,
+                'total_latency': round(stats['total_latency'], 3),
+                'max_latency': round(stats['max_latency'], 3),
+            }
+    return {
+        'sessions': sum(1 for session in list(_sessions.values()) if not session.closed),
+        'limit': HTTP_CLIENT_LIMIT,
+        'limit_per_host': HTTP_CLIENT_LIMIT_PER_HOST,
+        'hosts': hosts,
+    }
@@ -5,6 +5,7 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
 import logging
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -110,8 +111,13 @@ def get_invitation_stats(user_id: int) -> dict:
             'total_rewards': 0.0
         }
 
-def process_referral_reward(invitee_id: int, task_id: int, original_reward: float) -> bool:
-    """处理推荐奖励（被邀请人完成任务时调用）"""
+def process_referral_reward(invitee_id: int, task_id: int, original_reward: float) -> Optional[int]:
+    """
+    处理推荐奖励（被邀请人完成任务时调用）
+    
+    Returns:
+        Optional[int]: 发放成功时返回邀请人ID（调用方据此使邀请人的资料缓存失效），否则返回 None
+    """
     try:
         conn = get_db_connection()
         cur = conn.cursor()
@@ -128,7 +134,7 @@ def process_referral_reward(invitee_id: int, task_id: int, original_reward: floa
             logger.info(f"ℹ️ User {invitee_id} was not invited by anyone")
             cur.close()
             conn.close()
-            return False
+            return None
         
         inviter_id = invitation['inviter_id']
         is_first_task = not invitation['first_task_completed']
@@ -190,11 +196,11 @@ def process_referral_reward(invitee_id: int, task_id: int, original_reward: floa
         cur.close()
         conn.close()
         
-        return True
+        return inviter_id
         
     except Exception as e:
         logger.error(f"❌ Failed to process referral reward: {e}", exc_info=True)
-        return False
+        return None
 
 def get_inviter_id(invitee_id: int) -> int:
     """获取邀请人ID"""
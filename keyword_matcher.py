@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+多模式关键词匹配（Aho-Corasick）
+关键词编译成自动机后，一次扫描页面文本即可找出所有出现的关键词，
+耗时与文本长度成正比，与关键词数量无关
+"""
+from collections import deque
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 自动机（不区分大小写）"""
+
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns: 关键词列表（空字符串会被忽略）
+        """
+        self.patterns = list(dict.fromkeys(p.lower() for p in patterns if p))
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [frozenset()]
+
+        # 构建字典树
+        outputs = [set()]
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append(set())
+                    nxt = len(self._goto) - 1
+                    self._goto[node][ch] = nxt
+                node = nxt
+            outputs[node].add(index)
+
+        # 按层次计算失败指针，并合并后缀节点的输出
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                outputs[child] |= outputs[self._fail[child]]
+
+        self._output = [frozenset(out) for out in outputs]
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def find(self, text: str) -> set:
+        """
+        扫描文本，返回出现过的关键词（小写形式）
+
+        Example:
+            >>> KeywordAutomaton(['霸道总裁', 'CEO']).find('霸道总裁爱上我 ceo')
+            {'霸道总裁', 'ceo'}
+        """
+        if not text or not self.patterns:
+            return set()
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        found = set()
+        node = 0
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if output[node]:
+                found.update(output[node])
+        return {self.patterns[index] for index in found}
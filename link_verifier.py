@@ -5,14 +5,92 @@
 """
 import os
 import re
+import hashlib
 import logging
 import asyncio
-import aiohttp
+import oembed_store
+from collections import OrderedDict
 from datetime import datetime
-from urllib.parse import quote
+
+from keyword_matcher import KeywordAutomaton
 
 logger = logging.getLogger(__name__)
 
+KEYWORD_MATCHER_CACHE_MAX = int(os.getenv('KEYWORD_MATCHER_CACHE_MAX', '1000'))  # 缓存的任务匹配器数量上限
+
+
+def task_keyword_version(task_title: str, task_description: str) -> str:
+    """任务关键词版本：标题或描述变化后版本随之变化，旧匹配器失效"""
+    return hashlib.sha1(f"{task_title}\0{task_description}".encode('utf-8')).hexdigest()
+
+
+class TaskKeywordMatcher:
+    """单个任务编译后的关键词匹配器（剧名、剧名分词、核心关键词共用一个自动机）"""
+    
+    def __init__(self, version: str, drama_name: str, drama_words: list, keywords: list):
+        self.version = version
+        self.drama_name = drama_name
+        self.drama_words = drama_words
+        self.keywords = keywords
+        self.automaton = KeywordAutomaton([drama_name, *drama_words, *keywords])
+    
+    def match(self, page_text: str) -> dict:
+        """
+        严格匹配规则：
+        1. 如果任务标题包含剧名（《》），则必须匹配剧名，或匹配至少2个剧名分词
+        2. 否则，需要匹配至少2个核心关键词（关键词只有1个时匹配1个）
+        
+        Returns:
+            dict: {
+                'matched': bool,
+                'reason': str,
+                'rule': 'drama_name' | 'drama_words' | 'keywords',
+                'matched_keywords': 匹配到的关键词,
+                'keyword_count': 参与匹配的关键词数,
+                'required': 需要匹配的数量
+            }
+        """
+        found = self.automaton.find(page_text)
+        
+        if self.drama_name:
+            if self.drama_name.lower() in found:
+                return self._result(True, '', 'drama_name', [self.drama_name], 1, 1)
+            
+            matched_drama_words = [w for w in self.drama_words if w.lower() in found]
+            if len(matched_drama_words) >= 2:
+                return self._result(True, '', 'drama_words', matched_drama_words, len(self.drama_words), 2)
+            return self._result(
+                False,
+                f'视频标题中未找到剧名《{self.drama_name}》，请确保提交的是正确的剧集视频',
+                'drama_name', matched_drama_words, len(self.drama_words), 1
+            )
+        
+        if not self.keywords:
+            return self._result(False, '无法提取任务关键词', 'keywords', [], 0, 1)
+        
+        matched_keywords = [kw for kw in self.keywords if kw.lower() in found]
+        # 使用 min(2, len(keywords)) 确保不会要求匹配比实际关键词数量更多的数量
+        min_match_count = min(2, len(self.keywords))
+        if len(matched_keywords) >= min_match_count:
+            return self._result(True, '', 'keywords', matched_keywords, len(self.keywords), min_match_count)
+        return self._result(
+            False,
+            '视频标题与任务内容不匹配，请确保提交的是正确的任务视频',
+            'keywords', matched_keywords, len(self.keywords), min_match_count
+        )
+    
+    @staticmethod
+    def _result(matched, reason, rule, matched_keywords, keyword_count, required) -> dict:
+        return {
+            'matched': matched,
+            'reason': reason,
+            'rule': rule,
+            'matched_keywords': matched_keywords,
+            'keyword_count': keyword_count,
+            'required': required,
+        }
+
+
 class LinkVerifier:
     """视频链接验证器（使用 API 和 HTTP 请求）"""
     
@@ -20,6 +98,9 @@ class LinkVerifier:
         """初始化验证器"""
         self.screenshots_dir = screenshots_dir
         os.makedirs(screenshots_dir, exist_ok=True)
+        # 任务ID（或内容版本）-> 编译后的关键词匹配器
+        self._matchers = OrderedDict()
+        self._matcher_stats = {'hits': 0, 'compiled': 0, 'invalidated': 0, 'evicted': 0}
     
     def validate_platform_url(self, url: str, platform: str) -> dict:
         """
@@ -70,7 +151,7 @@ class LinkVerifier:
             'error_message': f'请提供正确的 {platform_names.get(platform, platform)} 链接（应包含 {expected_domains}）'
         }
     
-    async def verify_link(self, url: str, task_title: str, task_description: str, timeout: int = 20000) -> dict:
+    async def verify_link(self, url: str, task_title: str, task_description: str, timeout: int = 20000, task_id: int = None) -> dict:
         """
         验证视频链接 - 检查描述和标签是否包含任务关键词
         
@@ -79,11 +160,13 @@ class LinkVerifier:
             task_title: 任务标题（用于关键词匹配）
             task_description: 任务描述（用于关键词匹配）
             timeout: 请求超时时间（毫秒）
+            task_id: 任务ID（可选，用于缓存任务的关键词匹配器）
         
         Returns:
             dict: {
                 'success': bool,  # 验证是否成功
                 'matched': bool,  # 是否匹配任务关键词
+                'match_details': dict,  # 关键词匹配诊断（仅 TikTok）
                 'screenshot_path': str,  # 截图路径（已弃用）
                 'page_title': str,  # 页面标题
                 'page_text': str,  # 页面文本内容（描述+标签）
@@ -105,7 +188,7 @@ class LinkVerifier:
             # 判断平台
             if 'tiktok.com' in url.lower():
                 # 使用 TikTok oEmbed API
-                result = await self._verify_tiktok_oembed(url, task_title, task_description)
+                result = await self._verify_tiktok_oembed(url, task_title, task_description, task_id)
             elif 'youtube.com' in url.lower() or 'youtu.be' in url.lower():
                 # YouTube 验证（简化版）
                 result = await self._verify_youtube(url, task_title, task_description)
@@ -121,7 +204,7 @@ class LinkVerifier:
         
         return result
     
-    async def _verify_tiktok_oembed(self, url: str, task_title: str, task_description: str) -> dict:
+    async def _verify_tiktok_oembed(self, url: str, task_title: str, task_description: str, task_id: int = None) -> dict:
         """
         使用 TikTok oEmbed API 验证链接（带自动重试机制）
         
@@ -142,79 +225,65 @@ class LinkVerifier:
             'error': None
         }
         
-        # 构建 oEmbed API URL
-        oembed_url = f"https://www.tiktok.com/oembed?url={quote(url)}"
-        logger.info(f"📡 调用 TikTok oEmbed API: {oembed_url}")
-        
-        # 发送 HTTP GET 请求（添加 User-Agent 头，避免被 TikTok 拒绝）
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'application/json',
-            'Accept-Language': 'en-US,en;q=0.9'
-        }
-        
         # 自动重试机制：最多重试 3 次，每次间隔 60 秒
         # TikTok oEmbed API 有时会随机返回 400 错误，较长的重试间隔可以提高成功率
+        # 元数据由 oembed_store 按视频ID缓存，同一视频的并发核验只调用一次 API
         max_retries = 3
         retry_delay = 60
         last_error = None
         
         for attempt in range(max_retries):
             try:
-                async with aiohttp.ClientSession(headers=headers) as session:
-                    async with session.get(oembed_url, timeout=aiohttp.ClientTimeout(total=15)) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            logger.info(f"✅ oEmbed API 返回成功 (第 {attempt + 1} 次尝试)")
-                            
-                            # 提取标题和作者
-                            title = data.get('title', '')
-                            author_name = data.get('author_name', '')
-                            
-                            result['page_title'] = title
-                            result['page_text'] = f"{title} {author_name}"
-                            
-                            logger.info(f"📝 视频标题: {title}")
-                            logger.info(f"👤 作者: {author_name}")
-                            
-                            # 验证关键词匹配（使用严格模式）
-                            match_result = self._check_keywords_match_strict(
-                                result['page_text'],
-                                task_title,
-                                task_description
-                            )
-                            result['matched'] = match_result['matched']
-                            
-                            # 如果不匹配，设置错误原因
-                            if not result['matched']:
-                                result['error'] = match_result.get('reason', '内容不匹配')
-                            
-                            result['success'] = True
-                            return result  # 成功，直接返回
-                        else:
-                            last_error = f"API 返回错误: {response.status}"
-                            logger.warning(f"⚠️ oEmbed API 返回错误: {response.status} (第 {attempt + 1}/{max_retries} 次尝试)")
-                            
-                            # 如果不是最后一次尝试，等待后重试
-                            if attempt < max_retries - 1:
-                                logger.info(f"⏳ 等待 {retry_delay} 秒后重试...")
-                                await asyncio.sleep(retry_delay)
-                            
-            except aiohttp.ClientError as e:
-                last_error = f"网络请求失败: {str(e)}"
-                logger.warning(f"⚠️ 网络请求失败: {e} (第 {attempt + 1}/{max_retries} 次尝试)")
+                oembed = await oembed_store.get_tiktok_oembed(url, timeout=15)
                 
-                if attempt < max_retries - 1:
-                    logger.info(f"⏳ 等待 {retry_delay} 秒后重试...")
-                    await asyncio.sleep(retry_delay)
+                if oembed['status'] == 'ok':
+                    data = oembed['data']
+                    logger.info(f"✅ oEmbed API 返回成功 (第 {attempt + 1} 次尝试{'，缓存' if oembed['cached'] else ''})")
+                    
+                    # 提取标题和作者
+                    title = data.get('title', '')
+                    author_name = data.get('author_name', '')
+                    
+                    result['page_title'] = title
+                    result['page_text'] = f"{title} {author_name}"
+                    
+                    logger.info(f"📝 视频标题: {title}")
+                    logger.info(f"👤 作者: {author_name}")
                     
+                    # 验证关键词匹配（使用严格模式）
+                    match_result = self._check_keywords_match_strict(
+                        result['page_text'],
+                        task_title,
+                        task_description,
+                        task_id
+                    )
+                    result['matched'] = match_result['matched']
+                    result['match_details'] = match_result
+                    
+                    # 如果不匹配，设置错误原因
+                    if not result['matched']:
+                        result['error'] = match_result.get('reason', '内容不匹配')
+                    
+                    result['success'] = True
+                    return result  # 成功，直接返回
+                
+                if oembed['status'] == 'not_found':
+                    # 视频不存在或已删除，重试没有意义
+                    logger.warning(f"⚠️ oEmbed API 返回 404，视频不存在或已删除: {url}")
+                    result['error'] = oembed['error']
+                    return result
+                
+                last_error = oembed['error']
+                logger.warning(f"⚠️ oEmbed 请求失败: {last_error} (第 {attempt + 1}/{max_retries} 次尝试)")
+                
             except Exception as e:
                 last_error = str(e)
                 logger.error(f"❌ oEmbed 验证失败: {e} (第 {attempt + 1}/{max_retries} 次尝试)", exc_info=True)
-                
-                if attempt < max_retries - 1:
-                    logger.info(f"⏳ 等待 {retry_delay} 秒后重试...")
-                    await asyncio.sleep(retry_delay)
+            
+            # 如果不是最后一次尝试，等待后重试
+            if attempt < max_retries - 1:
+                logger.info(f"⏳ 等待 {retry_delay} 秒后重试...")
+                await asyncio.sleep(retry_delay)
         
         # 所有重试都失败
         logger.error(f"❌ oEmbed API 连续 {max_retries} 次失败, URL: {url}")
@@ -331,7 +400,47 @@ class LinkVerifier:
         logger.info(f"🔑 提取到的核心关键词: {keywords}")
         return keywords
     
-    def _check_keywords_match_strict(self, page_text: str, task_title: str, task_description: str) -> dict:
+    def get_keyword_matcher(self, task_title: str, task_description: str, task_id: int = None) -> TaskKeywordMatcher:
+        """
+        获取任务的编译后匹配器（按任务缓存，标题或描述变化时重新编译）
+        
+        Args:
+            task_title: 任务标题
+            task_description: 任务描述
+            task_id: 任务ID（可选，不传时按内容版本缓存）
+        """
+        task_description = task_description or ''
+        version = task_keyword_version(task_title, task_description)
+        key = task_id if task_id is not None else version
+        
+        matcher = self._matchers.get(key)
+        if matcher is not None and matcher.version == version:
+            self._matchers.move_to_end(key)
+            self._matcher_stats['hits'] += 1
+            return matcher
+        
+        if matcher is not None:
+            # 任务内容已变化，丢弃旧版本
+            self._matcher_stats['invalidated'] += 1
+        
+        drama_name = self._extract_drama_name(task_title)
+        drama_words = re.findall(r'[\u4e00-\u9fff]{2,}', drama_name) if drama_name else []
+        keywords = self._extract_core_keywords(task_title, task_description)
+        matcher = TaskKeywordMatcher(version, drama_name, drama_words, keywords)
+        
+        self._matchers[key] = matcher
+        self._matchers.move_to_end(key)
+        while len(self._matchers) > KEYWORD_MATCHER_CACHE_MAX:
+            self._matchers.popitem(last=False)
+            self._matcher_stats['evicted'] += 1
+        self._matcher_stats['compiled'] += 1
+        return matcher
+    
+    def get_matcher_stats(self) -> dict:
+        """关键词匹配器缓存统计（用于监控）"""
+        return {**self._matcher_stats, 'cached': len(self._matchers)}
+    
+    def _check_keywords_match_strict(self, page_text: str, task_title: str, task_description: str, task_id: int = None) -> dict:
         """
         严格检查页面文本是否包含任务关键词
         
@@ -343,64 +452,28 @@ class LinkVerifier:
             page_text: 页面文本内容
             task_title: 任务标题
             task_description: 任务描述
+            task_id: 任务ID（可选，用于缓存编译后的匹配器）
         
         Returns:
-            dict: {'matched': bool, 'reason': str}
+            dict: {'matched': bool, 'reason': str, ...匹配诊断信息（见 TaskKeywordMatcher.match）}
         """
         if not page_text:
             logger.warning("⚠️ 页面文本为空，默认不匹配")
             return {'matched': False, 'reason': '无法获取视频标题信息'}
         
-        page_text_lower = page_text.lower()
-        
-        # 1. 首先检查剧名匹配（最严格的检查）
-        drama_name = self._extract_drama_name(task_title)
-        if drama_name:
-            logger.info(f"🎬 检查剧名匹配: {drama_name}")
-            if drama_name.lower() in page_text_lower:
-                logger.info(f"✅ 剧名匹配成功: {drama_name}")
-                return {'matched': True, 'reason': ''}
-            else:
-                # 剧名不匹配，检查剧名的部分词是否匹配
-                drama_words = re.findall(r'[\u4e00-\u9fff]{2,}', drama_name)
-                matched_drama_words = [w for w in drama_words if w.lower() in page_text_lower]
-                if len(matched_drama_words) >= 2:
-                    logger.info(f"✅ 剧名部分匹配成功: {matched_drama_words}")
-                    return {'matched': True, 'reason': ''}
-                logger.warning(f"⚠️ 剧名不匹配: 期望 '{drama_name}'，实际 '{page_text[:100]}'")
-                return {
-                    'matched': False, 
-                    'reason': f'视频标题中未找到剧名《{drama_name}》，请确保提交的是正确的剧集视频'
-                }
-        
-        # 2. 提取核心关键词
-        keywords = self._extract_core_keywords(task_title, task_description)
-        
-        if not keywords:
-            logger.warning("⚠️ 未提取到关键词，默认不匹配")
-            return {'matched': False, 'reason': '无法提取任务关键词'}
-        
-        # 3. 检查关键词匹配（需要匹配至少2个）
-        matched_keywords = []
-        for keyword in keywords:
-            if keyword.lower() in page_text_lower:
-                matched_keywords.append(keyword)
+        matcher = self.get_keyword_matcher(task_title, task_description, task_id)
+        result = matcher.match(page_text)
         
-        logger.info(f"📊 匹配到的关键词: {matched_keywords} / {len(keywords)}")
-        
-        # 需要匹配至少1个关键词，如果有多个关键词则需要匹配至少2个
-        # 使用 min(2, len(keywords)) 确保不会要求匹配比实际关键词数量更多的数量
-        min_match_count = min(2, len(keywords))
-        
-        if len(matched_keywords) >= min_match_count:
-            logger.info(f"✅ 关键词匹配成功: 匹配 {len(matched_keywords)} 个，要求 {min_match_count} 个")
-            return {'matched': True, 'reason': ''}
+        if result['matched']:
+            logger.info(f"✅ 关键词匹配成功（{result['rule']}）: {result['matched_keywords']}")
+        elif result['rule'] == 'drama_name':
+            logger.warning(f"⚠️ 剧名不匹配: 期望 '{matcher.drama_name}'，实际 '{page_text[:100]}'")
         else:
-            logger.warning(f"⚠️ 关键词匹配失败: 匹配 {len(matched_keywords)} 个，要求 {min_match_count} 个")
-            return {
-                'matched': False, 
-                'reason': f'视频标题与任务内容不匹配，请确保提交的是正确的任务视频'
-            }
+            logger.warning(
+                f"⚠️ 关键词匹配失败: 匹配 {len(result['matched_keywords'])} 个，要求 {result['required']} 个"
+                f"（共 {result['keyword_count']} 个关键词）"
+            )
+        return result
     
     def _check_keywords_match(self, page_text: str, task_title: str, task_description: str) -> bool:
         """
@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+"""
+管理后台实时推送（Server-Sent Events）
+管理页面原来用 setInterval 定时拉取队列状态和全部列表，打开 N 个页面就是 N 份轮询；
+现在每个进程只有一个生产者线程，所有 SSE 连接共享它的结果：
+
+- 状态类主题（queue / broadcaster / view_counter）：有订阅者时每 LIVE_FEED_POLL_SECONDS 秒
+  读取一次状态，只推送发生变化的字段（delta），新连接先收到当前完整状态（snapshot）
+- 事件类主题（completions / withdrawals）：user_tasks / withdrawals 上的触发器在提交后
+  pg_notify，生产者线程 LISTEN 后转发；同一批收到的通知按主题合并为一条消息
+- 每个连接按 topics 参数订阅，消息只编码一次后放入各连接的有界队列；
+  队列满（客户端读取太慢）时断开该连接，由浏览器自动重连并重新获取完整状态
+"""
+
+import os
+import json
+import time
+import queue
+import select
+import logging
+import itertools
+import threading
+from typing import Iterable, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+import db_pool
+
+logger = logging.getLogger(__name__)
+
+# 数据库连接
+DATABASE_URL = db_pool.DATABASE_URL
+
+LIVE_FEED_POLL_SECONDS = int(os.getenv('LIVE_FEED_POLL_SECONDS', '3'))  # 状态类主题的读取间隔
+LIVE_FEED_HEARTBEAT_SECONDS = int(os.getenv('LIVE_FEED_HEARTBEAT_SECONDS', '15'))  # 空闲连接的心跳间隔
+LIVE_FEED_MAX_SUBSCRIBERS = int(os.getenv('LIVE_FEED_MAX_SUBSCRIBERS', '50'))
+LIVE_FEED_QUEUE_SIZE = int(os.getenv('LIVE_FEED_QUEUE_SIZE', '100'))  # 每个连接最多积压的消息数
+LIVE_FEED_MAX_EVENT_ITEMS = 20  # 合并后的事件消息最多携带的明细条数
+LIVE_FEED_RETRY_MS = 5000  # 浏览器断线重连间隔
+LIVE_FEED_CHANNEL = 'live_feed'
+LIVE_FEED_RECONNECT_SECONDS = 10
+
+STATE_TOPICS = ('queue', 'broadcaster', 'view_counter')
+EVENT_TOPICS = ('completions', 'withdrawals')
+TOPICS = STATE_TOPICS + EVENT_TOPICS
+
+LIVE_FEED_DDL = """
+-- 新的完成记录（进入 submitted / approved / completed）
+CREATE OR REPLACE FUNCTION live_feed_user_tasks_notify() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.status IN ('submitted', 'approved', 'completed') THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('live_feed', json_build_object(
+        'topic', 'completions', 'id', NEW.id, 'task_id', NEW.task_id, 'user_id', NEW.user_id,
+        'status', NEW.status, 'submitted_at', NEW.submitted_at)::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_live_feed_user_tasks ON user_tasks;
+CREATE TRIGGER trg_live_feed_user_tasks
+    AFTER INSERT OR UPDATE OF status ON user_tasks
+    FOR EACH ROW WHEN (NEW.status IN ('submitted', 'approved', 'completed'))
+    EXECUTE PROCEDURE live_feed_user_tasks_notify();
+
+-- 新的提现申请和提现状态变化
+CREATE OR REPLACE FUNCTION live_feed_withdrawals_notify() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.status IS NOT DISTINCT FROM NEW.status THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('live_feed', json_build_object(
+        'topic', 'withdrawals', 'withdrawal_id', NEW.withdrawal_id, 'user_id', NEW.user_id,
+        'amount', NEW.amount, 'status', NEW.status)::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_live_feed_withdrawals ON withdrawals;
+CREATE TRIGGER trg_live_feed_withdrawals
+    AFTER INSERT OR UPDATE OF status ON withdrawals
+    FOR EACH ROW EXECUTE PROCEDURE live_feed_withdrawals_notify();
+"""
+
+_lock = threading.Lock()
+_subscribers = {}  # 订阅者ID -> {'id', 'topics', 'queue', 'closed'}
+_subscriber_ids = itertools.count(1)
+_states = {}  # 状态类主题 -> 最近一次推送的完整状态
+_source_errors = {}  # 状态类主题 -> 最近一次读取错误（相同错误只记录一次日志）
+_producer_thread = None
+_producer_running = False
+
+_feed_metrics = {
+    'connections_total': 0,
+    'connections_rejected': 0,
+    'subscribers_dropped': 0,
+    'messages_published': 0,
+    'notifications': 0,
+    'state_polls': 0,
+    'listening': False,
+}
+
+
+def get_db_connection():
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
+
+
+def ensure_live_feed_triggers():
+    """安装完成记录 / 提现的变更通知触发器"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(LIVE_FEED_DDL)
+        conn.commit()
+        cur.close()
+        conn.close()
+        logger.info("✅ 实时推送触发器已就绪")
+        return True
+    except Exception as e:
+        logger.error(f"❌ 安装实时推送触发器失败: {e}")
+        return False
+
+
+# ============================================================
+# 订阅
+# ============================================================
+
+def parse_topics(value: Optional[str]) -> List[str]:
+    """
+    解析 topics 参数（逗号分隔，为空表示全部主题）
+    
+    Raises:
+        ValueError: 包含未知主题
+    """
+    if not value:
+        return list(TOPICS)
+    topics = [t.strip() for t in value.split(',') if t.strip()]
+    unknown = [t for t in topics if t not in TOPICS]
+    if unknown:
+        raise ValueError(f"未知主题: {', '.join(unknown)}")
+    return topics
+
+
+def _format(topic: str, kind: str, data) -> str:
+    payload = json.dumps({'type': kind, 'data': data}, ensure_ascii=False, default=str)
+    return f"event: {topic}\ndata: {payload}\n\n"
+
+
+def subscribe(topics: Iterable[str]) -> Optional[dict]:
+    """
+    注册一个订阅者，并放入已订阅状态类主题的当前完整状态
+    
+    Returns:
+        dict: 订阅者；连接数已达上限时返回 None
+    """
+    with _lock:
+        if len(_subscribers) >= LIVE_FEED_MAX_SUBSCRIBERS:
+            _feed_metrics['connections_rejected'] += 1
+            return None
+        sub = {
+            'id': next(_subscriber_ids),
+            'topics': frozenset(topics),
+            'queue': queue.Queue(maxsize=LIVE_FEED_QUEUE_SIZE),
+            'closed': False,
+        }
+        for topic in STATE_TOPICS:
+            if topic in sub['topics'] and topic in _states:
+                sub['queue'].put_nowait(_format(topic, 'snapshot', _states[topic]))
+        _subscribers[sub['id']] = sub
+        _feed_metrics['connections_total'] += 1
+    start_live_feed()
+    return sub
+
+
+def unsubscribe(sub: dict):
+    """移除订阅者；某个状态类主题没有订阅者后丢弃其缓存状态（停止读取后状态会过期）"""
+    with _lock:
+        sub['closed'] = True
+        _subscribers.pop(sub['id'], None)
+        wanted = _wanted_topics_locked()
+        for topic in list(_states):
+            if topic not in wanted:
+                del _states[topic]
+
+
+def stream(sub: dict):
+    """SSE 响应体：逐条输出订阅者队列中的消息，空闲时发送心跳注释；连接结束时自动退订"""
+    try:
+        yield f"retry: {LIVE_FEED_RETRY_MS}\n\n"
+        while not sub['closed']:
+            try:
+                yield sub['queue'].get(timeout=LIVE_FEED_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": ping\n\n"
+    finally:
+        unsubscribe(sub)
+
+
+def _wanted_topics_locked() -> set:
+    topics = set()
+    for sub in _subscribers.values():
+        topics |= sub['topics']
+    return topics
+
+
+def _publish_locked(topic: str, kind: str, data) -> int:
+    """消息编码一次后放入所有订阅了该主题的队列；队列已满的订阅者被断开"""
+    targets = [sub for sub in _subscribers.values() if topic in sub['topics']]
+    if not targets:
+        return 0
+    message = _format(topic, kind, data)
+    for sub in targets:
+        try:
+            sub['queue'].put_nowait(message)
+        except queue.Full:
+            sub['closed'] = True
+            del _subscribers[sub['id']]
+            _feed_metrics['subscribers_dropped'] += 1
+            logger.warning(f"⚠️ 实时推送客户端读取过慢，已断开 (订阅者 {sub['id']})")
+    _feed_metrics['messages_published'] += 1
+    return len(targets)
+
+
+def _update_state(topic: str, state: dict):
+    """与上次推送的状态比较，只推送变化的字段"""
+    with _lock:
+        if topic not in _wanted_topics_locked():
+            _states.pop(topic, None)
+            return
+        previous = _states.get(topic)
+        if previous is None:
+            kind, data = 'snapshot', state
+        else:
+            kind = 'delta'
+            data = {key: value for key, value in state.items() if previous.get(key) != value}
+            data.update({key: None for key in previous if key not in state})
+            if not data:
+                return
+        _states[topic] = state
+        _publish_locked(topic, kind, data)
+
+
+def _publish_events(topic: str, events: List[dict], resync: bool = False):
+    with _lock:
+        _publish_locked(topic, 'event', {
+            'count': len(events),
+            'items': events[-LIVE_FEED_MAX_EVENT_ITEMS:],
+            'resync': resync,
+        })
+
+
+# ============================================================
+# 状态来源
+# ============================================================
+
+def _queue_state() -> dict:
+    from async_verification_worker import get_queue_status
+    return get_queue_status()
+
+
+def _broadcaster_state() -> dict:
+    from stats_broadcaster import get_broadcaster_status
+    status = get_broadcaster_status()
+    metrics = {key: value for key, value in status['metrics'].items() if key != 'hosts'}
+    return {'running': status['running'], 'interval_seconds': status['interval_seconds'], **metrics}
+
+
+def _view_counter_state() -> dict:
+    from view_counter_service import is_timer_running, get_crawl_metrics
+    metrics = {key: value for key, value in get_crawl_metrics().items() if key != 'platforms'}
+    return {'running': is_timer_running(), **metrics}
+
+
+# 状态类主题 -> 读取函数
+STATE_SOURCES = {
+    'queue': _queue_state,
+    'broadcaster': _broadcaster_state,
+    'view_counter': _view_counter_state,
+}
+
+
+def _poll_states():
+    with _lock:
+        wanted = _wanted_topics_locked()
+    for topic, source in STATE_SOURCES.items():
+        if topic not in wanted:
+            continue
+        try:
+            state = source()
+        except Exception as e:
+            if _source_errors.get(topic) != str(e):
+                logger.warning(f"⚠️ 读取实时推送状态失败 ({topic}): {e}")
+            _source_errors[topic] = str(e)
+            continue
+        _source_errors.pop(topic, None)
+        _update_state(topic, state)
+    with _lock:
+        _feed_metrics['state_polls'] += 1
+
+
+# ============================================================
+# 生产者线程
+# ============================================================
+
+def _listen():
+    try:
+        conn = psycopg2.connect(DATABASE_URL)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        cur = conn.cursor()
+        cur.execute(f"LISTEN {LIVE_FEED_CHANNEL}")
+        cur.close()
+        logger.info(f"👂 已监听实时推送通知: {LIVE_FEED_CHANNEL}")
+        return conn
+    except Exception as e:
+        logger.warning(f"⚠️ 实时推送监听连接失败，{LIVE_FEED_RECONNECT_SECONDS} 秒后重试: {e}")
+        return None
+
+
+def _dispatch(payloads: List[str]):
+    """同一批通知按主题合并为一条消息"""
+    events = {topic: [] for topic in EVENT_TOPICS}
+    for payload in payloads:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            continue
+        topic = event.pop('topic', None)
+        if topic in events:
+            events[topic].append(event)
+    for topic, items in events.items():
+        if items:
+            _publish_events(topic, items)
+
+
+def _producer_loop():
+    conn = None
+    connected_before = False
+    retry_at = 0.0
+    next_poll = 0.0
+    
+    while _producer_running:
+        if conn is None and time.monotonic() >= retry_at:
+            conn = _listen()
+            if conn is None:
+                retry_at = time.monotonic() + LIVE_FEED_RECONNECT_SECONDS
+            else:
+                # 重连期间可能漏掉通知，让页面各自刷新一次
+                if connected_before:
+                    for topic in EVENT_TOPICS:
+                        _publish_events(topic, [], resync=True)
+                connected_before = True
+            with _lock:
+                _feed_metrics['listening'] = conn is not None
+        
+        timeout = max(0.0, next_poll - time.monotonic())
+        if conn is not None:
+            try:
+                if select.select([conn], [], [], timeout) != ([], [], []):
+                    conn.poll()
+                    payloads = []
+                    while conn.notifies:
+                        payloads.append(conn.notifies.pop(0).payload)
+                    with _lock:
+                        _feed_metrics['notifications'] += len(payloads)
+                    _dispatch(payloads)
+            except Exception as e:
+                logger.warning(f"⚠️ 实时推送监听连接断开: {e}")
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                conn = None
+                retry_at = time.monotonic() + LIVE_FEED_RECONNECT_SECONDS
+                with _lock:
+                    _feed_metrics['listening'] = False
+        elif timeout > 0:
+            time.sleep(min(timeout, LIVE_FEED_POLL_SECONDS))
+        
+        if time.monotonic() >= next_poll:
+            _poll_states()
+            next_poll = time.monotonic() + LIVE_FEED_POLL_SECONDS
+    
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    with _lock:
+        _feed_metrics['listening'] = False
+
+
+def start_live_feed():
+    """启动生产者线程（每个进程一个，第一个订阅者连接时自动启动）"""
+    global _producer_thread, _producer_running
+    with _lock:
+        if _producer_running:
+            return False
+        _producer_running = True
+    _producer_thread = threading.Thread(target=_producer_loop, name='live-feed', daemon=True)
+    _producer_thread.start()
+    logger.info(f"📡 实时推送生产者已启动，状态读取间隔: {LIVE_FEED_POLL_SECONDS} 秒")
+    return True
+
+
+def stop_live_feed():
+    """停止生产者线程"""
+    global _producer_running
+    _producer_running = False
+
+
+def get_live_feed_stats() -> dict:
+    """实时推送统计（用于监控）"""
+    with _lock:
+        topics = {topic: 0 for topic in TOPICS}
+        for sub in _subscribers.values():
+            for topic in sub['topics']:
+                topics[topic] += 1
+        return {
+            **_feed_metrics,
+            'running': _producer_running,
+            'subscribers': len(_subscribers),
+            'topics': topics,
+            'source_errors': dict(_source_errors),
+        }
@@ -0,0 +1,7 @@
+-- 播放量刷新调度：记录每个视频下次需要抓取的时间
+ALTER TABLE user_tasks ADD COLUMN IF NOT EXISTS next_refresh_at TIMESTAMP;
+
+-- 到期查询只扫已提交的视频，从未抓取（NULL）的排在最前
+CREATE INDEX IF NOT EXISTS idx_user_tasks_next_refresh_at
+ON user_tasks (next_refresh_at NULLS FIRST)
+WHERE status = 'submitted';
@@ -0,0 +1,12 @@
+-- 验证队列并发领取：租约 + 心跳字段
+-- 领取后 status 仍为 pending，lease_expires_at 未过期的记录不会被其他 worker 领取
+ALTER TABLE pending_verifications
+    ADD COLUMN IF NOT EXISTS locked_by VARCHAR(100),
+    ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS started_at TIMESTAMP;
+
+-- 按创建时间领取待验证记录
+CREATE INDEX IF NOT EXISTS idx_pending_verifications_queue
+ON pending_verifications(created_at)
+WHERE status = 'pending';
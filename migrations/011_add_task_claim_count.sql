@@ -0,0 +1,52 @@
+-- 任务领取人数计数：由 user_tasks 触发器维护，替代每次查询时 COUNT(DISTINCT user_id) 聚合
+ALTER TABLE drama_tasks ADD COLUMN IF NOT EXISTS claim_count INTEGER NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION user_tasks_claim_count_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        IF NOT EXISTS (
+            SELECT 1 FROM user_tasks
+            WHERE user_id = OLD.user_id AND task_id = OLD.task_id AND id <> OLD.id
+        ) THEN
+            UPDATE drama_tasks SET claim_count = GREATEST(claim_count - 1, 0)
+            WHERE task_id = OLD.task_id;
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NOT EXISTS (
+            SELECT 1 FROM user_tasks
+            WHERE user_id = NEW.user_id AND task_id = NEW.task_id AND id <> NEW.id
+        ) THEN
+            UPDATE drama_tasks SET claim_count = claim_count + 1
+            WHERE task_id = NEW.task_id;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_user_tasks_claim_count ON user_tasks;
+CREATE TRIGGER trg_user_tasks_claim_count
+AFTER INSERT OR DELETE OR UPDATE OF user_id, task_id ON user_tasks
+FOR EACH ROW EXECUTE FUNCTION user_tasks_claim_count_sync();
+
+-- 索引：NOT EXISTS 反连接 / 触发器查询 / 分类浏览
+CREATE INDEX IF NOT EXISTS idx_user_tasks_user_task ON user_tasks(user_id, task_id);
+CREATE INDEX IF NOT EXISTS idx_user_tasks_task_user ON user_tasks(task_id, user_id);
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_active_category_created
+ON drama_tasks(category, created_at DESC)
+WHERE status = 'active';
+
+-- 回填现有计数
+UPDATE drama_tasks dt
+SET claim_count = COALESCE(c.claim_count, 0)
+FROM drama_tasks d
+LEFT JOIN (
+    SELECT task_id, COUNT(DISTINCT user_id) as claim_count
+    FROM user_tasks
+    GROUP BY task_id
+) c ON c.task_id = d.task_id
+WHERE dt.task_id = d.task_id;
+
+-- 记录触发器版本（与 category_browser.CLAIM_COUNT_SCHEMA_VERSION 一致，启动时据此跳过重复安装）
+COMMENT ON FUNCTION user_tasks_claim_count_sync() IS 'claim_count:v1';
@@ -0,0 +1,20 @@
+-- 任务预翻译：译文存放在 drama_tasks.translations（键为 "{字段}_{语言}"，如 title_ja），
+-- 翻译队列由 API 服务器的后台线程消费（translation_queue.py）
+ALTER TABLE drama_tasks ADD COLUMN IF NOT EXISTS translations JSONB NOT NULL DEFAULT '{}'::jsonb;
+
+CREATE TABLE IF NOT EXISTS translation_jobs (
+    task_id INTEGER PRIMARY KEY REFERENCES drama_tasks(task_id) ON DELETE CASCADE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    enqueued_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_translation_jobs_next_attempt
+ON translation_jobs (next_attempt_at);
+
+-- 把现有活跃任务加入队列
+INSERT INTO translation_jobs (task_id)
+SELECT task_id FROM drama_tasks
+WHERE status = 'active' AND title IS NOT NULL
+ON CONFLICT (task_id) DO NOTHING;
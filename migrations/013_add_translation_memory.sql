@@ -0,0 +1,12 @@
+-- 翻译记忆库：按 (原文哈希, 目标语言, 上下文) 保存译文，同一原文只翻译一次
+CREATE TABLE IF NOT EXISTS translation_memory (
+    source_hash CHAR(64) NOT NULL,
+    target_lang VARCHAR(10) NOT NULL,
+    context VARCHAR(100) NOT NULL,
+    source_text TEXT NOT NULL,
+    translated_text TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source_hash, target_lang, context)
+);
@@ -0,0 +1,4 @@
+-- 提交限流：内存限流器把每日提交计数写回 users 表，重启或其他进程加载时从这里恢复
+ALTER TABLE users ADD COLUMN IF NOT EXISTS last_submission_time TIMESTAMP;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS daily_submit_date DATE;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS daily_submit_count INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,10 @@
+-- TikTok oEmbed 元数据缓存：按视频ID保存标题、作者等不变字段，bot 进程和 API 服务器进程共享
+-- status = 'ok' 长期缓存，status = 'not_found'（视频已删除）短期负缓存
+CREATE TABLE IF NOT EXISTS video_oembed_cache (
+    video_key VARCHAR(255) PRIMARY KEY,
+    status VARCHAR(20) NOT NULL,
+    data JSONB,
+    http_status INTEGER,
+    fetched_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
@@ -0,0 +1,26 @@
+-- 规范化视频ID：提交链接解析成 (平台, 视频ID) 保存在索引列中，替代 LIKE '%tiktok.com%' 扫描
+-- 历史数据由 video_identity.backfill_video_identity() 补齐（短链接需要跟随跳转）
+ALTER TABLE user_tasks ADD COLUMN IF NOT EXISTS video_platform VARCHAR(20);
+ALTER TABLE user_tasks ADD COLUMN IF NOT EXISTS video_id VARCHAR(64);
+CREATE INDEX IF NOT EXISTS idx_user_tasks_video ON user_tasks (video_platform, video_id);
+
+-- 同一视频只能被一条任务记录占用，重复提交检查是一次主键查询
+CREATE TABLE IF NOT EXISTS video_submissions (
+    video_platform VARCHAR(20) NOT NULL,
+    video_id VARCHAR(64) NOT NULL,
+    user_task_id INTEGER NOT NULL REFERENCES user_tasks(id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL,
+    task_id INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (video_platform, video_id)
+);
+CREATE INDEX IF NOT EXISTS idx_video_submissions_user_task ON video_submissions (user_task_id);
+
+-- 短链接解析结果（vm.tiktok.com / v.douyin.com 等只跳转一次）
+CREATE TABLE IF NOT EXISTS video_short_links (
+    short_url TEXT PRIMARY KEY,
+    video_platform VARCHAR(20) NOT NULL,
+    video_id VARCHAR(64) NOT NULL,
+    resolved_url TEXT,
+    resolved_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
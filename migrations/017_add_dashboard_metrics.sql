@@ -0,0 +1,232 @@
+-- 管理后台统计计数：由触发器增量维护，/api/stats/overview 和 /api/logs/stats 不再扫描业务表
+-- 历史数据由 dashboard_metrics.reconcile_dashboard_metrics() 回填（API 服务器启动时全量校正一次）
+CREATE TABLE IF NOT EXISTS dashboard_counters (
+    metric VARCHAR(50) NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    value NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, shard)
+);
+
+CREATE TABLE IF NOT EXISTS dashboard_hourly (
+    bucket TIMESTAMP NOT NULL,
+    metric VARCHAR(50) NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    value NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, metric, shard)
+);
+
+CREATE TABLE IF NOT EXISTS dashboard_task_users (
+    bucket TIMESTAMP NOT NULL,
+    user_id BIGINT NOT NULL,
+    claims INTEGER NOT NULL DEFAULT 0,
+    completions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, user_id)
+);
+
+CREATE OR REPLACE FUNCTION dashboard_bump(p_metric TEXT, p_delta NUMERIC) RETURNS void AS $$
+BEGIN
+    IF p_delta IS NULL OR p_delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO dashboard_counters (metric, shard, value)
+    VALUES (p_metric, pg_backend_pid() % 8, p_delta)
+    ON CONFLICT (metric, shard) DO UPDATE SET value = dashboard_counters.value + EXCLUDED.value;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_bump_hourly(p_at TIMESTAMP, p_metric TEXT, p_delta NUMERIC) RETURNS void AS $$
+BEGIN
+    IF p_at IS NULL OR p_delta IS NULL OR p_delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO dashboard_hourly (bucket, metric, shard, value)
+    VALUES (date_trunc('hour', p_at), p_metric, pg_backend_pid() % 8, p_delta)
+    ON CONFLICT (bucket, metric, shard) DO UPDATE SET value = dashboard_hourly.value + EXCLUDED.value;
+END
+$$ LANGUAGE plpgsql;
+
+-- 把一行的贡献从旧小时移到新小时（同一小时内只写差值）
+CREATE OR REPLACE FUNCTION dashboard_move_hourly(p_metric TEXT, p_old_at TIMESTAMP, p_old NUMERIC,
+                                                 p_new_at TIMESTAMP, p_new NUMERIC) RETURNS void AS $$
+BEGIN
+    IF date_trunc('hour', p_old_at) IS NOT DISTINCT FROM date_trunc('hour', p_new_at) THEN
+        PERFORM dashboard_bump_hourly(p_new_at, p_metric, p_new - p_old);
+    ELSE
+        PERFORM dashboard_bump_hourly(p_old_at, p_metric, -p_old);
+        PERFORM dashboard_bump_hourly(p_new_at, p_metric, p_new);
+    END IF;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_bump_task_user(p_bucket TIMESTAMP, p_user_id BIGINT,
+                                                    p_claims INTEGER, p_completions INTEGER) RETURNS void AS $$
+BEGIN
+    IF p_bucket IS NULL OR p_user_id IS NULL OR (p_claims = 0 AND p_completions = 0) THEN
+        RETURN;
+    END IF;
+    INSERT INTO dashboard_task_users (bucket, user_id, claims, completions)
+    VALUES (p_bucket, p_user_id, p_claims, p_completions)
+    ON CONFLICT (bucket, user_id) DO UPDATE
+    SET claims = dashboard_task_users.claims + EXCLUDED.claims,
+        completions = dashboard_task_users.completions + EXCLUDED.completions;
+END
+$$ LANGUAGE plpgsql;
+
+-- users / web_users：TG_ARGV[0] 为指标前缀
+CREATE OR REPLACE FUNCTION dashboard_users_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM dashboard_bump(TG_ARGV[0] || '_total', 1);
+        PERFORM dashboard_bump_hourly(NEW.created_at, TG_ARGV[0] || '_created', 1);
+    ELSE
+        PERFORM dashboard_bump(TG_ARGV[0] || '_total', -1);
+        PERFORM dashboard_bump_hourly(OLD.created_at, TG_ARGV[0] || '_created', -1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_drama_tasks_trigger() RETURNS trigger AS $$
+DECLARE
+    o_exists INTEGER := 0; n_exists INTEGER := 0;
+    o_active INTEGER := 0; n_active INTEGER := 0;
+    o_success INTEGER := 0; n_success INTEGER := 0;
+    o_failed INTEGER := 0; n_failed INTEGER := 0;
+    o_at TIMESTAMP; n_at TIMESTAMP;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        o_exists := 1;
+        o_active := (OLD.status = 'active')::INTEGER;
+        o_success := COALESCE((OLD.callback_status = 'success')::INTEGER, 0);
+        o_failed := COALESCE((OLD.callback_status = 'failed')::INTEGER, 0);
+        o_at := OLD.created_at;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        n_exists := 1;
+        n_active := (NEW.status = 'active')::INTEGER;
+        n_success := COALESCE((NEW.callback_status = 'success')::INTEGER, 0);
+        n_failed := COALESCE((NEW.callback_status = 'failed')::INTEGER, 0);
+        n_at := NEW.created_at;
+    END IF;
+
+    PERFORM dashboard_bump('tasks_total', n_exists - o_exists);
+    PERFORM dashboard_bump('active_tasks', COALESCE(n_active, 0) - COALESCE(o_active, 0));
+    PERFORM dashboard_bump('callbacks_success', n_success - o_success);
+    PERFORM dashboard_bump('callbacks_failed', n_failed - o_failed);
+    PERFORM dashboard_move_hourly('tasks_created', o_at, o_exists, n_at, n_exists);
+    PERFORM dashboard_move_hourly('callbacks_success', o_at, o_success, n_at, n_success);
+    PERFORM dashboard_move_hourly('callbacks_failed', o_at, o_failed, n_at, n_failed);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_user_tasks_trigger() RETURNS trigger AS $$
+DECLARE
+    o_exists INTEGER := 0; n_exists INTEGER := 0;
+    o_completed INTEGER := 0; n_completed INTEGER := 0;
+    o_submitted INTEGER := 0; n_submitted INTEGER := 0;
+    o_reward NUMERIC := 0; n_reward NUMERIC := 0;
+    o_created_at TIMESTAMP; n_created_at TIMESTAMP;
+    o_submitted_at TIMESTAMP; n_submitted_at TIMESTAMP;
+    o_bucket TIMESTAMP; n_bucket TIMESTAMP;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        o_exists := 1;
+        o_completed := COALESCE((OLD.status IN ('submitted', 'approved', 'completed'))::INTEGER, 0);
+        o_submitted := COALESCE((OLD.status = 'submitted')::INTEGER, 0);
+        o_reward := COALESCE(OLD.node_power_earned, 0);
+        o_created_at := OLD.created_at;
+        o_submitted_at := OLD.submitted_at;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        n_exists := 1;
+        n_completed := COALESCE((NEW.status IN ('submitted', 'approved', 'completed'))::INTEGER, 0);
+        n_submitted := COALESCE((NEW.status = 'submitted')::INTEGER, 0);
+        n_reward := COALESCE(NEW.node_power_earned, 0);
+        n_created_at := NEW.created_at;
+        n_submitted_at := NEW.submitted_at;
+    END IF;
+
+    PERFORM dashboard_bump('user_tasks_total', n_exists - o_exists);
+    PERFORM dashboard_bump('user_tasks_completed', n_completed - o_completed);
+    PERFORM dashboard_bump('rewards_total', n_reward - o_reward);
+    PERFORM dashboard_move_hourly('user_tasks_created', o_created_at, o_exists, n_created_at, n_exists);
+    PERFORM dashboard_move_hourly('user_tasks_completed', o_submitted_at, o_completed, n_submitted_at, n_completed);
+
+    -- 按任务创建小时汇总的用户领取 / 完成（只改奖励等字段时跳过）
+    IF TG_OP = 'UPDATE' AND OLD.task_id = NEW.task_id AND OLD.user_id = NEW.user_id
+       AND o_submitted = n_submitted THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        SELECT date_trunc('hour', created_at) INTO o_bucket FROM drama_tasks WHERE task_id = OLD.task_id;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        SELECT date_trunc('hour', created_at) INTO n_bucket FROM drama_tasks WHERE task_id = NEW.task_id;
+    END IF;
+    IF TG_OP = 'UPDATE' AND o_bucket IS NOT DISTINCT FROM n_bucket AND OLD.user_id = NEW.user_id THEN
+        PERFORM dashboard_bump_task_user(n_bucket, NEW.user_id, 0, n_submitted - o_submitted);
+    ELSE
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM dashboard_bump_task_user(o_bucket, OLD.user_id, -1, -o_submitted);
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            PERFORM dashboard_bump_task_user(n_bucket, NEW.user_id, 1, n_submitted);
+        END IF;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_withdrawals_trigger() RETURNS trigger AS $$
+DECLARE
+    o_exists INTEGER := 0; n_exists INTEGER := 0;
+    o_completed INTEGER := 0; n_completed INTEGER := 0;
+    o_pending INTEGER := 0; n_pending INTEGER := 0;
+    o_amount NUMERIC := 0; n_amount NUMERIC := 0;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        o_exists := 1;
+        o_completed := COALESCE((OLD.status = 'completed')::INTEGER, 0);
+        o_pending := COALESCE((OLD.status = 'pending')::INTEGER, 0);
+        o_amount := CASE WHEN o_completed = 1 THEN COALESCE(OLD.amount, 0) ELSE 0 END;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        n_exists := 1;
+        n_completed := COALESCE((NEW.status = 'completed')::INTEGER, 0);
+        n_pending := COALESCE((NEW.status = 'pending')::INTEGER, 0);
+        n_amount := CASE WHEN n_completed = 1 THEN COALESCE(NEW.amount, 0) ELSE 0 END;
+    END IF;
+
+    PERFORM dashboard_bump('withdrawals_total', n_exists - o_exists);
+    PERFORM dashboard_bump('withdrawals_completed', n_completed - o_completed);
+    PERFORM dashboard_bump('withdrawals_pending', n_pending - o_pending);
+    PERFORM dashboard_bump('withdrawals_completed_amount', n_amount - o_amount);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_dashboard_users ON users;
+CREATE TRIGGER trg_dashboard_users
+    AFTER INSERT OR DELETE ON users
+    FOR EACH ROW EXECUTE PROCEDURE dashboard_users_trigger('users');
+
+DROP TRIGGER IF EXISTS trg_dashboard_web_users ON web_users;
+CREATE TRIGGER trg_dashboard_web_users
+    AFTER INSERT OR DELETE ON web_users
+    FOR EACH ROW EXECUTE PROCEDURE dashboard_users_trigger('web_users');
+
+DROP TRIGGER IF EXISTS trg_dashboard_drama_tasks ON drama_tasks;
+CREATE TRIGGER trg_dashboard_drama_tasks
+    AFTER INSERT OR DELETE OR UPDATE OF status, callback_status, created_at ON drama_tasks
+    FOR EACH ROW EXECUTE PROCEDURE dashboard_drama_tasks_trigger();
+
+DROP TRIGGER IF EXISTS trg_dashboard_user_tasks ON user_tasks;
+CREATE TRIGGER trg_dashboard_user_tasks
+    AFTER INSERT OR DELETE OR UPDATE OF status, node_power_earned, created_at, submitted_at, task_id, user_id ON user_tasks
+    FOR EACH ROW EXECUTE PROCEDURE dashboard_user_tasks_trigger();
+
+DROP TRIGGER IF EXISTS trg_dashboard_withdrawals ON withdrawals;
+CREATE TRIGGER trg_dashboard_withdrawals
+    AFTER INSERT OR DELETE OR UPDATE OF status, amount ON withdrawals
+    FOR EACH ROW EXECUTE PROCEDURE dashboard_withdrawals_trigger();
@@ -0,0 +1,84 @@
+-- 统计时间序列：增加按天汇总表，以及提交数、领取批次完成数 / 奖励、提现申请、任务状态分布等指标
+-- /api/stats/user-growth 和 /api/stats/task-stats 改为读取汇总；历史数据由 API 服务器启动时的全量校正回填
+CREATE TABLE IF NOT EXISTS dashboard_daily (
+    day DATE NOT NULL,
+    metric VARCHAR(50) NOT NULL,
+    shard SMALLINT NOT NULL DEFAULT 0,
+    value NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, metric, shard)
+);
+
+CREATE OR REPLACE FUNCTION dashboard_bump_hourly(p_at TIMESTAMP, p_metric TEXT, p_delta NUMERIC) RETURNS void AS $$
+BEGIN
+    IF p_at IS NULL OR p_delta IS NULL OR p_delta = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO dashboard_hourly (bucket, metric, shard, value)
+    VALUES (date_trunc('hour', p_at), p_metric, pg_backend_pid() % 8, p_delta)
+    ON CONFLICT (bucket, metric, shard) DO UPDATE SET value = dashboard_hourly.value + EXCLUDED.value;
+    INSERT INTO dashboard_daily (day, metric, shard, value)
+    VALUES (p_at::DATE, p_metric, pg_backend_pid() % 8, p_delta)
+    ON CONFLICT (day, metric, shard) DO UPDATE SET value = dashboard_daily.value + EXCLUDED.value;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION dashboard_user_tasks_trigger() RETURNS trigger AS $$
+DECLARE
+    o_exists INTEGER := 0; n_exists INTEGER := 0;
+    o_completed INTEGER := 0; n_completed INTEGER := 0;
+    o_submitted INTEGER := 0; n_submitted INTEGER := 0;
+    o_reward NUMERIC := 0; n_reward NUMERIC := 0;
+    o_status TEXT; n_status TEXT;
+    o_created_at TIMESTAMP; n_created_at TIMESTAMP;
+    o_submitted_at TIMESTAMP; n_submitted_at TIMESTAMP;
+    o_bucket TIMESTAMP; n_bucket TIMESTAMP;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        o_exists := 1;
+        o_completed := COALESCE((OLD.status IN ('submitted', 'approved', 'completed'))::INTEGER, 0);
+        o_submitted := COALESCE((OLD.status = 'submitted')::INTEGER, 0);
+        o_reward := COALESCE(OLD.node_power_earned, 0);
+        o_status := OLD.status;
+        o_created_at := OLD.created_at;
+        o_submitted_at := OLD.submitted_at;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        n_exists := 1;
+        n_completed := COALESCE((NEW.status IN ('submitted', 'approved', 'completed'))::INTEGER, 0);
+        n_submitted := COALESCE((NEW.status = 'submitted')::INTEGER, 0);
+        n_reward := COALESCE(NEW.node_power_earned, 0);
+        n_status := NEW.status;
+        n_created_at := NEW.created_at;
+        n_submitted_at := NEW.submitted_at;
+    END IF;
+
+CREATE OR REPLACE FUNCTION dashboard_withdrawals_trigger() RETURNS trigger AS $$
+DECLARE
+    o_exists INTEGER := 0; n_exists INTEGER := 0;
+    o_completed INTEGER := 0; n_completed INTEGER := 0;
+    o_pending INTEGER := 0; n_pending INTEGER := 0;
+    o_amount NUMERIC := 0; n_amount NUMERIC := 0;
+    o_requested NUMERIC := 0; n_requested NUMERIC := 0;
+    o_at TIMESTAMP; n_at TIMESTAMP;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        o_exists := 1;
+        o_completed := COALESCE((OLD.status = 'completed')::INTEGER, 0);
+        o_pending := COALESCE((OLD.status = 'pending')::INTEGER, 0);
+        o_amount := CASE WHEN o_completed = 1 THEN COALESCE(OLD.amount, 0) ELSE 0 END;
+        o_requested := COALESCE(OLD.amount, 0);
+        o_at := OLD.created_at;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        n_exists := 1;
+        n_completed := COALESCE((NEW.status = 'completed')::INTEGER, 0);
+        n_pending := COALESCE((NEW.status = 'pending')::INTEGER, 0);
+        n_amount := CASE WHEN n_completed = 1 THEN COALESCE(NEW.amount, 0) ELSE 0 END;
+        n_requested := COALESCE(NEW.amount, 0);
+        n_at := NEW.created_at;
+    END IF;
+
+DROP TRIGGER IF EXISTS trg_dashboard_withdrawals ON withdrawals;
+CREATE TRIGGER trg_dashboard_withdrawals
+    AFTER INSERT OR DELETE OR UPDATE OF status, amount, created_at ON withdrawals
+    FOR EACH ROW EXECUTE PROCEDURE dashboard_withdrawals_trigger();
@@ -0,0 +1,165 @@
+-- 完成日志 / 回调日志的任务汇总表：每个任务一行，由触发器维护，列表按 (latest_completed_at, task_id) 游标分页
+-- 历史数据由 task_log_summary.reconcile_task_log_summary() 回填（API 服务器启动时运行）
+CREATE TABLE IF NOT EXISTS webhook_logs (
+    id SERIAL PRIMARY KEY,
+    task_id INTEGER,
+    task_title VARCHAR(500),
+    project_id VARCHAR(100),
+    callback_url TEXT,
+    callback_status VARCHAR(50) DEFAULT 'success',
+    payload JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_webhook_logs_task_id ON webhook_logs(task_id);
+CREATE INDEX IF NOT EXISTS idx_webhook_logs_created_at ON webhook_logs(created_at);
+
+CREATE TABLE IF NOT EXISTS task_log_summary (
+    task_id INTEGER PRIMARY KEY,
+    completion_count INTEGER NOT NULL DEFAULT 0,
+    total_view_count BIGINT NOT NULL DEFAULT 0,
+    total_like_count BIGINT NOT NULL DEFAULT 0,
+    total_earned NUMERIC NOT NULL DEFAULT 0,
+    latest_completed_at TIMESTAMP,
+    earliest_completed_at TIMESTAMP,
+    view_count_updated_at TIMESTAMP,
+    webhook_count INTEGER NOT NULL DEFAULT 0,
+    latest_webhook_id INTEGER,
+    latest_webhook_at TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_task_log_summary_completed
+    ON task_log_summary (latest_completed_at DESC, task_id DESC) WHERE completion_count > 0;
+CREATE INDEX IF NOT EXISTS idx_task_log_summary_webhooks
+    ON task_log_summary (latest_completed_at DESC NULLS LAST, task_id DESC) WHERE webhook_count > 0;
+CREATE INDEX IF NOT EXISTS idx_task_log_summary_latest_webhook
+    ON task_log_summary (latest_webhook_at) WHERE webhook_count > 0;
+
+-- 锁住任务的汇总行（不存在时先创建），之后的查询在新快照中进行，能看到先提交的并发修改
+CREATE OR REPLACE FUNCTION task_log_summary_lock(p_task_id INTEGER) RETURNS void AS $$
+BEGIN
+    INSERT INTO task_log_summary (task_id) VALUES (p_task_id) ON CONFLICT (task_id) DO NOTHING;
+    PERFORM 1 FROM task_log_summary WHERE task_id = p_task_id FOR UPDATE;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_log_summary_refresh_completions(p_task_id INTEGER) RETURNS void AS $$
+BEGIN
+    IF p_task_id IS NULL THEN
+        RETURN;
+    END IF;
+    PERFORM task_log_summary_lock(p_task_id);
+    UPDATE task_log_summary s
+    SET completion_count = c.completion_count,
+        total_view_count = c.total_view_count,
+        total_like_count = c.total_like_count,
+        total_earned = c.total_earned,
+        latest_completed_at = c.latest_completed_at,
+        earliest_completed_at = c.earliest_completed_at,
+        view_count_updated_at = c.view_count_updated_at,
+        updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT COUNT(DISTINCT user_id) AS completion_count,
+               COALESCE(SUM(view_count), 0) AS total_view_count,
+               COALESCE(SUM(like_count), 0) AS total_like_count,
+               COALESCE(SUM(node_power_earned), 0) AS total_earned,
+               MAX(submitted_at) AS latest_completed_at,
+               MIN(submitted_at) AS earliest_completed_at,
+               MAX(view_count_updated_at) AS view_count_updated_at
+        FROM user_tasks
+        WHERE task_id = p_task_id AND status = 'submitted'
+    ) c
+    WHERE s.task_id = p_task_id;
+    DELETE FROM task_log_summary WHERE task_id = p_task_id AND completion_count = 0 AND webhook_count = 0;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_log_summary_refresh_webhooks(p_task_id INTEGER) RETURNS void AS $$
+BEGIN
+    IF p_task_id IS NULL THEN
+        RETURN;
+    END IF;
+    PERFORM task_log_summary_lock(p_task_id);
+    UPDATE task_log_summary s
+    SET webhook_count = w.webhook_count,
+        latest_webhook_id = w.latest_webhook_id,
+        latest_webhook_at = (SELECT created_at FROM webhook_logs WHERE id = w.latest_webhook_id),
+        updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT COUNT(*) AS webhook_count, MAX(id) AS latest_webhook_id
+        FROM webhook_logs
+        WHERE task_id = p_task_id
+    ) w
+    WHERE s.task_id = p_task_id;
+    DELETE FROM task_log_summary WHERE task_id = p_task_id AND completion_count = 0 AND webhook_count = 0;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_log_summary_user_tasks_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM task_log_summary_refresh_completions(NEW.task_id);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM task_log_summary_refresh_completions(OLD.task_id);
+    ELSE
+        PERFORM task_log_summary_refresh_completions(OLD.task_id);
+        IF NEW.task_id IS DISTINCT FROM OLD.task_id THEN
+            PERFORM task_log_summary_refresh_completions(NEW.task_id);
+        END IF;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- 新增回调只累加，不重新统计（回传服务每轮都会写入，单个任务的回调记录会越来越多）
+CREATE OR REPLACE FUNCTION task_log_summary_webhook_insert_trigger() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO task_log_summary (task_id, webhook_count, latest_webhook_id, latest_webhook_at)
+    VALUES (NEW.task_id, 1, NEW.id, NEW.created_at)
+    ON CONFLICT (task_id) DO UPDATE
+    SET webhook_count = task_log_summary.webhook_count + 1,
+        latest_webhook_id = GREATEST(task_log_summary.latest_webhook_id, EXCLUDED.latest_webhook_id),
+        latest_webhook_at = CASE
+            WHEN task_log_summary.latest_webhook_id IS NULL
+                 OR EXCLUDED.latest_webhook_id > task_log_summary.latest_webhook_id
+            THEN EXCLUDED.latest_webhook_at
+            ELSE task_log_summary.latest_webhook_at
+        END,
+        updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_log_summary_webhook_change_trigger() RETURNS trigger AS $$
+BEGIN
+    PERFORM task_log_summary_refresh_webhooks(OLD.task_id);
+    IF TG_OP = 'UPDATE' AND NEW.task_id IS DISTINCT FROM OLD.task_id THEN
+        PERFORM task_log_summary_refresh_webhooks(NEW.task_id);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_task_log_summary_ut_insert ON user_tasks;
+CREATE TRIGGER trg_task_log_summary_ut_insert
+    AFTER INSERT ON user_tasks FOR EACH ROW WHEN (NEW.status = 'submitted')
+    EXECUTE PROCEDURE task_log_summary_user_tasks_trigger();
+
+DROP TRIGGER IF EXISTS trg_task_log_summary_ut_update ON user_tasks;
+CREATE TRIGGER trg_task_log_summary_ut_update
+    AFTER UPDATE OF status, task_id, user_id, submitted_at, view_count, like_count, node_power_earned, view_count_updated_at ON user_tasks FOR EACH ROW WHEN (OLD.status = 'submitted' OR NEW.status = 'submitted')
+    EXECUTE PROCEDURE task_log_summary_user_tasks_trigger();
+
+DROP TRIGGER IF EXISTS trg_task_log_summary_ut_delete ON user_tasks;
+CREATE TRIGGER trg_task_log_summary_ut_delete
+    AFTER DELETE ON user_tasks FOR EACH ROW WHEN (OLD.status = 'submitted')
+    EXECUTE PROCEDURE task_log_summary_user_tasks_trigger();
+
+DROP TRIGGER IF EXISTS trg_task_log_summary_wh_insert ON webhook_logs;
+CREATE TRIGGER trg_task_log_summary_wh_insert
+    AFTER INSERT ON webhook_logs FOR EACH ROW WHEN (NEW.task_id IS NOT NULL)
+    EXECUTE PROCEDURE task_log_summary_webhook_insert_trigger();
+
+DROP TRIGGER IF EXISTS trg_task_log_summary_wh_change ON webhook_logs;
+CREATE TRIGGER trg_task_log_summary_wh_change
+    AFTER DELETE OR UPDATE OF task_id ON webhook_logs FOR EACH ROW
+    EXECUTE PROCEDURE task_log_summary_webhook_change_trigger();
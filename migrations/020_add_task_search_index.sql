@@ -0,0 +1,47 @@
+-- 管理后台任务搜索索引：中日韩 / 短关键词用单字 + 双字切分，其他关键词用 pg_trgm 三元组索引
+CREATE TABLE IF NOT EXISTS task_search_grams (
+    task_id INTEGER PRIMARY KEY REFERENCES drama_tasks(task_id) ON DELETE CASCADE,
+    grams TEXT[] NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_task_search_grams ON task_search_grams USING GIN (grams);
+
+-- 各字段小写后的单字和双字切分（不含空白）
+CREATE OR REPLACE FUNCTION task_search_make_grams(p_values TEXT[]) RETURNS TEXT[] AS $$
+    SELECT COALESCE(array_agg(DISTINCT g), '{}')
+    FROM unnest(p_values) AS v,
+         generate_series(1, 2) AS n,
+         LATERAL generate_series(1, char_length(v) - n + 1) AS i,
+         LATERAL substr(lower(v), i, n) AS g
+    WHERE v IS NOT NULL AND g !~ '\s'
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION task_search_grams_trigger() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO task_search_grams (task_id, grams)
+    VALUES (NEW.task_id, task_search_make_grams(ARRAY[NEW.title, NEW.title_en, NEW.project_id, NEW.external_task_id::text]))
+    ON CONFLICT (task_id) DO UPDATE SET grams = EXCLUDED.grams;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_task_search_grams ON drama_tasks;
+CREATE TRIGGER trg_task_search_grams
+    AFTER INSERT OR UPDATE OF title, title_en, project_id, external_task_id ON drama_tasks
+    FOR EACH ROW EXECUTE PROCEDURE task_search_grams_trigger();
+
+-- 前缀补全和 ID 精确匹配
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_title_prefix ON drama_tasks (lower(title) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_title_en_prefix ON drama_tasks (lower(title_en) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_project_id_prefix ON drama_tasks (lower(project_id) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_external_task_id ON drama_tasks (external_task_id);
+
+INSERT INTO task_search_grams (task_id, grams)
+SELECT t.task_id, task_search_make_grams(ARRAY[t.title, t.title_en, t.project_id, t.external_task_id::text])
+FROM drama_tasks t
+ON CONFLICT (task_id) DO NOTHING;
+
+-- 需要创建扩展的权限；没有权限时搜索会退回到切分索引
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_title_trgm ON drama_tasks USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_title_en_trgm ON drama_tasks USING GIN (title_en gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_project_id_trgm ON drama_tasks USING GIN (project_id gin_trgm_ops);
@@ -0,0 +1,36 @@
+-- 管理后台实时推送：完成记录 / 提现变更时 pg_notify('live_feed', ...)，由 API 服务器的生产者线程转发给 SSE 连接
+CREATE OR REPLACE FUNCTION live_feed_user_tasks_notify() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.status IN ('submitted', 'approved', 'completed') THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('live_feed', json_build_object(
+        'topic', 'completions', 'id', NEW.id, 'task_id', NEW.task_id, 'user_id', NEW.user_id,
+        'status', NEW.status, 'submitted_at', NEW.submitted_at)::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_live_feed_user_tasks ON user_tasks;
+CREATE TRIGGER trg_live_feed_user_tasks
+    AFTER INSERT OR UPDATE OF status ON user_tasks
+    FOR EACH ROW WHEN (NEW.status IN ('submitted', 'approved', 'completed'))
+    EXECUTE PROCEDURE live_feed_user_tasks_notify();
+
+-- 新的提现申请和提现状态变化
+CREATE OR REPLACE FUNCTION live_feed_withdrawals_notify() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.status IS NOT DISTINCT FROM NEW.status THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('live_feed', json_build_object(
+        'topic', 'withdrawals', 'withdrawal_id', NEW.withdrawal_id, 'user_id', NEW.user_id,
+        'amount', NEW.amount, 'status', NEW.status)::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_live_feed_withdrawals ON withdrawals;
+CREATE TRIGGER trg_live_feed_withdrawals
+    AFTER INSERT OR UPDATE OF status ON withdrawals
+    FOR EACH ROW EXECUTE PROCEDURE live_feed_withdrawals_notify();
@@ -0,0 +1,31 @@
+-- 任务日志汇总：播放量 / 点赞 / 奖励变化按差值更新，只有状态、用户、任务、提交时间变化时才重新合计
+-- 完成日志索引改为 DESC NULLS LAST，与列表排序一致（与 task_log_summary.TASK_LOG_SUMMARY_DDL 保持同步）
+DROP INDEX IF EXISTS idx_task_log_summary_completed;
+CREATE INDEX IF NOT EXISTS idx_task_log_summary_completions
+    ON task_log_summary (latest_completed_at DESC NULLS LAST, task_id DESC) WHERE completion_count > 0;
+
+CREATE OR REPLACE FUNCTION task_log_summary_user_tasks_delta_trigger() RETURNS trigger AS $$
+BEGIN
+    UPDATE task_log_summary
+    SET total_view_count = total_view_count + COALESCE(NEW.view_count, 0) - COALESCE(OLD.view_count, 0),
+        total_like_count = total_like_count + COALESCE(NEW.like_count, 0) - COALESCE(OLD.like_count, 0),
+        total_earned = total_earned + COALESCE(NEW.node_power_earned, 0) - COALESCE(OLD.node_power_earned, 0),
+        view_count_updated_at = GREATEST(view_count_updated_at, NEW.view_count_updated_at),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE task_id = NEW.task_id;
+    IF NOT FOUND THEN
+        PERFORM task_log_summary_refresh_completions(NEW.task_id);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_task_log_summary_ut_update ON user_tasks;
+CREATE TRIGGER trg_task_log_summary_ut_update
+    AFTER UPDATE OF status, task_id, user_id, submitted_at ON user_tasks FOR EACH ROW WHEN ((OLD.status = 'submitted' OR NEW.status = 'submitted') AND (OLD.status, OLD.task_id, OLD.user_id, OLD.submitted_at) IS DISTINCT FROM (NEW.status, NEW.task_id, NEW.user_id, NEW.submitted_at))
+    EXECUTE PROCEDURE task_log_summary_user_tasks_trigger();
+
+DROP TRIGGER IF EXISTS trg_task_log_summary_ut_values ON user_tasks;
+CREATE TRIGGER trg_task_log_summary_ut_values
+    AFTER UPDATE OF view_count, like_count, node_power_earned, view_count_updated_at ON user_tasks FOR EACH ROW WHEN (OLD.status = 'submitted' AND NEW.status = 'submitted' AND (OLD.task_id, OLD.user_id, OLD.submitted_at) IS NOT DISTINCT FROM (NEW.task_id, NEW.user_id, NEW.submitted_at) AND (OLD.view_count, OLD.like_count, OLD.node_power_earned, OLD.view_count_updated_at) IS DISTINCT FROM (NEW.view_count, NEW.like_count, NEW.node_power_earned, NEW.view_count_updated_at))
+    EXECUTE PROCEDURE task_log_summary_user_tasks_delta_trigger();
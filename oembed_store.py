@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TikTok oEmbed 元数据存储
+LinkVerifier（提交时核验）和 VideoStatsFetcher（回传时抓取）共用。
+oEmbed 只返回标题、作者等不会变化的元数据，按视频ID缓存：
+
+- 进程内缓存在前，video_oembed_cache 表在后（bot 进程和 API 服务器进程共享结果）
+- 同一视频的并发请求合并为一次上游调用（singleflight）
+- 成功结果长期缓存，视频已删除（404）短期负缓存，其他错误不缓存，由调用方自行重试
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Optional, Dict
+from urllib.parse import quote, urlparse
+
+import aiohttp
+
+import db_pool
+import http_client
+
+logger = logging.getLogger(__name__)
+
+# 数据库连接
+DATABASE_URL = db_pool.DATABASE_URL
+
+OEMBED_TTL = int(os.getenv('OEMBED_TTL', str(7 * 24 * 3600)))  # 成功结果缓存时间（秒）
+OEMBED_NEGATIVE_TTL = int(os.getenv('OEMBED_NEGATIVE_TTL', '3600'))  # 视频不存在的缓存时间（秒）
+OEMBED_MEMORY_MAX = int(os.getenv('OEMBED_MEMORY_MAX', '20000'))
+
+OEMBED_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'application/json',
+    'Accept-Language': 'en-US,en;q=0.9'
+}
+
+# 视频键 -> (result, expires_at)；多个事件循环所在线程共用
+_memory = {}
+_memory_lock = threading.Lock()
+
+# 事件循环 -> {视频键: 进行中的上游请求}
+_inflight = weakref.WeakKeyDictionary()
+
+_oembed_metrics = {
+    'memory_hits': 0,
+    'db_hits': 0,
+    'negative_hits': 0,
+    'coalesced': 0,
+    'upstream_calls': 0,
+    'upstream_errors': 0,
+}
+
+
+def get_db_connection():
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
+
+
+def ensure_oembed_cache_table():
+    """确保 video_oembed_cache 表存在"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS video_oembed_cache (
+                video_key VARCHAR(255) PRIMARY KEY,
+                status VARCHAR(20) NOT NULL,
+                data JSONB,
+                http_status INTEGER,
+                fetched_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL
+            )
+        """)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error(f"❌ 初始化 oEmbed 缓存表失败: {e}")
+        return False
+
+
+def tiktok_video_key(url: str) -> str:
+    """
+    视频缓存键：能解析出视频ID时用 tiktok:{id}，否则（短链接等）用去掉参数的链接
+    """
+    match = re.search(r'/video/(\d+)', url)
+    if match:
+        return f"tiktok:{match.group(1)}"
+    parsed = urlparse(url.strip())
+    return f"tiktok-url:{parsed.netloc.lower()}{parsed.path.rstrip('/')}"
+
+
+def _count(name: str, n: int = 1):
+    with _memory_lock:
+        _oembed_metrics[name] += n
+
+
+def _memory_get(key: str) -> Optional[Dict]:
+    with _memory_lock:
+        cached = _memory.get(key)
+        if cached and cached[1] > time.time():
+            return cached[0]
+        if cached:
+            del _memory[key]
+    return None
+
+
+def _memory_put(key: str, result: Dict, expires_at: float):
+    with _memory_lock:
+        if len(_memory) >= OEMBED_MEMORY_MAX:
+            now = time.time()
+            for cached_key in [k for k, (_, exp) in _memory.items() if exp <= now]:
+                del _memory[cached_key]
+            if len(_memory) >= OEMBED_MEMORY_MAX:
+                _memory.clear()
+        _memory[key] = (result, expires_at)
+
+
+def _load_cached(key: str) -> Optional[Dict]:
+    """从数据库读取未过期的缓存结果"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT status, data, http_status, EXTRACT(EPOCH FROM expires_at - CURRENT_TIMESTAMP) as ttl
+            FROM video_oembed_cache
+            WHERE video_key = %s AND expires_at > CURRENT_TIMESTAMP
+        """, (key,))
+        row = cur.fetchone()
+        cur.close()
+    finally:
+        conn.close()
+    
+    if not row:
+        return None
+    return {
+        'status': row['status'],
+        'data': row['data'] or {},
+        'http_status': row['http_status'],
+        'error': None if row['status'] == 'ok' else '视频不存在或已被删除',
+        'ttl': float(row['ttl']),
+    }
+
+
+def _save_cached(key: str, result: Dict, ttl: int):
+    """写入数据库缓存"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO video_oembed_cache (video_key, status, data, http_status, fetched_at, expires_at)
+            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP + %s * INTERVAL '1 second')
+            ON CONFLICT (video_key) DO UPDATE
+            SET status = EXCLUDED.status, data = EXCLUDED.data, http_status = EXCLUDED.http_status,
+                fetched_at = EXCLUDED.fetched_at, expires_at = EXCLUDED.expires_at
+        """, (key, result['status'], json.dumps(result['data'], ensure_ascii=False), result['http_status'], ttl))
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+
+async def _fetch_upstream(url: str, timeout: float) -> Dict:
+    """调用 TikTok oEmbed API"""
+    oembed_url = f"https://www.tiktok.com/oembed?url={quote(url)}"
+    logger.info(f"📡 调用 TikTok oEmbed API: {oembed_url}")
+    _count('upstream_calls')
+    
+    try:
+        session = http_client.get_session()
+        async with session.get(oembed_url, headers=OEMBED_HEADERS, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status == 200:
+                data = await response.json(content_type=None)
+                return {'status': 'ok', 'data': data or {}, 'http_status': 200, 'error': None}
+            if response.status == 404:
+                return {'status': 'not_found', 'data': {}, 'http_status': 404, 'error': '视频不存在或已被删除'}
+            _count('upstream_errors')
+            return {'status': 'error', 'data': {}, 'http_status': response.status, 'error': f"API 返回错误: {response.status}"}
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        _count('upstream_errors')
+        return {'status': 'error', 'data': {}, 'http_status': None, 'error': f"网络请求失败: {str(e) or type(e).__name__}"}
+
+
+async def _resolve(key: str, url: str, timeout: float) -> Dict:
+    """数据库缓存 -> 上游请求，并写回两级缓存"""
+    from async_db import run_db
+    
+    try:
+        cached = await run_db(_load_cached, key)
+    except Exception as e:
+        logger.warning(f"⚠️ 读取 oEmbed 缓存失败: {e}")
+        cached = None
+    
+    if cached:
+        _count('db_hits')
+        _memory_put(key, cached, time.time() + cached.pop('ttl'))
+        return cached
+    
+    result = await _fetch_upstream(url, timeout)
+    if result['status'] == 'error':
+        return result
+    
+    ttl = OEMBED_TTL if result['status'] == 'ok' else OEMBED_NEGATIVE_TTL
+    _memory_put(key, result, time.time() + ttl)
+    try:
+        await run_db(_save_cached, key, result, ttl)
+    except Exception as e:
+        logger.warning(f"⚠️ 写入 oEmbed 缓存失败: {e}")
+    return result
+
+
+async def get_tiktok_oembed(url: str, timeout: float = 15, use_cache: bool = True) -> Dict:
+    """
+    获取 TikTok 视频的 oEmbed 元数据
+    
+    Args:
+        url: TikTok 视频链接
+        timeout: 上游请求超时（秒）
+        use_cache: False 时跳过缓存读取（结果仍会写入缓存）
+    
+    Returns:
+        dict: {
+            'status': 'ok' | 'not_found' | 'error',
+            'data': oEmbed 返回的 JSON（title、author_name 等）,
+            'http_status': 上游状态码,
+            'error': 错误信息,
+            'cached': 是否来自缓存
+        }
+    """
+    key = tiktok_video_key(url)
+    
+    if use_cache:
+        cached = _memory_get(key)
+        if cached:
+            _count('negative_hits' if cached['status'] == 'not_found' else 'memory_hits')
+            return {**cached, 'cached': True}
+    
+    loop = asyncio.get_running_loop()
+    inflight = _inflight.setdefault(loop, {})
+    task = inflight.get(key)
+    if task is not None:
+        _count('coalesced')
+        return {**await asyncio.shield(task), 'cached': True}
+    
+    async def run():
+        try:
+            if use_cache:
+                return await _resolve(key, url, timeout)
+            result = await _fetch_upstream(url, timeout)
+            if result['status'] != 'error':
+                ttl = OEMBED_TTL if result['status'] == 'ok' else OEMBED_NEGATIVE_TTL
+                _memory_put(key, result, time.time() + ttl)
+            return result
+        finally:
+            inflight.pop(key, None)
+    
+    task = loop.create_task(run())
+    inflight[key] = task
+    return {**await asyncio.shield(task), 'cached': False}
+
+
+def get_oembed_stats() -> Dict:
+    """oEmbed 缓存统计（用于监控）"""
+    with _memory_lock:
+        return {**_oembed_metrics, 'memory_entries': len(_memory)}
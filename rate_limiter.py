@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+按用户的滑动窗口限流 + 每日配额
+状态保存在进程内存中（可替换为其他存储），用户首次访问时从数据库加载，
+记录的提交由后台线程批量写回数据库，拒绝判断不需要访问数据库
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, date, timedelta
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_STORE_MAX = int(os.getenv('RATE_LIMIT_STORE_MAX', '50000'))  # 内存中保存的用户数上限
+RATE_LIMIT_SEED_TTL = int(os.getenv('RATE_LIMIT_SEED_TTL', '3600'))  # 超过该时间重新从数据库加载（秒）
+RATE_LIMIT_FLUSH_SECONDS = int(os.getenv('RATE_LIMIT_FLUSH_SECONDS', '5'))  # 写回间隔（秒）
+
+
+class MemoryStore:
+    """进程内存存储（按最近访问淘汰），实现 get / set / delete 即可替换"""
+    
+    def __init__(self, max_size: int = RATE_LIMIT_STORE_MAX):
+        self.max_size = max_size
+        self._items = OrderedDict()
+    
+    def get(self, key):
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+        return item
+    
+    def set(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+    
+    def delete(self, key):
+        self._items.pop(key, None)
+    
+    def __len__(self):
+        return len(self._items)
+
+
+class UserLimitState:
+    """单个用户的限流状态"""
+    
+    __slots__ = ('exists', 'created_at', 'events', 'day', 'daily_count', 'loaded_at', 'dirty')
+    
+    def __init__(self, exists, created_at, events, day, daily_count):
+        self.exists = exists
+        self.created_at = created_at
+        self.events = events  # 窗口内的提交时间（datetime，升序）
+        self.day = day
+        self.daily_count = daily_count
+        self.loaded_at = time.monotonic()
+        self.dirty = False  # 有尚未写回数据库的提交
+
+
+class SlidingWindowRateLimiter:
+    """
+    滑动窗口限流器
+    
+    seed(user_id) 返回 {'created_at', 'last_submission_time', 'today_count'} 或 None（用户不存在），
+    write_back(rows) 接收 [(user_id, last_submission_time, day, daily_count), ...] 批量写回
+    
+    Example:
+        >>> limiter = SlidingWindowRateLimiter(seed, write_back, window_seconds=60, window_limit=1)
+        >>> snapshot = limiter.snapshot(user_id)
+        >>> limiter.record(user_id)
+    """
+    
+    def __init__(self, seed, write_back, window_seconds: int, window_limit: int = 1, store=None):
+        self.seed = seed
+        self.write_back = write_back
+        self.window = timedelta(seconds=window_seconds)
+        self.window_limit = window_limit
+        self.store = store if store is not None else MemoryStore()
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._flush_thread = None
+        self._flush_running = False
+        self._metrics = {
+            'checks': 0,
+            'seeds': 0,
+            'recorded': 0,
+            'flushed': 0,
+            'flush_errors': 0,
+        }
+    
+    def _load(self, user_id) -> UserLimitState:
+        row = self.seed(user_id)
+        with self._lock:
+            self._metrics['seeds'] += 1
+        today = date.today()
+        if not row:
+            return UserLimitState(False, None, deque(), today, 0)
+        
+        events = deque()
+        last = row.get('last_submission_time')
+        if last and last > datetime.now() - self.window:
+            events.append(last)
+        return UserLimitState(True, row['created_at'], events, today, row.get('today_count') or 0)
+    
+    def _get_state(self, user_id) -> UserLimitState:
+        """取用户状态；不在内存中或已过期时从数据库加载（加载在锁外执行）"""
+        with self._lock:
+            state = self.store.get(user_id)
+            if state is not None and (state.dirty or time.monotonic() - state.loaded_at <= RATE_LIMIT_SEED_TTL):
+                return state
+        
+        loaded = self._load(user_id)
+        
+        with self._lock:
+            current = self.store.get(user_id)
+            # 加载期间其他线程已经记录了提交时保留内存中的状态
+            if current is not None and current is not state:
+                return current
+            if current is not None and current.dirty:
+                return current
+            self.store.set(user_id, loaded)
+            return loaded
+    
+    def is_cached(self, user_id) -> bool:
+        """用户状态是否已在内存中且未过期（为 True 时 snapshot 不会访问数据库）"""
+        with self._lock:
+            state = self.store.get(user_id)
+            return state is not None and (state.dirty or time.monotonic() - state.loaded_at <= RATE_LIMIT_SEED_TTL)
+    
+    def _expire(self, state: UserLimitState, now: datetime):
+        while state.events and state.events[0] <= now - self.window:
+            state.events.popleft()
+        if state.day != now.date():
+            state.day = now.date()
+            state.daily_count = 0
+    
+    def snapshot(self, user_id):
+        """
+        当前限流状态（首次访问时从数据库加载，之后只读内存）
+        
+        Returns:
+            None（用户不存在）或 dict: {
+                'created_at': 注册时间,
+                'last_submission_time': 决定窗口何时释放的那次提交（窗口未满时为 None）,
+                'today_count': 今日已提交次数
+            }
+        """
+        state = self._get_state(user_id)
+        
+        with self._lock:
+            self._metrics['checks'] += 1
+            if not state.exists:
+                return None
+            
+            self._expire(state, datetime.now())
+            blocking = state.events[-self.window_limit] if len(state.events) >= self.window_limit else None
+            return {
+                'created_at': state.created_at,
+                'last_submission_time': blocking,
+                'today_count': state.daily_count,
+            }
+    
+    def record(self, user_id, when: datetime = None):
+        """记录一次提交（立即计入内存，稍后写回数据库）"""
+        when = when or datetime.now()
+        state = self._get_state(user_id)
+        
+        with self._lock:
+            self._expire(state, when)
+            state.events.append(when)
+            state.daily_count += 1
+            state.dirty = True
+            # 状态对象可能已被淘汰，重新放回存储
+            self.store.set(user_id, state)
+            self._dirty.add(user_id)
+            self._metrics['recorded'] += 1
+    
+    def forget(self, user_id):
+        """丢弃用户的内存状态，下次访问时重新从数据库加载"""
+        with self._lock:
+            self.store.delete(user_id)
+    
+    def flush(self) -> int:
+        """把有新提交的用户状态写回数据库"""
+        with self._lock:
+            rows = []
+            for user_id in self._dirty:
+                state = self.store.get(user_id)
+                if state is not None and state.dirty and state.events:
+                    rows.append((user_id, state.events[-1], state.day, state.daily_count))
+                    state.dirty = False
+            self._dirty.clear()
+        
+        if not rows:
+            return 0
+        
+        try:
+            self.write_back(rows)
+            with self._lock:
+                self._metrics['flushed'] += len(rows)
+            return len(rows)
+        except Exception as e:
+            logger.error(f"❌ 限流状态写回失败: {e}")
+            with self._lock:
+                self._metrics['flush_errors'] += 1
+                # 下一轮重试
+                for user_id, *_ in rows:
+                    state = self.store.get(user_id)
+                    if state is not None:
+                        state.dirty = True
+                        self._dirty.add(user_id)
+            return 0
+    
+    def start_write_back(self, interval: int = RATE_LIMIT_FLUSH_SECONDS):
+        """启动后台写回线程"""
+        if self._flush_running:
+            return False
+        self._flush_running = True
+        
+        def flush_loop():
+            while self._flush_running:
+                time.sleep(interval)
+                self.flush()
+        
+        self._flush_thread = threading.Thread(target=flush_loop, name='rate-limit-flush', daemon=True)
+        self._flush_thread.start()
+        logger.info(f"✅ 限流状态写回线程已启动，间隔: {interval} 秒")
+        return True
+    
+    def stop_write_back(self):
+        """停止写回线程并立即写回剩余状态"""
+        self._flush_running = False
+        self.flush()
+    
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._metrics,
+                'users': len(self.store),
+                'window_seconds': int(self.window.total_seconds()),
+                'window_limit': self.window_limit,
+            }
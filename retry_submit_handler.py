@@ -97,20 +97,6 @@ async def retry_submit_callback(update: Update, context: ContextTypes.DEFAULT_TY
         reward = submit_task_link(user_id, task_id, platform, link)
         logger.info(f"✅ 重试提交成功，奖励: {reward} X2C")
         
-        # 更新最后提交时间
-        try:
-            cur = conn.cursor()
-            cur.execute(
-                "UPDATE users SET last_submission_time = NOW() WHERE user_id = %s",
-                (user_id,)
-            )
-            conn.commit()
-            cur.close()
-            logger.info(f"✅ 已更新用户 {user_id} 的最后提交时间")
-        except Exception as update_error:
-            logger.error(f"⚠️ 更新最后提交时间失败: {update_error}")
-            conn.rollback()
-        
         # 发送 Webhook 回调通知
         try:
             from webhook_notifier import send_task_completed_webhook
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+配置缓存（bot_settings / system_config）
+两张表都很小，按表整体加载到进程内存，之后按 TTL 刷新：
+
+- 读取只访问内存，提供按类型转换的读取函数
+- 写入配置后调用 invalidate_settings()：本进程立即失效（版本号 +1），
+  并通过 NOTIFY 通知其他进程（bot / API 服务器）的监听线程同步失效
+- 加载期间发生失效时丢弃本次加载结果，不会把旧值写回缓存
+"""
+
+import os
+import time
+import select
+import logging
+import threading
+from typing import Optional
+
+import psycopg2
+import psycopg2.extensions
+
+import db_pool
+
+logger = logging.getLogger(__name__)
+
+# 数据库连接
+DATABASE_URL = db_pool.DATABASE_URL
+
+SETTINGS_CACHE_TTL = int(os.getenv('SETTINGS_CACHE_TTL', '60'))  # 缓存时间（秒），收不到通知时的兜底
+SETTINGS_NOTIFY_ENABLED = os.getenv('SETTINGS_NOTIFY_ENABLED', 'true').lower() == 'true'
+SETTINGS_NOTIFY_CHANNEL = 'settings_changed'
+SETTINGS_LISTEN_RECONNECT_SECONDS = 10
+
+BOT_SETTINGS = 'bot_settings'
+SYSTEM_CONFIG = 'system_config'
+
+# 配置来源 -> 读取整表的 SQL
+SETTINGS_SOURCES = {
+    BOT_SETTINGS: "SELECT key, value FROM bot_settings",
+    SYSTEM_CONFIG: "SELECT config_key AS key, config_value AS value FROM system_config",
+}
+
+# 配置来源 -> (配置字典, 加载时间, 加载时的版本号)
+_snapshots = {}
+_versions = {source: 0 for source in SETTINGS_SOURCES}
+_lock = threading.Lock()
+
+_listener_thread = None
+_listener_running = False
+
+_settings_metrics = {
+    'hits': 0,
+    'loads': 0,
+    'load_errors': 0,
+    'invalidations': 0,
+    'notifications': 0,
+}
+
+
+def get_db_connection():
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
+
+
+def ensure_settings_tables():
+    """确保 bot_settings 和 system_config 表存在"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS bot_settings (
+                key VARCHAR(100) PRIMARY KEY,
+                value TEXT NOT NULL,
+                description TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS system_config (
+                id SERIAL PRIMARY KEY,
+                config_key VARCHAR(100) UNIQUE NOT NULL,
+                config_value TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error(f"❌ 初始化配置表失败: {e}")
+        return False
+
+
+def _load(source: str) -> dict:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(SETTINGS_SOURCES[source])
+        rows = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()
+    return {row['key']: row['value'] for row in rows}
+
+
+def get_settings(source: str = BOT_SETTINGS) -> dict:
+    """
+    取整张配置表（缓存未过期时不访问数据库）
+    
+    Returns:
+        dict: {key: value}（值为数据库中的原始字符串）
+    """
+    with _lock:
+        snapshot = _snapshots.get(source)
+        if snapshot and time.monotonic() - snapshot[1] < SETTINGS_CACHE_TTL:
+            _settings_metrics['hits'] += 1
+            return snapshot[0]
+        version = _versions[source]
+    
+    try:
+        settings = _load(source)
+    except Exception as e:
+        logger.error(f"❌ 加载配置失败 ({source}): {e}")
+        with _lock:
+            _settings_metrics['load_errors'] += 1
+            # 数据库不可用时沿用旧值，没有旧值时按空配置（调用方使用默认值）
+            settings = snapshot[0] if snapshot else {}
+            _snapshots[source] = (settings, time.monotonic(), version)
+        return settings
+    
+    with _lock:
+        _settings_metrics['loads'] += 1
+        # 加载期间配置被修改过，本次结果可能是旧值，不写入缓存
+        if _versions[source] == version:
+            _snapshots[source] = (settings, time.monotonic(), version)
+    return settings
+
+
+def get_setting(key: str, default: Optional[str] = None, source: str = BOT_SETTINGS) -> Optional[str]:
+    """读取字符串配置"""
+    value = get_settings(source).get(key)
+    return default if value is None else value
+
+
+def get_int_setting(key: str, default: int, source: str = BOT_SETTINGS) -> int:
+    """读取整数配置，缺失或无法转换时返回默认值"""
+    value = get_settings(source).get(key)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        logger.warning(f"⚠️ 配置 {key} 不是整数: {value!r}，使用默认值 {default}")
+        return default
+
+
+def get_bool_setting(key: str, default: bool, source: str = BOT_SETTINGS) -> bool:
+    """读取布尔配置（true / 1 / yes 为真）"""
+    value = get_settings(source).get(key)
+    if value is None:
+        return default
+    return str(value).strip().lower() in ('true', '1', 'yes')
+
+
+def get_config(key: str, default: Optional[str] = None) -> Optional[str]:
+    """读取 system_config 中的配置（空字符串视为未配置）"""
+    value = get_settings(SYSTEM_CONFIG).get(key)
+    return value if value else default
+
+
+def _bump(source: str):
+    with _lock:
+        _versions[source] += 1
+        _snapshots.pop(source, None)
+        _settings_metrics['invalidations'] += 1
+
+
+def invalidate_settings(source: Optional[str] = None, notify: bool = True):
+    """
+    配置写入提交后调用：本进程立即失效，并通知其他进程
+    
+    Args:
+        source: BOT_SETTINGS / SYSTEM_CONFIG，None 表示全部
+        notify: 是否通过 NOTIFY 通知其他进程
+    """
+    sources = [source] if source else list(SETTINGS_SOURCES)
+    for name in sources:
+        _bump(name)
+    
+    if not (notify and SETTINGS_NOTIFY_ENABLED):
+        return
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        for name in sources:
+            cur.execute("SELECT pg_notify(%s, %s)", (SETTINGS_NOTIFY_CHANNEL, name))
+        conn.commit()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        # 通知失败时其他进程最迟 SETTINGS_CACHE_TTL 秒后刷新
+        logger.warning(f"⚠️ 发送配置变更通知失败: {e}")
+
+
+def get_settings_version(source: str = BOT_SETTINGS) -> int:
+    """本进程内配置的版本号（每次失效 +1）"""
+    with _lock:
+        return _versions[source]
+
+
+# ============================================================
+# 跨进程失效通知
+# ============================================================
+
+def _listen_loop():
+    while _listener_running:
+        try:
+            conn = psycopg2.connect(DATABASE_URL)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {SETTINGS_NOTIFY_CHANNEL}")
+            cur.close()
+        except Exception as e:
+            logger.warning(f"⚠️ 配置监听连接失败，{SETTINGS_LISTEN_RECONNECT_SECONDS} 秒后重试: {e}")
+            time.sleep(SETTINGS_LISTEN_RECONNECT_SECONDS)
+            continue
+        
+        logger.info(f"👂 已监听配置变更通知: {SETTINGS_NOTIFY_CHANNEL}")
+        # 重连期间可能漏掉通知，全部失效一次
+        for source in SETTINGS_SOURCES:
+            _bump(source)
+        
+        try:
+            while _listener_running:
+                if select.select([conn], [], [], 5) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    with _lock:
+                        _settings_metrics['notifications'] += 1
+                    if notify.payload in SETTINGS_SOURCES:
+                        _bump(notify.payload)
+        except Exception as e:
+            logger.warning(f"⚠️ 配置监听连接断开: {e}")
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def start_settings_listener():
+    """启动配置变更监听线程（独立连接，不占用连接池）"""
+    global _listener_thread, _listener_running
+    if not SETTINGS_NOTIFY_ENABLED or _listener_running:
+        return False
+    _listener_running = True
+    _listener_thread = threading.Thread(target=_listen_loop, name='settings-listener', daemon=True)
+    _listener_thread.start()
+    return True
+
+
+def stop_settings_listener():
+    """停止配置变更监听线程"""
+    global _listener_running
+    _listener_running = False
+
+
+def get_settings_cache_stats() -> dict:
+    """配置缓存统计（用于监控）"""
+    with _lock:
+        return {
+            **_settings_metrics,
+            'versions': dict(_versions),
+            'listening': _listener_running,
+            'ttl': SETTINGS_CACHE_TTL,
+        }
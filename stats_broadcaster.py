@@ -9,7 +9,13 @@ import os
 import asyncio
 import logging
 import json
+import time
+import threading
 from datetime import datetime
+from urllib.parse import urlparse
+
+import db_pool
+from settings_cache import get_config
 
 # 配置日志
 logging.basicConfig(
@@ -58,6 +64,35 @@ def log_webhook_success(task_id, task_title, project_id, callback_url, payload):
         import traceback
         traceback.print_exc()
 
+def log_webhook_successes(rows):
+    """
+    批量记录成功的webhook日志
+    
+    Args:
+        rows: [(task_id, task_title, project_id, callback_url, callback_status, payload_json), ...]
+    """
+    if not rows:
+        return
+    try:
+        from psycopg2.extras import execute_values
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        execute_values(cur, """
+            INSERT INTO webhook_logs 
+            (task_id, task_title, project_id, callback_url, callback_status, payload)
+            VALUES %s
+        """, rows, page_size=500)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        logger.info(f"✅ 记录webhook成功日志: {len(rows)} 条")
+    except Exception as e:
+        logger.error(f"❌ 批量记录webhook成功日志失败: {e}")
+
 def log_broadcaster_error(task_id, task_title, project_id, video_url, platform, error_type, error_message, callback_url):
     """
     记录回传错误日志
@@ -83,190 +118,428 @@ def log_broadcaster_error(task_id, task_title, project_id, video_url, platform,
         logger.error(f"❌ 记录错误日志失败: {e}")
 
 def get_db_connection():
-    """获取数据库连接"""
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
     # 直接使用DATABASE_URL连接，保留所有连接参数（如SSL等）
-    return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
+    return db_pool.get_connection(DATABASE_URL)
+
+# ============================================================
+# 并发回传引擎
+# ============================================================
+
+BROADCAST_INTERVAL_SECONDS = int(os.getenv('BROADCAST_INTERVAL_SECONDS', '180'))  # 回传周期
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '20'))  # 全局并发上限
+BROADCAST_PER_HOST_CONCURRENCY = int(os.getenv('BROADCAST_PER_HOST_CONCURRENCY', '5'))  # 单个回调主机并发上限
+BROADCAST_HOST_RATE = float(os.getenv('BROADCAST_HOST_RATE', '10'))  # 单个回调主机每秒请求数
+BROADCAST_HOST_BURST = int(os.getenv('BROADCAST_HOST_BURST', '20'))  # 令牌桶容量（允许的突发请求数）
+BROADCAST_WEBHOOK_TIMEOUT = int(os.getenv('BROADCAST_WEBHOOK_TIMEOUT', '30'))
+
+# 批量回传：同一回调地址的多条 stats 合并到一个签名请求
+BROADCAST_BATCH_ENABLED = os.getenv('BROADCAST_BATCH_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+BROADCAST_BATCH_MAX_ENTRIES = int(os.getenv('BROADCAST_BATCH_MAX_ENTRIES', '100'))  # 每批最多条数
+BROADCAST_BATCH_MAX_BYTES = int(os.getenv('BROADCAST_BATCH_MAX_BYTES', str(256 * 1024)))  # 每批 stats 最大字节数
+BROADCAST_BATCH_RETRIES = int(os.getenv('BROADCAST_BATCH_RETRIES', '2'))  # 网络错误 / 5xx 时整批重试次数
+BROADCAST_RETRY_BACKOFF_SECONDS = float(os.getenv('BROADCAST_RETRY_BACKOFF_SECONDS', '2'))  # 整批重试的初始退避（秒），之后翻倍
+
+# 防止回传周期重叠（定时循环和手动触发可能在不同线程/事件循环中）
+_cycle_lock = threading.Lock()
+
+# 回传指标
+_broadcast_metrics = {
+    'cycles_completed': 0,
+    'cycles_skipped': 0,
+    'cycle_in_progress': False,
+    'last_cycle_started_at': None,
+    'last_cycle_finished_at': None,
+    'last_cycle_duration': None,
+    'last_cycle_webhooks': 0,
+    'last_cycle_failed': 0,
+    'last_cycle_webhooks_per_sec': None,
+    'total_webhooks_sent': 0,
+    'total_webhooks_failed': 0,
+    'last_cycle_entries': 0,
+    'last_cycle_entries_failed': 0,
+    'total_entries_sent': 0,
+    'batch_enabled': BROADCAST_BATCH_ENABLED,
+    'hosts': {},
+}
+
+
+class TokenBucket:
+    """异步令牌桶限速器"""
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """获取一个令牌，不足时等待"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
 
-async def fetch_task_stats(task_id: int, video_url: str, platform: str):
+
+class BroadcastContext:
     """
-    获取任务的视频统计数据
+    单轮回传的共享资源：全局并发信号量、按主机的信号量和令牌桶
     
-    Args:
-        task_id: 任务ID
-        video_url: 视频链接
-        platform: 平台类型
-        
-    Returns:
-        dict: 视频统计数据
+    每轮创建一次，保证资源绑定在当前事件循环上；HTTP 连接使用当前事件循环的
+    共享会话，跨轮次保持 keep-alive
     """
-    try:
-        from video_stats_fetcher import VideoStatsFetcher
-        fetcher = VideoStatsFetcher()
-        stats = await fetcher.fetch_video_stats(video_url, platform)
+    
+    def __init__(self):
+        self.session = None
+        self.semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+        self.host_semaphores = {}
+        self.host_buckets = {}
+        self.host_stats = {}
+    
+    async def __aenter__(self):
+        import http_client
+        self.session = http_client.get_session()
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, tb):
+        self.session = None
+    
+    def _host_limits(self, host: str):
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(BROADCAST_PER_HOST_CONCURRENCY)
+            self.host_buckets[host] = TokenBucket(BROADCAST_HOST_RATE, BROADCAST_HOST_BURST)
+            self.host_stats[host] = {'sent': 0, 'failed': 0, 'total_latency': 0.0}
+        return self.host_semaphores[host], self.host_buckets[host]
+    
+    async def send(self, callback_url: str, payload: dict, secret: str):
+        """在并发和限速约束下发送一个回调，返回 (success, HTTP状态码, error)"""
+        from webhook_notifier import send_webhook_with_status
+        host = urlparse(callback_url).netloc or callback_url
+        host_semaphore, bucket = self._host_limits(host)
+        
+        async with self.semaphore, host_semaphore:
+            await bucket.acquire()
+            started = time.monotonic()
+            success, status, error = await send_webhook_with_status(
+                callback_url,
+                payload,
+                secret,
+                timeout=BROADCAST_WEBHOOK_TIMEOUT,
+                session=self.session
+            )
         
-        if stats:
-            logger.info(f"✅ 任务 {task_id} 数据抓取成功: {stats}")
-            return stats
-        else:
-            logger.warning(f"⚠️ 任务 {task_id} 数据抓取失败")
-            return None
-            
-    except Exception as e:
-        logger.error(f"❌ 任务 {task_id} 数据抓取异常: {e}")
-        return None
+        host_stats = self.host_stats[host]
+        host_stats['total_latency'] += time.monotonic() - started
+        host_stats['sent' if success else 'failed'] += 1
+        return success, status, error
 
-async def broadcast_task_stats(task, global_callback_url=None):
+
+def get_global_callback_url(cur=None):
+    """读取全局 Callback URL 配置（配置缓存；cur 参数保留兼容旧调用）"""
+    return get_config('x2c_callback_url')
+
+
+def load_broadcast_tasks():
     """
-    回传单个任务的统计数据
+    一次查询加载所有需要回传的任务及其全部用户提交
+    
+    需要回传的任务：最近7天内有用户提交的任务；每个任务带上它所有 submitted 的提交记录
     
-    Args:
-        task: 任务信息字典
-        global_callback_url: 全局 Callback URL（可选）
-        
     Returns:
-        bool: 是否成功
+        (global_callback_url, tasks)，tasks 中每个元素带 'submissions' 列表
     """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
     try:
-        from webhook_notifier import send_webhook
-        task_id = task['task_id']
-        external_task_id = task['external_task_id']
-        project_id = task['project_id']
-        # 优先使用全局 Callback URL
-        callback_url = global_callback_url or task.get('callback_url')
-        callback_secret = task.get('callback_secret') or 'X2C_WEBHOOK_SECRET'
-        video_url = task['video_url']
-        duration = task['duration']
-        
-        # 检查必要字段
-        if not callback_url:
-            logger.warning(f"⚠️ 任务 {task_id} 没有配置 callback_url，跳过")
-            return False
-        
-        # 从user_tasks表获取每个用户的提交数据
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # 查询该任务所有用户提交的数据（包含每个用户的 submission_link）
-        cur.execute('''
-            SELECT 
-                user_id,
-                platform,
-                submission_link,
-                COALESCE(view_count, 0) as view_count,
-                COALESCE(like_count, 0) as like_count
-            FROM user_tasks
-            WHERE task_id = %s AND status = 'submitted'
-            ORDER BY submitted_at ASC
-        ''', (task_id,))
-        user_submissions = cur.fetchall()
-        
+        global_callback_url = get_global_callback_url()
+        if global_callback_url:
+            logger.info(f"🔗 使用全局 Callback URL: {global_callback_url}")
+        
+        # 没有全局 Callback URL 时，只回传有任务级别 callback_url 的任务
+        callback_filter = "" if global_callback_url else "AND t.callback_url IS NOT NULL AND t.callback_url != ''"
+        
+        cur.execute(f"""
+            SELECT
+                t.task_id,
+                t.external_task_id,
+                t.project_id,
+                t.title,
+                t.callback_url,
+                t.callback_secret,
+                t.duration,
+                ut.user_id,
+                ut.platform,
+                ut.submission_link,
+                COALESCE(ut.view_count, 0) as view_count,
+                COALESCE(ut.like_count, 0) as like_count
+            FROM drama_tasks t
+            JOIN user_tasks ut ON ut.task_id = t.task_id AND ut.status = 'submitted'
+            WHERE t.task_id IN (
+                SELECT DISTINCT task_id FROM user_tasks
+                WHERE status = 'submitted'
+                  AND submitted_at >= NOW() - INTERVAL '7 days'
+            )
+            {callback_filter}
+            ORDER BY t.task_id, ut.submitted_at ASC
+        """)
+        rows = cur.fetchall()
+    finally:
         cur.close()
         conn.close()
-        
-        if not user_submissions:
-            logger.warning(f"⚠️ 任务 {task_id} 没有用户提交，跳过")
-            return False
-        
-        # 统计总数据
-        yt_view_count = 0
-        yt_like_count = 0
-        yt_account_count = 0
-        tt_view_count = 0
-        tt_like_count = 0
-        tt_account_count = 0
-        total_account_count = len(user_submissions)
-        
-        # 根据平台分类统计
-        for us in user_submissions:
-            platform_name = (us['platform'] or '').lower()
-            views = int(us['view_count'] or 0)
-            likes = int(us['like_count'] or 0)
-            
-            if platform_name in ['youtube', 'yt']:
-                yt_view_count += views
-                yt_like_count += likes
-                yt_account_count += 1
-            elif platform_name in ['tiktok', 'tt']:
-                tt_view_count += views
-                tt_like_count += likes
-                tt_account_count += 1
-            else:
-                # 其他平台默认计入TikTok
-                tt_view_count += views
-                tt_like_count += likes
-                tt_account_count += 1
-        
-        # 计算总播放量和点赞数
-        total_view_count = yt_view_count + tt_view_count
-        total_like_count = yt_like_count + tt_like_count
-        
-        logger.info(f"📊 任务 {task_id} 统计数据: 总播放={total_view_count}, 总点赞={total_like_count}, 总账号数={total_account_count}")
-        logger.info(f"   YouTube: 播放={yt_view_count}, 点赞={yt_like_count}, 账号={yt_account_count}")
-        logger.info(f"   TikTok: 播放={tt_view_count}, 点赞={tt_like_count}, 账号={tt_account_count}")
-        
-        # 为每个用户提交发送回调（每个用户的 external_url 不同）
-        all_success = True
-        for us in user_submissions:
-            submission_link = us['submission_link'] or ''
-            
-            # 构建符合X2C Pool期望的数据结构
-            stats_data = {
-                'project_id': project_id,
-                'task_id': external_task_id,
-                'duration': duration,
-                'account_count': total_account_count,
-                # X2C Pool期望的字段（始终发送，即使为0）
-                'view_count': total_view_count,
-                'like_count': total_like_count,
-                'comment_count': 0,  # 暂时不统计评论数
-                'share_count': 0,    # 暂时不统计分享数
-                'external_url': submission_link,  # 用户提交的视频链接
-                # 平台特定字段
-                'yt_view_count': yt_view_count,
-                'yt_like_count': yt_like_count,
-                'yt_account_count': yt_account_count,
-                'tt_view_count': tt_view_count,
-                'tt_like_count': tt_like_count,
-                'tt_account_count': tt_account_count
-            }
-            
-            # 构建payload（符合X2C Pool批量更新格式）
-            payload = {
-                'site_name': 'DramaRelayBot',
-                'stats': [stats_data]
+    
+    tasks = {}
+    for row in rows:
+        task = tasks.get(row['task_id'])
+        if task is None:
+            task = {
+                'task_id': row['task_id'],
+                'external_task_id': row['external_task_id'],
+                'project_id': row['project_id'],
+                'title': row['title'],
+                'callback_url': row['callback_url'],
+                'callback_secret': row['callback_secret'],
+                'duration': row['duration'],
+                'submissions': [],
             }
-            
-            logger.info(f"📤 回传任务 {task_id} 用户 {us['user_id']} 数据: external_url={submission_link}")
-            
-            # 发送Webhook
-            success, error = await send_webhook(
-                callback_url,
-                payload,
-                callback_secret,
-                timeout=30
-            )
-            
-            if success:
-                logger.info(f"✅ 任务 {task_id} 用户 {us['user_id']} 数据回传成功")
-                # 记录成功日志
-                log_webhook_success(
-                    task_id=task_id,
-                    task_title=task.get('title', ''),
-                    project_id=task.get('project_id', ''),
-                    callback_url=callback_url,
-                    payload=payload
-                )
-            else:
-                logger.error(f"❌ 任务 {task_id} 用户 {us['user_id']} 数据回传失败: {error}")
-                all_success = False
-            
-            # 每个用户之间间隔0.5秒，避免请求过快
-            await asyncio.sleep(0.5)
-        
-        if not all_success:
+            tasks[row['task_id']] = task
+        task['submissions'].append({
+            'user_id': row['user_id'],
+            'platform': row['platform'],
+            'submission_link': row['submission_link'],
+            'view_count': row['view_count'],
+            'like_count': row['like_count'],
+        })
+    
+    logger.info(f"🔍 查询到 {len(tasks)} 个需要回传的任务，共 {len(rows)} 条用户提交")
+    return global_callback_url, list(tasks.values())
+
+
+def load_task_submissions(task_id: int) -> list:
+    """查询单个任务所有用户提交的数据"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute("""
+        SELECT
+            user_id,
+            platform,
+            submission_link,
+            COALESCE(view_count, 0) as view_count,
+            COALESCE(like_count, 0) as like_count
+        FROM user_tasks
+        WHERE task_id = %s AND status = 'submitted'
+        ORDER BY submitted_at ASC
+    """, (task_id,))
+    user_submissions = cur.fetchall()
+    
+    cur.close()
+    conn.close()
+    
+    return [dict(us) for us in user_submissions]
+
+
+def build_task_stats_entries(task, user_submissions) -> list:
+    """
+    根据任务的全部用户提交构建回传数据，每个用户提交一条（external_url 不同）
+    
+    Returns:
+        list: [(user_id, stats_data), ...]
+    """
+    task_id = task['task_id']
+    
+    # 统计总数据
+    yt_view_count = 0
+    yt_like_count = 0
+    yt_account_count = 0
+    tt_view_count = 0
+    tt_like_count = 0
+    tt_account_count = 0
+    total_account_count = len(user_submissions)
+    
+    # 根据平台分类统计
+    for us in user_submissions:
+        platform_name = (us['platform'] or '').lower()
+        views = int(us['view_count'] or 0)
+        likes = int(us['like_count'] or 0)
+        
+        if platform_name in ['youtube', 'yt']:
+            yt_view_count += views
+            yt_like_count += likes
+            yt_account_count += 1
+        elif platform_name in ['tiktok', 'tt']:
+            tt_view_count += views
+            tt_like_count += likes
+            tt_account_count += 1
+        else:
+            # 其他平台默认计入TikTok
+            tt_view_count += views
+            tt_like_count += likes
+            tt_account_count += 1
+    
+    # 计算总播放量和点赞数
+    total_view_count = yt_view_count + tt_view_count
+    total_like_count = yt_like_count + tt_like_count
+    
+    logger.info(f"📊 任务 {task_id} 统计数据: 总播放={total_view_count}, 总点赞={total_like_count}, 总账号数={total_account_count}")
+    
+    entries = []
+    for us in user_submissions:
+        # 构建符合X2C Pool期望的数据结构
+        stats_data = {
+            'project_id': task['project_id'],
+            'task_id': task['external_task_id'],
+            'duration': task['duration'],
+            'account_count': total_account_count,
+            # X2C Pool期望的字段（始终发送，即使为0）
+            'view_count': total_view_count,
+            'like_count': total_like_count,
+            'comment_count': 0,  # 暂时不统计评论数
+            'share_count': 0,    # 暂时不统计分享数
+            'external_url': us['submission_link'] or '',  # 用户提交的视频链接
+            # 平台特定字段
+            'yt_view_count': yt_view_count,
+            'yt_like_count': yt_like_count,
+            'yt_account_count': yt_account_count,
+            'tt_view_count': tt_view_count,
+            'tt_like_count': tt_like_count,
+            'tt_account_count': tt_account_count
+        }
+        entries.append((us['user_id'], stats_data))
+    
+    return entries
+
+
+def _split_into_batches(items: list) -> list:
+    """按条数和字节数上限把回传条目切分成批次"""
+    batches = []
+    current = []
+    current_bytes = 0
+    
+    for item in items:
+        item_bytes = len(json.dumps(item['stats'], ensure_ascii=False).encode('utf-8')) + 1
+        if current and (len(current) >= BROADCAST_BATCH_MAX_ENTRIES or
+                        current_bytes + item_bytes > BROADCAST_BATCH_MAX_BYTES):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append(item)
+        current_bytes += item_bytes
+    
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _build_payload(items: list) -> dict:
+    """构建回传请求体（符合X2C Pool批量更新格式）"""
+    return {
+        'site_name': 'DramaRelayBot',
+        'stats': [item['stats'] for item in items]
+    }
+
+
+def _is_payload_rejected(status) -> bool:
+    """对方拒绝了请求内容（4xx，如 400 / 413）；408 / 429 属于临时错误"""
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+async def _send_batch(ctx: BroadcastContext, callback_url: str, secret: str, items: list) -> list:
+    """
+    发送一个批次
+    
+    - 请求内容被拒绝（4xx）：对半拆分重试，直到定位到被拒绝的单条条目
+    - 超时、网络错误、5xx：整批按退避重试，仍失败则整批记为失败；
+      回调地址不可用时不拆分，避免一个批次放大成上百个请求
+    
+    Returns:
+        list: [(item, success, error, payload_json), ...]，payload_json 为该条目自己的请求体
+        （批量发送时只含这一条统计，不复制整批内容）
+    """
+    payload = _build_payload(items)
+    
+    for attempt in range(BROADCAST_BATCH_RETRIES + 1):
+        success, status, error = await ctx.send(callback_url, payload, secret)
+        if success or _is_payload_rejected(status) or attempt == BROADCAST_BATCH_RETRIES:
+            break
+        delay = BROADCAST_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+        logger.warning(f"⚠️ 回传失败（{len(items)} 条），{delay:.0f} 秒后整批重试: {error}")
+        await asyncio.sleep(delay)
+    
+    if success:
+        return [(item, True, None, json.dumps(_build_payload([item]), ensure_ascii=False)) for item in items]
+    
+    if len(items) == 1 or not _is_payload_rejected(status):
+        for item in items:
+            logger.error(f"❌ 任务 {item['task']['task_id']} 用户 {item['user_id']} 数据回传失败: {error}")
+        return [(item, False, error, None) for item in items]
+    
+    logger.warning(f"⚠️ 批量回传被拒绝（{len(items)} 条），拆分重试: {error}")
+    mid = len(items) // 2
+    left, right = await asyncio.gather(
+        _send_batch(ctx, callback_url, secret, items[:mid]),
+        _send_batch(ctx, callback_url, secret, items[mid:])
+    )
+    return left + right
+
+
+async def _deliver_entries(ctx: BroadcastContext, callback_url: str, secret: str, items: list) -> list:
+    """
+    把同一回调地址的条目发送出去（批量模式下打包，否则逐条发送）
+    
+    Returns:
+        list: [(item, success, error, payload_json), ...]
+    """
+    if BROADCAST_BATCH_ENABLED:
+        batches = _split_into_batches(items)
+        logger.info(f"📤 回传 {len(items)} 条数据到 {callback_url}，共 {len(batches)} 个批次")
+    else:
+        batches = [[item] for item in items]
+    
+    results = await asyncio.gather(*(_send_batch(ctx, callback_url, secret, batch) for batch in batches))
+    return [r for batch_results in results for r in batch_results]
+
+
+def _finalize_delivery(delivered: list) -> dict:
+    """
+    写入每条成功回传的 webhook_logs（payload 为该条目对应的请求体），并为有失败条目的任务记录错误日志
+    
+    Returns:
+        dict: {task_id: (sent_count, failed_count)}
+    """
+    per_task = {}
+    success_rows = []
+    
+    for item, success, error, payload_json in delivered:
+        task = item['task']
+        sent, failed = per_task.get(task['task_id'], (0, 0))
+        if success:
+            sent += 1
+            success_rows.append((
+                task['task_id'],
+                task.get('title', ''),
+                task.get('project_id', ''),
+                item['callback_url'],
+                'success',
+                payload_json
+            ))
+        else:
+            failed += 1
+        per_task[task['task_id']] = (sent, failed)
+    
+    log_webhook_successes(success_rows)
+    
+    tasks_by_id = {item['task']['task_id']: item for item, _, _, _ in delivered}
+    for task_id, (sent, failed) in per_task.items():
+        if failed:
+            item = tasks_by_id[task_id]
+            task = item['task']
             # 记录错误日志
             log_broadcaster_error(
                 task_id=task_id,
@@ -275,18 +548,88 @@ async def broadcast_task_stats(task, global_callback_url=None):
                 video_url=task.get('video_url', ''),
                 platform='unknown',
                 error_type='CALLBACK_PARTIAL_FAILED',
-                error_message='部分用户回传失败',
-                callback_url=callback_url
+                error_message=f'部分用户回传失败（{failed}/{sent + failed}）',
+                callback_url=item['callback_url']
             )
+    
+    return per_task
+
+
+def _build_delivery_groups(tasks: list, global_callback_url=None) -> dict:
+    """把所有任务的回传条目按 (callback_url, secret) 分组，同组条目可以合并到一个请求"""
+    groups = {}
+    for task in tasks:
+        # 优先使用全局 Callback URL
+        callback_url = global_callback_url or task.get('callback_url')
+        callback_secret = task.get('callback_secret') or 'X2C_WEBHOOK_SECRET'
         
-        return all_success
-            
+        if not callback_url:
+            logger.warning(f"⚠️ 任务 {task['task_id']} 没有配置 callback_url，跳过")
+            continue
+        if not task.get('submissions'):
+            logger.warning(f"⚠️ 任务 {task['task_id']} 没有用户提交，跳过")
+            continue
+        
+        group = groups.setdefault((callback_url, callback_secret), [])
+        for user_id, stats_data in build_task_stats_entries(task, task['submissions']):
+            group.append({
+                'task': task,
+                'user_id': user_id,
+                'callback_url': callback_url,
+                'stats': stats_data,
+            })
+    return groups
+
+
+async def _broadcast_tasks(ctx: BroadcastContext, tasks: list, global_callback_url=None) -> dict:
+    """
+    在共享上下文中回传一组任务
+    
+    Returns:
+        dict: {task_id: (sent_count, failed_count)}，没有可回传数据的任务不在结果中
+    """
+    from async_db import run_db
+    
+    groups = _build_delivery_groups(tasks, global_callback_url)
+    deliveries = await asyncio.gather(*(
+        _deliver_entries(ctx, callback_url, secret, items)
+        for (callback_url, secret), items in groups.items()
+    ))
+    delivered = [r for group_results in deliveries for r in group_results]
+    return await run_db(_finalize_delivery, delivered)
+
+
+async def broadcast_task_stats(task, global_callback_url=None):
+    """
+    回传单个任务的统计数据
+    
+    Args:
+        task: 任务信息字典
+        global_callback_url: 全局 Callback URL（可选）
+    
+    Returns:
+        bool: 是否成功
+    """
+    from async_db import run_db
+    
+    task_id = task['task_id']
+    try:
+        if task.get('submissions') is None:
+            task = {**task, 'submissions': await run_db(load_task_submissions, task_id)}
+        
+        async with BroadcastContext() as ctx:
+            per_task = await _broadcast_tasks(ctx, [task], global_callback_url)
+        
+        sent, failed = per_task.get(task_id, (0, 0))
+        return sent > 0 and failed == 0
+    
     except Exception as e:
         logger.error(f"❌ 任务 {task_id} 回传异常: {e}")
         import traceback
         traceback.print_exc()
         # 记录错误日志
-        log_broadcaster_error(
+        await run_db(
+            log_broadcaster_error,
             task_id=task_id,
             task_title=task.get('title', ''),
             project_id=task.get('project_id', ''),
@@ -294,115 +637,74 @@ async def broadcast_task_stats(task, global_callback_url=None):
             platform='unknown',
             error_type='BROADCAST_ERROR',
             error_message=str(e),
-            callback_url=task.get('callback_url', '')
+            callback_url=global_callback_url or task.get('callback_url', '')
         )
         return False
 
+
+def _record_cycle_metrics(started_at: datetime, duration: float, entries_sent: int, entries_failed: int, host_stats: dict):
+    """更新回传指标（webhooks 指 HTTP 请求数，entries 指回传条目数）"""
+    requests_sent = sum(stats['sent'] for stats in host_stats.values())
+    requests_failed = sum(stats['failed'] for stats in host_stats.values())
+    total_requests = requests_sent + requests_failed
+    
+    _broadcast_metrics['cycles_completed'] += 1
+    _broadcast_metrics['last_cycle_started_at'] = started_at.isoformat()
+    _broadcast_metrics['last_cycle_finished_at'] = datetime.now().isoformat()
+    _broadcast_metrics['last_cycle_duration'] = round(duration, 3)
+    _broadcast_metrics['last_cycle_webhooks'] = requests_sent
+    _broadcast_metrics['last_cycle_failed'] = requests_failed
+    _broadcast_metrics['last_cycle_webhooks_per_sec'] = round(total_requests / duration, 2) if duration > 0 else None
+    _broadcast_metrics['last_cycle_entries'] = entries_sent
+    _broadcast_metrics['last_cycle_entries_failed'] = entries_failed
+    _broadcast_metrics['total_webhooks_sent'] += requests_sent
+    _broadcast_metrics['total_webhooks_failed'] += requests_failed
+    _broadcast_metrics['total_entries_sent'] += entries_sent
+    
+    hosts = _broadcast_metrics['hosts']
+    for host, stats in host_stats.items():
+        count = stats['sent'] + stats['failed']
+        agg = hosts.setdefault(host, {'sent': 0, 'failed': 0})
+        agg['sent'] += stats['sent']
+        agg['failed'] += stats['failed']
+        agg['last_cycle_avg_latency'] = round(stats['total_latency'] / count, 3) if count else None
+
+
 async def broadcast_all_tasks():
     """
     回传所有活跃任务的统计数据
     
+    一次 SQL 加载全部任务和提交，同一回调地址的条目打包成批量请求，
+    在共享会话上并发发送；同一时间只允许一轮回传在执行
+    
     Returns:
         dict: 回传结果统计
     """
+    from async_db import run_db
+    
+    if not _cycle_lock.acquire(blocking=False):
+        _broadcast_metrics['cycles_skipped'] += 1
+        logger.warning("⚠️ 上一轮回传尚未结束，跳过本轮")
+        return {
+            'success': False,
+            'skipped': True,
+            'error': '上一轮回传尚未结束',
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    started_at = datetime.now()
+    started = time.monotonic()
+    _broadcast_metrics['cycle_in_progress'] = True
+    
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # 获取全局 Callback URL 配置
-        global_callback_url = None
-        try:
-            cur.execute("""
-                SELECT config_value FROM system_config WHERE config_key = 'x2c_callback_url'
-            """)
-            config_result = cur.fetchone()
-            if config_result:
-                global_callback_url = config_result['config_value']
-                logger.info(f"🔗 使用全局 Callback URL: {global_callback_url}")
-        except Exception as config_error:
-            logger.warning(f"⚠️ 获取全局 Callback URL 失败: {config_error}")
-        
-        # 查询最近7天内用户已完成的任务
-        logger.info("🔍 [DEBUG] 开始查询已完成的任务...")
-        
-        # 先查询user_tasks表中所有submitted的记录
-        cur.execute("""
-            SELECT COUNT(*) as total
-            FROM user_tasks 
-            WHERE status = 'submitted'
-        """)
-        total_submitted = cur.fetchone()['total']
-        logger.info(f"🔍 [DEBUG] user_tasks表中 submitted 状态的任务总数: {total_submitted}")
-        
-        # 查询最近7天的submitted任务数
-        cur.execute("""
-            SELECT COUNT(*) as total
-            FROM user_tasks
-            WHERE status = 'submitted'
-              AND submitted_at >= NOW() - INTERVAL '7 days'
-        """)
-        recent_count = cur.fetchone()['total']
-        logger.info(f"🔍 [DEBUG] 最近7天内submitted的任务数: {recent_count}")
-        
-        # 如果有全局 Callback URL，查询所有已完成的任务（不需要任务级别的callback_url）
-        if global_callback_url:
-            cur.execute("""
-                SELECT DISTINCT
-                    t.task_id,
-                    t.external_task_id,
-                    t.project_id,
-                    t.title,
-                    ut.submission_link as video_url,
-                    t.callback_secret,
-                    t.duration,
-                    ut.user_id,
-                    ut.submitted_at
-                FROM user_tasks ut
-                JOIN drama_tasks t ON ut.task_id = t.task_id
-                WHERE ut.status = 'submitted'
-                  AND ut.submitted_at >= NOW() - INTERVAL '7 days'
-                ORDER BY ut.submitted_at DESC
-            """)
-        else:
-            # 没有全局 Callback URL，只查询有任务级别 callback_url 的任务
-            cur.execute("""
-                SELECT DISTINCT
-                    t.task_id,
-                    t.external_task_id,
-                    t.project_id,
-                    t.title,
-                    ut.submission_link as video_url,
-                    t.callback_url,
-                    t.callback_secret,
-                    t.duration,
-                    ut.user_id,
-                    ut.submitted_at
-                FROM user_tasks ut
-                JOIN drama_tasks t ON ut.task_id = t.task_id
-                WHERE ut.status = 'submitted'
-                  AND t.callback_url IS NOT NULL
-                  AND t.callback_url != ''
-                  AND ut.submitted_at >= NOW() - INTERVAL '7 days'
-                ORDER BY ut.submitted_at DESC
-            """)
-        
-        tasks = cur.fetchall()
-        logger.info(f"🔍 [DEBUG] 查询到 {len(tasks)} 个符合条件的任务")
-        
-        if tasks:
-            for task in tasks:
-                task_callback = global_callback_url or task.get('callback_url', 'NULL')
-                callback_preview = task_callback[:50] if task_callback else 'NULL'
-                logger.info(f"🔍 [DEBUG] 任务: task_id={task['task_id']}, title={task['title']}, callback_url={callback_preview}...")
-        
-        cur.close()
-        conn.close()
+        global_callback_url, tasks = await run_db(load_broadcast_tasks)
         
         if not tasks:
             if global_callback_url:
                 logger.warning("⚠️ 没有需要回传的任务（最近7天内没有已完成的任务）")
             else:
                 logger.warning("⚠️ 没有需要回传的任务（未配置全局 Callback URL 且任务没有单独的 callback_url）")
+            _record_cycle_metrics(started_at, time.monotonic() - started, 0, 0, {})
             return {
                 'success': True,
                 'total': 0,
@@ -412,36 +714,26 @@ async def broadcast_all_tasks():
         
         logger.info(f"📊 开始回传 {len(tasks)} 个任务的数据")
         
-        # 逐个回传
-        success_count = 0
-        failed_count = 0
-        total_views = 0  # 统计总播放量
-        
-        for task in tasks:
-            # 先获取视频统计数据
-            video_url = task['video_url']
-            platform = 'youtube'
-            if 'tiktok.com' in video_url or 'vm.tiktok.com' in video_url:
-                platform = 'tiktok'
-            elif 'douyin.com' in video_url or 'v.douyin.com' in video_url:
-                platform = 'douyin'
-            
-            stats = await fetch_task_stats(task['task_id'], video_url, platform)
-            if stats:
-                views = stats.get('views', 0) or stats.get('view_count', 0)
-                total_views += views
-            
-            # 回传数据
-            success = await broadcast_task_stats(task, global_callback_url)
-            if success:
-                success_count += 1
-            else:
-                failed_count += 1
-            
-            # 每个任务之间间隔1秒，避免请求过快
-            await asyncio.sleep(1)
+        # 总播放量直接由已入库的播放量统计（播放量由 view_counter_service 定期更新）
+        total_views = sum(int(us['view_count'] or 0) for task in tasks for us in task['submissions'])
         
-        logger.info(f"✅ 回传完成: 成功 {success_count}, 失败 {failed_count}, 总播放量 {total_views}")
+        async with BroadcastContext() as ctx:
+            per_task = await _broadcast_tasks(ctx, tasks, global_callback_url)
+            host_stats = ctx.host_stats
+        
+        success_count = sum(1 for sent, failed in per_task.values() if sent and not failed)
+        failed_count = len(tasks) - success_count
+        entries_sent = sum(sent for sent, _ in per_task.values())
+        entries_failed = sum(failed for _, failed in per_task.values())
+        
+        duration = time.monotonic() - started
+        _record_cycle_metrics(started_at, duration, entries_sent, entries_failed, host_stats)
+        webhooks_sent = sum(stats['sent'] + stats['failed'] for stats in host_stats.values())
+        
+        logger.info(
+            f"✅ 回传完成: 成功 {success_count}, 失败 {failed_count}, 总播放量 {total_views}, "
+            f"条目 {entries_sent + entries_failed}, 请求 {webhooks_sent} 次, 耗时 {duration:.1f}s"
+        )
         
         return {
             'success': True,
@@ -449,9 +741,13 @@ async def broadcast_all_tasks():
             'success_count': success_count,
             'failed_count': failed_count,
             'total_views': total_views,  # 添加总播放量字段
+            'entries_sent': entries_sent,
+            'entries_failed': entries_failed,
+            'webhooks_sent': webhooks_sent,
+            'duration': round(duration, 3),
             'timestamp': datetime.now().isoformat()
         }
-        
+    
     except Exception as e:
         logger.error(f"❌ 回传任务失败: {e}")
         import traceback
@@ -461,11 +757,14 @@ async def broadcast_all_tasks():
             'error': str(e),
             'timestamp': datetime.now().isoformat()
         }
+    finally:
+        _broadcast_metrics['cycle_in_progress'] = False
+        _cycle_lock.release()
 
 async def broadcaster_loop():
     """
     分发数据回传循环
-    每3分钟执行一次
+    每 BROADCAST_INTERVAL_SECONDS 秒（默认3分钟）执行一次
     """
     global broadcaster_running
     
@@ -483,9 +782,10 @@ async def broadcaster_loop():
             logger.info(f"📊 回传结果: {json.dumps(result, ensure_ascii=False)}")
             logger.info("="*70)
             
-            # 等待3分钟
-            logger.info("⏰ 等待3分钟后进行下一轮回传...")
-            await asyncio.sleep(180)  # 3分钟 = 180秒
+            # 按固定周期执行：扣除本轮耗时，回传耗时超过周期时立即开始下一轮
+            wait_seconds = max(0, BROADCAST_INTERVAL_SECONDS - (result.get('duration') or 0))
+            logger.info(f"⏰ 等待 {wait_seconds:.0f} 秒后进行下一轮回传...")
+            await asyncio.sleep(wait_seconds)
             
         except Exception as e:
             logger.error(f"❌ 回传循环异常: {e}")
@@ -517,9 +817,8 @@ def start_broadcaster():
             import threading
             
             def run_broadcaster():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                loop.run_until_complete(broadcaster_loop())
+                import http_client
+                http_client.run(broadcaster_loop())
             
             thread = threading.Thread(target=run_broadcaster, daemon=True)
             thread.start()
@@ -571,6 +870,8 @@ def get_broadcaster_status():
     """获取分发数据回传服务状态"""
     return {
         'running': broadcaster_running,
+        'interval_seconds': BROADCAST_INTERVAL_SECONDS,
+        'metrics': {**_broadcast_metrics, 'hosts': dict(_broadcast_metrics['hosts'])},
         'timestamp': datetime.now().isoformat()
     }
 
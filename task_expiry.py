@@ -9,6 +9,8 @@
 import logging
 from datetime import datetime, timedelta
 
+from settings_cache import BOT_SETTINGS, get_int_setting, invalidate_settings
+
 logger = logging.getLogger(__name__)
 
 # 默认任务过期时间（小时）- 7天
@@ -17,29 +19,12 @@ DEFAULT_TASK_EXPIRY_HOURS = 168
 
 def get_task_expiry_hours() -> int:
     """
-    从数据库获取任务过期时间配置
+    获取任务过期时间配置（读配置缓存，不访问数据库）
     
     Returns:
         int: 任务过期时间（小时）
     """
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT value FROM bot_settings WHERE key = 'task_expiry_hours'
-        """)
-        result = cur.fetchone()
-        
-        cur.close()
-        conn.close()
-        
-        if result:
-            return int(result['value'])
-        return DEFAULT_TASK_EXPIRY_HOURS
-    except Exception as e:
-        logger.error(f"❌ 获取任务过期时间配置失败: {e}")
-        return DEFAULT_TASK_EXPIRY_HOURS
+    return get_int_setting('task_expiry_hours', DEFAULT_TASK_EXPIRY_HOURS)
 
 
 def set_task_expiry_hours(hours: int) -> bool:
@@ -67,6 +52,8 @@ def set_task_expiry_hours(hours: int) -> bool:
         cur.close()
         conn.close()
         
+        invalidate_settings(BOT_SETTINGS)
+        
         logger.info(f"✅ 任务过期时间已设置为 {hours} 小时")
         return True
     except Exception as e:
@@ -0,0 +1,483 @@
+# -*- coding: utf-8 -*-
+"""
+任务日志汇总（完成日志 / 回调日志）
+/api/logs/completions 和 /api/logs/webhooks 按任务展示，原来每次请求都对 user_tasks、webhook_logs
+做 GROUP BY 后再 LIMIT/OFFSET，翻页越深越慢。现在由触发器维护每个任务一行的汇总表：
+
+- 完成数据（完成人数、播放量、点赞、奖励、最早/最新完成时间）：已提交记录的新增、删除，或状态、
+  用户、任务、提交时间变化时，先锁住该任务的汇总行再按任务重新合计，并发修改同一任务时不会丢失更新；
+  播放量同步只改播放量 / 点赞 / 奖励 / 同步时间，按差值增量更新，不重新合计
+- 回调数据（回调次数、最新一条回调）：新增回调时增量更新，删除回调时按任务重新合计
+- 列表按 (latest_completed_at, task_id) 倒序做游标（keyset）分页，任意页都是一次索引范围扫描
+- 总数查询只读汇总表；校正线程定期比对业务表，修正绕过触发器的写入（首次运行即回填历史数据）
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Optional, Tuple
+
+import db_pool
+import task_search
+
+logger = logging.getLogger(__name__)
+
+# 数据库连接
+DATABASE_URL = db_pool.DATABASE_URL
+
+TASK_LOG_RECONCILE_MINUTES = int(os.getenv('TASK_LOG_RECONCILE_MINUTES', '60'))  # 校正间隔（分钟）
+
+TASK_LOG_SUMMARY_DDL = """
+CREATE TABLE IF NOT EXISTS webhook_logs (
+    id SERIAL PRIMARY KEY,
+    task_id INTEGER,
+    task_title VARCHAR(500),
+    project_id VARCHAR(100),
+    callback_url TEXT,
+    callback_status VARCHAR(50) DEFAULT 'success',
+    payload JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_webhook_logs_task_id ON webhook_logs(task_id);
+CREATE INDEX IF NOT EXISTS idx_webhook_logs_created_at ON webhook_logs(created_at);
+
+CREATE TABLE IF NOT EXISTS task_log_summary (
+    task_id INTEGER PRIMARY KEY,
+    completion_count INTEGER NOT NULL DEFAULT 0,
+    total_view_count BIGINT NOT NULL DEFAULT 0,
+    total_like_count BIGINT NOT NULL DEFAULT 0,
+    total_earned NUMERIC NOT NULL DEFAULT 0,
+    latest_completed_at TIMESTAMP,
+    earliest_completed_at TIMESTAMP,
+    view_count_updated_at TIMESTAMP,
+    webhook_count INTEGER NOT NULL DEFAULT 0,
+    latest_webhook_id INTEGER,
+    latest_webhook_at TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+-- 与列表的 ORDER BY latest_completed_at DESC NULLS LAST, task_id DESC 一致（替换旧的 idx_task_log_summary_completed）
+DROP INDEX IF EXISTS idx_task_log_summary_completed;
+CREATE INDEX IF NOT EXISTS idx_task_log_summary_completions
+    ON task_log_summary (latest_completed_at DESC NULLS LAST, task_id DESC) WHERE completion_count > 0;
+CREATE INDEX IF NOT EXISTS idx_task_log_summary_webhooks
+    ON task_log_summary (latest_completed_at DESC NULLS LAST, task_id DESC) WHERE webhook_count > 0;
+CREATE INDEX IF NOT EXISTS idx_task_log_summary_latest_webhook
+    ON task_log_summary (latest_webhook_at) WHERE webhook_count > 0;
+
+-- 锁住任务的汇总行（不存在时先创建），之后的查询在新快照中进行，能看到先提交的并发修改
+CREATE OR REPLACE FUNCTION task_log_summary_lock(p_task_id INTEGER) RETURNS void AS $$
+BEGIN
+    INSERT INTO task_log_summary (task_id) VALUES (p_task_id) ON CONFLICT (task_id) DO NOTHING;
+    PERFORM 1 FROM task_log_summary WHERE task_id = p_task_id FOR UPDATE;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_log_summary_refresh_completions(p_task_id INTEGER) RETURNS void AS $$
+BEGIN
+    IF p_task_id IS NULL THEN
+        RETURN;
+    END IF;
+    PERFORM task_log_summary_lock(p_task_id);
+    UPDATE task_log_summary s
+    SET completion_count = c.completion_count,
+        total_view_count = c.total_view_count,
+        total_like_count = c.total_like_count,
+        total_earned = c.total_earned,
+        latest_completed_at = c.latest_completed_at,
+        earliest_completed_at = c.earliest_completed_at,
+        view_count_updated_at = c.view_count_updated_at,
+        updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT COUNT(DISTINCT user_id) AS completion_count,
+               COALESCE(SUM(view_count), 0) AS total_view_count,
+               COALESCE(SUM(like_count), 0) AS total_like_count,
+               COALESCE(SUM(node_power_earned), 0) AS total_earned,
+               MAX(submitted_at) AS latest_completed_at,
+               MIN(submitted_at) AS earliest_completed_at,
+               MAX(view_count_updated_at) AS view_count_updated_at
+        FROM user_tasks
+        WHERE task_id = p_task_id AND status = 'submitted'
+    ) c
+    WHERE s.task_id = p_task_id;
+    DELETE FROM task_log_summary WHERE task_id = p_task_id AND completion_count = 0 AND webhook_count = 0;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_log_summary_refresh_webhooks(p_task_id INTEGER) RETURNS void AS $$
+BEGIN
+    IF p_task_id IS NULL THEN
+        RETURN;
+    END IF;
+    PERFORM task_log_summary_lock(p_task_id);
+    UPDATE task_log_summary s
+    SET webhook_count = w.webhook_count,
+        latest_webhook_id = w.latest_webhook_id,
+        latest_webhook_at = (SELECT created_at FROM webhook_logs WHERE id = w.latest_webhook_id),
+        updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT COUNT(*) AS webhook_count, MAX(id) AS latest_webhook_id
+        FROM webhook_logs
+        WHERE task_id = p_task_id
+    ) w
+    WHERE s.task_id = p_task_id;
+    DELETE FROM task_log_summary WHERE task_id = p_task_id AND completion_count = 0 AND webhook_count = 0;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_log_summary_user_tasks_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM task_log_summary_refresh_completions(NEW.task_id);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM task_log_summary_refresh_completions(OLD.task_id);
+    ELSE
+        PERFORM task_log_summary_refresh_completions(OLD.task_id);
+        IF NEW.task_id IS DISTINCT FROM OLD.task_id THEN
+            PERFORM task_log_summary_refresh_completions(NEW.task_id);
+        END IF;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- 播放量 / 点赞 / 奖励变化只影响合计值，按差值更新（播放量同步会批量刷新大量已提交记录）
+CREATE OR REPLACE FUNCTION task_log_summary_user_tasks_delta_trigger() RETURNS trigger AS $$
+BEGIN
+    UPDATE task_log_summary
+    SET total_view_count = total_view_count + COALESCE(NEW.view_count, 0) - COALESCE(OLD.view_count, 0),
+        total_like_count = total_like_count + COALESCE(NEW.like_count, 0) - COALESCE(OLD.like_count, 0),
+        total_earned = total_earned + COALESCE(NEW.node_power_earned, 0) - COALESCE(OLD.node_power_earned, 0),
+        view_count_updated_at = GREATEST(view_count_updated_at, NEW.view_count_updated_at),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE task_id = NEW.task_id;
+    IF NOT FOUND THEN
+        PERFORM task_log_summary_refresh_completions(NEW.task_id);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- 新增回调只累加，不重新统计（回传服务每轮都会写入，单个任务的回调记录会越来越多）
+CREATE OR REPLACE FUNCTION task_log_summary_webhook_insert_trigger() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO task_log_summary (task_id, webhook_count, latest_webhook_id, latest_webhook_at)
+    VALUES (NEW.task_id, 1, NEW.id, NEW.created_at)
+    ON CONFLICT (task_id) DO UPDATE
+    SET webhook_count = task_log_summary.webhook_count + 1,
+        latest_webhook_id = GREATEST(task_log_summary.latest_webhook_id, EXCLUDED.latest_webhook_id),
+        latest_webhook_at = CASE
+            WHEN task_log_summary.latest_webhook_id IS NULL
+                 OR EXCLUDED.latest_webhook_id > task_log_summary.latest_webhook_id
+            THEN EXCLUDED.latest_webhook_at
+            ELSE task_log_summary.latest_webhook_at
+        END,
+        updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION task_log_summary_webhook_change_trigger() RETURNS trigger AS $$
+BEGIN
+    PERFORM task_log_summary_refresh_webhooks(OLD.task_id);
+    IF TG_OP = 'UPDATE' AND NEW.task_id IS DISTINCT FROM OLD.task_id THEN
+        PERFORM task_log_summary_refresh_webhooks(NEW.task_id);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# (触发器名, 表, 触发事件与条件, 触发器函数)
+TASK_LOG_SUMMARY_TRIGGERS = [
+    ('trg_task_log_summary_ut_insert', 'user_tasks',
+     "AFTER INSERT ON user_tasks FOR EACH ROW WHEN (NEW.status = 'submitted')",
+     'task_log_summary_user_tasks_trigger()'),
+    ('trg_task_log_summary_ut_update', 'user_tasks',
+     "AFTER UPDATE OF status, task_id, user_id, submitted_at ON user_tasks FOR EACH ROW "
+     "WHEN ((OLD.status = 'submitted' OR NEW.status = 'submitted') "
+     "AND (OLD.status, OLD.task_id, OLD.user_id, OLD.submitted_at) "
+     "IS DISTINCT FROM (NEW.status, NEW.task_id, NEW.user_id, NEW.submitted_at))",
+     'task_log_summary_user_tasks_trigger()'),
+    ('trg_task_log_summary_ut_values', 'user_tasks',
+     "AFTER UPDATE OF view_count, like_count, node_power_earned, view_count_updated_at ON user_tasks FOR EACH ROW "
+     "WHEN (OLD.status = 'submitted' AND NEW.status = 'submitted' "
+     "AND (OLD.task_id, OLD.user_id, OLD.submitted_at) IS NOT DISTINCT FROM (NEW.task_id, NEW.user_id, NEW.submitted_at) "
+     "AND (OLD.view_count, OLD.like_count, OLD.node_power_earned, OLD.view_count_updated_at) "
+     "IS DISTINCT FROM (NEW.view_count, NEW.like_count, NEW.node_power_earned, NEW.view_count_updated_at))",
+     'task_log_summary_user_tasks_delta_trigger()'),
+    ('trg_task_log_summary_ut_delete', 'user_tasks',
+     "AFTER DELETE ON user_tasks FOR EACH ROW WHEN (OLD.status = 'submitted')",
+     'task_log_summary_user_tasks_trigger()'),
+    ('trg_task_log_summary_wh_insert', 'webhook_logs',
+     "AFTER INSERT ON webhook_logs FOR EACH ROW WHEN (NEW.task_id IS NOT NULL)",
+     'task_log_summary_webhook_insert_trigger()'),
+    ('trg_task_log_summary_wh_change', 'webhook_logs',
+     "AFTER DELETE OR UPDATE OF task_id ON webhook_logs FOR EACH ROW",
+     'task_log_summary_webhook_change_trigger()'),
+]
+
+_reconcile_thread = None
+_reconcile_running = False
+
+_task_log_metrics = {
+    'reconcile_runs': 0,
+    'reconcile_corrections': 0,
+    'last_reconcile_at': None,
+    'last_reconcile_seconds': None,
+}
+_metrics_lock = threading.Lock()
+
+
+def get_db_connection():
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
+
+
+def ensure_task_log_summary():
+    """创建 webhook_logs、汇总表和触发器"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(TASK_LOG_SUMMARY_DDL)
+        for trigger, table, definition, function in TASK_LOG_SUMMARY_TRIGGERS:
+            cur.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+            cur.execute(f"CREATE TRIGGER {trigger} {definition} EXECUTE PROCEDURE {function}")
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        logger.info("✅ 任务日志汇总表和触发器已就绪")
+        return True
+    except Exception as e:
+        logger.error(f"❌ 初始化任务日志汇总失败: {e}")
+        return False
+
+
+# ============================================================
+# 校正（比对业务表，按任务重新合计有偏差的行）
+# ============================================================
+
+def reconcile_task_log_summary() -> int:
+    """
+    找出汇总与业务表不一致的任务，逐个调用刷新函数重新合计
+    
+    刷新函数先锁汇总行再统计，不会用旧快照覆盖并发触发器写入的结果；
+    汇总表为空时（首次部署）即完成全部历史数据的回填
+    
+    Returns:
+        int: 修正的任务数
+    """
+    started = time.monotonic()
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            WITH completions AS (
+                SELECT task_id,
+                       COUNT(DISTINCT user_id) AS completion_count,
+                       COALESCE(SUM(view_count), 0) AS total_view_count,
+                       COALESCE(SUM(like_count), 0) AS total_like_count,
+                       COALESCE(SUM(node_power_earned), 0) AS total_earned,
+                       MAX(submitted_at) AS latest_completed_at,
+                       MIN(submitted_at) AS earliest_completed_at,
+                       MAX(view_count_updated_at) AS view_count_updated_at
+                FROM user_tasks
+                WHERE status = 'submitted'
+                GROUP BY task_id
+            ),
+            webhooks AS (
+                SELECT task_id, COUNT(*) AS webhook_count, MAX(id) AS latest_webhook_id
+                FROM webhook_logs
+                WHERE task_id IS NOT NULL
+                GROUP BY task_id
+            )
+            SELECT
+                COALESCE(c.task_id, w.task_id, s.task_id) AS task_id,
+                (c.completion_count, c.total_view_count, c.total_like_count, c.total_earned,
+                 c.latest_completed_at, c.earliest_completed_at, c.view_count_updated_at)
+                IS DISTINCT FROM
+                (NULLIF(s.completion_count, 0), CASE WHEN s.completion_count > 0 THEN s.total_view_count END,
+                 CASE WHEN s.completion_count > 0 THEN s.total_like_count END,
+                 CASE WHEN s.completion_count > 0 THEN s.total_earned END,
+                 s.latest_completed_at, s.earliest_completed_at, s.view_count_updated_at) AS completions_drift,
+                (w.webhook_count, w.latest_webhook_id)
+                IS DISTINCT FROM (NULLIF(s.webhook_count, 0), s.latest_webhook_id) AS webhooks_drift
+            FROM completions c
+            FULL OUTER JOIN webhooks w ON w.task_id = c.task_id
+            FULL OUTER JOIN task_log_summary s ON s.task_id = COALESCE(c.task_id, w.task_id)
+        """)
+        drifted = [row for row in cur.fetchall() if row['completions_drift'] or row['webhooks_drift']]
+        
+        for row in drifted:
+            if row['completions_drift']:
+                cur.execute("SELECT task_log_summary_refresh_completions(%s)", (row['task_id'],))
+            if row['webhooks_drift']:
+                cur.execute("SELECT task_log_summary_refresh_webhooks(%s)", (row['task_id'],))
+            conn.commit()
+        cur.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    duration = time.monotonic() - started
+    with _metrics_lock:
+        _task_log_metrics['reconcile_runs'] += 1
+        _task_log_metrics['reconcile_corrections'] += len(drifted)
+        _task_log_metrics['last_reconcile_at'] = datetime.now().isoformat()
+        _task_log_metrics['last_reconcile_seconds'] = round(duration, 3)
+    
+    if drifted:
+        logger.info(f"🔧 任务日志汇总已校正 {len(drifted)} 个任务 (耗时 {duration:.1f}s)")
+    return len(drifted)
+
+
+def start_task_log_reconciler(interval_minutes: int = TASK_LOG_RECONCILE_MINUTES):
+    """启动校正线程（启动时立即运行一次，同时完成历史数据回填）"""
+    global _reconcile_thread, _reconcile_running
+    if _reconcile_running:
+        return False
+    _reconcile_running = True
+    
+    def reconcile_loop():
+        while _reconcile_running:
+            try:
+                reconcile_task_log_summary()
+            except Exception as e:
+                logger.error(f"❌ 任务日志汇总校正失败: {e}")
+            time.sleep(interval_minutes * 60)
+    
+    _reconcile_thread = threading.Thread(target=reconcile_loop, name='task-log-reconcile', daemon=True)
+    _reconcile_thread.start()
+    logger.info(f"✅ 任务日志汇总校正线程已启动，间隔: {interval_minutes} 分钟")
+    return True
+
+
+def stop_task_log_reconciler():
+    """停止校正线程"""
+    global _reconcile_running
+    _reconcile_running = False
+
+
+# ============================================================
+# 游标分页
+# ============================================================
+
+def encode_cursor(latest_completed_at: Optional[datetime], task_id: int) -> str:
+    """分页游标：最后一行的 (latest_completed_at, task_id)"""
+    return f"{latest_completed_at.isoformat() if latest_completed_at else ''}|{task_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """
+    解析分页游标
+    
+    Raises:
+        ValueError: 游标格式错误
+    """
+    latest, _, task_id = cursor.rpartition('|')
+    if not task_id:
+        raise ValueError(f"无效的分页游标: {cursor}")
+    return (datetime.fromisoformat(latest) if latest else None), int(task_id)
+
+
+def _keyset_condition(cursor: Optional[str], nullable: bool = True) -> Tuple[str, list]:
+    """
+    (latest_completed_at DESC NULLS LAST, task_id DESC) 顺序中位于游标之后的行
+    
+    nullable 为 False 时（完成日志：有完成记录的任务一定有提交时间）不再拼接 IS NULL 分支，
+    条件是单纯的行比较，可以直接走索引范围扫描
+    """
+    if not cursor:
+        return "", []
+    latest, task_id = decode_cursor(cursor)
+    if latest is None:
+        return " AND s.latest_completed_at IS NULL AND s.task_id < %s", [task_id]
+    if not nullable:
+        return " AND (s.latest_completed_at, s.task_id) < (%s, %s)", [latest, task_id]
+    return (
+        " AND ((s.latest_completed_at, s.task_id) < (%s, %s) OR s.latest_completed_at IS NULL)",
+        [latest, task_id]
+    )
+
+
+def _filters(cur, condition: str, latest_column: str, hours: int, search: str) -> Tuple[str, list]:
+    where = f" WHERE {condition}"
+    params = []
+    if hours > 0:
+        where += f" AND s.{latest_column} >= NOW() - %s * INTERVAL '1 hour'"
+        params.append(hours)
+    if search:
+        # 按任务名 / 英文标题 / project_id / 外部任务ID 搜索（索引见 task_search）
+        search_sql, search_params = task_search.search_condition(cur, search)
+        where += f" AND s.task_id IN (SELECT t.task_id FROM drama_tasks t WHERE {search_sql})"
+        params += search_params
+    return where, params
+
+
+def _completion_filters(cur, hours: int, search: str) -> Tuple[str, list]:
+    return _filters(cur, "s.completion_count > 0", 'latest_completed_at', hours, search)
+
+
+def _webhook_filters(cur, hours: int, search: str) -> Tuple[str, list]:
+    return _filters(cur, "s.webhook_count > 0", 'latest_webhook_at', hours, search)
+
+
+def count_completion_tasks(cur, hours: int = 24, search: str = '') -> int:
+    """有完成记录的任务数（hours 为 0 或负数表示全部）"""
+    where, params = _completion_filters(cur, hours, search)
+    cur.execute(f"SELECT COUNT(*) AS total FROM task_log_summary s{where}", params)
+    return cur.fetchone()['total']
+
+
+def count_webhook_tasks(cur, hours: int = 24, search: str = '') -> int:
+    """有回调记录的任务数（hours 为 0 或负数表示全部）"""
+    where, params = _webhook_filters(cur, hours, search)
+    cur.execute(f"SELECT COUNT(*) AS total FROM task_log_summary s{where}", params)
+    return cur.fetchone()['total']
+
+
+def _page(cur, filters, cursor, limit, offset, nullable=True):
+    where, params = filters
+    keyset, keyset_params = _keyset_condition(cursor, nullable)
+    cur.execute(f"""
+        SELECT s.*
+        FROM task_log_summary s{where}{keyset}
+        ORDER BY s.latest_completed_at DESC NULLS LAST, s.task_id DESC
+        LIMIT %s OFFSET %s
+    """, params + keyset_params + [limit + 1, 0 if cursor else offset])
+    rows = cur.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]['latest_completed_at'], rows[-1]['task_id']) if has_more else None
+    return rows, next_cursor
+
+
+def list_completion_tasks(cur, hours: int = 24, search: str = '', limit: int = 50,
+                          cursor: Optional[str] = None, offset: int = 0):
+    """
+    完成日志的一页任务汇总
+    
+    Args:
+        cursor: 上一页返回的 next_cursor；不传时从第一页（或 offset，兼容旧参数）开始
+    
+    Returns:
+        tuple: (汇总行列表, next_cursor)，没有下一页时 next_cursor 为 None
+    """
+    return _page(cur, _completion_filters(cur, hours, search), cursor, limit, offset, nullable=False)
+
+
+def list_webhook_tasks(cur, hours: int = 24, search: str = '', limit: int = 100,
+                       cursor: Optional[str] = None, offset: int = 0):
+    """回调日志的一页任务汇总，返回值同 list_completion_tasks"""
+    return _page(cur, _webhook_filters(cur, hours, search), cursor, limit, offset)
+
+
+def get_task_log_summary_stats() -> dict:
+    """任务日志汇总运行状态（用于监控）"""
+    with _metrics_lock:
+        return {**_task_log_metrics, 'reconcile_minutes': TASK_LOG_RECONCILE_MINUTES}
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+管理后台任务搜索
+任务名 / 英文标题 / project_id / 外部任务ID 的搜索，原来是 ILIKE '%关键词%' 全表扫描，现在走索引：
+
+- 英文等 3 个字符以上的关键词：pg_trgm 三元组 GIN 索引（ILIKE 可以直接使用）
+- 中日韩关键词和 1~2 个字符的短关键词：三元组对这类文本无效，改用 task_search_grams 表中
+  每个任务的单字 + 双字切分（GIN 数组索引，@> 匹配后再用 ILIKE 精确复核）
+- 纯数字关键词同时按 task_id / 外部任务ID 精确匹配
+- 排序：ID 精确匹配 > 标题完全相同 > 标题前缀 > 相似度（pg_trgm 可用时）> 创建时间
+- 前缀补全（搜索框联想）使用 lower(...) text_pattern_ops 的 B-tree 索引
+
+数据库没有 pg_trgm 扩展（无权限创建）时，所有关键词都走单字 + 双字切分。
+"""
+
+import re
+import logging
+from typing import List, Optional, Tuple
+
+import db_pool
+
+logger = logging.getLogger(__name__)
+
+# 数据库连接
+DATABASE_URL = db_pool.DATABASE_URL
+
+SEARCH_MAX_RESULTS = 50
+
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+TASK_SEARCH_DDL = """
+CREATE TABLE IF NOT EXISTS task_search_grams (
+    task_id INTEGER PRIMARY KEY REFERENCES drama_tasks(task_id) ON DELETE CASCADE,
+    grams TEXT[] NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_task_search_grams ON task_search_grams USING GIN (grams);
+
+-- 各字段小写后的单字和双字切分（不含空白）
+CREATE OR REPLACE FUNCTION task_search_make_grams(p_values TEXT[]) RETURNS TEXT[] AS $$
+    SELECT COALESCE(array_agg(DISTINCT g), '{}')
+    FROM unnest(p_values) AS v,
+         generate_series(1, 2) AS n,
+         LATERAL generate_series(1, char_length(v) - n + 1) AS i,
+         LATERAL substr(lower(v), i, n) AS g
+    WHERE v IS NOT NULL AND g !~ '\\s'
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION task_search_grams_trigger() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO task_search_grams (task_id, grams)
+    VALUES (NEW.task_id, task_search_make_grams(ARRAY[NEW.title, NEW.title_en, NEW.project_id, NEW.external_task_id::text]))
+    ON CONFLICT (task_id) DO UPDATE SET grams = EXCLUDED.grams;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_task_search_grams ON drama_tasks;
+CREATE TRIGGER trg_task_search_grams
+    AFTER INSERT OR UPDATE OF title, title_en, project_id, external_task_id ON drama_tasks
+    FOR EACH ROW EXECUTE PROCEDURE task_search_grams_trigger();
+
+-- 前缀补全和 ID 精确匹配
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_title_prefix ON drama_tasks (lower(title) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_title_en_prefix ON drama_tasks (lower(title_en) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_project_id_prefix ON drama_tasks (lower(project_id) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_external_task_id ON drama_tasks (external_task_id);
+"""
+
+TASK_SEARCH_TRGM_DDL = """
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_title_trgm ON drama_tasks USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_title_en_trgm ON drama_tasks USING GIN (title_en gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_drama_tasks_project_id_trgm ON drama_tasks USING GIN (project_id gin_trgm_ops);
+"""
+
+# None 表示尚未检查
+_trgm_available = None
+
+
+def get_db_connection():
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
+
+
+def ensure_task_search_index():
+    """创建切分表、触发器和索引，补齐历史任务的切分；pg_trgm 不可用时只记录警告"""
+    global _trgm_available
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(TASK_SEARCH_DDL)
+        cur.execute("""
+            INSERT INTO task_search_grams (task_id, grams)
+            SELECT t.task_id, task_search_make_grams(ARRAY[t.title, t.title_en, t.project_id, t.external_task_id::text])
+            FROM drama_tasks t
+            WHERE NOT EXISTS (SELECT 1 FROM task_search_grams g WHERE g.task_id = t.task_id)
+        """)
+        backfilled = cur.rowcount
+        conn.commit()
+        
+        try:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cur.execute(TASK_SEARCH_TRGM_DDL)
+            conn.commit()
+            _trgm_available = True
+        except Exception as e:
+            conn.rollback()
+            _trgm_available = False
+            logger.warning(f"⚠️ pg_trgm 不可用，任务搜索只使用单字/双字索引: {e}")
+        
+        cur.close()
+        conn.close()
+        logger.info(f"✅ 任务搜索索引已就绪 (pg_trgm: {_trgm_available}, 补齐切分: {backfilled})")
+        return True
+    except Exception as e:
+        logger.error(f"❌ 初始化任务搜索索引失败: {e}")
+        return False
+
+
+def _has_trgm(cur) -> bool:
+    global _trgm_available
+    if _trgm_available is None:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS installed")
+        _trgm_available = cur.fetchone()['installed']
+    return _trgm_available
+
+
+def _like_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _term_grams(term: str) -> List[str]:
+    """关键词的切分：1 个字符时为单字，否则为全部双字（跳过含空白的）"""
+    if len(term) == 1:
+        return [term]
+    grams = {term[i:i + 2] for i in range(len(term) - 1)}
+    return sorted(g for g in grams if not any(ch.isspace() for ch in g))
+
+
+def search_condition(cur, search: str, alias: str = 't') -> Tuple[str, list]:
+    """
+    drama_tasks 的搜索条件（用于 WHERE）
+    
+    Args:
+        cur: 数据库游标（首次调用时用于检查 pg_trgm）
+        search: 关键词
+        alias: drama_tasks 在查询中的别名
+    
+    Returns:
+        tuple: (SQL 片段, 参数列表)，关键词为空时返回 ("TRUE", [])
+    """
+    term = search.strip().lower()
+    if not term:
+        return "TRUE", []
+    
+    pattern = f'%{_like_escape(term)}%'
+    like = (
+        f"({alias}.title ILIKE %s OR {alias}.title_en ILIKE %s "
+        f"OR {alias}.project_id ILIKE %s OR {alias}.external_task_id::text LIKE %s)"
+    )
+    params = [pattern] * 4
+    
+    if len(term) >= 3 and not CJK_PATTERN.search(term) and _has_trgm(cur):
+        # 三元组索引可以直接用于 ILIKE（BitmapOr 合并三个索引）
+        condition = (
+            f"({alias}.title ILIKE %s OR {alias}.title_en ILIKE %s OR {alias}.project_id ILIKE %s)"
+        )
+        params = [pattern] * 3
+    else:
+        grams = _term_grams(term)
+        if grams:
+            condition = (
+                f"({alias}.task_id IN (SELECT task_id FROM task_search_grams WHERE grams @> %s::text[]) AND {like})"
+            )
+            params = [grams] + params
+        else:
+            condition = like
+    
+    if term.isdigit():
+        condition = f"({condition} OR {alias}.task_id = %s OR {alias}.external_task_id = %s)"
+        params += [int(term), int(term)]
+    return condition, params
+
+
+def search_tasks(search: str, limit: int = 10) -> List[dict]:
+    """
+    按相关度排序的任务搜索
+    
+    Returns:
+        list: drama_tasks 行（附加 score 字段），相关度高的在前
+    """
+    term = search.strip()
+    if not term:
+        return []
+    limit = max(1, min(limit, SEARCH_MAX_RESULTS))
+    lowered = term.lower()
+    
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        condition, params = search_condition(cur, term)
+        similarity = (
+            "GREATEST(similarity(t.title, %s), similarity(COALESCE(t.title_en, ''), %s))"
+            if _has_trgm(cur) else "0"
+        )
+        similarity_params = [term, term] if _has_trgm(cur) else []
+        cur.execute(f"""
+            SELECT t.*,
+                   CASE WHEN lower(t.project_id) = %s OR t.external_task_id::text = %s
+                             OR t.task_id::text = %s THEN 3 ELSE 0 END
+                 + CASE WHEN lower(t.title) = %s OR lower(t.title_en) = %s THEN 2
+                        WHEN lower(t.title) LIKE %s OR lower(t.title_en) LIKE %s THEN 1
+                        ELSE 0 END
+                 + {similarity} AS score
+            FROM drama_tasks t
+            WHERE {condition}
+            ORDER BY score DESC, t.created_at DESC
+            LIMIT %s
+        """, [lowered, term, term, lowered, lowered,
+              f'{_like_escape(lowered)}%', f'{_like_escape(lowered)}%']
+             + similarity_params + params + [limit])
+        rows = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()
+    return rows
+
+
+def suggest_tasks(prefix: str, limit: int = 10) -> List[dict]:
+    """
+    搜索框前缀补全：标题 / 英文标题 / project_id 以输入内容开头的任务
+    
+    Returns:
+        list: [{'task_id', 'title', 'project_id', 'match'}]，match 为匹配到的文本
+    """
+    term = prefix.strip().lower()
+    if not term:
+        return []
+    limit = max(1, min(limit, SEARCH_MAX_RESULTS))
+    pattern = f'{_like_escape(term)}%'
+    
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            (SELECT task_id, title, project_id, title AS match FROM drama_tasks
+             WHERE lower(title) LIKE %s ORDER BY lower(title) LIMIT %s)
+            UNION ALL
+            (SELECT task_id, title, project_id, title_en AS match FROM drama_tasks
+             WHERE lower(title_en) LIKE %s ORDER BY lower(title_en) LIMIT %s)
+            UNION ALL
+            (SELECT task_id, title, project_id, project_id AS match FROM drama_tasks
+             WHERE lower(project_id) LIKE %s ORDER BY lower(project_id) LIMIT %s)
+        """, (pattern, limit, pattern, limit, pattern, limit))
+        rows = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()
+    
+    suggestions = []
+    seen = set()
+    for row in rows:
+        if row['match'] in seen:
+            continue
+        seen.add(row['match'])
+        suggestions.append(dict(row))
+        if len(suggestions) >= limit:
+            break
+    return suggestions
+
+
+def is_trgm_available() -> Optional[bool]:
+    """pg_trgm 是否可用（None 表示尚未检查）"""
+    return _trgm_available
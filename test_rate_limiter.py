@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+滑动窗口限流器测试（纯内存，不需要数据库）
+运行: python test_rate_limiter.py 或 pytest test_rate_limiter.py
+"""
+
+from datetime import datetime, timedelta
+
+from rate_limiter import SlidingWindowRateLimiter
+
+USER_ID = 1001
+
+
+def make_limiter(seed_row=None, window_seconds=60, window_limit=1, seed=None, write_back=None):
+    """创建限流器；seed_row 为数据库中的用户状态（默认一个已注册很久、今日未提交的用户）"""
+    if seed_row is None:
+        seed_row = {
+            'created_at': datetime.now() - timedelta(days=30),
+            'last_submission_time': None,
+            'today_count': 0,
+        }
+    written = []
+    limiter = SlidingWindowRateLimiter(
+        seed or (lambda user_id: seed_row),
+        write_back or written.extend,
+        window_seconds=window_seconds,
+        window_limit=window_limit
+    )
+    return limiter, written
+
+
+def test_window_expiry():
+    """窗口内的提交阻塞下一次提交，窗口过去后释放"""
+    limiter, _ = make_limiter()
+    
+    limiter.record(USER_ID, datetime.now() - timedelta(seconds=90))
+    assert limiter.snapshot(USER_ID)['last_submission_time'] is None
+    
+    recent = datetime.now() - timedelta(seconds=10)
+    limiter.record(USER_ID, recent)
+    assert limiter.snapshot(USER_ID)['last_submission_time'] == recent
+    print("✅ 窗口过期")
+
+
+def test_window_limit():
+    """window_limit 次以内不阻塞，达到上限时由最早一次提交决定释放时间"""
+    limiter, _ = make_limiter(window_limit=2)
+    
+    first = datetime.now() - timedelta(seconds=20)
+    limiter.record(USER_ID, first)
+    assert limiter.snapshot(USER_ID)['last_submission_time'] is None
+    
+    limiter.record(USER_ID, datetime.now() - timedelta(seconds=10))
+    assert limiter.snapshot(USER_ID)['last_submission_time'] == first
+    print("✅ 窗口内次数上限")
+
+
+def test_day_rollover():
+    """跨天后每日计数从 0 重新开始"""
+    limiter, _ = make_limiter(seed_row={
+        'created_at': datetime.now() - timedelta(days=30),
+        'last_submission_time': None,
+        'today_count': 5,
+    })
+    
+    limiter.record(USER_ID, datetime.now() - timedelta(days=1))
+    assert limiter.snapshot(USER_ID)['today_count'] == 0
+    
+    limiter.record(USER_ID)
+    assert limiter.snapshot(USER_ID)['today_count'] == 1
+    print("✅ 跨天重置")
+
+
+def test_seed_from_database():
+    """首次访问从数据库加载今日计数和窗口内的最后一次提交；用户不存在返回 None"""
+    last = datetime.now() - timedelta(seconds=30)
+    limiter, _ = make_limiter(seed_row={
+        'created_at': datetime.now() - timedelta(days=1),
+        'last_submission_time': last,
+        'today_count': 7,
+    })
+    snapshot = limiter.snapshot(USER_ID)
+    assert snapshot['today_count'] == 7
+    assert snapshot['last_submission_time'] == last
+    assert limiter.is_cached(USER_ID)
+    
+    missing, _ = make_limiter(seed=lambda user_id: None)
+    assert missing.snapshot(USER_ID) is None
+    print("✅ 从数据库加载")
+
+
+def test_record_during_seed_is_kept():
+    """加载期间（锁外）其他线程记录的提交不会被加载结果覆盖"""
+    calls = []
+    limiter = None
+    
+    def seed(user_id):
+        calls.append(user_id)
+        if len(calls) == 1:
+            # 模拟加载数据库期间另一个线程记录了一次提交
+            limiter.record(user_id)
+        return {
+            'created_at': datetime.now() - timedelta(days=30),
+            'last_submission_time': None,
+            'today_count': 0,
+        }
+    
+    limiter, _ = make_limiter(seed=seed)
+    snapshot = limiter.snapshot(USER_ID)
+    assert snapshot['today_count'] == 1
+    assert snapshot['last_submission_time'] is not None
+    print("✅ 加载与记录并发")
+
+
+def test_flush_and_retry():
+    """写回后清除脏标记；写回失败时下一轮重试"""
+    limiter, written = make_limiter()
+    limiter.record(USER_ID)
+    assert limiter.flush() == 1
+    assert written[0][0] == USER_ID and written[0][3] == 1
+    assert limiter.flush() == 0
+    
+    failures = []
+    
+    def failing_write_back(rows):
+        failures.append(rows)
+        raise RuntimeError("数据库不可用")
+    
+    limiter, _ = make_limiter(write_back=failing_write_back)
+    limiter.record(USER_ID)
+    assert limiter.flush() == 0
+    assert limiter.flush() == 0
+    assert len(failures) == 2
+    assert limiter.get_stats()['flush_errors'] == 2
+    print("✅ 写回与失败重试")
+
+
+if __name__ == "__main__":
+    test_window_expiry()
+    test_window_limit()
+    test_day_rollover()
+    test_seed_from_database()
+    test_record_during_seed_is_kept()
+    test_flush_and_retry()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频链接规范化 / 视频归属登记测试（不访问网络和数据库）
+运行: python test_video_identity.py 或 pytest test_video_identity.py
+"""
+
+from video_identity import parse_video_url, is_short_link, short_link_key, claim_video, VIDEO_ID_MAX_LENGTH
+
+
+def test_parse_youtube():
+    """youtu.be / watch?v= / shorts / embed 解析成同一个视频ID"""
+    video_id = 'dQw4w9WgXcQ'
+    for url in (
+        f'https://youtu.be/{video_id}?si=abc',
+        f'https://www.youtube.com/watch?v={video_id}&feature=share',
+        f'https://m.youtube.com/watch?v={video_id}',
+        f'https://youtube.com/shorts/{video_id}',
+        f'https://www.youtube.com/embed/{video_id}',
+    ):
+        assert parse_video_url(url) == ('youtube', video_id), url
+    
+    # 视频ID不是 11 位时不识别（youtu.be 与 watch?v= 同样校验）
+    assert parse_video_url('https://youtu.be/' + 'a' * 80) == ('youtube', None)
+    assert parse_video_url('https://youtu.be/') == ('youtube', None)
+    assert parse_video_url('https://www.youtube.com/watch?v=short') == ('youtube', None)
+    print("✅ YouTube 链接解析")
+
+
+def test_parse_other_platforms():
+    """其他平台按路径 / 参数解析，不支持的域名返回 (None, None)"""
+    assert parse_video_url('https://www.tiktok.com/@user/video/7579119977337294093?is_from_webapp=1') == \
+        ('tiktok', '7579119977337294093')
+    assert parse_video_url('https://www.douyin.com/discover?modal_id=7300000000000000000') == \
+        ('douyin', '7300000000000000000')
+    assert parse_video_url('https://www.instagram.com/reel/Cabc123_-/') == ('instagram', 'Cabc123_-')
+    assert parse_video_url('https://x.com/user/status/1234567890') == ('twitter', '1234567890')
+    assert parse_video_url('https://www.facebook.com/watch/?v=987654321') == ('facebook', '987654321')
+    assert parse_video_url('https://example.com/video/123') == (None, None)
+    assert parse_video_url('') == (None, None)
+    
+    # 超出列宽的视频ID不写库
+    assert parse_video_url('https://www.instagram.com/p/' + 'b' * (VIDEO_ID_MAX_LENGTH + 1)) == ('instagram', None)
+    print("✅ 其他平台链接解析")
+
+
+def test_short_links():
+    """短链接识别平台但没有视频ID，需要跟随跳转；缓存键保留路径大小写"""
+    for url in ('https://vm.tiktok.com/ZMabc123/', 'https://www.tiktok.com/t/ZTabc123/', 'https://v.douyin.com/iAbC/'):
+        assert is_short_link(url), url
+        platform, video_id = parse_video_url(url)
+        assert platform is not None and video_id is None, url
+    
+    assert not is_short_link('https://www.tiktok.com/@user/video/7579119977337294093')
+    assert short_link_key('HTTPS://VM.TikTok.com/ZMabc123/?x=1') == 'vm.tiktok.com/ZMabc123'
+    print("✅ 短链接识别")
+
+
+class FakeCursor:
+    """模拟 video_submissions 表上的 DELETE / INSERT ... ON CONFLICT DO NOTHING / SELECT"""
+    
+    def __init__(self, rows=None):
+        self.rows = dict(rows or {})  # (platform, video_id) -> {'user_task_id', 'user_id', 'task_id'}
+        self._result = None
+    
+    def execute(self, sql, params):
+        sql = ' '.join(sql.split())
+        if sql.startswith('DELETE'):
+            user_task_id, platform, video_id = params
+            for key, row in list(self.rows.items()):
+                if row['user_task_id'] == user_task_id and key != (platform, video_id):
+                    del self.rows[key]
+            self._result = None
+        elif sql.startswith('INSERT'):
+            platform, video_id, user_task_id, user_id, task_id = params
+            if (platform, video_id) in self.rows:
+                self._result = None
+            else:
+                self.rows[(platform, video_id)] = {'user_task_id': user_task_id, 'user_id': user_id, 'task_id': task_id}
+                self._result = {'user_task_id': user_task_id}
+        else:
+            self._result = self.rows.get(tuple(params))
+    
+    def fetchone(self):
+        return self._result
+
+
+def test_claim_video():
+    """未被占用时登记成功；同一任务记录重复登记视为成功；其他记录占用时返回占用者"""
+    cur = FakeCursor()
+    assert claim_video(cur, 1, 100, 10, 'youtube', 'dQw4w9WgXcQ') is None
+    assert cur.rows[('youtube', 'dQw4w9WgXcQ')]['user_task_id'] == 1
+    
+    # 同一任务记录再次提交同一视频（重试提交）
+    assert claim_video(cur, 1, 100, 10, 'youtube', 'dQw4w9WgXcQ') is None
+    
+    # 其他用户提交同一视频
+    owner = claim_video(cur, 2, 200, 20, 'youtube', 'dQw4w9WgXcQ')
+    assert owner == {'user_task_id': 1, 'user_id': 100, 'task_id': 10}
+    
+    # 同一任务记录改交其他视频时释放旧视频
+    assert claim_video(cur, 1, 100, 10, 'youtube', 'aaaaaaaaaaa') is None
+    assert ('youtube', 'dQw4w9WgXcQ') not in cur.rows
+    assert claim_video(cur, 2, 200, 20, 'youtube', 'dQw4w9WgXcQ') is None
+    print("✅ 视频归属登记")
+
+
+if __name__ == "__main__":
+    test_parse_youtube()
+    test_parse_other_platforms()
+    test_short_links()
+    test_claim_video()
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+翻译记忆库
+按 (原文哈希, 目标语言, 上下文) 持久化保存译文，进程内 LRU 缓存在前，
+同一原文在所有任务、所有进程间只需要翻译一次
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from psycopg2.extras import execute_values
+
+import db_pool
+
+logger = logging.getLogger(__name__)
+
+# 数据库连接
+DATABASE_URL = db_pool.DATABASE_URL
+
+TRANSLATION_MEMORY_LRU_SIZE = int(os.getenv('TRANSLATION_MEMORY_LRU_SIZE', '20000'))
+
+# (source_hash, target_lang, context) -> 译文
+_lru = OrderedDict()
+_lock = threading.Lock()
+
+_memory_metrics = {
+    'lru_hits': 0,
+    'db_hits': 0,
+    'misses': 0,
+    'stored': 0,
+    'segment_reuse': 0,
+    'db_errors': 0,
+}
+
+
+def get_db_connection():
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
+
+
+def ensure_translation_memory_table():
+    """确保 translation_memory 表存在"""
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS translation_memory (
+                source_hash CHAR(64) NOT NULL,
+                target_lang VARCHAR(10) NOT NULL,
+                context VARCHAR(100) NOT NULL,
+                source_text TEXT NOT NULL,
+                translated_text TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                last_used_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (source_hash, target_lang, context)
+            )
+        """)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error(f"❌ 初始化翻译记忆库失败: {e}")
+        return False
+
+
+def source_hash(text: str) -> str:
+    """原文内容哈希（忽略首尾空白）"""
+    return hashlib.sha256(text.strip().encode('utf-8')).hexdigest()
+
+
+def _lru_put(key, value):
+    _lru[key] = value
+    _lru.move_to_end(key)
+    while len(_lru) > TRANSLATION_MEMORY_LRU_SIZE:
+        _lru.popitem(last=False)
+
+
+def lookup(texts, target_lang: str, context: str) -> dict:
+    """
+    查询已有译文：先查进程内 LRU，未命中的一次性查数据库
+    
+    Returns:
+        dict: {原文: 译文}，没有译文的原文不在结果中
+    """
+    found = {}
+    misses = {}
+    
+    with _lock:
+        for text in texts:
+            digest = source_hash(text)
+            key = (digest, target_lang, context)
+            if key in _lru:
+                _lru.move_to_end(key)
+                found[text] = _lru[key]
+            else:
+                misses[digest] = text
+        _memory_metrics['lru_hits'] += len(found)
+    
+    if not misses:
+        return found
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            UPDATE translation_memory
+            SET hits = hits + 1, last_used_at = CURRENT_TIMESTAMP
+            WHERE source_hash = ANY(%s) AND target_lang = %s AND context = %s
+            RETURNING source_hash, translated_text
+        """, (list(misses.keys()), target_lang, context))
+        rows = cur.fetchall()
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        # 记忆库不可用时按未命中处理，不影响翻译
+        logger.warning(f"⚠️ 查询翻译记忆库失败: {e}")
+        rows = []
+        with _lock:
+            _memory_metrics['db_errors'] += 1
+    
+    with _lock:
+        for row in rows:
+            text = misses[row['source_hash']]
+            found[text] = row['translated_text']
+            _lru_put((row['source_hash'], target_lang, context), row['translated_text'])
+        _memory_metrics['db_hits'] += len(rows)
+        _memory_metrics['misses'] += len(misses) - len(rows)
+    
+    return found
+
+
+def store(translations: dict, target_lang: str, context: str):
+    """
+    保存新译文
+    
+    Args:
+        translations: {原文: 译文}
+    """
+    if not translations:
+        return
+    
+    rows = {}
+    with _lock:
+        for text, translated in translations.items():
+            digest = source_hash(text)
+            rows[digest] = (digest, target_lang, context, text.strip(), translated)
+            _lru_put((digest, target_lang, context), translated)
+        _memory_metrics['stored'] += len(rows)
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        execute_values(cur, """
+            INSERT INTO translation_memory (source_hash, target_lang, context, source_text, translated_text)
+            VALUES %s
+            ON CONFLICT (source_hash, target_lang, context) DO UPDATE
+            SET translated_text = EXCLUDED.translated_text, last_used_at = CURRENT_TIMESTAMP
+        """, list(rows.values()))
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        logger.warning(f"⚠️ 保存翻译记忆库失败: {e}")
+        with _lock:
+            _memory_metrics['db_errors'] += 1
+
+
+def record_segment_reuse(count: int):
+    """记录通过片段（剧名）复用组装出的译文条数"""
+    with _lock:
+        _memory_metrics['segment_reuse'] += count
+
+
+def get_translation_memory_stats() -> dict:
+    """翻译记忆库命中率统计（用于监控）"""
+    with _lock:
+        stats = dict(_memory_metrics)
+        stats['lru_size'] = len(_lru)
+    lookups = stats['lru_hits'] + stats['db_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['lru_hits'] + stats['db_hits']) / lookups, 3) if lookups else None
+    return stats
@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+"""
+任务预翻译队列
+任务入库（/api/x2c/tasks、/api/tasks）时加入翻译队列，由 API 服务器的后台线程
+批量调用模型，把标题和描述翻译成 i18n.SUPPORTED_LANGUAGES 中的所有语言，
+结果写入 drama_tasks.translations（JSONB，键为 "{字段}_{语言}"，如 title_ja）。
+
+Bot 的 handler 只读取预翻译结果，缺失时返回原文并把任务重新加入队列，不会阻塞在模型调用上
+"""
+
+import os
+import time
+import json
+import hashlib
+import logging
+import threading
+
+from psycopg2.extras import execute_values
+
+import db_pool
+import translation_memory
+from i18n import SUPPORTED_LANGUAGES
+
+logger = logging.getLogger(__name__)
+
+# 数据库连接
+DATABASE_URL = db_pool.DATABASE_URL
+
+# 任务原文语言，其余支持的语言都需要翻译
+SOURCE_LANGUAGE = 'zh-CN'
+TARGET_LANGUAGES = [lang for lang in SUPPORTED_LANGUAGES if lang != SOURCE_LANGUAGE]
+
+# 需要翻译的字段 -> 翻译上下文
+TRANSLATABLE_FIELDS = {
+    'title': 'drama title',
+    'description': 'drama description',
+}
+
+TRANSLATION_JOB_BATCH = int(os.getenv('TRANSLATION_JOB_BATCH', '50'))  # 每轮领取的任务数
+TRANSLATION_TITLE_BATCH = int(os.getenv('TRANSLATION_TITLE_BATCH', '40'))  # 每次模型调用的标题条数
+TRANSLATION_DESCRIPTION_BATCH = int(os.getenv('TRANSLATION_DESCRIPTION_BATCH', '10'))  # 每次模型调用的描述条数
+TRANSLATION_LEASE_SECONDS = int(os.getenv('TRANSLATION_LEASE_SECONDS', '300'))  # 领取后的租约时间
+TRANSLATION_POLL_SECONDS = int(os.getenv('TRANSLATION_POLL_SECONDS', '30'))  # 队列为空时的轮询间隔
+TRANSLATION_MAX_ATTEMPTS = int(os.getenv('TRANSLATION_MAX_ATTEMPTS', '5'))
+
+# 后台线程状态
+_worker_thread = None
+_worker_running = False
+_wake_event = threading.Event()
+
+# 本进程已请求过补翻译的任务，避免每次渲染都写一次队列
+_requested_task_ids = set()
+_REQUESTED_MAX = 10000
+
+_metrics_lock = threading.Lock()
+_translation_metrics = {
+    'jobs_completed': 0,
+    'jobs_failed': 0,
+    'texts_translated': 0,
+    'texts_deduped': 0,
+    'last_batch_at': None,
+    'last_batch_duration': None,
+}
+
+
+def get_db_connection():
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
+
+
+def ensure_translation_tables():
+    """确保 drama_tasks.translations 字段、translation_jobs 队列表和翻译记忆库存在"""
+    translation_memory.ensure_translation_memory_table()
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("ALTER TABLE drama_tasks ADD COLUMN IF NOT EXISTS translations JSONB NOT NULL DEFAULT '{}'::jsonb")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS translation_jobs (
+                task_id INTEGER PRIMARY KEY REFERENCES drama_tasks(task_id) ON DELETE CASCADE,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                enqueued_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_translation_jobs_next_attempt
+            ON translation_jobs (next_attempt_at)
+        """)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        return True
+    except Exception as e:
+        logger.error(f"❌ 初始化翻译队列表失败: {e}")
+        return False
+
+
+# ============================================================
+# 入队
+# ============================================================
+
+def enqueue_translation(task_ids, cur=None):
+    """
+    把任务加入翻译队列
+    
+    Args:
+        task_ids: 任务ID列表
+        cur: 可选，传入时在调用方的事务中入队（随任务一起提交），提交后调用 wake_translation_worker()
+    """
+    task_ids = [task_id for task_id in task_ids if task_id]
+    if not task_ids:
+        return
+    
+    sql = """
+        INSERT INTO translation_jobs (task_id)
+        VALUES %s
+        ON CONFLICT (task_id) DO UPDATE
+        SET attempts = 0, last_error = NULL, next_attempt_at = CURRENT_TIMESTAMP
+    """
+    rows = [(task_id,) for task_id in task_ids]
+    
+    if cur is not None:
+        execute_values(cur, sql, rows)
+        return
+    
+    conn = get_db_connection()
+    try:
+        own_cur = conn.cursor()
+        execute_values(own_cur, sql, rows)
+        conn.commit()
+        own_cur.close()
+    finally:
+        conn.close()
+    
+    wake_translation_worker()
+
+
+def wake_translation_worker():
+    """唤醒同进程的后台翻译线程，立即处理新入队的任务"""
+    _wake_event.set()
+
+
+def enqueue_missing_translations() -> int:
+    """把缺少任一语言译文的活跃任务加入队列（启动时补齐历史任务）"""
+    keys = [f"{field}_{lang}" for field in TRANSLATABLE_FIELDS for lang in TARGET_LANGUAGES]
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute("""
+        INSERT INTO translation_jobs (task_id)
+        SELECT task_id FROM drama_tasks
+        WHERE status = 'active'
+          AND title IS NOT NULL
+          AND NOT (translations ?& %s)
+        ON CONFLICT (task_id) DO NOTHING
+    """, (keys,))
+    count = cur.rowcount
+    
+    conn.commit()
+    cur.close()
+    conn.close()
+    
+    if count:
+        logger.info(f"🌐 已将 {count} 个缺少译文的任务加入翻译队列")
+        wake_translation_worker()
+    return count
+
+
+def request_translation(task_id):
+    """渲染时发现缺少译文：加入队列（每个任务在本进程内只请求一次）"""
+    if not task_id or task_id in _requested_task_ids:
+        return
+    if len(_requested_task_ids) >= _REQUESTED_MAX:
+        _requested_task_ids.clear()
+    _requested_task_ids.add(task_id)
+    
+    try:
+        enqueue_translation([task_id])
+    except Exception as e:
+        logger.error(f"❌ 任务 {task_id} 加入翻译队列失败: {e}")
+
+
+# ============================================================
+# 读取
+# ============================================================
+
+def get_translated_text(task, field, lang):
+    """
+    读取预翻译结果
+    
+    Returns:
+        译文；原文语言返回原文；尚未翻译返回 None
+    """
+    if lang == SOURCE_LANGUAGE or lang not in SUPPORTED_LANGUAGES:
+        return task.get(field)
+    
+    translations = task.get('translations') or {}
+    if isinstance(translations, str):
+        translations = json.loads(translations)
+    
+    text = translations.get(f"{field}_{lang}")
+    if not text and lang == 'en':
+        # 兼容旧的 title_en / description_en 字段
+        text = task.get(f"{field}_en")
+    return text or None
+
+
+# ============================================================
+# 后台翻译
+# ============================================================
+
+def _content_hash(text: str, context: str) -> str:
+    return hashlib.sha256(f"{context}\n{text}".encode('utf-8')).hexdigest()
+
+
+def _claim_translation_jobs(limit: int) -> list:
+    """领取到期的翻译任务（带租约，进程崩溃后自动重新可领取）"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    cur.execute("""
+        WITH next AS (
+            SELECT task_id FROM translation_jobs
+            WHERE next_attempt_at <= CURRENT_TIMESTAMP
+              AND attempts < %s
+            ORDER BY next_attempt_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE translation_jobs j
+        SET next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second',
+            attempts = j.attempts + 1
+        FROM next, drama_tasks dt
+        WHERE j.task_id = next.task_id AND dt.task_id = j.task_id
+        RETURNING dt.task_id, dt.title, dt.description, dt.title_en, dt.description_en, dt.translations
+    """, (TRANSLATION_MAX_ATTEMPTS, limit, TRANSLATION_LEASE_SECONDS))
+    jobs = cur.fetchall()
+    
+    conn.commit()
+    cur.close()
+    conn.close()
+    return jobs
+
+
+def _translate_unique(pending: dict, lang: str, field: str) -> dict:
+    """
+    按批次翻译去重后的文本（经过翻译记忆库，只有未命中的原文才调用模型）
+    
+    Args:
+        pending: {content_hash: text}
+    
+    Returns:
+        dict: {content_hash: 译文}，失败的条目不在结果中
+    """
+    from translator import translate_cached
+    
+    context = TRANSLATABLE_FIELDS[field]
+    batch_size = TRANSLATION_TITLE_BATCH if field == 'title' else TRANSLATION_DESCRIPTION_BATCH
+    items = list(pending.items())
+    translated = translate_cached([text for _, text in items], lang, context=context, batch_size=batch_size)
+    return {digest: text for (digest, _), text in zip(items, translated) if text}
+
+
+def _save_translations(updates: dict):
+    """把译文合并写入 drama_tasks.translations，并同步旧的英文字段"""
+    if not updates:
+        return
+    
+    rows = [
+        (task_id, json.dumps(values, ensure_ascii=False), values.get('title_en'), values.get('description_en'))
+        for task_id, values in updates.items()
+    ]
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    execute_values(cur, """
+        UPDATE drama_tasks dt
+        SET translations = dt.translations || v.translations::jsonb,
+            title_en = COALESCE(v.title_en, dt.title_en),
+            description_en = COALESCE(v.description_en, dt.description_en)
+        FROM (VALUES %s) AS v(task_id, translations, title_en, description_en)
+        WHERE dt.task_id = v.task_id
+    """, rows)
+    
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def _finish_jobs(done: list, failed: dict):
+    """删除已完成的任务；未完成的按尝试次数退避重试"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    if done:
+        cur.execute("DELETE FROM translation_jobs WHERE task_id = ANY(%s)", (done,))
+    if failed:
+        execute_values(cur, """
+            UPDATE translation_jobs j
+            SET last_error = v.error,
+                next_attempt_at = CURRENT_TIMESTAMP + POWER(2, j.attempts) * INTERVAL '1 minute'
+            FROM (VALUES %s) AS v(task_id, error)
+            WHERE j.task_id = v.task_id
+        """, list(failed.items()))
+    
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def process_translation_batch() -> int:
+    """
+    处理一批翻译任务
+    
+    同一轮内相同的原文（按内容哈希）只翻译一次，每种语言、每个字段按批次调用模型
+    
+    Returns:
+        int: 本轮处理的任务数
+    """
+    jobs = _claim_translation_jobs(TRANSLATION_JOB_BATCH)
+    if not jobs:
+        return 0
+    
+    started = time.monotonic()
+    
+    # (field, lang) -> {content_hash: text}；任务 -> 需要的 (field, lang, content_hash)
+    pending = {}
+    needed = {}
+    total_texts = 0
+    for job in jobs:
+        existing = job['translations'] or {}
+        needed[job['task_id']] = []
+        for field, context in TRANSLATABLE_FIELDS.items():
+            text = (job.get(field) or '').strip()
+            if not text:
+                continue
+            digest = _content_hash(text, context)
+            for lang in TARGET_LANGUAGES:
+                # 已有译文（包括任务入库时自带的 title_en / description_en）不再翻译
+                if existing.get(f"{field}_{lang}") or (lang == 'en' and job.get(f"{field}_en")):
+                    continue
+                pending.setdefault((field, lang), {})[digest] = text
+                needed[job['task_id']].append((field, lang, digest))
+                total_texts += 1
+    
+    translated = {}
+    for (field, lang), texts in pending.items():
+        translated[(field, lang)] = _translate_unique(texts, lang, field)
+    
+    updates = {}
+    done = []
+    failed = {}
+    for task_id, items in needed.items():
+        missing = 0
+        for field, lang, digest in items:
+            text = translated[(field, lang)].get(digest)
+            if text:
+                updates.setdefault(task_id, {})[f"{field}_{lang}"] = text
+            else:
+                missing += 1
+        if missing:
+            failed[task_id] = f'{missing} 条译文失败'
+        else:
+            done.append(task_id)
+    
+    _save_translations(updates)
+    _finish_jobs(done, failed)
+    
+    unique_texts = sum(len(texts) for texts in pending.values())
+    duration = time.monotonic() - started
+    with _metrics_lock:
+        _translation_metrics['jobs_completed'] += len(done)
+        _translation_metrics['jobs_failed'] += len(failed)
+        _translation_metrics['texts_translated'] += unique_texts
+        _translation_metrics['texts_deduped'] += total_texts - unique_texts
+        _translation_metrics['last_batch_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        _translation_metrics['last_batch_duration'] = round(duration, 3)
+    
+    logger.info(
+        f"🌐 翻译完成: 任务 {len(jobs)} 个（成功 {len(done)}，待重试 {len(failed)}），"
+        f"译文 {unique_texts} 条（去重 {total_texts - unique_texts} 条），耗时 {duration:.1f}s"
+    )
+    return len(jobs)
+
+
+def start_translation_worker():
+    """启动后台翻译线程（在 API 服务器进程中运行）"""
+    global _worker_thread, _worker_running
+    
+    if _worker_running:
+        logger.warning("⚠️ 翻译线程已在运行中")
+        return False
+    
+    _worker_running = True
+    
+    def worker_loop():
+        while _worker_running:
+            try:
+                processed = process_translation_batch()
+            except Exception as e:
+                logger.error(f"❌ 翻译任务执行失败: {e}")
+                processed = 0
+            
+            # 队列还有任务时继续处理，否则等待入队唤醒或定时轮询
+            if not processed:
+                _wake_event.wait(TRANSLATION_POLL_SECONDS)
+                _wake_event.clear()
+    
+    _worker_thread = threading.Thread(target=worker_loop, name='translation-worker', daemon=True)
+    _worker_thread.start()
+    logger.info(f"✅ 翻译线程已启动，目标语言: {', '.join(TARGET_LANGUAGES)}")
+    return True
+
+
+def stop_translation_worker():
+    """停止后台翻译线程"""
+    global _worker_running
+    _worker_running = False
+    _wake_event.set()
+    logger.info("⏹️ 翻译线程已停止")
+    return True
+
+
+def get_translation_status() -> dict:
+    """翻译队列状态（用于监控）"""
+    with _metrics_lock:
+        status = {
+            'running': _worker_running,
+            'target_languages': TARGET_LANGUAGES,
+            **_translation_metrics,
+        }
+    status['memory'] = translation_memory.get_translation_memory_stats()
+    
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute("""
+            SELECT
+                COUNT(*) FILTER (WHERE attempts < %s) as pending,
+                COUNT(*) FILTER (WHERE attempts >= %s) as exhausted
+            FROM translation_jobs
+        """, (TRANSLATION_MAX_ATTEMPTS, TRANSLATION_MAX_ATTEMPTS))
+        queue = cur.fetchone()
+        
+        cur.close()
+        conn.close()
+        
+        status['pending'] = queue['pending']
+        status['exhausted'] = queue['exhausted']
+    except Exception as e:
+        status['error'] = str(e)
+    return status
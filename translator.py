@@ -1,13 +1,17 @@
 # -*- coding: utf-8 -*-
 """
 自动翻译模块
-使用 Gemini API 将中文内容翻译成英文
+使用 Gemini API 将中文内容翻译成英文及其他支持的语言
 """
 
 import os
+import re
+import json
 import logging
 import google.generativeai as genai
 
+import translation_memory
+
 logger = logging.getLogger(__name__)
 
 # 配置 Gemini API
@@ -17,6 +21,31 @@ genai.configure(api_key=GEMINI_API_KEY)
 # 创建模型实例
 model = genai.GenerativeModel('gemini-2.0-flash-exp')
 
+# 语言代码 -> 提示词中的语言名称（与 i18n.SUPPORTED_LANGUAGES 对应）
+LANGUAGE_NAMES = {
+    'zh-CN': 'Simplified Chinese',
+    'zh-TW': 'Traditional Chinese',
+    'en': 'English',
+    'ja': 'Japanese',
+    'ko': 'Korean',
+    'es': 'Spanish',
+}
+
+# 翻译上下文（同时是翻译记忆库的 context 键）
+TITLE_CONTEXT = "drama title"
+SERIES_NAME_CONTEXT = "drama series name"
+TITLE_TEMPLATE_CONTEXT = "drama title; keep placeholders like [[S0]] unchanged"
+
+# 标题中的《剧名》片段，及组装译文时剧名的书写格式
+SERIES_NAME_PATTERN = re.compile(r'《([^《》]+)》')
+SEGMENT_PLACEHOLDER_PATTERN = re.compile(r'\[\[S\d+\]\]')
+SERIES_NAME_FORMATS = {
+    'zh-CN': '《{}》',
+    'zh-TW': '《{}》',
+    'ja': '『{}』',
+    'ko': '《{}》',
+}
+
 def translate_to_english(text, context="drama task"):
     """
     将中文文本翻译成英文
@@ -28,14 +57,36 @@ def translate_to_english(text, context="drama task"):
     Returns:
         翻译后的英文文本，如果翻译失败则返回原文
     """
+    return translate_text(text, 'en', context)
+
+
+def translate_text(text, target_lang='en', context="drama task"):
+    """
+    将中文文本翻译成目标语言
+    
+    Args:
+        text: 要翻译的中文文本
+        target_lang: 目标语言代码（见 LANGUAGE_NAMES）
+        context: 上下文信息，帮助提高翻译质量
+    
+    Returns:
+        翻译后的文本，如果翻译失败则返回原文
+    """
     if not text or not text.strip():
         return text
     
+    # 优先使用翻译记忆库
+    cached = translation_memory.lookup([text.strip()], target_lang, context)
+    if cached:
+        return cached[text.strip()]
+    
+    language = LANGUAGE_NAMES.get(target_lang, target_lang)
+    
     try:
-        logger.info(f"🌐 Translating text: {text[:50]}...")
+        logger.info(f"🌐 Translating text ({target_lang}): {text[:50]}...")
         
         # 构建翻译提示
-        prompt = f"""Translate the following Chinese text to English. 
+        prompt = f"""Translate the following Chinese text to {language}. 
 Context: {context}
 Keep the translation natural, concise, and professional.
 Only return the translated text, no explanations.
@@ -43,7 +94,7 @@ Only return the translated text, no explanations.
 Chinese text:
 {text}
 
-English translation:"""
+{language} translation:"""
         
         # 调用 Gemini API
         response = model.generate_content(
@@ -57,6 +108,7 @@ English translation:"""
         if response and response.text:
             translated = response.text.strip()
             logger.info(f"✅ Translation successful: {translated[:50]}...")
+            translation_memory.store({text: translated}, target_lang, context)
             return translated
         else:
             logger.error(f"❌ API returned empty response")
@@ -67,6 +119,133 @@ English translation:"""
         return text  # 翻译失败时返回原文
 
 
+def translate_batch(texts, target_lang, context="drama title"):
+    """
+    一次模型调用翻译多条文本
+    
+    Args:
+        texts: 要翻译的中文文本列表
+        target_lang: 目标语言代码（见 LANGUAGE_NAMES）
+        context: 上下文信息
+    
+    Returns:
+        与 texts 一一对应的译文列表；翻译失败的条目为 None（不回退原文，便于调用方重试）
+    """
+    if not texts:
+        return []
+    
+    language = LANGUAGE_NAMES.get(target_lang, target_lang)
+    
+    try:
+        logger.info(f"🌐 Translating batch ({target_lang}, {context}): {len(texts)} items")
+        
+        prompt = f"""Translate each Chinese string in the following JSON array to {language}.
+Context: {context}
+Keep the translations natural, concise, and professional.
+Return only a JSON array of strings with exactly {len(texts)} items, in the same order.
+
+{json.dumps(texts, ensure_ascii=False)}"""
+        
+        response = model.generate_content(
+            prompt,
+            generation_config=genai.types.GenerationConfig(
+                temperature=0.3,
+                max_output_tokens=8192,
+                response_mime_type='application/json',
+            )
+        )
+        
+        translated = json.loads(response.text) if response and response.text else None
+        if not isinstance(translated, list) or len(translated) != len(texts):
+            logger.error(f"❌ Batch translation returned {len(translated) if isinstance(translated, list) else 'invalid'} items, expected {len(texts)}")
+            return [None] * len(texts)
+        
+        return [item.strip() if isinstance(item, str) and item.strip() else None for item in translated]
+    
+    except Exception as e:
+        logger.error(f"❌ Batch translation failed: {e}")
+        return [None] * len(texts)
+
+
+def translate_cached(texts, target_lang, context="drama title", batch_size=40):
+    """
+    带翻译记忆库的批量翻译
+    
+    先查记忆库（进程内 LRU + translation_memory 表），标题中的《剧名》片段单独翻译并复用，
+    剩余未命中的原文按 batch_size 分批调用模型，新译文写回记忆库
+    
+    Returns:
+        与 texts 一一对应的译文列表；空文本原样返回，翻译失败的条目为 None
+    """
+    unique = list(dict.fromkeys(text.strip() for text in texts if text and text.strip()))
+    found = translation_memory.lookup(unique, target_lang, context) if unique else {}
+    misses = [text for text in unique if text not in found]
+    
+    if misses and context == TITLE_CONTEXT:
+        found.update(_translate_titles_by_segment(misses, target_lang))
+        misses = [text for text in misses if text not in found]
+    
+    for i in range(0, len(misses), batch_size):
+        chunk = misses[i:i + batch_size]
+        translated = {src: dst for src, dst in zip(chunk, translate_batch(chunk, target_lang, context)) if dst}
+        translation_memory.store(translated, target_lang, context)
+        found.update(translated)
+    
+    return [found.get(text.strip()) if text and text.strip() else text for text in texts]
+
+
+def _translate_titles_by_segment(titles, target_lang):
+    """
+    按《剧名》片段组装标题译文
+    
+    同一部剧的各集标题（如「《剧名》第12集」）共用剧名译文，剧名每种语言只翻译一次，
+    去掉剧名后的模板（「[[S0]]第12集」）也走记忆库
+    
+    Returns:
+        dict: {标题: 译文}，无法按片段组装的标题不在结果中
+    """
+    templates = {}
+    for title in titles:
+        names = SERIES_NAME_PATTERN.findall(title)
+        if not names:
+            continue
+        template = title
+        for i, name in enumerate(names):
+            template = template.replace(f'《{name}》', f'[[S{i}]]', 1)
+        templates[title] = (template, names)
+    
+    if not templates:
+        return {}
+    
+    names = list(dict.fromkeys(name for _, title_names in templates.values() for name in title_names))
+    name_translations = dict(zip(names, translate_cached(names, target_lang, SERIES_NAME_CONTEXT)))
+    
+    # 只剩占位符的模板（标题就是剧名）不需要翻译
+    to_translate = list(dict.fromkeys(
+        template for template, _ in templates.values()
+        if SEGMENT_PLACEHOLDER_PATTERN.sub('', template).strip()
+    ))
+    template_translations = dict(zip(to_translate, translate_cached(to_translate, target_lang, TITLE_TEMPLATE_CONTEXT)))
+    
+    name_format = SERIES_NAME_FORMATS.get(target_lang, '"{}"')
+    results = {}
+    for title, (template, title_names) in templates.items():
+        translated = template_translations.get(template, template)
+        if not translated or any(not name_translations.get(name) for name in title_names):
+            continue
+        # 模型丢了占位符时放弃组装，整条标题交给模型翻译
+        if any(f'[[S{i}]]' not in translated for i in range(len(title_names))):
+            continue
+        for i, name in enumerate(title_names):
+            translated = translated.replace(f'[[S{i}]]', name_format.format(name_translations[name]))
+        results[title] = translated.strip()
+    
+    if results:
+        translation_memory.store(results, target_lang, TITLE_CONTEXT)
+        translation_memory.record_segment_reuse(len(results))
+    return results
+
+
 def translate_task_content(title, description):
     """
     翻译任务标题和描述
@@ -6,17 +6,157 @@
 """
 
 import os
-import re
+import asyncio
 import logging
+import threading
+import weakref
 import aiohttp
-from typing import Optional, Dict
-from urllib.parse import quote, urlparse, parse_qs
+import http_client
+import oembed_store
+from video_identity import parse_video_url, resolve_video_identity
+from datetime import datetime
+from typing import Optional, Dict, List
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 logger = logging.getLogger(__name__)
 
 
+# ============================================================
+# YouTube 批量查询（videos.list 每次最多 50 个 ID，1 个配额单位）
+# ============================================================
+
+YOUTUBE_BATCH_SIZE = 50
+YOUTUBE_BATCH_WINDOW = float(os.getenv('YOUTUBE_BATCH_WINDOW', '0.05'))  # 攒批等待时间（秒）
+YOUTUBE_DAILY_QUOTA = int(os.getenv('YOUTUBE_DAILY_QUOTA', '10000'))  # 每日配额上限（单位）
+
+# 配额统计（按 UTC 日期重置，多个事件循环/线程共用）
+_youtube_quota_lock = threading.Lock()
+_youtube_quota = {
+    'date': None,
+    'units_used': 0,
+    'requests': 0,
+    'videos_requested': 0,
+    'rejected': 0,
+}
+
+# googleapiclient 的 HTTP 对象不是线程安全的，每个工作线程单独构建客户端
+_youtube_clients = threading.local()
+
+
+def _reserve_youtube_quota(units: int, videos: int) -> bool:
+    """预占配额，超出每日上限返回 False"""
+    with _youtube_quota_lock:
+        today = datetime.utcnow().date().isoformat()
+        if _youtube_quota['date'] != today:
+            _youtube_quota.update(date=today, units_used=0, requests=0, videos_requested=0, rejected=0)
+        if _youtube_quota['units_used'] + units > YOUTUBE_DAILY_QUOTA:
+            _youtube_quota['rejected'] += videos
+            return False
+        _youtube_quota['units_used'] += units
+        _youtube_quota['requests'] += 1
+        _youtube_quota['videos_requested'] += videos
+        return True
+
+
+def get_youtube_quota_status() -> Dict:
+    """YouTube API 配额使用情况（用于监控）"""
+    with _youtube_quota_lock:
+        return {**_youtube_quota, 'daily_quota': YOUTUBE_DAILY_QUOTA}
+
+
+def _list_youtube_videos(api_key: str, video_ids: list) -> Dict:
+    """
+    同步调用 videos.list（在线程池中执行）
+    
+    Returns:
+        dict: {video_id: item}，不存在的视频不在结果中
+    """
+    clients = getattr(_youtube_clients, 'by_key', None)
+    if clients is None:
+        clients = _youtube_clients.by_key = {}
+    youtube = clients.get(api_key)
+    if youtube is None:
+        youtube = clients[api_key] = build('youtube', 'v3', developerKey=api_key, cache_discovery=False)
+    
+    response = youtube.videos().list(
+        part="snippet,statistics",
+        id=','.join(video_ids),
+        maxResults=YOUTUBE_BATCH_SIZE
+    ).execute()
+    return {item['id']: item for item in response.get('items', [])}
+
+
+class YouTubeBatcher:
+    """
+    把同一事件循环内的单个视频查询合并成批量请求
+    
+    调用方 await get(video_id)；短暂攒批后每 50 个 ID 在线程池中发一次 videos.list，
+    结果按 ID 分发回各个调用方。绑定在创建它的事件循环上
+    """
+    
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self._pending = {}  # video_id -> [Future]
+        self._flush_handle = None
+        self._tasks = set()  # 持有批量请求任务的引用，防止被回收
+    
+    async def get(self, video_id: str) -> Optional[Dict]:
+        """查询单个视频，返回 videos.list 的 item，视频不存在返回 None"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(video_id, []).append(future)
+        
+        if len(self._pending) >= YOUTUBE_BATCH_SIZE:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(YOUTUBE_BATCH_WINDOW, self._flush)
+        return await future
+    
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        pending, self._pending = self._pending, {}
+        video_ids = list(pending)
+        for i in range(0, len(video_ids), YOUTUBE_BATCH_SIZE):
+            chunk = {vid: pending[vid] for vid in video_ids[i:i + YOUTUBE_BATCH_SIZE]}
+            task = asyncio.ensure_future(self._run_batch(chunk))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run_batch(self, chunk: Dict):
+        try:
+            if not _reserve_youtube_quota(1, len(chunk)):
+                raise RuntimeError('YouTube API 今日配额已用完')
+            logger.info(f"📡 调用 YouTube Data API: {len(chunk)} 个视频")
+            items = await asyncio.to_thread(_list_youtube_videos, self.api_key, list(chunk))
+        except Exception as e:
+            for futures in chunk.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        
+        for video_id, futures in chunk.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(items.get(video_id))
+
+
+# 每个事件循环 + API Key 一个批处理器
+_youtube_batchers = weakref.WeakKeyDictionary()
+
+
+def _get_youtube_batcher(api_key: str) -> YouTubeBatcher:
+    loop = asyncio.get_running_loop()
+    batchers = _youtube_batchers.setdefault(loop, {})
+    if api_key not in batchers:
+        batchers[api_key] = YouTubeBatcher(api_key)
+    return batchers[api_key]
+
+
 class VideoStatsFetcher:
     """统一的视频统计数据抓取器"""
     
@@ -134,25 +274,26 @@ class VideoStatsFetcher:
         }
         
         try:
-            # 构建 oEmbed API URL
-            oembed_url = f"https://www.tiktok.com/oembed?url={quote(url)}"
-            logger.info(f"📡 调用 TikTok oEmbed API: {oembed_url}")
+            # 元数据按视频ID缓存，与提交核验共用，同一视频只调用一次 oEmbed API
+            oembed = await oembed_store.get_tiktok_oembed(url, timeout=10)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(oembed_url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        result['title'] = data.get('title', '')
-                        result['author'] = data.get('author_name', '')
-                        result['video_id'] = self._extract_tiktok_id(url)
-                        result['success'] = True
-                        
-                        logger.info(f"✅ TikTok 数据获取成功: {result['title']}")
-                    else:
-                        result['error'] = f"API 返回错误: {response.status}"
-                        logger.error(f"❌ TikTok oEmbed API 错误: {response.status}")
-                        
+            if oembed['status'] == 'ok':
+                data = oembed['data']
+                
+                result['title'] = data.get('title', '')
+                result['author'] = data.get('author_name', '')
+                video_id = self._extract_tiktok_id(url)
+                if not video_id:
+                    # vm.tiktok.com 等短链接
+                    _, video_id = await resolve_video_identity(url)
+                result['video_id'] = video_id or ''
+                result['success'] = True
+                
+                logger.info(f"✅ TikTok 数据获取成功: {result['title']}")
+            else:
+                result['error'] = oembed['error']
+                logger.error(f"❌ TikTok oEmbed API 错误: {oembed['http_status'] or oembed['error']}")
+                
         except Exception as e:
             result['error'] = str(e)
             logger.error(f"❌ TikTok 数据获取失败: {e}")
@@ -189,22 +330,15 @@ class VideoStatsFetcher:
                 return result
             
             result['video_id'] = video_id
-            logger.info(f"📡 调用 YouTube Data API: video_id={video_id}")
-            
-            # 调用YouTube API
-            request = self.youtube.videos().list(
-                part="snippet,statistics",
-                id=video_id
-            )
-            response = request.execute()
+            # 调用YouTube API（与同一时刻的其他查询合并成批量请求，在线程池中执行）
+            video_data = await _get_youtube_batcher(self.youtube_api_key).get(video_id)
             
-            if not response.get('items'):
+            if not video_data:
                 result['error'] = '视频不存在或已删除'
                 logger.error(f"❌ YouTube 视频不存在: {video_id}")
                 return result
             
             # 提取数据
-            video_data = response['items'][0]
             snippet = video_data.get('snippet', {})
             statistics = video_data.get('statistics', {})
             
@@ -226,6 +360,20 @@ class VideoStatsFetcher:
         
         return result
     
+    async def fetch_youtube_stats_batch(self, urls: List[str]) -> List[Dict]:
+        """
+        批量获取多个 YouTube 视频的数据
+        
+        每 50 个视频只消耗 1 次 videos.list 配额
+        
+        Args:
+            urls: YouTube 视频链接列表
+        
+        Returns:
+            list: 与 urls 一一对应的结果（结构同 fetch_video_stats）
+        """
+        return list(await asyncio.gather(*(self._fetch_youtube_stats(url) for url in urls)))
+
     async def _fetch_douyin_stats(self, url: str) -> Dict:
         """
         获取抖音视频数据（使用TikHub API）
@@ -263,41 +411,41 @@ class VideoStatsFetcher:
             endpoint = f"{self.tikhub_base_url}/douyin/web/fetch_one_video"
             params = {"aweme_id": video_id}
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    endpoint,
-                    headers=self.tikhub_headers,
-                    params=params,
-                    timeout=aiohttp.ClientTimeout(total=15)
-                ) as response:
-                    if response.status != 200:
-                        result['error'] = f"API 返回错误: {response.status}"
-                        logger.error(f"❌ TikHub API 错误: {response.status}")
-                        return result
-                    
-                    data = await response.json()
-                    
-                    if 'data' not in data or not data['data']:
-                        result['error'] = 'API 返回数据为空'
-                        logger.error("❌ TikHub API 返回数据为空")
-                        return result
-                    
-                    # 提取数据
-                    aweme_detail = data['data'].get('aweme_detail', data['data'])
-                    statistics = aweme_detail.get('statistics', {})
-                    author = aweme_detail.get('author', {})
-                    
-                    result['title'] = aweme_detail.get('desc', '')
-                    result['author'] = author.get('nickname', '')
-                    result['view_count'] = statistics.get('play_count', 0)
-                    result['like_count'] = statistics.get('digg_count', 0)
-                    result['comment_count'] = statistics.get('comment_count', 0)
-                    result['share_count'] = statistics.get('share_count', 0)
-                    result['collect_count'] = statistics.get('collect_count', 0)
-                    result['success'] = True
-                    
-                    logger.info(f"✅ 抖音数据获取成功: {result['title']} (点赞: {result['like_count']:,})")
-                    
+            session = http_client.get_session()
+            async with session.get(
+                endpoint,
+                headers=self.tikhub_headers,
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=15)
+            ) as response:
+                if response.status != 200:
+                    result['error'] = f"API 返回错误: {response.status}"
+                    logger.error(f"❌ TikHub API 错误: {response.status}")
+                    return result
+                
+                data = await response.json()
+                
+                if 'data' not in data or not data['data']:
+                    result['error'] = 'API 返回数据为空'
+                    logger.error("❌ TikHub API 返回数据为空")
+                    return result
+                
+                # 提取数据
+                aweme_detail = data['data'].get('aweme_detail', data['data'])
+                statistics = aweme_detail.get('statistics', {})
+                author = aweme_detail.get('author', {})
+                
+                result['title'] = aweme_detail.get('desc', '')
+                result['author'] = author.get('nickname', '')
+                result['view_count'] = statistics.get('play_count', 0)
+                result['like_count'] = statistics.get('digg_count', 0)
+                result['comment_count'] = statistics.get('comment_count', 0)
+                result['share_count'] = statistics.get('share_count', 0)
+                result['collect_count'] = statistics.get('collect_count', 0)
+                result['success'] = True
+                
+                logger.info(f"✅ 抖音数据获取成功: {result['title']} (点赞: {result['like_count']:,})")
+                
         except Exception as e:
             result['error'] = str(e)
             logger.error(f"❌ 抖音数据获取失败: {e}")
@@ -306,44 +454,19 @@ class VideoStatsFetcher:
     
     def _extract_tiktok_id(self, url: str) -> str:
         """提取TikTok视频ID"""
-        match = re.search(r'/video/(\d+)', url)
-        return match.group(1) if match else ''
+        platform, video_id = parse_video_url(url)
+        return video_id if platform == 'tiktok' and video_id else ''
     
     def _extract_youtube_id(self, url: str) -> Optional[str]:
-        """提取YouTube视频ID"""
-        # 解析URL
-        parsed_url = urlparse(url)
-        
-        # youtube.com/watch?v=VIDEO_ID
-        if 'youtube.com' in parsed_url.netloc:
-            query_params = parse_qs(parsed_url.query)
-            if 'v' in query_params:
-                return query_params['v'][0]
-            
-            # youtube.com/shorts/VIDEO_ID
-            match = re.search(r'/shorts/([a-zA-Z0-9_-]+)', url)
-            if match:
-                return match.group(1)
-        
-        # youtu.be/VIDEO_ID
-        elif 'youtu.be' in parsed_url.netloc:
-            return parsed_url.path.strip('/')
-        
-        return None
+        """提取YouTube视频ID（watch?v= / youtu.be / shorts / embed 等形式）"""
+        platform, video_id = parse_video_url(url)
+        return video_id if platform == 'youtube' else None
     
     async def _extract_douyin_id(self, url: str) -> Optional[str]:
-        """提取抖音视频ID（支持短链接跳转）"""
+        """提取抖音视频ID（短链接只跳转一次，解析结果共享）"""
         try:
-            # 如果是短链接，先跳转获取真实URL
-            if 'v.douyin.com' in url:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url, allow_redirects=True, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                        url = str(response.url)
-            
-            # 从URL中提取视频ID
-            match = re.search(r'/video/(\d+)', url)
-            return match.group(1) if match else None
-            
+            platform, video_id = await resolve_video_identity(url)
+            return video_id if platform == 'douyin' else None
         except Exception as e:
             logger.error(f"提取抖音视频ID失败: {e}")
             return None
@@ -12,10 +12,10 @@ import json
 from datetime import datetime
 from typing import Dict, Optional
 import aiohttp
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import http_client
+import db_pool
+from settings_cache import get_config
 import os
-from urllib.parse import urlparse
 
 # 配置日志
 logging.basicConfig(
@@ -28,16 +28,8 @@ logger = logging.getLogger(__name__)
 DATABASE_URL = os.getenv('DATABASE_URL')
 
 def get_db_connection():
-    """获取数据库连接"""
-    result = urlparse(DATABASE_URL)
-    return psycopg2.connect(
-        database=result.path[1:],
-        user=result.username,
-        password=result.password,
-        host=result.hostname,
-        port=result.port,
-        cursor_factory=RealDictCursor
-    )
+    """获取数据库连接（从共享连接池借出，conn.close() 时归还）"""
+    return db_pool.get_connection(DATABASE_URL)
 
 def generate_signature(payload: str, secret: str) -> str:
     """生成 HMAC-SHA256 签名"""
@@ -47,11 +39,32 @@ def generate_signature(payload: str, secret: str) -> str:
         hashlib.sha256
     ).hexdigest()
 
+async def _post_webhook(session, callback_url: str, payload: Dict, headers: Dict, timeout: int) -> tuple[bool, int, Optional[str]]:
+    """使用给定会话 POST 回调数据，返回 (success, HTTP状态码, error_message)"""
+    async with session.post(
+        callback_url,
+        json=payload,
+        headers=headers,
+        timeout=aiohttp.ClientTimeout(total=timeout)
+    ) as response:
+        status = response.status
+        response_text = await response.text()
+        
+        # 2xx 状态码表示成功
+        if 200 <= status < 300:
+            logger.info(f"✅ Webhook 发送成功: {callback_url} (status={status})")
+            return True, status, None
+        else:
+            error_msg = f"HTTP {status}: {response_text[:200]}"
+            logger.warning(f"⚠️ Webhook 返回非成功状态: {error_msg}")
+            return False, status, error_msg
+
 async def send_webhook(
     callback_url: str,
     payload: Dict,
     secret: Optional[str] = None,
-    timeout: int = 30
+    timeout: int = 30,
+    session: Optional[aiohttp.ClientSession] = None
 ) -> tuple[bool, Optional[str]]:
     """
     发送 Webhook 回调
@@ -61,10 +74,27 @@ async def send_webhook(
         payload: 回调数据
         secret: 回调密钥 (可选)
         timeout: 超时时间 (秒)
+        session: 使用的 aiohttp 会话 (可选，默认使用当前事件循环的共享会话)
     
     Returns:
         (success, error_message)
     """
+    success, _, error_msg = await send_webhook_with_status(callback_url, payload, secret, timeout, session)
+    return success, error_msg
+
+async def send_webhook_with_status(
+    callback_url: str,
+    payload: Dict,
+    secret: Optional[str] = None,
+    timeout: int = 30,
+    session: Optional[aiohttp.ClientSession] = None
+) -> tuple[bool, Optional[int], Optional[str]]:
+    """
+    发送 Webhook 回调，同时返回 HTTP 状态码（参数同 send_webhook）
+    
+    Returns:
+        (success, status, error_message)，超时 / 网络错误时 status 为 None
+    """
     import json
     
     # 准备请求头
@@ -82,39 +112,22 @@ async def send_webhook(
         headers['X-Webhook-Signature'] = generate_signature(payload_str, secret)
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                callback_url,
-                json=payload,
-                headers=headers,
-                timeout=aiohttp.ClientTimeout(total=timeout)
-            ) as response:
-                status = response.status
-                response_text = await response.text()
-                
-                # 2xx 状态码表示成功
-                if 200 <= status < 300:
-                    logger.info(f"✅ Webhook 发送成功: {callback_url} (status={status})")
-                    return True, None
-                else:
-                    error_msg = f"HTTP {status}: {response_text[:200]}"
-                    logger.warning(f"⚠️ Webhook 返回非成功状态: {error_msg}")
-                    return False, error_msg
+        return await _post_webhook(session or http_client.get_session(), callback_url, payload, headers, timeout)
     
     except asyncio.TimeoutError:
         error_msg = f"Timeout after {timeout}s"
         logger.error(f"❌ Webhook 超时: {callback_url}")
-        return False, error_msg
+        return False, None, error_msg
     
     except aiohttp.ClientError as e:
         error_msg = f"Client error: {str(e)}"
         logger.error(f"❌ Webhook 客户端错误: {error_msg}")
-        return False, error_msg
+        return False, None, error_msg
     
     except Exception as e:
         error_msg = f"Unexpected error: {str(e)}"
         logger.error(f"❌ Webhook 发送异常: {error_msg}", exc_info=True)
-        return False, error_msg
+        return False, None, error_msg
 
 async def send_task_completed_webhook(
     task_id: int,
@@ -143,18 +156,10 @@ async def send_task_completed_webhook(
         conn = get_db_connection()
         cur = conn.cursor()
         
-        # 获取全局 Callback URL 配置
-        global_callback_url = None
-        try:
-            cur.execute("""
-                SELECT config_value FROM system_config WHERE config_key = 'x2c_callback_url'
-            """)
-            config_result = cur.fetchone()
-            if config_result:
-                global_callback_url = config_result['config_value']
-                logger.info(f"🔗 使用全局 Callback URL: {global_callback_url}")
-        except Exception as config_error:
-            logger.warning(f"⚠️ 获取全局 Callback URL 失败: {config_error}")
+        # 获取全局 Callback URL 配置（配置缓存）
+        global_callback_url = get_config('x2c_callback_url')
+        if global_callback_url:
+            logger.info(f"🔗 使用全局 Callback URL: {global_callback_url}")
         
         # 获取任务信息
         cur.execute("""